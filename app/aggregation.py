@@ -0,0 +1,370 @@
+"""
+Server-side summaries of verdicts, and rolling per-device attack rates.
+
+`VerdictAggregator` reduces the probabilities of a batch (or of a stream, one
+chunk at a time) to the numbers a dashboard shows: attack count and rate, a
+probability histogram, the k highest-risk rows and, when the upload carries
+device and/or timestamp columns, counts per device and per time window. Every
+chunk is reduced with a handful of NumPy calls, so a summary costs a fraction
+of the per-row response it replaces.
+
+`DeviceRateStore` keeps the recent attack rate of every device seen with a
+device column, in fixed-size ring buffers of per-bucket row and attack counts.
+It lives in the memory of one server process and counts only what that
+process scored.
+"""
+import math
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.csv_decoder import CsvRowError
+
+
+class RowKeys(NamedTuple):
+    """The device ids (str) and Unix timestamps (float64) of the rows of an upload, where supplied."""
+
+    devices: Optional[np.ndarray]
+    timestamps: Optional[np.ndarray]
+
+
+def split_key_columns(
+    lines: List[bytes], row_numbers: np.ndarray, device_column: bool, timestamp_column: bool,
+) -> Tuple[RowKeys, List[bytes]]:
+    """
+    Splits the leading device id and/or timestamp columns off non-blank CSV
+    lines, in that order; returns their keys and the feature part of each line.
+    """
+    n_keys = int(device_column) + int(timestamp_column)
+    if n_keys == 0:
+        return RowKeys(None, None), lines
+    keys, features = [], []
+    for line, row in zip(lines, row_numbers.tolist()):
+        fields = line.split(b",", n_keys)
+        if len(fields) <= n_keys:
+            raise CsvRowError(row, f"expected {n_keys} leading key columns before the features.")
+        keys.append(fields[:n_keys])
+        features.append(fields[n_keys])
+    columns = list(zip(*keys)) if keys else [()] * n_keys
+
+    devices = timestamps = None
+    if device_column:
+        devices = np.array([value.strip().decode("utf-8", errors="replace") for value in columns[0]], dtype=str)
+    if timestamp_column:
+        values = columns[-1]
+        try:
+            timestamps = np.array(values, dtype=np.bytes_).astype(np.float64)
+            valid = bool(np.isfinite(timestamps).all())
+        except ValueError:
+            valid = False
+        if not valid:
+            for value, row in zip(values, row_numbers.tolist()):
+                try:
+                    if math.isfinite(float(value)):
+                        continue
+                except ValueError:
+                    pass
+                raise CsvRowError(row, f"could not parse timestamp '{value.decode('utf-8', errors='replace')}'.")
+    return RowKeys(devices, timestamps), features
+
+
+def numbered_lines(data: bytes) -> Tuple[np.ndarray, List[bytes]]:
+    """The non-blank lines of a whole CSV upload, with their 1-based line numbers."""
+    lines = data.replace(b"\r\n", b"\n").split(b"\n")
+    numbered = [(number, line) for number, line in enumerate(lines, 1) if line.strip()]
+    return np.array([number for number, _ in numbered], dtype=np.int64), [line for _, line in numbered]
+
+
+def _rate(attacks: int, rows: int) -> float:
+    return attacks / rows if rows else 0.0
+
+
+def _count_groups(attack: np.ndarray, device_codes: np.ndarray, buckets: np.ndarray):
+    """
+    Rows and attacks per distinct (device code, bucket) pair. Both are packed into
+    one int64 key, as a 1-D `np.unique` is several times faster than one over rows.
+    """
+    low = int(buckets.min())
+    span = int(buckets.max()) - low + 1
+    if span * (int(device_codes.max()) + 1) < 2 ** 62:
+        groups, inverse = np.unique(device_codes * span + (buckets - low), return_inverse=True)
+        group_devices, group_buckets = groups // span, groups % span + low
+    else:
+        groups, inverse = np.unique(np.column_stack([device_codes, buckets]), axis=0, return_inverse=True)
+        group_devices, group_buckets = groups[:, 0], groups[:, 1]
+    inverse = inverse.reshape(-1)
+    rows = np.bincount(inverse, minlength=len(group_devices))
+    attacks = np.bincount(inverse, weights=attack, minlength=len(group_devices)).astype(np.int64)
+    return group_devices, group_buckets, rows, attacks
+
+
+class VerdictAggregator:
+    """
+    Incremental summary of P(attack) values, fed one batch or chunk at a time.
+
+    Rows are indexed in the order they were added (0-based, data rows only).
+    Time windows are `window_seconds` long and aligned to the Unix epoch.
+    """
+
+    def __init__(self, threshold: float, histogram_bins: int = 10, top_k: int = 10, window_seconds: float = 60.0):
+        if histogram_bins < 1:
+            raise ValueError("histogram_bins must be at least 1")
+        if top_k < 0:
+            raise ValueError("top_k must not be negative")
+        if window_seconds <= 0:
+            raise ValueError("window_seconds must be positive")
+        self.threshold = threshold
+        self.histogram_bins = histogram_bins
+        self.top_k = top_k
+        self.window_seconds = window_seconds
+        self.rows = 0
+        self.attacks = 0
+        self._histogram = np.zeros(histogram_bins, dtype=np.int64)
+        self._top_index = np.empty(0, dtype=np.int64)
+        self._top_probability = np.empty(0, dtype=np.float64)
+        # (device or None, window start or None) -> [rows, attacks]
+        self._groups: Dict[tuple, List[int]] = {}
+        self._has_devices = self._has_windows = False
+
+    def add(self, probabilities: np.ndarray, keys: Optional[RowKeys] = None):
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        n = len(probabilities)
+        if n == 0:
+            return
+        attack = probabilities > self.threshold
+        self.attacks += int(np.count_nonzero(attack))
+
+        bins = np.clip((probabilities * self.histogram_bins).astype(np.int64), 0, self.histogram_bins - 1)
+        self._histogram += np.bincount(bins, minlength=self.histogram_bins)
+
+        if self.top_k:
+            # Only the chunk's own top k can enter the overall top k.
+            candidates = np.arange(n) if n <= self.top_k else np.argpartition(-probabilities, self.top_k - 1)[:self.top_k]
+            index = np.concatenate([self._top_index, candidates + self.rows])
+            probability = np.concatenate([self._top_probability, probabilities[candidates]])
+            order = np.lexsort((index, -probability))[:self.top_k]
+            self._top_index, self._top_probability = index[order], probability[order]
+
+        if keys is not None and (keys.devices is not None or keys.timestamps is not None):
+            self._add_groups(attack, keys)
+        self.rows += n
+
+    def _add_groups(self, attack: np.ndarray, keys: RowKeys):
+        n = len(attack)
+        device_names, device_codes = None, np.zeros(n, dtype=np.int64)
+        windows = np.zeros(n, dtype=np.int64)
+        if keys.devices is not None:
+            self._has_devices = True
+            device_names, device_codes = np.unique(keys.devices, return_inverse=True)
+        if keys.timestamps is not None:
+            self._has_windows = True
+            windows = np.floor(keys.timestamps / self.window_seconds).astype(np.int64)
+        groups = _count_groups(attack, device_codes.reshape(-1).astype(np.int64), windows)
+        for code, window, rows, attacks in zip(*(column.tolist() for column in groups)):
+            device = str(device_names[code]) if device_names is not None else None
+            window = window * self.window_seconds if keys.timestamps is not None else None
+            counts = self._groups.setdefault((device, window), [0, 0])
+            counts[0] += rows
+            counts[1] += attacks
+
+    def summary(self) -> dict:
+        edges = [i / self.histogram_bins for i in range(self.histogram_bins + 1)]
+        summary = {
+            "rows": self.rows,
+            "attacks": self.attacks,
+            "attack_rate": _rate(self.attacks, self.rows),
+            "threshold": self.threshold,
+            "probability_histogram": {"edges": edges, "counts": self._histogram.tolist()},
+            "top_k": [
+                {"index": index, "probability_attack": probability}
+                for index, probability in zip(self._top_index.tolist(), self._top_probability.tolist())
+            ],
+        }
+        if self._has_windows:
+            summary["window_seconds"] = self.window_seconds
+        if self._has_devices:
+            devices: Dict[str, dict] = {}
+            for (device, window), (rows, attacks) in sorted(self._groups.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+                entry = devices.setdefault(device, {"device": device, "rows": 0, "attacks": 0, "attack_rate": 0.0})
+                entry["rows"] += rows
+                entry["attacks"] += attacks
+                if window is not None:
+                    entry.setdefault("windows", []).append(
+                        {"start": window, "rows": rows, "attacks": attacks, "attack_rate": _rate(attacks, rows)}
+                    )
+            for entry in devices.values():
+                entry["attack_rate"] = _rate(entry["attacks"], entry["rows"])
+            # Riskiest devices first.
+            summary["devices"] = sorted(devices.values(), key=lambda entry: (-entry["attacks"], entry["device"]))
+        elif self._has_windows:
+            summary["windows"] = [
+                {"start": window, "rows": rows, "attacks": attacks, "attack_rate": _rate(attacks, rows)}
+                for (_, window), (rows, attacks) in sorted(self._groups.items(), key=lambda item: item[0][1])
+            ]
+        return summary
+
+
+class DeviceRateStore:
+    """
+    Rolling per-device row and attack counts in ring buffers of `buckets`
+    buckets of `bucket_seconds` each, for at most `max_devices` devices.
+
+    Device d's counts for time bucket b live in row d, column b % buckets of
+    two uint32 matrices, next to the bucket id they belong to, so a column is
+    reset when its next bucket comes in. The store's clock is the newest
+    bucket recorded (live traffic keeps it at the current time; a replay of old
+    captures moves it to their time), and only the `buckets` buckets up to it
+    are kept: older rows are dropped on arrival and devices without recent
+    rows are the first evicted when a new device needs room.
+    """
+
+    _NO_BUCKET = np.iinfo(np.int64).min
+
+    def __init__(self, bucket_seconds: float = 60.0, buckets: int = 60, max_devices: int = 10_000, devices_gauge=None):
+        if bucket_seconds <= 0:
+            raise ValueError("bucket_seconds must be positive")
+        if buckets < 1 or max_devices < 1:
+            raise ValueError("buckets and max_devices must be at least 1")
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.max_devices = max_devices
+        self.devices_gauge = devices_gauge
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        self._names: List[Optional[str]] = []
+        self._clock = self._NO_BUCKET
+        self._free: List[int] = []
+        self._allocate(min(64, max_devices))
+
+    def _allocate(self, capacity: int):
+        old = len(self._names)
+        rows = np.zeros((capacity, self.buckets), dtype=np.uint32)
+        attacks = np.zeros((capacity, self.buckets), dtype=np.uint32)
+        bucket_ids = np.full((capacity, self.buckets), self._NO_BUCKET, dtype=np.int64)
+        latest = np.full(capacity, self._NO_BUCKET, dtype=np.int64)
+        if old:
+            rows[:old], attacks[:old], bucket_ids[:old], latest[:old] = self._rows, self._attacks, self._bucket_ids, self._latest
+        self._rows, self._attacks, self._bucket_ids, self._latest = rows, attacks, bucket_ids, latest
+        self._names.extend([None] * (capacity - old))
+        # Popped from the end, so the lowest free slot is used first.
+        self._free = list(range(capacity - 1, old - 1, -1))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _slot(self, device: str, pinned: set) -> int:
+        """The slot of `device`, allocating (or evicting) one for a new device; -1 if none is free."""
+        slot = self._slots.get(device)
+        if slot is not None:
+            return slot
+        if not self._free and len(self._names) < self.max_devices:
+            self._allocate(min(2 * len(self._names), self.max_devices))
+        if self._free:
+            slot = self._free.pop()
+        else:
+            # Evict the device seen least recently, except the ones of the rows being recorded.
+            latest = self._latest.copy()
+            latest[list(pinned)] = np.iinfo(np.int64).max
+            slot = int(np.argmin(latest))
+            if slot in pinned:
+                return -1
+            del self._slots[self._names[slot]]
+        self._rows[slot] = 0
+        self._attacks[slot] = 0
+        self._bucket_ids[slot] = self._NO_BUCKET
+        self._latest[slot] = self._NO_BUCKET
+        self._names[slot] = device
+        self._slots[device] = slot
+        return slot
+
+    def record(self, devices: np.ndarray, timestamps: np.ndarray, attack: np.ndarray):
+        """Counts rows and attacks (a bool per row) per device and time bucket."""
+        if len(devices) == 0:
+            return
+        names, device_codes = np.unique(devices, return_inverse=True)
+        bucket = np.floor(np.asarray(timestamps, dtype=np.float64) / self.bucket_seconds).astype(np.int64)
+        group_devices, group_buckets, rows, attacks = _count_groups(
+            attack, device_codes.reshape(-1).astype(np.int64), bucket
+        )
+
+        with self._lock:
+            self._clock = max(self._clock, int(bucket.max()))
+            pinned = set()
+            slots = np.empty(len(names), dtype=np.int64)
+            for code, name in enumerate(names.tolist()):
+                slots[code] = slot = self._slot(name, pinned)
+                if slot >= 0:
+                    pinned.add(slot)
+            slot, bucket = slots[group_devices], group_buckets
+            column = bucket % self.buckets
+            stored = self._bucket_ids[slot, column]
+            # Within the horizon, every kept (device, bucket) group has a column of its own.
+            keep = (slot >= 0) & (bucket > self._clock - self.buckets) & (bucket >= stored)
+            slot, column, bucket, rows, attacks = slot[keep], column[keep], bucket[keep], rows[keep], attacks[keep]
+            stale = bucket > self._bucket_ids[slot, column]
+            self._rows[slot[stale], column[stale]] = 0
+            self._attacks[slot[stale], column[stale]] = 0
+            self._bucket_ids[slot, column] = bucket
+            self._rows[slot, column] += rows.astype(np.uint32)
+            self._attacks[slot, column] += attacks.astype(np.uint32)
+            np.maximum.at(self._latest, slot, bucket)
+            devices_tracked = len(self._slots)
+        if self.devices_gauge is not None:
+            self.devices_gauge.set(devices_tracked)
+
+    def _window(self, window_seconds: Optional[float]) -> int:
+        if window_seconds is None:
+            return self.buckets
+        return max(1, min(self.buckets, math.ceil(window_seconds / self.bucket_seconds)))
+
+    def rates(self, window_seconds: Optional[float] = None, limit: Optional[int] = None) -> List[dict]:
+        """Rows, attacks and attack rate per device over the last `window_seconds` (default: all kept), riskiest first."""
+        with self._lock:
+            since = self._clock - self._window(window_seconds)
+            recent = self._bucket_ids > since
+            rows = np.where(recent, self._rows, 0).sum(axis=1)
+            attacks = np.where(recent, self._attacks, 0).sum(axis=1)
+            entries = [
+                {
+                    "device": self._names[slot],
+                    "rows": int(rows[slot]),
+                    "attacks": int(attacks[slot]),
+                    "attack_rate": _rate(int(attacks[slot]), int(rows[slot])),
+                    "last_seen": float(self._latest[slot] * self.bucket_seconds),
+                }
+                for slot in self._slots.values()
+                if rows[slot]
+            ]
+        entries.sort(key=lambda entry: (-entry["attack_rate"], -entry["attacks"], entry["device"]))
+        return entries[:limit] if limit is not None else entries
+
+    def device(self, device: str, window_seconds: Optional[float] = None) -> Optional[dict]:
+        """One device's counts over the last `window_seconds` and per bucket, oldest first; None if unknown."""
+        with self._lock:
+            slot = self._slots.get(device)
+            if slot is None:
+                return None
+            since = self._clock - self._window(window_seconds)
+            bucket_ids = self._bucket_ids[slot]
+            columns = np.flatnonzero(bucket_ids > since)
+            columns = columns[np.argsort(bucket_ids[columns])]
+            buckets = [
+                {
+                    "start": float(bucket_ids[column] * self.bucket_seconds),
+                    "rows": int(self._rows[slot, column]),
+                    "attacks": int(self._attacks[slot, column]),
+                    "attack_rate": _rate(int(self._attacks[slot, column]), int(self._rows[slot, column])),
+                }
+                for column in columns.tolist()
+            ]
+        rows = sum(bucket["rows"] for bucket in buckets)
+        attacks = sum(bucket["attacks"] for bucket in buckets)
+        return {
+            "device": device,
+            "rows": rows,
+            "attacks": attacks,
+            "attack_rate": _rate(attacks, rows),
+            "bucket_seconds": self.bucket_seconds,
+            "buckets": buckets,
+        }
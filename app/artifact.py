@@ -0,0 +1,183 @@
+"""
+Single-file, memory-mappable model artifact.
+
+Layout (all offsets in bytes, arrays little-endian and 64-byte aligned):
+
+    magic        8 bytes   b"NBIOTTE\\0"
+    version      uint32
+    header_len   uint32
+    header       JSON (feature list, model metadata, array table, sha256 of payload)
+    payload      raw array data, starting at a 64-byte aligned offset
+
+The RobustScaler is folded into the split thresholds at build time, so the
+loaded ensemble scores raw feature vectors directly.
+
+Build it with:
+
+    python -m app.artifact --output app/saved_assets/lgbm_nbiot_model.nbm
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+from typing import List, Tuple
+
+import numpy as np
+
+from app.tree_engine import TreeEnsemble
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NBIOTTE\0"
+FORMAT_VERSION = 1
+_ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sII")
+
+# Arrays stored in the artifact, in file order.
+_ARRAY_FIELDS = (
+    "split_feature", "threshold", "children", "default_left",
+    "missing_type", "node_value", "roots", "nan_value",
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, "saved_assets")
+DEFAULT_ARTIFACT_PATH = os.path.join(ASSETS_DIR, "lgbm_nbiot_model.nbm")
+
+
+class ArtifactError(RuntimeError):
+    """Raised when an artifact is malformed, of an unknown version or corrupted."""
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def write_artifact(path: str, ensemble: TreeEnsemble, feature_list: List[str], metadata: dict = None):
+    """Writes `ensemble` (already folded, taking raw features) and its feature order to `path`."""
+    if len(feature_list) != ensemble.num_features:
+        raise ValueError(f"Feature list has {len(feature_list)} names, model expects {ensemble.num_features}.")
+
+    arrays = {name: np.ascontiguousarray(getattr(ensemble, name)) for name in _ARRAY_FIELDS}
+    table = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        dtype = array.dtype.newbyteorder("<")
+        table[name] = {"dtype": dtype.str, "shape": list(array.shape), "offset": offset}
+        arrays[name] = array.astype(dtype, copy=False)
+        offset += array.nbytes
+    payload_len = offset
+
+    payload = bytearray(payload_len)
+    for name, array in arrays.items():
+        start = table[name]["offset"]
+        payload[start:start + array.nbytes] = array.tobytes()
+
+    header = {
+        "feature_list": list(feature_list),
+        "num_features": ensemble.num_features,
+        "num_trees": ensemble.num_trees,
+        "max_depth": ensemble.max_depth,
+        "sigmoid": ensemble.sigmoid,
+        "arrays": table,
+        "payload_len": payload_len,
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "metadata": metadata or {},
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    payload_offset = _align(_PREAMBLE.size + len(header_bytes))
+    header_bytes += b" " * (payload_offset - _PREAMBLE.size - len(header_bytes))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path: str, verify: bool = True) -> Tuple[TreeEnsemble, List[str]]:
+    """
+    Memory-maps an artifact and returns (ensemble, feature_list).
+
+    The ensemble's arrays are read-only views into the mapping, so every
+    process that loads the same file shares its pages.
+    """
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    if mapped.size < _PREAMBLE.size:
+        raise ArtifactError(f"{path} is too small to be a model artifact.")
+    magic, version, header_len = _PREAMBLE.unpack(mapped[:_PREAMBLE.size].tobytes())
+    if magic != MAGIC:
+        raise ArtifactError(f"{path} is not a model artifact.")
+    if version != FORMAT_VERSION:
+        raise ArtifactError(f"{path} has format version {version}, expected {FORMAT_VERSION}.")
+
+    try:
+        header = json.loads(mapped[_PREAMBLE.size:_PREAMBLE.size + header_len].tobytes())
+    except ValueError as e:
+        raise ArtifactError(f"{path} has a corrupt header.") from e
+    payload_offset = _PREAMBLE.size + header_len
+    payload = mapped[payload_offset:]
+    if payload.size != header["payload_len"]:
+        raise ArtifactError(f"{path} is truncated or has trailing data.")
+    if verify and hashlib.sha256(payload).hexdigest() != header["sha256"]:
+        raise ArtifactError(f"{path} failed its checksum.")
+
+    arrays = {}
+    for name in _ARRAY_FIELDS:
+        spec = header["arrays"][name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        array = np.frombuffer(mapped, dtype=dtype, count=count, offset=payload_offset + spec["offset"])
+        arrays[name] = array.reshape(spec["shape"])
+    # Index arrays are stored as int64; this is a no-copy view on 64-bit platforms.
+    for name in ("split_feature", "children", "roots"):
+        arrays[name] = arrays[name].astype(np.intp, copy=False)
+
+    ensemble = TreeEnsemble(
+        max_depth=header["max_depth"],
+        num_features=header["num_features"],
+        sigmoid=header["sigmoid"],
+        **arrays,
+    )
+    return ensemble, header["feature_list"]
+
+
+def build_artifact(model_path: str, scaler_path: str, feature_list_path: str, output_path: str) -> TreeEnsemble:
+    """Folds the scaler into the LightGBM model and writes the artifact."""
+    import joblib
+
+    with open(feature_list_path, "r") as f:
+        feature_list = json.load(f)
+    scaler = joblib.load(scaler_path)
+    model = joblib.load(model_path)
+
+    ensemble = TreeEnsemble.from_booster(model.booster_).fold_scaler(scaler)
+    metadata = {
+        "source_model": os.path.basename(model_path),
+        "source_scaler": os.path.basename(scaler_path),
+        "scaler_folded": True,
+    }
+    write_artifact(output_path, ensemble, feature_list, metadata)
+    return ensemble
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the precompiled single-file model artifact.")
+    parser.add_argument("--model", default=os.path.join(ASSETS_DIR, "lgbm_nbiot_model.joblib"))
+    parser.add_argument("--scaler", default=os.path.join(ASSETS_DIR, "lgbm_nbiot_scaler.gz"))
+    parser.add_argument("--features", default=os.path.join(ASSETS_DIR, "lgbm_features.json"))
+    parser.add_argument("--output", default=DEFAULT_ARTIFACT_PATH)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] - %(message)s")
+    ensemble = build_artifact(args.model, args.scaler, args.features, args.output)
+    logger.info(f"Wrote {args.output} ({ensemble.num_trees} trees, {os.path.getsize(args.output)} bytes).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
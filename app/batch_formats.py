@@ -0,0 +1,73 @@
+import json
+from typing import Optional
+
+import numpy as np
+from fastapi.responses import Response
+
+# --- Batch Response Formats ---
+# Selected through the Accept header of /predict_batch. The list-of-objects JSON
+# stays the default; the other formats are built straight from NumPy arrays.
+MEDIA_TYPE_JSON = "application/json"
+MEDIA_TYPE_COLUMNAR_JSON = "application/vnd.nbiot.columnar+json"
+# Binary layout: float32[n] probability_attack followed by uint8[n] prediction_label,
+# both little-endian, with n in the X-Row-Count header.
+MEDIA_TYPE_BINARY = "application/vnd.nbiot.predictions"
+# Only the aggregate of the verdicts (app/aggregation.py), no per-row results.
+MEDIA_TYPE_SUMMARY = "application/vnd.nbiot.summary+json"
+
+SUPPORTED_MEDIA_TYPES = (MEDIA_TYPE_JSON, MEDIA_TYPE_COLUMNAR_JSON, MEDIA_TYPE_BINARY, MEDIA_TYPE_SUMMARY)
+
+
+def negotiate_media_type(accept: Optional[str]) -> Optional[str]:
+    """
+    Returns the supported media type the client prefers most, honouring q-values.
+    A missing header or a wildcard selects the default JSON; None means nothing acceptable.
+    """
+    if not accept:
+        return MEDIA_TYPE_JSON
+    candidates = []
+    for position, media_range in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type.lower()))
+
+    for _, _, media_type in sorted(candidates):
+        if media_type in ("*/*", "application/*"):
+            return MEDIA_TYPE_JSON
+        if media_type in SUPPORTED_MEDIA_TYPES:
+            return media_type
+    return None
+
+
+def columnar_json_response(probabilities: np.ndarray, threshold: float) -> Response:
+    labels = (probabilities > threshold).astype(np.uint8)
+    body = json.dumps({"labels": labels.tolist(), "probability_attack": probabilities.tolist()})
+    return Response(content=body, media_type=MEDIA_TYPE_COLUMNAR_JSON)
+
+
+def encode_binary(probabilities: np.ndarray, threshold: float) -> bytes:
+    labels = (probabilities > threshold).astype(np.uint8)
+    return probabilities.astype("<f4").tobytes() + labels.tobytes()
+
+
+def binary_response(probabilities: np.ndarray, threshold: float) -> Response:
+    return Response(
+        content=encode_binary(probabilities, threshold),
+        media_type=MEDIA_TYPE_BINARY,
+        headers={"X-Row-Count": str(len(probabilities))},
+    )
+
+
+def decode_binary(body: bytes):
+    """Inverse of `encode_binary`, for clients: returns (probability_attack, prediction_label)."""
+    n_rows = len(body) // 5
+    probabilities = np.frombuffer(body, dtype="<f4", count=n_rows)
+    labels = np.frombuffer(body, dtype=np.uint8, count=n_rows, offset=4 * n_rows)
+    return probabilities, labels
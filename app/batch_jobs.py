@@ -0,0 +1,429 @@
+"""
+Asynchronous batch scoring jobs, spooled to local disk.
+
+POST /jobs spools an upload (a headerless CSV or packed float32/float64 rows)
+into a directory of its own under BATCH_JOBS_DIR and returns a job id at once.
+Worker threads score it `chunk_rows` rows at a time, and the results are
+kept as a `.npz` file of two columns, `probability_attack` (float32) and
+`prediction_label` (uint8), until the job expires. A job directory holds:
+
+    job.json           state and progress, replaced atomically after every chunk
+    input.csv|.f4|.f8  the upload, deleted once the job is done
+    probabilities.f4   float32 P(attack) of the chunks done so far, appended per chunk
+    results.npz        the results, once the job has completed
+    lock               flock-ed by the process working on the job
+
+job.json is the commit point: a chunk is done only once job.json records it.
+A job interrupted by a restart is picked up again from its last recorded
+chunk: probabilities.f4 is truncated to the rows recorded and the upload is
+read again from the recorded offset. The lock is released by the OS when its
+process dies, so workers of several processes sharing the directory (see
+app/prefork.py) never work on the same job, and idle workers look for
+interrupted jobs every `poll_seconds`. Nothing leaves the local disk, so a
+job can only be polled through the server (pod) it was submitted to.
+"""
+import fcntl
+import itertools
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.csv_decoder import CsvRowError, decode_csv
+from app.inference_executor import Overloaded
+from app.model_registry import VersionNotFound
+
+logger = logging.getLogger(__name__)
+
+STATUS_UPLOADING = "uploading"
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+FORMAT_CSV = "csv"
+FORMAT_FLOAT32 = "float32"
+FORMAT_FLOAT64 = "float64"
+
+_INPUT_FILES = {FORMAT_CSV: "input.csv", FORMAT_FLOAT32: "input.f4", FORMAT_FLOAT64: "input.f8"}
+_RAW_DTYPES = {FORMAT_FLOAT32: np.dtype("<f4"), FORMAT_FLOAT64: np.dtype("<f8")}
+_STATE_FILE = "job.json"
+_PROBABILITIES_FILE = "probabilities.f4"
+RESULTS_FILE = "results.npz"
+
+
+class JobNotFound(LookupError):
+    pass
+
+
+class InvalidJobInput(ValueError):
+    pass
+
+
+class BatchJobManager:
+    """
+    Spools, schedules and scores batch jobs; all of their state lives in `directory`.
+
+    `score_fn(features_np, model_version)` returns P(attack) for a raw
+    (n_rows, n_features) matrix with the named model version. Every chunk is
+    parsed and scored through `runner(fn, *args)`, a blocking call (the
+    inference executor's `call`, so jobs share its bounded capacity); a chunk
+    shed with `Overloaded` is retried after the suggested delay. Workers wait
+    while `ready()` is false, e.g. until the startup model is active.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        score_fn: Callable[[np.ndarray, str], np.ndarray],
+        chunk_rows: int = 50_000,
+        workers: int = 1,
+        threshold: float = 0.5,
+        csv_threads: int = 1,
+        ttl_seconds: float = 24 * 3600,
+        poll_seconds: float = 5.0,
+        runner: Optional[Callable] = None,
+        ready: Optional[Callable[[], bool]] = None,
+        jobs_counter=None,
+    ):
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be at least 1")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.directory = directory
+        self.score_fn = score_fn
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+        self.threshold = threshold
+        self.csv_threads = csv_threads
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds
+        self.runner = runner or (lambda fn, *args: fn(*args))
+        self.ready = ready or (lambda: True)
+        self.jobs_counter = jobs_counter
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._threads:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._recover()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"batch-job-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Batch job workers started ({self.workers} workers, {self.chunk_rows} rows per chunk, in {self.directory}).")
+
+    def stop(self, timeout: float = 30.0):
+        """Stops the workers after their current chunk; unfinished jobs resume on the next start."""
+        if not self._threads:
+            return
+        self._stop.set()
+        for _ in self._threads:
+            self._queue.put(None)  # wakes an idle worker
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        logger.info("Batch job workers stopped.")
+
+    # --- Submission ---
+    def create(self, format: str, model_version: str, n_features: int) -> str:
+        """Creates an empty job; its upload is then written to `input_path(job_id)` and handed to `submit`."""
+        if format not in _INPUT_FILES:
+            raise InvalidJobInput(f"Unsupported job format '{format}'.")
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._path(job_id))
+        self._write_state(job_id, {
+            "job_id": job_id,
+            "status": STATUS_UPLOADING,
+            "format": format,
+            "model_version": model_version,
+            "n_features": n_features,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "bytes_total": 0,
+            "bytes_done": 0,
+            "lines_done": 0,
+            "rows_done": 0,
+            "chunks_done": 0,
+            "seconds": 0.0,
+            "error": None,
+        })
+        return job_id
+
+    def input_path(self, job_id: str) -> str:
+        state = self._read_state(job_id)
+        return self._path(job_id, _INPUT_FILES[state["format"]])
+
+    def submit(self, job_id: str) -> dict:
+        """Queues a spooled upload; raises `InvalidJobInput` (and deletes the job) if it cannot be scored."""
+        state = self._read_state(job_id)
+        size = os.path.getsize(self._path(job_id, _INPUT_FILES[state["format"]]))
+        error = None
+        if size == 0:
+            error = "Uploaded file is empty."
+        elif state["format"] in _RAW_DTYPES:
+            row_bytes = _RAW_DTYPES[state["format"]].itemsize * state["n_features"]
+            if size % row_bytes:
+                error = (f"Body length {size} is not a multiple of {state['n_features']} {state['format']} values "
+                         f"({row_bytes} bytes per row).")
+        if error:
+            self.delete(job_id)
+            raise InvalidJobInput(error)
+        state.update(status=STATUS_QUEUED, bytes_total=size)
+        self._write_state(job_id, state)
+        self._enqueue(job_id)
+        return self.describe(state)
+
+    # --- Queries ---
+    def status(self, job_id: str) -> dict:
+        return self.describe(self._read_state(job_id))
+
+    def describe(self, state: dict) -> dict:
+        """The public view of a job's state: its progress, throughput and outcome."""
+        total_rows = None
+        if state["format"] in _RAW_DTYPES:
+            total_rows = state["bytes_total"] // (_RAW_DTYPES[state["format"]].itemsize * state["n_features"])
+        return {
+            "job_id": state["job_id"],
+            "status": state["status"],
+            "format": state["format"],
+            "model_version": state["model_version"],
+            "rows_done": state["rows_done"],
+            "total_rows": total_rows,
+            "progress": state["bytes_done"] / state["bytes_total"] if state["bytes_total"] else 0.0,
+            "rows_per_second": state["rows_done"] / state["seconds"] if state["seconds"] else 0.0,
+            "created_at": state["created_at"],
+            "started_at": state["started_at"],
+            "finished_at": state["finished_at"],
+            "error": state["error"],
+        }
+
+    def results_path(self, job_id: str) -> Optional[str]:
+        """Path of the results of a completed job, or None while it is not completed."""
+        state = self._read_state(job_id)
+        return self._path(job_id, RESULTS_FILE) if state["status"] == STATUS_COMPLETED else None
+
+    def delete(self, job_id: str):
+        """Removes a job and its files; a worker scoring it stops at its next chunk."""
+        path = self._path(job_id)
+        if not os.path.isfile(os.path.join(path, _STATE_FILE)):
+            raise JobNotFound(f"Job '{job_id}' not found.")
+        shutil.rmtree(path, ignore_errors=True)
+
+    # --- State files ---
+    def _path(self, job_id: str, *names: str) -> str:
+        # Job ids are uuid4 hex strings; anything else could escape the jobs directory.
+        if len(job_id) != 32 or not all(c in "0123456789abcdef" for c in job_id):
+            raise JobNotFound(f"Job '{job_id}' not found.")
+        return os.path.join(self.directory, job_id, *names)
+
+    def _read_state(self, job_id: str) -> dict:
+        try:
+            with open(self._path(job_id, _STATE_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise JobNotFound(f"Job '{job_id}' not found.") from None
+
+    def _write_state(self, job_id: str, state: dict):
+        path = self._path(job_id, _STATE_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _enqueue(self, job_id: str):
+        with self._queued_lock:
+            if job_id in self._queued:
+                return
+            self._queued.add(job_id)
+        self._queue.put(job_id)
+
+    def _recover(self):
+        """Queues interrupted jobs and deletes the expired ones."""
+        try:
+            job_ids = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        now = time.time()
+        for job_id in job_ids:
+            try:
+                state = self._read_state(job_id)
+            except (JobNotFound, ValueError):
+                continue
+            if now - (state["finished_at"] or state["created_at"]) > self.ttl_seconds:
+                if state["status"] in (STATUS_COMPLETED, STATUS_FAILED, STATUS_UPLOADING):
+                    logger.info(f"Deleting expired batch job {job_id}.")
+                    shutil.rmtree(self._path(job_id), ignore_errors=True)
+                    continue
+            if state["status"] in (STATUS_QUEUED, STATUS_RUNNING):
+                self._enqueue(job_id)
+
+    # --- Workers ---
+    def _work(self):
+        while not self._stop.is_set():
+            if not self.ready():
+                self._stop.wait(min(self.poll_seconds, 0.1))
+                continue
+            try:
+                job_id = self._queue.get(timeout=self.poll_seconds)
+            except queue.Empty:
+                self._recover()
+                continue
+            if job_id is None:
+                continue
+            with self._queued_lock:
+                self._queued.discard(job_id)
+            try:
+                self._run_locked(job_id)
+            except Exception:
+                logger.error(f"Batch job {job_id} could not be run.", exc_info=True)
+
+    def _run_locked(self, job_id: str):
+        try:
+            lock = open(self._path(job_id, "lock"), "a")
+        except FileNotFoundError:
+            return  # deleted
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # another process is scoring it
+            try:
+                state = self._read_state(job_id)
+            except JobNotFound:
+                return
+            if state["status"] in (STATUS_QUEUED, STATUS_RUNNING):
+                self._run(job_id, state)
+
+    def _run(self, job_id: str, state: dict):
+        probabilities_path = self._path(job_id, _PROBABILITIES_FILE)
+        with open(probabilities_path, "ab"):
+            pass
+        if os.path.getsize(probabilities_path) < state["rows_done"] * 4:
+            # The recorded results were lost (e.g. not yet on disk when the host crashed); start over.
+            logger.warning(f"Batch job {job_id}: results shorter than recorded, restarting from the first row.")
+            state.update(bytes_done=0, lines_done=0, rows_done=0, chunks_done=0)
+        if state["status"] == STATUS_RUNNING:
+            logger.info(f"Resuming batch job {job_id} after {state['rows_done']} rows.")
+        state.update(status=STATUS_RUNNING, started_at=state["started_at"] or time.time())
+        self._write_state(job_id, state)
+
+        try:
+            with open(self.input_path(job_id), "rb") as source, open(probabilities_path, "r+b") as results:
+                results.truncate(state["rows_done"] * 4)
+                results.seek(0, os.SEEK_END)
+                source.seek(state["bytes_done"])
+                while True:
+                    if self._stop.is_set() or not os.path.isdir(self._path(job_id)):
+                        return  # resumed on the next start, or deleted
+                    started = time.perf_counter()
+                    data, lines = self._read_chunk(source, state)
+                    if not data:
+                        break
+                    probabilities = self._score_chunk(state, data, lines)
+                    results.write(probabilities.astype("<f4").tobytes())
+                    results.flush()
+                    state["bytes_done"] += len(data)
+                    state["lines_done"] += lines
+                    state["rows_done"] += len(probabilities)
+                    state["chunks_done"] += 1
+                    state["seconds"] += time.perf_counter() - started
+                    self._write_state(job_id, state)
+            if state["rows_done"] == 0:
+                raise InvalidJobInput("CSV file is empty or contains no data rows.")
+            self._finish(job_id, state)
+        except (CsvRowError, InvalidJobInput, VersionNotFound) as e:
+            # Bad input or a model version that is no longer loaded: the job cannot succeed.
+            self._fail(job_id, state, str(e))
+        except Exception as e:
+            if self._stop.is_set() or not os.path.isdir(self._path(job_id)):
+                return
+            logger.error(f"Error while scoring batch job {job_id}", exc_info=True)
+            self._fail(job_id, state, f"An unexpected server error occurred: {type(e).__name__}.")
+
+    def _read_chunk(self, source, state: dict):
+        """The next chunk of the upload and its number of lines (for CSV; 0 otherwise)."""
+        if state["format"] == FORMAT_CSV:
+            lines = list(itertools.islice(source, self.chunk_rows))
+            return b"".join(lines), len(lines)
+        row_bytes = _RAW_DTYPES[state["format"]].itemsize * state["n_features"]
+        return source.read(self.chunk_rows * row_bytes), 0
+
+    def _score_chunk(self, state: dict, data: bytes, lines: int) -> np.ndarray:
+        while True:
+            try:
+                return self.runner(self._parse_and_score, state, data, lines)
+            except Overloaded as e:
+                # Interactive requests come first; try the chunk again once the executor has room.
+                if self._stop.wait(e.retry_after):
+                    raise
+
+    def _parse_and_score(self, state: dict, data: bytes, lines: int) -> np.ndarray:
+        n_features = state["n_features"]
+        if state["format"] == FORMAT_CSV:
+            first_line = state["lines_done"] + 1
+            features_np = decode_csv(
+                data, n_features, threads=self.csv_threads, line_numbers=np.arange(first_line, first_line + lines)
+            )
+            if len(features_np) == 0:
+                return np.empty(0, dtype=np.float32)
+        else:
+            features_np = np.frombuffer(data, dtype=_RAW_DTYPES[state["format"]]).reshape(-1, n_features)
+        return self.score_fn(features_np, state["model_version"])
+
+    def _finish(self, job_id: str, state: dict):
+        probabilities = np.fromfile(self._path(job_id, _PROBABILITIES_FILE), dtype="<f4")
+        results_path = self._path(job_id, RESULTS_FILE)
+        with open(f"{results_path}.tmp", "wb") as f:
+            np.savez(f, probability_attack=probabilities, prediction_label=(probabilities > self.threshold).astype(np.uint8))
+        os.replace(f"{results_path}.tmp", results_path)
+        state.update(status=STATUS_COMPLETED, finished_at=time.time())
+        self._write_state(job_id, state)
+        self._remove_work_files(job_id, state)
+        self._count(STATUS_COMPLETED)
+        logger.info(
+            f"Batch job {job_id} completed: {state['rows_done']} rows in {state['chunks_done']} chunks "
+            f"({self.describe(state)['rows_per_second']:.0f} rows/s)."
+        )
+
+    def _fail(self, job_id: str, state: dict, error: str):
+        logger.warning(f"Batch job {job_id} failed: {error}")
+        state.update(status=STATUS_FAILED, finished_at=time.time(), error=error)
+        try:
+            self._write_state(job_id, state)
+        except FileNotFoundError:
+            return  # deleted meanwhile
+        self._remove_work_files(job_id, state)
+        self._count(STATUS_FAILED)
+
+    def _remove_work_files(self, job_id: str, state: dict):
+        for name in (_INPUT_FILES[state["format"]], _PROBABILITIES_FILE):
+            try:
+                os.remove(self._path(job_id, name))
+            except FileNotFoundError:
+                pass
+
+    def _count(self, outcome: str):
+        if self.jobs_counter is not None:
+            self.jobs_counter.labels(outcome=outcome).inc()
+
+
+def load_results(path: str) -> Dict[str, np.ndarray]:
+    """Reads a downloaded results file, for clients: {"probability_attack": ..., "prediction_label": ...}."""
+    with np.load(path) as results:
+        return {name: results[name] for name in results.files}
@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.inference_executor import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Sentinel placed on the queue to stop the worker thread.
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row scoring calls into one batched call.
+
+    Callers block in `submit` while a background thread collects up to
+    `max_batch_size` rows, waiting at most `max_wait_ms` after the first row
+    arrives, scores them with a single `score_fn(rows, deadline)` call and fans
+    the results back out to each caller. A caller stops waiting at its deadline
+    (time.monotonic()) with `DeadlineExceeded`; rows whose deadline has passed
+    are dropped from their batch, and the batch is scored with the latest
+    deadline of its rows (None if any row has none).
+    """
+
+    def __init__(
+        self,
+        score_fn: Callable[[np.ndarray, Optional[float]], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0,
+        batch_size_histogram=None,
+        queue_wait_histogram=None,
+        rejected_counter=None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must not be negative")
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch_size_histogram = batch_size_histogram
+        self.queue_wait_histogram = queue_wait_histogram
+        self.rejected_counter = rejected_counter
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Micro-batcher started (max_batch_size={self.max_batch_size}, max_wait={self.max_wait * 1000:.2f} ms).")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        logger.info("Micro-batcher stopped.")
+
+    def submit(self, features: np.ndarray, deadline: Optional[float] = None) -> float:
+        """Scores one feature vector, blocking until its batch has been evaluated or the deadline passes."""
+        if self._thread is None:
+            raise RuntimeError("MicroBatcher is not running.")
+        future: Future = Future()
+        self._queue.put((features, future, time.perf_counter(), deadline))
+        try:
+            return future.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # A row not picked up yet is skipped; one already being scored is discarded.
+            future.cancel()
+            self._reject()
+            raise DeadlineExceeded("The request deadline passed before scoring completed.")
+
+    def _reject(self):
+        if self.rejected_counter is not None:
+            self.rejected_counter.labels(reason="deadline").inc()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        stop = False
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._score(batch)
+            if stop:
+                return
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        now = time.monotonic()
+        live = []
+        for item in batch:
+            _, future, _, deadline = item
+            # False once the caller has given up; after this, cancel() no longer succeeds.
+            if not future.set_running_or_notify_cancel():
+                continue
+            if deadline is not None and deadline <= now:
+                self._reject()
+                future.set_exception(DeadlineExceeded("The request deadline passed while it was queued."))
+                continue
+            live.append(item)
+        if not live:
+            return
+        batch = live
+        if self.batch_size_histogram is not None:
+            self.batch_size_histogram.observe(len(batch))
+        if self.queue_wait_histogram is not None:
+            for _, _, enqueued_at, _ in batch:
+                self.queue_wait_histogram.observe(started - enqueued_at)
+
+        deadlines = [deadline for _, _, _, deadline in batch]
+        try:
+            features_np = np.vstack([features for features, _, _, _ in batch])
+            probabilities = self.score_fn(features_np, None if None in deadlines else max(deadlines))
+            if len(probabilities) != len(batch):
+                raise RuntimeError(f"Scoring returned {len(probabilities)} results for a batch of {len(batch)}.")
+        except Exception as e:
+            for _, future, _, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _, _), probability in zip(batch, probabilities):
+            future.set_result(float(probability))
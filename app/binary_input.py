@@ -0,0 +1,75 @@
+import msgpack
+import numpy as np
+
+# --- Binary Request Bodies ---
+# Feature matrices sent as packed little-endian floats, row-major (n_rows x n_features).
+MEDIA_TYPE_FLOAT32 = "application/vnd.nbiot.float32"
+MEDIA_TYPE_FLOAT64 = "application/vnd.nbiot.float64"
+# msgpack body: either {"dtype": "float32" | "float64", "data": <bin>} with packed
+# values as above, or a plain array of floats (one row) / array of arrays.
+MEDIA_TYPE_MSGPACK = "application/msgpack"
+
+_RAW_DTYPES = {
+    MEDIA_TYPE_FLOAT32: np.dtype("<f4"),
+    MEDIA_TYPE_FLOAT64: np.dtype("<f8"),
+}
+_MSGPACK_DTYPES = {"float32": np.dtype("<f4"), "float64": np.dtype("<f8")}
+
+SUPPORTED_CONTENT_TYPES = (MEDIA_TYPE_FLOAT32, MEDIA_TYPE_FLOAT64, MEDIA_TYPE_MSGPACK)
+
+
+class UnsupportedContentType(ValueError):
+    pass
+
+
+class InvalidFeatureBody(ValueError):
+    pass
+
+
+def _from_packed(data: bytes, dtype: np.dtype, n_features: int) -> np.ndarray:
+    row_bytes = dtype.itemsize * n_features
+    if not data:
+        raise InvalidFeatureBody("Request body is empty.")
+    if len(data) % row_bytes:
+        raise InvalidFeatureBody(
+            f"Body length {len(data)} is not a multiple of {n_features} {dtype.name} values ({row_bytes} bytes per row)."
+        )
+    # A read-only view over the request bytes; no per-element Python objects are created.
+    return np.frombuffer(data, dtype=dtype).reshape(-1, n_features)
+
+
+def _from_msgpack(data: bytes, n_features: int) -> np.ndarray:
+    try:
+        payload = msgpack.unpackb(data, raw=False)
+    except Exception as e:
+        raise InvalidFeatureBody("Body is not valid msgpack.") from e
+
+    if isinstance(payload, dict):
+        dtype = payload.get("dtype", "float64")
+        # Only strings are looked up: a map or list is unhashable.
+        dtype = _MSGPACK_DTYPES.get(dtype) if isinstance(dtype, str) else None
+        if dtype is None or not isinstance(payload.get("data"), bytes):
+            raise InvalidFeatureBody("msgpack map must hold 'data' (bin) and 'dtype' ('float32' or 'float64').")
+        return _from_packed(payload["data"], dtype, n_features)
+
+    try:
+        features_np = np.asarray(payload, dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        raise InvalidFeatureBody("msgpack array must contain only numbers.") from e
+    if features_np.ndim == 1:
+        features_np = features_np.reshape(1, -1)
+    if features_np.ndim != 2 or features_np.shape[0] == 0:
+        raise InvalidFeatureBody("msgpack array must be a row or a list of rows.")
+    if features_np.shape[1] != n_features:
+        raise InvalidFeatureBody(f"Expected {n_features} features, but got {features_np.shape[1]}")
+    return features_np
+
+
+def decode_feature_body(data: bytes, content_type: str, n_features: int) -> np.ndarray:
+    """Turns a binary request body into an (n_rows, n_features) array."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in _RAW_DTYPES:
+        return _from_packed(data, _RAW_DTYPES[media_type], n_features)
+    if media_type in (MEDIA_TYPE_MSGPACK, "application/x-msgpack"):
+        return _from_msgpack(data, n_features)
+    raise UnsupportedContentType(f"Unsupported Content-Type '{media_type}'. Supported: {', '.join(SUPPORTED_CONTENT_TYPES)}.")
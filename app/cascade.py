@@ -0,0 +1,331 @@
+"""
+Early-exit cascade over the trees of the binary LightGBM ensemble.
+
+Each batch is first scored with the first K trees only. Rows whose partial
+margin is at least `cutoff` away from the decision threshold (in log-odds)
+stop there; the remaining trees are evaluated for the uncertain rows alone.
+Because tree outputs add up, the rows that run to the end get exactly the
+full-model score. Rows that exit early are reported with the K-tree estimate
+of P(attack).
+
+The cut-offs are calibrated offline on a reference dataset so that every
+early exit agrees with the full model's decision there:
+
+    python -m app.cascade --data reference.csv --output app/saved_assets/lgbm_nbiot_cascade.json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from app.tree_engine import TreeEnsemble, binary_sigmoid
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, "saved_assets")
+DEFAULT_CASCADE_PATH = os.path.join(ASSETS_DIR, "lgbm_nbiot_cascade.json")
+
+# Stage sizes tried by the calibration when none are given, as fractions of the ensemble.
+DEFAULT_CANDIDATE_FRACTIONS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6)
+
+PartialMargin = Callable[[np.ndarray, int, int], np.ndarray]
+
+
+class _BoosterMargin:
+    """partial_margin for a `lightgbm.Booster`; a class rather than a closure so it pickles."""
+
+    def __init__(self, booster, num_threads: Optional[int] = None):
+        self.booster = booster
+        self.num_threads = num_threads
+
+    def __call__(self, X, start, end):
+        params = {"num_threads": self.num_threads} if self.num_threads else {}
+        return self.booster.predict(X, raw_score=True, start_iteration=start, num_iteration=end - start, **params)
+
+
+def partial_margin_fn(model):
+    """
+    Returns (partial_margin, num_trees, sigmoid) for a TreeEnsemble, a
+    `lightgbm.Booster` or an LGBMClassifier. `partial_margin(X, start, end)` is
+    the raw score contributed by trees [start, end).
+    """
+    if isinstance(model, TreeEnsemble):
+        return model.predict_margin, model.num_trees, model.sigmoid
+
+    booster = getattr(model, "booster_", model)
+    # predict_proba stops at the best iteration when early stopping recorded one.
+    num_trees = booster.best_iteration if booster.best_iteration > 0 else booster.num_trees()
+    sigmoid = binary_sigmoid(booster.dump_model(num_iteration=1)["objective"])
+    return _BoosterMargin(booster), num_trees, sigmoid
+
+
+def threshold_margin(threshold: float, sigmoid: float) -> float:
+    """The raw score at which P(attack) equals `threshold`."""
+    return math.log(threshold / (1.0 - threshold)) / sigmoid
+
+
+class CascadeModel:
+    """
+    Drop-in replacement for `predict_proba` that evaluates the ensemble in stages.
+
+    `stages` is a list of (num_trees, cutoff) pairs in increasing num_trees;
+    after each stage the rows with |margin - threshold margin| >= cutoff exit.
+    The rows left after the last stage are finished with all `num_trees` trees.
+    """
+
+    def __init__(
+        self,
+        partial_margin: PartialMargin,
+        num_trees: int,
+        stages: Sequence[tuple],
+        threshold: float = 0.5,
+        sigmoid: float = 1.0,
+        exit_counter=None,
+    ):
+        stages = [(int(k), float(cutoff)) for k, cutoff in stages]
+        if any(not 0 < k < num_trees for k, _ in stages) or [k for k, _ in stages] != sorted({k for k, _ in stages}):
+            raise ValueError(f"Stage sizes must be increasing and below the ensemble's {num_trees} trees.")
+        self.partial_margin = partial_margin
+        self.num_trees = num_trees
+        self.stages = stages
+        self.threshold = threshold
+        self.sigmoid = sigmoid
+        self.threshold_margin = threshold_margin(threshold, sigmoid)
+        self.exit_counter = exit_counter
+        # Rows that exited after each stage; the last entry counts rows that ran all trees.
+        # The model is shared by the inference threads, so the counts are updated under a lock.
+        self.exits = [0] * (len(stages) + 1)
+        self._exits_lock = threading.Lock()
+
+    @classmethod
+    def from_calibration(cls, model, calibration: dict, threshold: float = 0.5, exit_counter=None) -> "CascadeModel":
+        """Wraps `model` with calibrated stages, checking they were calibrated for this model and threshold."""
+        partial_margin, num_trees, sigmoid = partial_margin_fn(model)
+        if calibration["num_trees"] != num_trees:
+            raise ValueError(f"Cascade was calibrated for {calibration['num_trees']} trees, the model has {num_trees}.")
+        if not math.isclose(calibration["threshold"], threshold):
+            raise ValueError(f"Cascade was calibrated for threshold {calibration['threshold']}, serving uses {threshold}.")
+        stages = [(stage["num_trees"], stage["cutoff"]) for stage in calibration["stages"]]
+        return cls(partial_margin, num_trees, stages, threshold, sigmoid, exit_counter)
+
+    def __getstate__(self):
+        # Metrics stay with the serving process when the model is shipped to a worker process.
+        state = dict(self.__dict__)
+        state["exit_counter"] = None
+        del state["_exits_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._exits_lock = threading.Lock()
+
+    def set_num_threads(self, num_threads: int):
+        if isinstance(self.partial_margin, _BoosterMargin):
+            self.partial_margin.num_threads = num_threads
+
+    def exit_counts(self) -> List[int]:
+        """A consistent copy of `exits`."""
+        with self._exits_lock:
+            return list(self.exits)
+
+    @property
+    def rows_scored(self) -> int:
+        return sum(self.exit_counts())
+
+    @property
+    def average_trees_per_row(self) -> float:
+        return self._average_trees(self.exit_counts())
+
+    def _average_trees(self, exits: List[int]) -> float:
+        if not sum(exits):
+            return float(self.num_trees)
+        sizes = [k for k, _ in self.stages] + [self.num_trees]
+        return sum(k * n for k, n in zip(sizes, exits)) / sum(exits)
+
+    def predict_margin(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X)
+        margin = np.zeros(len(X))
+        pending = np.arange(len(X))
+        evaluated = 0
+        exits = []
+        for k, cutoff in self.stages:
+            rows = X if len(pending) == len(X) else X[pending]
+            margin[pending] += self.partial_margin(rows, evaluated, k)
+            evaluated = k
+            uncertain = np.abs(margin[pending] - self.threshold_margin) < cutoff
+            exits.append(len(pending) - int(uncertain.sum()))
+            pending = pending[uncertain]
+            if not len(pending):
+                break
+        if len(pending):
+            rows = X if len(pending) == len(X) else X[pending]
+            margin[pending] += self.partial_margin(rows, evaluated, self.num_trees)
+        exits += [0] * (len(self.stages) - len(exits))
+        exits.append(len(pending))
+
+        with self._exits_lock:
+            for i, n in enumerate(exits):
+                self.exits[i] += n
+        if self.exit_counter is not None:
+            sizes = [k for k, _ in self.stages] + [self.num_trees]
+            for k, n in zip(sizes, exits):
+                if n:
+                    self.exit_counter.labels(trees=str(k)).inc(n)
+        return margin
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Returns [[P(benign), P(attack)], ...] like `LGBMClassifier.predict_proba`."""
+        probability_attack = 1.0 / (1.0 + np.exp(-self.sigmoid * self.predict_margin(X)))
+        return np.column_stack([1.0 - probability_attack, probability_attack])
+
+    def describe(self) -> dict:
+        exits = self.exit_counts()
+        return {
+            "stages": [{"num_trees": k, "cutoff": cutoff} for k, cutoff in self.stages],
+            "num_trees": self.num_trees,
+            "rows_scored": sum(exits),
+            "exits": exits,
+            "average_trees_per_row": round(self._average_trees(exits), 3),
+        }
+
+
+def _labels(margin: np.ndarray, sigmoid: float, threshold: float) -> np.ndarray:
+    # Same decision rule as the API: P(attack) > threshold.
+    return 1.0 / (1.0 + np.exp(-sigmoid * margin)) > threshold
+
+
+def _best_time(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def calibrate(
+    model,
+    features_np: np.ndarray,
+    threshold: float = 0.5,
+    stages: Optional[List[int]] = None,
+    slack: float = 0.0,
+    timing_repeats: int = 3,
+) -> dict:
+    """
+    Calibrates cut-offs on `features_np` (already scaled for the model) and returns
+    the calibration with a report of exits, average trees per row and speedup.
+
+    For each stage the cut-off is the smallest distance from the threshold margin
+    beyond which no reference row's K-tree decision differs from the full model's,
+    plus `slack` log-odds. Without explicit `stages`, the single stage size with
+    the lowest expected number of trees per row is picked from a few candidates.
+    """
+    partial_margin, num_trees, sigmoid = partial_margin_fn(model)
+    if num_trees < 2:
+        raise ValueError("A cascade needs an ensemble of at least two trees.")
+    if stages is None:
+        candidates = sorted({min(max(1, round(f * num_trees)), num_trees - 1) for f in DEFAULT_CANDIDATE_FRACTIONS})
+    else:
+        candidates = sorted(set(stages))
+        if any(not 0 < k < num_trees for k in candidates):
+            raise ValueError(f"Stage sizes must lie between 1 and {num_trees - 1}.")
+
+    t = threshold_margin(threshold, sigmoid)
+    prefix, evaluated, running = {}, 0, np.zeros(len(features_np))
+    for k in candidates:
+        running = running + partial_margin(features_np, evaluated, k)
+        prefix[k], evaluated = running, k
+    full = running + partial_margin(features_np, evaluated, num_trees)
+    full_labels = _labels(full, sigmoid, threshold)
+
+    cutoffs = {}
+    for k in candidates:
+        distance = np.abs(prefix[k] - t)
+        disagree = _labels(prefix[k], sigmoid, threshold) != full_labels
+        # Exits need distance >= cutoff, so the cutoff must lie strictly above every disagreeing row.
+        worst = np.nextafter(distance[disagree].max(), np.inf) if disagree.any() else 0.0
+        cutoffs[k] = float(worst + slack)
+
+    def expected_trees(chosen):
+        remaining = np.ones(len(features_np), dtype=bool)
+        total = 0.0
+        for k in chosen:
+            exits = remaining & (np.abs(prefix[k] - t) >= cutoffs[k])
+            total += k * exits.sum()
+            remaining &= ~exits
+        return (total + num_trees * remaining.sum()) / max(len(features_np), 1)
+
+    chosen = candidates if stages is not None else [min(candidates, key=lambda k: expected_trees([k]))]
+    cascade = CascadeModel(partial_margin, num_trees, [(k, cutoffs[k]) for k in chosen], threshold, sigmoid)
+    cascade_margin = cascade.predict_margin(features_np)
+    exits = cascade.exit_counts()
+    agreement = float(np.mean(_labels(cascade_margin, sigmoid, threshold) == full_labels)) if len(features_np) else 1.0
+
+    full_seconds = _best_time(lambda: partial_margin(features_np, 0, num_trees), timing_repeats)
+    cascade_seconds = _best_time(lambda: cascade.predict_margin(features_np), timing_repeats)
+    exit_sizes = chosen + [num_trees]
+    report = {
+        "rows": len(features_np),
+        "candidates": {str(k): {"cutoff": cutoffs[k], "average_trees_per_row": round(expected_trees([k]), 3)} for k in candidates},
+        "exit_fraction": {str(k): round(n / max(len(features_np), 1), 4) for k, n in zip(exit_sizes, exits)},
+        "average_trees_per_row": round(expected_trees(chosen), 3),
+        "tree_speedup": round(num_trees / expected_trees(chosen), 3) if len(features_np) else 1.0,
+        "full_seconds": round(full_seconds, 6),
+        "cascade_seconds": round(cascade_seconds, 6),
+        "measured_speedup": round(full_seconds / cascade_seconds, 3) if cascade_seconds else None,
+        "decision_agreement": agreement,
+    }
+    return {
+        "num_trees": num_trees,
+        "threshold": threshold,
+        "sigmoid": sigmoid,
+        "slack": slack,
+        "stages": [{"num_trees": k, "cutoff": cutoffs[k]} for k in chosen],
+        "report": report,
+    }
+
+
+def load_calibration(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the early-exit cascade on a reference dataset.")
+    parser.add_argument("--data", required=True, help="headerless CSV (or .npy) of raw feature vectors")
+    parser.add_argument("--model", default=os.path.join(ASSETS_DIR, "lgbm_nbiot_model.joblib"))
+    parser.add_argument("--scaler", default=os.path.join(ASSETS_DIR, "lgbm_nbiot_scaler.gz"))
+    parser.add_argument("--threshold", type=float, default=0.5, help="decision threshold on P(attack)")
+    parser.add_argument("--stages", help="comma-separated stage sizes in trees (default: pick the best single stage)")
+    parser.add_argument("--slack", type=float, default=0.0, help="extra log-odds added to every cut-off")
+    parser.add_argument("--output", default=DEFAULT_CASCADE_PATH)
+    args = parser.parse_args(argv)
+
+    import joblib
+    import pandas as pd
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] - %(message)s")
+    features_np = np.load(args.data) if args.data.endswith(".npy") else pd.read_csv(args.data, header=None).values
+    scaler = joblib.load(args.scaler)
+    model = joblib.load(args.model)
+    stages = [int(k) for k in args.stages.split(",")] if args.stages else None
+
+    calibration = calibrate(model, scaler.transform(features_np), args.threshold, stages, args.slack)
+    calibration["source_model"] = os.path.basename(args.model)
+    with open(args.output, "w") as f:
+        json.dump(calibration, f, indent=2)
+    logger.info(f"Wrote {args.output} with stages {[s['num_trees'] for s in calibration['stages']]}.")
+    print(json.dumps(calibration["report"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Decoder for headerless, all-numeric CSV feature files.
+
+`pd.read_csv` on a whole upload tokenizes it on one thread, infers a type for
+each column and hands the API a DataFrame, only for it to take the values as
+one float matrix whose width it knew in advance. `decode_csv` keeps pandas' C
+reader, which releases the GIL while it tokenizes and converts, but:
+
+- cuts the buffer into line-aligned chunks, one per thread, and parses them in
+  parallel, each straight to `dtype` with no type inference and no search for
+  NA strings, so that a short row, an empty field or any value that is not a
+  plain number makes the chunk fail instead of becoming NaN;
+- checks that every chunk came out n_features wide;
+- parses a chunk that fails again line by line, which either reports the first
+  bad row, its column and value, or parses it exactly like `float()`, with
+  empty fields read as NaN as pandas does.
+
+Skipping type inference and NA matching makes it faster than read_csv on one
+thread, and the threads add to that (see benchmarks/csv_decode.py). Values are converted by pandas' default float
+parser, as /predict_batch always did: usually within one ulp of `float()`, and
+within 1e-12 relative for extreme exponents such as 3.29E-84 (its exact
+"round_trip" parser takes twice as long).
+
+Row numbers in errors are 1-based line numbers in the upload; blank and
+whitespace-only lines are skipped but counted.
+"""
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from app.inference_executor import available_cpus
+from app.lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+# Smallest chunk worth a thread of its own; smaller uploads are parsed on the calling thread.
+MIN_CHUNK_BYTES = 1 << 20
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+class CsvRowError(ValueError):
+    """A malformed CSV row, identified by its 1-based line number in the upload."""
+
+    def __init__(self, row: int, message: str):
+        super().__init__(f"Row {row}: {message}")
+        self.row = row
+        self.message = message
+
+
+def _thread_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=available_cpus(), thread_name_prefix="csv-decoder")
+        return _pool
+
+
+def _parse_lines(lines: List[bytes], out: np.ndarray, line_numbers: np.ndarray) -> int:
+    """
+    The exact, slow path: one line at a time, so the first bad row and column are
+    known. Blank lines are skipped; returns the number of rows written to `out`.
+    """
+    n_features = out.shape[1]
+    row = 0
+    for line, line_number in zip(lines, line_numbers.tolist()):
+        if not line.strip():
+            continue
+        fields = line.split(b",")
+        if len(fields) != n_features:
+            raise CsvRowError(line_number, f"expected {n_features} columns, got {len(fields)}.")
+        for column, field in enumerate(fields):
+            try:
+                out[row, column] = float(field)
+            except ValueError:
+                if field.strip():
+                    value = field.decode("utf-8", errors="replace")
+                    raise CsvRowError(line_number, f"could not parse '{value}' in column {column + 1} as a number.") from None
+                out[row, column] = np.nan
+        row += 1
+    return row
+
+
+def _parse_chunk(chunk: bytes, n_features: int, dtype, line_numbers: Optional[np.ndarray]) -> np.ndarray:
+    try:
+        values = pd.read_csv(io.BytesIO(chunk), header=None, dtype=dtype, na_filter=False).values
+    except ValueError:  # ParserError and EmptyDataError included
+        values = None
+    if values is not None and values.shape[1] == n_features:
+        return values
+    lines = chunk.split(b"\n")
+    if line_numbers is None:
+        line_numbers = np.arange(1, len(lines) + 1)
+    out = np.empty((len(lines), n_features), dtype=dtype)
+    return out[:_parse_lines(lines, out, line_numbers)]
+
+
+def decode_csv(
+    data: bytes,
+    n_features: int,
+    dtype=np.float64,
+    threads: int = 1,
+    line_numbers: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Parses a headerless CSV of numbers into a (rows, n_features) array of `dtype`.
+
+    Uses up to `threads` threads, each for at least MIN_CHUNK_BYTES of the
+    upload. `line_numbers` numbers the lines of `data` when it was cut from a
+    larger upload. Raises `CsvRowError` for the first bad row.
+    """
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    end = len(data)
+    while end and data[end - 1] == 0x0A:  # trailing line ends
+        end -= 1
+    if end == 0:
+        return np.empty((0, n_features), dtype=dtype)
+
+    # Line-aligned chunks: each ends just before a newline and starts just after one.
+    n_chunks = max(1, min(threads, end // MIN_CHUNK_BYTES))
+    if n_chunks == 1:
+        return _parse_chunk(data, n_features, dtype, line_numbers)
+    bounds, start = [], 0
+    for i in range(1, n_chunks):
+        stop = data.find(b"\n", max(start, end * i // n_chunks), end)
+        if stop == -1:
+            break
+        bounds.append((start, stop))
+        start = stop + 1
+    bounds.append((start, end))
+    offsets = np.cumsum([0] + [data.count(b"\n", start, stop) + 1 for start, stop in bounds])
+    if line_numbers is None:
+        line_numbers = np.arange(1, offsets[-1] + 1)
+
+    jobs = [
+        (data[start:stop], n_features, dtype, line_numbers[first:last])
+        for (start, stop), first, last in zip(bounds, offsets[:-1], offsets[1:])
+    ]
+    pool = _thread_pool()
+    futures = [pool.submit(_parse_chunk, *job) for job in jobs]
+    # In order, so the error reported is the one of the first bad row.
+    return np.concatenate([future.result() for future in futures])
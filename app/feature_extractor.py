@@ -0,0 +1,290 @@
+import json
+from typing import Dict, Hashable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# --- N-BaIoT Feature Definitions ---
+# Decay factors of the damped windows; a stat's weight halves every 1/lambda seconds.
+LAMBDAS = (5.0, 3.0, 1.0, 0.1, 0.01)
+LAMBDA_NAMES = ("L5", "L3", "L1", "L0_1", "L0_01")
+
+STATS_1D = ("weight", "mean", "variance")
+STATS_2D = ("weight", "mean", "std", "magnitude", "radius", "covariance", "pcc")
+
+# (feature prefix, statistics) in the order the extractor computes them.
+FEATURE_GROUPS = (
+    ("MI_dir", STATS_1D),   # packet sizes per source MAC + IP
+    ("H", STATS_1D),        # packet sizes per source IP
+    ("HH", STATS_2D),       # packet sizes per channel (src IP -> dst IP) vs. its reverse
+    ("HH_jit", STATS_1D),   # inter-arrival times per channel
+    ("HpHp", STATS_2D),     # packet sizes per socket (src IP:port -> dst IP:port) vs. its reverse
+)
+
+
+def canonical_feature_names(lambda_names: Sequence[str] = LAMBDA_NAMES) -> List[str]:
+    return [
+        f"{group}_{lambda_name}_{stat}"
+        for group, stats in FEATURE_GROUPS
+        for lambda_name in lambda_names
+        for stat in stats
+    ]
+
+
+class Packet(NamedTuple):
+    # Addresses may be any hashable (strings, or raw bytes as decoded from captures).
+    timestamp: float
+    src_mac: Hashable
+    src_ip: Hashable
+    dst_ip: Hashable
+    src_port: int
+    dst_port: int
+    size: float
+
+
+class DampedStatStore:
+    """
+    Damped incremental statistics for many keys in preallocated arrays.
+
+    Each key owns one row (slot); each column is one decay window. A stat is
+    decayed lazily, only when its key is touched, by 2 ** (-lambda * dt), so
+    an update is O(number of windows) regardless of how many keys exist.
+    Slots of keys idle for longer than a timeout are recycled. `static_fields`
+    are stored per slot and window like `fields` but never decayed.
+    """
+
+    def __init__(
+        self,
+        fields: Sequence[str],
+        lambdas: Sequence[float] = LAMBDAS,
+        capacity: int = 1024,
+        static_fields: Sequence[str] = (),
+    ):
+        self.lambdas = np.asarray(lambdas, dtype=np.float64)
+        self.fields = tuple(fields) + tuple(static_fields)
+        self._decayed = tuple(fields)
+        self.slots: Dict[Hashable, int] = {}
+        self._keys: List[Optional[Hashable]] = []
+        self._free: List[int] = []
+        self._capacity = 0
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.last_t = np.zeros(0)
+        self._grow(capacity)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _grow(self, capacity: int):
+        n_windows = len(self.lambdas)
+        for field in self.fields:
+            grown = np.zeros((capacity, n_windows))
+            grown[:self._capacity] = self.arrays.get(field, grown[:0])
+            self.arrays[field] = grown
+        last_t = np.zeros(capacity)
+        last_t[:self._capacity] = self.last_t
+        self.last_t = last_t
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._keys.extend([None] * (capacity - self._capacity))
+        self._capacity = capacity
+
+    def slot(self, key: Hashable, t: float) -> int:
+        """Returns the slot of `key`, allocating a zeroed one (last seen at `t`) if needed."""
+        slot = self.slots.get(key)
+        if slot is None:
+            if not self._free:
+                self._grow(self._capacity * 2)
+            slot = self._free.pop()
+            for array in self.arrays.values():
+                array[slot] = 0.0
+            self.last_t[slot] = t
+            self.slots[key] = slot
+            self._keys[slot] = key
+        return slot
+
+    def get(self, key: Hashable) -> Optional[int]:
+        return self.slots.get(key)
+
+    def decay(self, slot: int, t: float):
+        dt = t - self.last_t[slot]
+        if dt > 0:
+            factor = np.exp2(-self.lambdas * dt)
+            for field in self._decayed:
+                self.arrays[field][slot] *= factor
+            self.last_t[slot] = t
+
+    def evict_idle(self, now: float, idle_timeout: float) -> int:
+        """Frees the slots of keys not updated within `idle_timeout` seconds; returns how many."""
+        used = np.fromiter(self.slots.values(), dtype=np.intp, count=len(self.slots))
+        idle = used[self.last_t[used] < now - idle_timeout]
+        for slot in idle.tolist():
+            del self.slots[self._keys[slot]]
+            self._keys[slot] = None
+            self._free.append(slot)
+        return len(idle)
+
+
+class _Stats1D:
+    """Weight/mean/variance of a value stream per key (sums CF1 = sum(v), CF2 = sum(v^2))."""
+
+    def __init__(self, lambdas, capacity):
+        # `residual` is v - mean right after the key's latest update, used for 2D covariance.
+        self.store = DampedStatStore(("w", "cf1", "cf2"), lambdas, capacity, static_fields=("residual",))
+
+    def update(self, key: Hashable, v: float, t: float) -> int:
+        store = self.store
+        slot = store.slot(key, t)
+        store.decay(slot, t)
+        a = store.arrays
+        a["w"][slot] += 1.0
+        a["cf1"][slot] += v
+        a["cf2"][slot] += v * v
+        a["residual"][slot] = v - a["cf1"][slot] / a["w"][slot]
+        return slot
+
+    def moments(self, slot: Optional[int]):
+        """Returns (weight, mean, variance) arrays over the decay windows."""
+        if slot is None:
+            zeros = np.zeros(len(self.store.lambdas))
+            return zeros, zeros, zeros
+        a = self.store.arrays
+        w = a["w"][slot]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(w > 0, a["cf1"][slot] / w, 0.0)
+            variance = np.where(w > 0, np.abs(a["cf2"][slot] / w - mean * mean), 0.0)
+        return w, mean, variance
+
+
+class FeatureExtractor:
+    """
+    Incremental N-BaIoT feature extractor.
+
+    `update` consumes one packet and returns the 115 damped-window statistics
+    for it, ordered like `feature_list` so the vector can be scored directly.
+    """
+
+    def __init__(
+        self,
+        feature_list: Optional[Sequence[str]] = None,
+        idle_timeout: float = 600.0,
+        sweep_interval: float = 60.0,
+        capacity: int = 1024,
+    ):
+        canonical = canonical_feature_names()
+        feature_list = list(feature_list) if feature_list is not None else canonical
+        index = {name: i for i, name in enumerate(canonical)}
+        unknown = [name for name in feature_list if name not in index]
+        if unknown:
+            raise ValueError(f"Cannot compute features: {', '.join(unknown)}")
+        self.feature_list = feature_list
+        self._order = np.asarray([index[name] for name in feature_list], dtype=np.intp)
+
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._next_sweep: Optional[float] = None
+
+        self.mi_dir = _Stats1D(LAMBDAS, capacity)
+        self.host = _Stats1D(LAMBDAS, capacity)
+        self.channel = _Stats1D(LAMBDAS, capacity)
+        self.jitter = _Stats1D(LAMBDAS, capacity)
+        self.socket = _Stats1D(LAMBDAS, capacity)
+        # Decayed sums of residual products for channel and socket pairs (both directions).
+        self.channel_pairs = DampedStatStore(("sr",), LAMBDAS, capacity)
+        self.socket_pairs = DampedStatStore(("sr",), LAMBDAS, capacity)
+
+    @classmethod
+    def from_feature_file(cls, path: str, **kwargs) -> "FeatureExtractor":
+        with open(path, "r") as f:
+            return cls(json.load(f), **kwargs)
+
+    def _stores(self):
+        return (self.mi_dir.store, self.host.store, self.channel.store, self.jitter.store,
+                self.socket.store, self.channel_pairs, self.socket_pairs)
+
+    @property
+    def num_keys(self) -> int:
+        return sum(len(store) for store in self._stores())
+
+    @staticmethod
+    def _update_2d(streams: _Stats1D, pairs: DampedStatStore, key, reverse_key, v: float, t: float):
+        slot = streams.update(key, v, t)
+        reverse_slot = streams.store.get(reverse_key)
+        if reverse_slot is not None:
+            streams.store.decay(reverse_slot, t)
+
+        pair = pairs.slot((key, reverse_key) if key <= reverse_key else (reverse_key, key), t)
+        pairs.decay(pair, t)
+        if reverse_slot is not None:
+            a = streams.store.arrays
+            pairs.arrays["sr"][pair] += a["residual"][slot] * a["residual"][reverse_slot]
+        return slot, reverse_slot, pair
+
+    def _stats_2d(self, streams: _Stats1D, pairs: DampedStatStore, key, reverse_key, v: float, t: float):
+        slot, reverse_slot, pair = self._update_2d(streams, pairs, key, reverse_key, v, t)
+        w, mean, variance = streams.moments(slot)
+        w_rev, mean_rev, variance_rev = streams.moments(reverse_slot)
+        std, std_rev = np.sqrt(variance), np.sqrt(variance_rev)
+        magnitude = np.sqrt(mean * mean + mean_rev * mean_rev)
+        radius = np.sqrt(variance * variance + variance_rev * variance_rev)
+        covariance = pairs.arrays["sr"][pair] / (w + w_rev)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pcc = np.where(std * std_rev > 0, covariance / (std * std_rev), 0.0)
+        return np.column_stack([w, mean, std, magnitude, radius, covariance, pcc]).ravel()
+
+    def update(self, packet: Packet) -> np.ndarray:
+        t = packet.timestamp
+        v = float(packet.size)
+        self._maybe_sweep(t)
+
+        groups = []
+        slot = self.mi_dir.update((packet.src_mac, packet.src_ip), v, t)
+        groups.append(np.column_stack(self.mi_dir.moments(slot)).ravel())
+        slot = self.host.update(packet.src_ip, v, t)
+        groups.append(np.column_stack(self.host.moments(slot)).ravel())
+
+        channel = (packet.src_ip, packet.dst_ip)
+        groups.append(self._stats_2d(self.channel, self.channel_pairs, channel, (packet.dst_ip, packet.src_ip), v, t))
+
+        # Inter-arrival time on the channel; 0 for its first packet.
+        jitter_slot = self.jitter.store.get(channel)
+        jitter = t - self.jitter.store.last_t[jitter_slot] if jitter_slot is not None else 0.0
+        slot = self.jitter.update(channel, max(jitter, 0.0), t)
+        groups.append(np.column_stack(self.jitter.moments(slot)).ravel())
+
+        socket = (packet.src_ip, packet.src_port, packet.dst_ip, packet.dst_port)
+        reverse_socket = (packet.dst_ip, packet.dst_port, packet.src_ip, packet.src_port)
+        groups.append(self._stats_2d(self.socket, self.socket_pairs, socket, reverse_socket, v, t))
+
+        return np.concatenate(groups)[self._order]
+
+    def observe(self, packet: Packet):
+        """
+        Applies only the channel and socket updates of `packet`, without emitting
+        a vector. A shard that owns the packet's destination host uses this so
+        the reverse-direction stats of its own hosts stay exact.
+        """
+        t = packet.timestamp
+        v = float(packet.size)
+        self._maybe_sweep(t)
+        self._update_2d(self.channel, self.channel_pairs, (packet.src_ip, packet.dst_ip),
+                        (packet.dst_ip, packet.src_ip), v, t)
+        self._update_2d(self.socket, self.socket_pairs, (packet.src_ip, packet.src_port, packet.dst_ip, packet.dst_port),
+                        (packet.dst_ip, packet.dst_port, packet.src_ip, packet.src_port), v, t)
+
+    def transform(self, packets) -> np.ndarray:
+        """Runs `update` over packets in timestamp order and stacks the vectors."""
+        vectors = [self.update(packet) for packet in packets]
+        if not vectors:
+            return np.zeros((0, len(self.feature_list)))
+        return np.vstack(vectors)
+
+    def _maybe_sweep(self, t: float):
+        if self._next_sweep is None:
+            self._next_sweep = t + self.sweep_interval
+        if t < self._next_sweep:
+            return
+        self._next_sweep = t + self.sweep_interval
+        self.evict_idle(t)
+
+    def evict_idle(self, now: float) -> int:
+        """Frees every key idle for longer than `idle_timeout`; returns how many."""
+        return sum(store.evict_idle(now, self.idle_timeout) for store in self._stores())
+
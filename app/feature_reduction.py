@@ -0,0 +1,360 @@
+"""
+Reduced-feature variant of the LightGBM model.
+
+Many of the 115 N-BaIoT inputs carry no information for the model: the trees
+never split on some of them, the MI_dir and H statistics are computed over the
+same packets and come out identical, and many HH/HpHp features contribute a
+negligible share of the gain. This tool analyses the feature usage and
+importance of the model together with a reference dataset, and writes a model
+artifact (see app/artifact.py) that takes only the features still needed:
+
+    unused      never split on; dropped without changing any prediction
+    constant    a single value throughout the reference set; its splits are
+                resolved for that value
+    duplicate   identical to an earlier used column throughout the reference
+                set; its splits read that column instead
+    low_gain    a share of the total gain below --min-gain (off by default);
+                its splits are resolved for the reference median
+
+The scaler is folded into the split thresholds, so the API scores the shorter
+vectors (/predict_reduced) without parsing, sending or scaling the dropped
+columns. Alongside the artifact a JSON report lists every feature's analysis
+and the parity of the reduced model with the full model on rows the analysis
+did not see: --eval-data, or else a random --holdout share of the reference set
+(20% by default), which the analysis leaves out. The report's "evaluated_on"
+says which set it was:
+
+    python -m app.feature_reduction --data reference.csv --output app/saved_assets/lgbm_nbiot_reduced.nbm
+    python -m app.feature_reduction --data reference.csv --eval-data evaluation.csv
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.artifact import write_artifact
+from app.csv_decoder import decode_csv
+from app.tree_engine import MISSING_NONE, TreeEnsemble
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, "saved_assets")
+DEFAULT_REDUCED_PATH = os.path.join(ASSETS_DIR, "lgbm_nbiot_reduced.nbm")
+
+ACTION_KEPT = "kept"
+ACTION_UNUSED = "unused"
+ACTION_CONSTANT = "constant"
+ACTION_DUPLICATE = "duplicate"
+ACTION_LOW_GAIN = "low_gain"
+
+
+def _split_nodes(ensemble: TreeEnsemble) -> np.ndarray:
+    return ensemble.children[0::2] != np.arange(len(ensemble.threshold))
+
+
+def analyze_features(
+    ensemble: TreeEnsemble,
+    feature_list: List[str],
+    reference: np.ndarray,
+    gain: Optional[np.ndarray] = None,
+    min_gain: float = 0.0,
+) -> List[dict]:
+    """
+    One entry per feature with its split count, share of the gain, whether it
+    is constant or a duplicate of an earlier column on `reference` (raw
+    vectors), and what the reduction does with it (`action`).
+
+    Splits on a duplicate are merged into the first used, non-constant column
+    it equals (`merged_into`); its gain counts towards that column's for
+    `min_gain`. Without `gain` (a plain TreeEnsemble), split counts stand in.
+    """
+    splits = np.bincount(ensemble.split_feature[_split_nodes(ensemble)], minlength=len(feature_list))
+    gain = np.asarray(gain if gain is not None else splits, dtype=np.float64)
+    gain_share = gain / gain.sum() if gain.sum() else np.zeros_like(gain)
+
+    if len(reference) < 2:
+        raise ValueError("The reference set needs at least two rows.")
+    constant = np.all((reference == reference[:1]) | (np.isnan(reference) & np.isnan(reference[:1])), axis=0)
+    first_seen: Dict[bytes, int] = {}
+    first_used: Dict[bytes, int] = {}
+    features = []
+    for index, name in enumerate(feature_list):
+        column = np.ascontiguousarray(reference[:, index]).tobytes()
+        duplicate_of = first_seen.setdefault(column, index)
+        used = bool(splits[index])
+        entry = {
+            "name": name,
+            "splits": int(splits[index]),
+            "gain_share": float(gain_share[index]),
+            "constant": bool(constant[index]),
+            "duplicate_of": feature_list[duplicate_of] if duplicate_of != index else None,
+        }
+        if not used:
+            entry["action"] = ACTION_UNUSED
+        elif constant[index]:
+            entry["action"] = ACTION_CONSTANT
+            entry["fill_value"] = float(reference[0, index])
+        elif first_used.setdefault(column, index) != index:
+            entry["action"] = ACTION_DUPLICATE
+            entry["merged_into"] = feature_list[first_used[column]]
+        else:
+            entry["action"] = ACTION_KEPT
+        features.append(entry)
+
+    by_name = {entry["name"]: entry for entry in features}
+    group_share = {entry["name"]: entry["gain_share"] for entry in features if entry["action"] == ACTION_KEPT}
+    for entry in features:
+        if entry["action"] == ACTION_DUPLICATE:
+            group_share[entry["merged_into"]] += entry["gain_share"]
+    for index, entry in enumerate(features):
+        if entry["action"] == ACTION_KEPT and group_share[entry["name"]] < min_gain:
+            entry["action"] = ACTION_LOW_GAIN
+            entry["fill_value"] = float(np.nanmedian(reference[:, index]))
+    # Duplicates of a dropped column are resolved like it.
+    for entry in features:
+        if entry["action"] == ACTION_DUPLICATE and by_name[entry["merged_into"]]["action"] == ACTION_LOW_GAIN:
+            entry["action"] = ACTION_LOW_GAIN
+            entry["fill_value"] = by_name[entry["merged_into"]]["fill_value"]
+    return features
+
+
+def reduce_ensemble(ensemble: TreeEnsemble, features: List[dict]) -> TreeEnsemble:
+    """
+    Rebuilds `ensemble` (taking raw features, i.e. with the scaler folded) over
+    the kept features of `analyze_features`. Splits on a dropped feature are
+    replaced by the subtree its fill value goes to, so trees also get shallower.
+    """
+    names = [entry["name"] for entry in features]
+    kept = [index for index, entry in enumerate(features) if entry["action"] == ACTION_KEPT]
+    new_index = {old: new for new, old in enumerate(kept)}
+    for index, entry in enumerate(features):
+        if entry["action"] == ACTION_DUPLICATE:
+            new_index[index] = new_index[names.index(entry["merged_into"])]
+    fill = {index: entry["fill_value"] for index, entry in enumerate(features) if "fill_value" in entry}
+
+    is_split = _split_nodes(ensemble)
+    split_feature, threshold, children = [], [], []
+    default_left, missing_type, node_value = [], [], []
+    max_depth = 0
+
+    def add(node, depth):
+        nonlocal max_depth
+        while is_split[node] and int(ensemble.split_feature[node]) in fill:
+            feature = int(ensemble.split_feature[node])
+            # A NaN fill value is compared as the value NaN inputs are evaluated as.
+            value = fill[feature] if not np.isnan(fill[feature]) else ensemble.nan_value[feature]
+            node = int(ensemble.children[2 * node + int(value > ensemble.threshold[node])])
+        index = len(threshold)
+        children.extend((index, index))
+        threshold.append(ensemble.threshold[node])
+        default_left.append(ensemble.default_left[node])
+        missing_type.append(ensemble.missing_type[node])
+        node_value.append(ensemble.node_value[node])
+        if not is_split[node]:
+            split_feature.append(0)
+            max_depth = max(max_depth, depth)
+            return index
+        split_feature.append(new_index[int(ensemble.split_feature[node])])
+        children[2 * index] = add(int(ensemble.children[2 * node]), depth + 1)
+        children[2 * index + 1] = add(int(ensemble.children[2 * node + 1]), depth + 1)
+        return index
+
+    roots = [add(int(root), 0) for root in ensemble.roots]
+    return TreeEnsemble(
+        split_feature=np.asarray(split_feature, dtype=np.intp),
+        threshold=np.asarray(threshold, dtype=np.float64),
+        children=np.asarray(children, dtype=np.intp),
+        default_left=np.asarray(default_left, dtype=bool),
+        missing_type=np.asarray(missing_type, dtype=np.int8),
+        node_value=np.asarray(node_value, dtype=np.float64),
+        roots=np.asarray(roots, dtype=np.intp),
+        max_depth=max_depth,
+        num_features=len(kept),
+        sigmoid=ensemble.sigmoid,
+        nan_value=np.asarray(ensemble.nan_value)[kept],
+    )
+
+
+def kept_indices(features: List[dict]) -> List[int]:
+    """Positions, in the full feature vector, of the columns the reduced model takes."""
+    return [index for index, entry in enumerate(features) if entry["action"] == ACTION_KEPT]
+
+
+def _csv_text(rows: np.ndarray) -> bytes:
+    return "".join(",".join(map(repr, row)) + "\n" for row in rows.tolist()).encode()
+
+
+def _best_time(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(max(repeats, 1)):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def parity_report(
+    full_proba: np.ndarray,
+    full: TreeEnsemble,
+    reduced: TreeEnsemble,
+    reference: np.ndarray,
+    features: List[dict],
+    threshold: float = 0.5,
+    timing_repeats: int = 3,
+) -> dict:
+    """
+    Compares the reduced model on the kept columns of `reference` with the full
+    model's P(attack) `full_proba`, and times parsing and scoring a CSV of the
+    reference rows with the full and the reduced (both folded) ensembles.
+    """
+    kept = kept_indices(features)
+    reduced_rows = reference[:, kept]
+    reduced_proba = reduced.predict_proba(reduced_rows)[:, 1]
+    full_labels, reduced_labels = full_proba > threshold, reduced_proba > threshold
+    difference = np.abs(reduced_proba - full_proba)
+    full_csv, reduced_csv = _csv_text(reference), _csv_text(reduced_rows)
+    rows = max(len(reference), 1)
+
+    full_seconds = _best_time(lambda: full.predict_proba(decode_csv(full_csv, full.num_features)), timing_repeats)
+    reduced_seconds = _best_time(
+        lambda: reduced.predict_proba(decode_csv(reduced_csv, reduced.num_features)), timing_repeats)
+    actions = [entry["action"] for entry in features]
+    return {
+        "rows": len(reference),
+        "threshold": threshold,
+        "full_features": len(features),
+        "reduced_features": len(kept),
+        "dropped": {action: actions.count(action) for action in
+                    (ACTION_UNUSED, ACTION_CONSTANT, ACTION_DUPLICATE, ACTION_LOW_GAIN)},
+        "decision_agreement": float(np.mean(full_labels == reduced_labels)) if len(reference) else 1.0,
+        "disagreements": {
+            "attack_to_benign": int(np.sum(full_labels & ~reduced_labels)),
+            "benign_to_attack": int(np.sum(~full_labels & reduced_labels)),
+        },
+        "max_abs_probability_difference": float(difference.max()) if len(reference) else 0.0,
+        "mean_abs_probability_difference": float(difference.mean()) if len(reference) else 0.0,
+        "csv_bytes_per_row": {"full": len(full_csv) / rows, "reduced": len(reduced_csv) / rows},
+        "float32_bytes_per_row": {"full": 4 * len(features), "reduced": 4 * len(kept)},
+        "max_depth": {"full": full.max_depth, "reduced": reduced.max_depth},
+        "full_seconds": round(full_seconds, 6),
+        "reduced_seconds": round(reduced_seconds, 6),
+        "measured_speedup": round(full_seconds / reduced_seconds, 3) if reduced_seconds else None,
+    }
+
+
+def split_holdout(reference: np.ndarray, holdout: float, seed: int = 0):
+    """Splits `reference` at random into the rows to analyse and a `holdout` share of them to evaluate on."""
+    if not 0 <= holdout < 1:
+        raise ValueError("holdout must be at least 0 and below 1.")
+    order = np.random.default_rng(seed).permutation(len(reference))
+    held_out = int(round(len(reference) * holdout))
+    return reference[np.sort(order[held_out:])], reference[np.sort(order[:held_out])]
+
+
+def build_reduced_model(
+    model, scaler, feature_list: List[str], reference: np.ndarray, output_path: str,
+    min_gain: float = 0.0, threshold: float = 0.5, metadata: Optional[dict] = None,
+    evaluation: Optional[np.ndarray] = None, holdout: float = 0.2, seed: int = 0,
+) -> dict:
+    """
+    Analyses the features, writes the reduced artifact to `output_path` and returns the report.
+
+    Parity is measured on `evaluation` if given, else on a `holdout` share of
+    `reference` left out of the analysis (on the whole of it if `holdout` is 0).
+    """
+    booster = getattr(model, "booster_", model)
+    full = TreeEnsemble.from_booster(booster).fold_scaler(scaler)
+    for name, rows in (("reference", reference), ("evaluation", evaluation)):
+        if rows is not None and rows.shape[1:] != (full.num_features,):
+            raise ValueError(f"The model takes {full.num_features} features; the {name} data has "
+                             f"{rows.shape[1] if rows.ndim == 2 else '?'} columns.")
+    if len(feature_list) != full.num_features:
+        raise ValueError(f"The model takes {full.num_features} features; the feature list has {len(feature_list)}.")
+    if evaluation is not None:
+        evaluated_on = "eval_data"
+    elif holdout:
+        reference, evaluation = split_holdout(reference, holdout, seed)
+        evaluated_on = "holdout"
+    else:
+        evaluation, evaluated_on = reference, "reference"
+    if np.any(full.missing_type != MISSING_NONE):
+        logger.warning("The model has splits with missing-value handling; NaN inputs of merged columns may differ.")
+
+    features = analyze_features(full, feature_list, reference, booster.feature_importance("gain"), min_gain)
+    reduced = reduce_ensemble(full, features)
+    kept = [feature_list[index] for index in kept_indices(features)]
+    full_proba = model.predict_proba(scaler.transform(evaluation))[:, 1]
+    report = parity_report(full_proba, full, reduced, evaluation, features, threshold)
+    report["evaluated_on"] = {"set": evaluated_on, "rows": len(evaluation), "analysis_rows": len(reference)}
+    if evaluated_on == "holdout":
+        report["evaluated_on"].update(holdout=holdout, seed=seed)
+
+    write_artifact(output_path, reduced, kept, dict(
+        metadata or {},
+        scaler_folded=True,
+        reduced_from=len(feature_list),
+        dropped={entry["name"]: entry["action"] for entry in features if entry["action"] != ACTION_KEPT},
+    ))
+    return {"report": report, "features": features}
+
+
+def _load_rows(path: str, n_features: int) -> np.ndarray:
+    if path.endswith(".npy"):
+        return np.load(path)
+    with open(path, "rb") as f:
+        return decode_csv(f.read(), n_features)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the reduced-feature model artifact and its parity report.")
+    parser.add_argument("--data", required=True, help="headerless CSV (or .npy) of raw reference feature vectors")
+    parser.add_argument("--eval-data", help="headerless CSV (or .npy) to measure parity on; default: a holdout of --data")
+    parser.add_argument("--holdout", type=float, default=0.2,
+                        help="share of --data left out of the analysis to measure parity on, without --eval-data "
+                             "(0 measures it on the rows analysed)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random holdout")
+    parser.add_argument("--model", default=os.path.join(ASSETS_DIR, "lgbm_nbiot_model.joblib"))
+    parser.add_argument("--scaler", default=os.path.join(ASSETS_DIR, "lgbm_nbiot_scaler.gz"))
+    parser.add_argument("--features", default=os.path.join(ASSETS_DIR, "lgbm_features.json"))
+    parser.add_argument("--min-gain", type=float, default=0.0,
+                        help="also drop features below this share of the total gain (e.g. 0.0001)")
+    parser.add_argument("--threshold", type=float, default=0.5, help="decision threshold on P(attack)")
+    parser.add_argument("--output", default=DEFAULT_REDUCED_PATH)
+    parser.add_argument("--report", help="where to write the JSON report (default: the output path with .json)")
+    args = parser.parse_args(argv)
+
+    import joblib
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] - %(message)s")
+    with open(args.features, "r") as f:
+        feature_list = json.load(f)
+    reference = _load_rows(args.data, len(feature_list))
+    evaluation = _load_rows(args.eval_data, len(feature_list)) if args.eval_data else None
+
+    result = build_reduced_model(
+        joblib.load(args.model), joblib.load(args.scaler), feature_list, reference, args.output,
+        min_gain=args.min_gain, threshold=args.threshold,
+        metadata={"source_model": os.path.basename(args.model), "source_scaler": os.path.basename(args.scaler)},
+        evaluation=evaluation, holdout=args.holdout, seed=args.seed,
+    )
+    report_path = args.report or os.path.splitext(args.output)[0] + ".json"
+    with open(report_path, "w") as f:
+        json.dump(result, f, indent=2)
+    report = result["report"]
+    logger.info(
+        f"Wrote {args.output} with {report['reduced_features']} of {report['full_features']} features "
+        f"({report['decision_agreement']:.4%} decision agreement on {report['rows']} {report['evaluated_on']['set']} "
+        f"rows) and {report_path}."
+    )
+    print(json.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
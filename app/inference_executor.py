@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(RuntimeError):
+    """Raised by `submit` when every worker is busy and the queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full.")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def cpu_quota(cgroup_root: str = "/sys/fs/cgroup") -> Optional[float]:
+    """CPUs granted by the container's cgroup CPU quota (v2 `cpu.max` or v1 CFS), or None if unlimited."""
+    try:
+        with open(os.path.join(cgroup_root, "cpu.max")) as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us")) as f:
+            quota = int(f.read())
+        with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us")) as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: its affinity mask, capped by the cgroup CPU quota (rounded up)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cpu_quota()
+    return cpus if quota is None else max(1, min(cpus, math.ceil(quota)))
+
+
+def threads_per_worker(workers: int, cpus: Optional[int] = None) -> int:
+    """Native threads each scoring worker may use so that all of them together fit the CPUs."""
+    return max(1, (cpus or available_cpus()) // max(workers, 1))
+
+
+def _run_before_deadline(deadline: Optional[float], fn: Callable, args: tuple):
+    # time.monotonic is system-wide on Linux, so the check also holds in worker processes.
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded("The request deadline passed while it was queued.")
+    return fn(*args)
+
+
+# --- Process workers ---
+# A worker process holds one unpickled ModelVersion, installed by its initializer.
+_worker_model = None
+
+
+def init_model_worker(version_bytes: bytes, num_threads: Optional[int] = None):
+    global _worker_model
+    _worker_model = pickle.loads(version_bytes)
+    if num_threads:
+        _worker_model.set_num_threads(num_threads)
+
+
+def score_in_worker(features_np):
+    """Scores raw features with the worker's model version; runs in a worker process."""
+    return _worker_model.score(features_np)
+
+
+class InferenceExecutor:
+    """
+    Bounded pool that runs every scoring job off the event loop.
+
+    Jobs run on `max_workers` threads (LightGBM, NumPy and the scaler release
+    the GIL for the heavy parts), or on `processes` worker processes when
+    submitted with `in_process=True`. At most `max_queue` jobs wait beyond
+    the ones being executed; further submissions fail fast with `Overloaded`,
+    so callers can shed load instead of queueing without bound. A job whose
+    deadline passes while it is queued is never started.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_queue: int = 64,
+        processes: int = 0,
+        retry_after_seconds: int = 1,
+        queue_depth_gauge=None,
+        rejected_counter=None,
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.processes = processes
+        self.retry_after = retry_after_seconds
+        self.queue_depth_gauge = queue_depth_gauge
+        self.rejected_counter = rejected_counter
+        self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._process_initargs: Optional[tuple] = None
+        self._pending = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.processes + self.max_queue
+
+    @property
+    def pending(self) -> int:
+        """Jobs submitted and not finished yet (running or queued)."""
+        return self._pending
+
+    def set_process_model(self, version_bytes: bytes, num_threads: Optional[int] = None):
+        """Sets the pickled model version for worker processes; running workers are replaced."""
+        if not self.processes:
+            return
+        with self._lock:
+            old, self._process_pool = self._process_pool, None
+            self._process_initargs = (version_bytes, num_threads)
+        if old is not None:
+            # Jobs already handed to the old workers finish with the model they started with.
+            old.shutdown(wait=False)
+
+    def _process_executor(self) -> ProcessPoolExecutor:
+        if self._process_initargs is None:
+            raise RuntimeError("No model has been set for the worker processes.")
+        if self._process_pool is None:
+            # Spawned rather than forked: OpenMP and the telemetry threads do not survive a fork.
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_model_worker,
+                initargs=self._process_initargs,
+            )
+        return self._process_pool
+
+    def _reject(self, reason: str):
+        if self.rejected_counter is not None:
+            self.rejected_counter.labels(reason=reason).inc()
+
+    def _finished(self, _future: Future):
+        with self._lock:
+            self._pending -= 1
+            pending = self._pending
+        if self.queue_depth_gauge is not None:
+            self.queue_depth_gauge.set(pending)
+
+    def submit(self, fn: Callable, *args, deadline: Optional[float] = None, in_process: bool = False) -> Future:
+        """Queues fn(*args); raises `Overloaded` at once when the queue is full."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("InferenceExecutor is shut down.")
+            if self._pending >= self.capacity:
+                overloaded = True
+            else:
+                overloaded = False
+                self._pending += 1
+                pending = self._pending
+                pool = self._process_executor() if in_process and self.processes else self._threads
+        if overloaded:
+            self._reject("overloaded")
+            raise Overloaded(self.retry_after)
+        if self.queue_depth_gauge is not None:
+            self.queue_depth_gauge.set(pending)
+        try:
+            future = pool.submit(_run_before_deadline, deadline, fn, args)
+        except BaseException:
+            self._finished(None)
+            raise
+        future.add_done_callback(self._finished)
+        return future
+
+    def _timeout(self, deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    async def run(self, fn: Callable, *args, deadline: Optional[float] = None, in_process: bool = False):
+        """Awaits fn(*args) on the executor; queued work is cancelled once the deadline passes."""
+        future = self.submit(fn, *args, deadline=deadline, in_process=in_process)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self._timeout(deadline))
+        except DeadlineExceeded:
+            # Expired while queued.
+            self._reject("deadline")
+            raise
+        except asyncio.TimeoutError:
+            future.cancel()
+            self._reject("deadline")
+            raise DeadlineExceeded("The request deadline passed before scoring completed.")
+
+    def call(self, fn: Callable, *args, deadline: Optional[float] = None, in_process: bool = False):
+        """Blocking variant of `run`, for synchronous callers."""
+        future = self.submit(fn, *args, deadline=deadline, in_process=in_process)
+        try:
+            return future.result(self._timeout(deadline))
+        except DeadlineExceeded:
+            # Expired while queued.
+            self._reject("deadline")
+            raise
+        except FutureTimeoutError:
+            future.cancel()
+            self._reject("deadline")
+            raise DeadlineExceeded("The request deadline passed before scoring completed.")
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            process_pool, self._process_pool = self._process_pool, None
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if process_pool is not None:
+            process_pool.shutdown(wait=False, cancel_futures=True)
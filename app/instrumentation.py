@@ -0,0 +1,103 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import List, Optional, Tuple
+
+import numpy as np
+from opentelemetry import trace
+
+_NO_STAGE = nullcontext()
+
+
+class StageTimer:
+    """
+    Wall times of the stages (parse, scale, predict, serialize, ...) of one request.
+
+    `stage()` costs two clock reads and a list append, and may be entered from the
+    executor threads that score the request. `finish()` observes the per-stage
+    histogram once per stage and, only when the request's span is sampled, adds a
+    child span per stage with the recorded start and end times, so unsampled
+    requests never create span objects.
+    """
+
+    __slots__ = ("endpoint", "histogram", "stages")
+
+    def __init__(self, endpoint: str, histogram=None):
+        self.endpoint = endpoint
+        self.histogram = histogram
+        self.stages: List[Tuple[str, int, int]] = []  # (stage, start epoch ns, duration ns)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.time_ns()
+        started = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.stages.append((name, start, time.perf_counter_ns() - started))
+
+    def finish(self, span: Optional[trace.Span] = None, tracer: Optional[trace.Tracer] = None):
+        if self.histogram is not None:
+            for name, _, duration in self.stages:
+                self.histogram.labels(endpoint=self.endpoint, stage=name).observe(duration / 1e9)
+        if span is None or tracer is None or not span.is_recording() or not span.get_span_context().trace_flags.sampled:
+            return
+        context = trace.set_span_in_context(span)
+        for name, start, duration in self.stages:
+            tracer.start_span(name, context=context, start_time=start).end(end_time=start + duration)
+
+
+def timed(timer: Optional[StageTimer], name: str):
+    """`timer.stage(name)`, or a no-op context when there is no timer."""
+    return timer.stage(name) if timer is not None else _NO_STAGE
+
+
+class ScoringMetrics:
+    """Per-endpoint request metrics of the scoring path: stage timers, rows, batch sizes and verdicts."""
+
+    def __init__(self, stage_histogram=None, rows_counter=None, batch_rows_histogram=None, predictions_counter=None):
+        self.stage_histogram = stage_histogram
+        self.rows_counter = rows_counter
+        self.batch_rows_histogram = batch_rows_histogram
+        self.predictions_counter = predictions_counter
+
+    def timer(self, endpoint: str) -> StageTimer:
+        return StageTimer(endpoint, self.stage_histogram)
+
+    def record_predictions(self, endpoint: str, probabilities: np.ndarray, threshold: float):
+        """Counts the rows and verdicts of one request and observes its batch size."""
+        self.record_verdicts(endpoint, probabilities, threshold)
+        self.observe_batch(endpoint, len(probabilities))
+
+    def observe_batch(self, endpoint: str, rows: int):
+        if self.batch_rows_histogram is not None:
+            self.batch_rows_histogram.labels(endpoint=endpoint).observe(rows)
+
+    def record_verdicts(self, endpoint: str, probabilities: np.ndarray, threshold: float):
+        """Counts rows and verdicts only; for requests scored in several chunks."""
+        rows = len(probabilities)
+        attacks = int(np.count_nonzero(np.asarray(probabilities) > threshold))
+        if self.rows_counter is not None:
+            self.rows_counter.labels(endpoint=endpoint).inc(rows)
+        if self.predictions_counter is not None:
+            self.predictions_counter.labels(endpoint=endpoint, label="attack").inc(attacks)
+            self.predictions_counter.labels(endpoint=endpoint, label="benign").inc(rows - attacks)
+
+
+class InFlightMiddleware:
+    """ASGI middleware counting the requests in progress per scoring path in a gauge."""
+
+    def __init__(self, app, gauge, paths):
+        self.app = app
+        self.gauge = gauge
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path")
+        if scope["type"] not in ("http", "websocket") or path not in self.paths:
+            return await self.app(scope, receive, send)
+        in_flight = self.gauge.labels(endpoint=path)
+        in_flight.inc()
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            in_flight.dec()
@@ -0,0 +1,31 @@
+"""
+Deferred imports for the heavy libraries only some code paths need.
+
+pandas, joblib (and through unpickling, scikit-learn and LightGBM) account for
+most of the time it takes to import app.main. A module bound with
+`lazy_import` is imported on its first attribute access instead, so a server
+running the memory-mapped artifact or the MLP never imports scikit-learn or
+LightGBM, and pandas is imported by the first CSV upload that
+app/csv_decoder.py parses.
+"""
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stands in for module `__name__` and imports it on the first attribute access."""
+
+    def __getattr__(self, attr: str):
+        # importlib holds a per-module lock, so concurrent first accesses import it once.
+        return getattr(importlib.import_module(self.__name__), attr)
+
+    def __repr__(self):
+        state = "imported" if self.__name__ in sys.modules else "not imported"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Module `name` if it is already imported, otherwise a `LazyModule` for it."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
@@ -1,31 +1,72 @@
 import os
-import io
 import json
-import joblib
 import numpy as np
-import pandas as pd
 import logging
+import pickle
+import shutil
+import tempfile
+import threading
+import time
 from contextlib import asynccontextmanager
-from typing import List
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from sklearn.preprocessing import RobustScaler
-import lightgbm
 
 # --- OpenTelemetry Imports ---
+# The SDK and the OTLP exporters are imported by the lifespan, see app/telemetry.py.
 from opentelemetry import trace
-from opentelemetry._logs import set_logger_provider
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.sdk._logs import LoggerProvider as OtelSDKLoggerProvider
-from opentelemetry.sdk._logs._internal.export import BatchLogRecordProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
-from opentelemetry.sdk.resources import Resource
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.logging import LoggingInstrumentor
 from opentelemetry.trace import Status, StatusCode
+from prometheus_client import make_asgi_app
+from threadpoolctl import threadpool_limits
+
+from app.aggregation import DeviceRateStore, RowKeys, VerdictAggregator, numbered_lines, split_key_columns
+from app.artifact import DEFAULT_ARTIFACT_PATH, load_artifact
+from app.cascade import DEFAULT_CASCADE_PATH, CascadeModel, load_calibration
+from app.batch_formats import (
+    MEDIA_TYPE_BINARY, MEDIA_TYPE_COLUMNAR_JSON, MEDIA_TYPE_SUMMARY, SUPPORTED_MEDIA_TYPES,
+    binary_response, columnar_json_response, negotiate_media_type,
+)
+from app.batch_jobs import (
+    FORMAT_CSV, FORMAT_FLOAT32, FORMAT_FLOAT64, STATUS_FAILED, BatchJobManager, InvalidJobInput, JobNotFound,
+)
+from app.batching import MicroBatcher
+from app.binary_input import (
+    MEDIA_TYPE_FLOAT32, MEDIA_TYPE_FLOAT64, SUPPORTED_CONTENT_TYPES, InvalidFeatureBody, UnsupportedContentType, decode_feature_body,
+)
+from app.csv_decoder import decode_csv
+from app.feature_reduction import DEFAULT_REDUCED_PATH
+from app.streaming import CSV_HEADER, CsvRowError, format_csv, format_ndjson, iter_csv_line_chunks, parse_csv_lines
+from app.tree_engine import TreeEnsemble
+from app.metrics import (
+    exposition_registry, MICRO_BATCH_SIZE, MICRO_BATCH_QUEUE_WAIT_SECONDS, WEBSOCKET_BATCH_ROWS, WEBSOCKET_CONNECTIONS,
+    PREDICTION_CACHE_HITS, PREDICTION_CACHE_MISSES, PREDICTION_CACHE_EVICTIONS, PREDICTION_CACHE_ENTRIES,
+    CASCADE_EXIT_ROWS, INFERENCE_QUEUE_DEPTH, INFERENCE_REJECTED,
+    STAGE_DURATION_SECONDS, ROWS_SCORED, REQUEST_BATCH_ROWS, PREDICTIONS, REQUESTS_IN_FLIGHT, MODEL_INFO,
+    BATCH_JOBS, DEVICE_RATE_DEVICES, TELEMETRY_DROPPED,
+)
+from app.instrumentation import InFlightMiddleware, ScoringMetrics, StageTimer, timed
+from app.lazy_imports import lazy_import
+from app.inference_executor import (
+    DeadlineExceeded, InferenceExecutor, Overloaded, available_cpus, score_in_worker, threads_per_worker,
+)
+from app.mlp_engine import DEFAULT_CHECKPOINT_PATH, DEFAULT_MLP_SCALER_PATH, BlendedModel, MLPEngine
+from app.model_registry import ModelRegistry, ModelVersion, VersionNotFound, VersionNotReady, fingerprint_files
+from app.prediction_cache import PredictionCache
+from app.websocket_scoring import AsyncBatcher, serve_connection
+
+# Imported on first use (see app/lazy_imports.py): only the LightGBM, MLP and ensemble engines
+# unpickle assets, which imports scikit-learn.
+joblib = lazy_import("joblib")
+
+if TYPE_CHECKING:
+    import lightgbm
+    from opentelemetry.sdk._logs import LoggerProvider as OtelSDKLoggerProvider
+    from opentelemetry.sdk.trace import TracerProvider
+    from sklearn.preprocessing import RobustScaler
 
 # --- Application Configuration ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -35,21 +76,162 @@ MODEL_PATH = os.path.join(ASSETS_DIR, "lgbm_nbiot_model.joblib")
 SCALER_PATH = os.path.join(ASSETS_DIR, "lgbm_nbiot_scaler.gz")
 FEATURE_LIST_PATH = os.path.join(ASSETS_DIR, "lgbm_features.json")
 
+# Decision threshold on P(attack). Adjust this threshold based on your precision/recall needs
+PREDICTION_THRESHOLD = 0.5
+
+# Rows parsed and scored per chunk by /predict_batch/stream
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "10000"))
+
 # OTEL Configuration
 OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "nbiot-detector-api")
 OTEL_EXPORTER_OTLP_TRACES_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "http://localhost:4318/v1/traces")
 OTEL_EXPORTER_OTLP_LOGS_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_LOGS_ENDPOINT", "http://localhost:4318/v1/logs")
 
+# Telemetry overhead Configuration (see app/telemetry.py). OTEL_TRACES_SAMPLER_RATIO of the
+# requests are traced, unless the caller's trace context decides; with OTEL_TRACES_SAMPLE_ERRORS
+# (off by default) the others are recorded too, at some cost per request, and exported only
+# when they fail. Log records of
+# OTEL_LOGS_EXPORT_LEVEL and above are exported ("OFF" exports none). At most
+# OTEL_EXPORT_MAX_QUEUE_SIZE spans and as many log records wait for export; beyond that the
+# oldest are dropped (nbiot_telemetry_dropped) instead of requests waiting on the collector.
+# LOG_REQUESTS=false silences the per-request INFO logs: uvicorn's access log, finished
+# streams and submitted jobs.
+OTEL_TRACES_SAMPLER_RATIO = float(os.getenv("OTEL_TRACES_SAMPLER_RATIO", "1.0"))
+OTEL_TRACES_SAMPLE_ERRORS = os.getenv("OTEL_TRACES_SAMPLE_ERRORS", "false").lower() == "true"
+OTEL_LOGS_EXPORT_LEVEL = os.getenv("OTEL_LOGS_EXPORT_LEVEL", "INFO").upper()
+OTEL_EXPORT_MAX_QUEUE_SIZE = int(os.getenv("OTEL_EXPORT_MAX_QUEUE_SIZE", "2048"))
+OTEL_EXPORT_MAX_BATCH_SIZE = int(os.getenv("OTEL_EXPORT_MAX_BATCH_SIZE", "512"))
+OTEL_EXPORT_SCHEDULE_DELAY_MS = float(os.getenv("OTEL_EXPORT_SCHEDULE_DELAY_MS", "5000"))
+OTEL_EXPORT_TIMEOUT_SECONDS = int(os.getenv("OTEL_EXPORT_TIMEOUT_SECONDS", "10"))
+LOG_REQUESTS = os.getenv("LOG_REQUESTS", "true").lower() == "true"
+
+# Inference engine: "lightgbm" (LGBMClassifier.predict_proba), "native" (flat NumPy tree evaluator),
+# "artifact" (memory-mapped precompiled model with the scaler folded in, see app/artifact.py),
+# "mlp" (the MLPDetector checkpoint evaluated with NumPy, see app/mlp_engine.py) or "ensemble"
+# (P(attack) of LightGBM and the MLP averaged, the MLP weighted by ENSEMBLE_MLP_WEIGHT)
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "lightgbm").lower()
+MODEL_ARTIFACT_PATH = os.getenv("MODEL_ARTIFACT_PATH", DEFAULT_ARTIFACT_PATH)
+# The MLP checkpoint (.pth, read without torch) or its NumPy conversion (.npz), and its scaler
+MLP_MODEL_PATH = os.getenv("MLP_MODEL_PATH", DEFAULT_CHECKPOINT_PATH)
+MLP_SCALER_PATH = os.getenv("MLP_SCALER_PATH", DEFAULT_MLP_SCALER_PATH)
+ENSEMBLE_MLP_WEIGHT = float(os.getenv("ENSEMBLE_MLP_WEIGHT", "0.5"))
+
+# Micro-batching Configuration (coalesces concurrent /predict calls)
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "false").lower() == "true"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "64"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "2"))
+
+# WebSocket streaming Configuration (/ws/predict). Rows from all connections are coalesced
+# into batches of up to WS_BATCH_MAX_ROWS; WS_MAX_PENDING bounds the frames queued for scoring
+# across connections and WS_MAX_IN_FLIGHT the verdicts awaiting delivery on one connection.
+WS_BATCH_MAX_ROWS = int(os.getenv("WS_BATCH_MAX_ROWS", "1024"))
+WS_BATCH_MAX_WAIT_MS = float(os.getenv("WS_BATCH_MAX_WAIT_MS", "2"))
+WS_MAX_PENDING = int(os.getenv("WS_MAX_PENDING", "1024"))
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "256"))
+
+# Prediction cache Configuration (/predict, /predict_batch, /predict_raw). Repeated vectors are
+# answered without scoring; PREDICTION_CACHE_DECIMALS rounds vectors before hashing so
+# near-identical ones share an entry (unset = exact match).
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "false").lower() == "true"
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "100000"))
+PREDICTION_CACHE_MAX_BYTES = int(os.getenv("PREDICTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "300"))
+PREDICTION_CACHE_DECIMALS = os.getenv("PREDICTION_CACHE_DECIMALS")
+
+# Early-exit cascade Configuration. Rows whose verdict is settled after the first trees skip
+# the rest of the ensemble; the stages and cut-offs come from CASCADE_CONFIG_PATH, written by
+# `python -m app.cascade` (which also reports trees per row and the speedup).
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+CASCADE_CONFIG_PATH = os.getenv("CASCADE_CONFIG_PATH", DEFAULT_CASCADE_PATH)
+
+# Reduced-feature model Configuration (/predict_reduced). With REDUCED_MODEL_ENABLED the
+# artifact at REDUCED_MODEL_PATH, written by `python -m app.feature_reduction` (which also
+# reports its parity with the full model), is loaded and warmed up with the startup model.
+# It scores vectors of only the features listed by GET /predict_reduced/features, in that order.
+REDUCED_MODEL_ENABLED = os.getenv("REDUCED_MODEL_ENABLED", "false").lower() == "true"
+REDUCED_MODEL_PATH = os.getenv("REDUCED_MODEL_PATH", DEFAULT_REDUCED_PATH)
+
+# Inference executor Configuration. All scoring runs on INFERENCE_WORKERS threads (and, for the
+# active model, on INFERENCE_PROCESSES spawned worker processes when set) instead of the event
+# loop. Beyond INFERENCE_MAX_QUEUE waiting jobs, requests are shed with INFERENCE_SHED_STATUS
+# (429 or 503) and Retry-After. Requests may set X-Request-Timeout (seconds); queued work is
+# dropped once it expires (504). LightGBM gets LIGHTGBM_NUM_THREADS OpenMP threads per call, by
+# default the available CPUs divided among the workers so they do not oversubscribe the cores.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "0"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "64"))
+INFERENCE_SHED_STATUS = int(os.getenv("INFERENCE_SHED_STATUS", "503"))
+INFERENCE_RETRY_AFTER_SECONDS = int(os.getenv("INFERENCE_RETRY_AFTER_SECONDS", "1"))
+INFERENCE_DEADLINE_SECONDS = float(os.getenv("INFERENCE_DEADLINE_SECONDS", "30"))
+LIGHTGBM_NUM_THREADS = int(os.getenv("LIGHTGBM_NUM_THREADS", "0"))
+
+# Model registry Configuration. Versions loaded through /admin/models are read from
+# MODEL_REGISTRY_DIR and must score MODEL_WARMUP_ROWS warm-up rows before they can be
+# activated. When ADMIN_TOKEN is set, /admin requires "Authorization: Bearer <token>".
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", ASSETS_DIR)
+MODEL_WARMUP_ROWS = int(os.getenv("MODEL_WARMUP_ROWS", "64"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Startup Configuration. The startup model scores MODEL_WARMUP_ROWS rows on the inference
+# executor before /readyz reports ready. With MODEL_LOAD_IN_BACKGROUND the server accepts
+# connections (and answers /livez) at once while telemetry is set up and the model loads on a
+# background thread; /readyz and the scoring endpoints return 503 until it is active, and
+# /livez fails if the load does, so the orchestrator restarts the process.
+MODEL_LOAD_IN_BACKGROUND = os.getenv("MODEL_LOAD_IN_BACKGROUND", "false").lower() == "true"
+
+# Asynchronous batch jobs (/jobs, see app/batch_jobs.py). Uploads of up to BATCH_JOB_MAX_BYTES
+# are spooled to BATCH_JOBS_DIR and scored by BATCH_JOB_WORKERS threads, BATCH_JOB_CHUNK_ROWS
+# rows per inference executor call. The directory must be local and outlive the server process
+# (e.g. an emptyDir volume) for interrupted jobs to resume after a restart; finished jobs and
+# their results are deleted BATCH_JOB_TTL_SECONDS after they finish.
+BATCH_JOBS_DIR = os.getenv("BATCH_JOBS_DIR", os.path.join(tempfile.gettempdir(), "nbiot-batch-jobs"))
+BATCH_JOB_WORKERS = int(os.getenv("BATCH_JOB_WORKERS", "1"))
+BATCH_JOB_CHUNK_ROWS = int(os.getenv("BATCH_JOB_CHUNK_ROWS", "50000"))
+BATCH_JOB_MAX_BYTES = int(os.getenv("BATCH_JOB_MAX_BYTES", str(4 * 1024 ** 3)))
+BATCH_JOB_TTL_SECONDS = float(os.getenv("BATCH_JOB_TTL_SECONDS", "86400"))
+
+# Rolling per-device attack rates (/devices, see app/aggregation.py), fed by uploads with a
+# device column: DEVICE_RATE_BUCKETS buckets of DEVICE_RATE_BUCKET_SECONDS per device, for at
+# most DEVICE_RATE_MAX_DEVICES devices (about 16 bytes per bucket). Each server process keeps
+# its own store, so a device's rate counts only the uploads that reached this process: behind a
+# load balancer, send each device's uploads to the same replica. Pre-forked workers
+# (app/prefork.py) cannot be routed to, so there the store is off and /devices answers 503.
+DEVICE_RATE_BUCKET_SECONDS = float(os.getenv("DEVICE_RATE_BUCKET_SECONDS", "60"))
+DEVICE_RATE_BUCKETS = int(os.getenv("DEVICE_RATE_BUCKETS", "60"))
+DEVICE_RATE_MAX_DEVICES = int(os.getenv("DEVICE_RATE_MAX_DEVICES", "10000"))
+
+INFERENCE_ENGINES = ("lightgbm", "native", "artifact", "mlp", "ensemble")
+
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] - %(message)s")
 logger = logging.getLogger(__name__)
+# The INFO logs written once per request, silenced with LOG_REQUESTS=false.
+request_logger = logging.getLogger(f"{__name__}.requests")
 
 # --- Global Variables ---
-lgbm_model: lightgbm = None
-scaler: RobustScaler = None
+# The assets of the active model version, kept in sync by the registry on every swap.
+lgbm_model: "lightgbm.LGBMClassifier" = None
+scaler: "RobustScaler" = None
+tree_ensemble: TreeEnsemble = None
 feature_list: List[str] = None
+model_registry: ModelRegistry = None
 tracer: trace.Tracer = None
-otel_sdk_logger_provider: OtelSDKLoggerProvider = None
+trace_provider: "TracerProvider" = None
+otel_sdk_logger_provider: "OtelSDKLoggerProvider" = None
+micro_batcher: MicroBatcher = None
+ws_batcher: AsyncBatcher = None
+prediction_cache: PredictionCache = None
+inference_executor: InferenceExecutor = None
+batch_jobs: BatchJobManager = None
+device_rates: DeviceRateStore = None
+# The reduced-feature model of /predict_reduced, outside the registry: it cannot score full vectors.
+reduced_model: ModelVersion = None
+# Loaded once by the pre-forking server (app/prefork.py) and shared copy-on-write by its workers.
+preloaded_version: ModelVersion = None
+# Workers forked by app/prefork.py, each with its own model registry; 1 when served by uvicorn.
+prefork_workers: int = 1
+# Why the startup model could not be loaded, when it could not (reported by /livez and /readyz).
+startup_error: Optional[str] = None
 
 # --- Pydantic Models ---
 class NetworkFeaturesInput(BaseModel):
@@ -60,59 +242,437 @@ class PredictionResponse(BaseModel):
     status: str
     probability_attack: float
 
-# --- Lifespan Event Handler (Loads assets at startup) ---
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    global lgbm_model, scaler, feature_list, tracer, otel_sdk_logger_provider
+class ModelLoadRequest(BaseModel):
+    # File names are relative to MODEL_REGISTRY_DIR; the version defaults to a fingerprint of the files.
+    version: Optional[str] = None
+    engine: str = "lightgbm"
+    model_file: str = os.path.basename(MODEL_PATH)
+    scaler_file: str = os.path.basename(SCALER_PATH)
+    feature_list_file: str = os.path.basename(FEATURE_LIST_PATH)
+    artifact_file: str = os.path.basename(DEFAULT_ARTIFACT_PATH)
+    mlp_file: str = os.path.basename(DEFAULT_CHECKPOINT_PATH)
+    mlp_scaler_file: str = os.path.basename(DEFAULT_MLP_SCALER_PATH)
+    cascade_file: Optional[str] = None
+    activate: bool = False
 
-    # 1. Configure OpenTelemetry (Tracing and Logging)
-    resource = Resource(attributes={"service.name": OTEL_SERVICE_NAME})
-    
-    # Configure Tracing
-    trace_provider = TracerProvider(resource=resource)
-    otlp_trace_exporter = OTLPSpanExporter(endpoint=OTEL_EXPORTER_OTLP_TRACES_ENDPOINT)
-    trace_processor = BatchSpanProcessor(otlp_trace_exporter)
-    trace_provider.add_span_processor(trace_processor)
-    trace.set_tracer_provider(trace_provider)
-    tracer = trace.get_tracer(__name__)
-    logger.info(f"OTEL Tracing configured. Service: {OTEL_SERVICE_NAME}, Endpoint: {OTEL_EXPORTER_OTLP_TRACES_ENDPOINT}")
-
-    # Configure Logging SDK
-    otel_sdk_logger_provider = OtelSDKLoggerProvider(resource=resource)
-    otlp_log_exporter = OTLPLogExporter(endpoint=OTEL_EXPORTER_OTLP_LOGS_ENDPOINT)
-    log_processor = BatchLogRecordProcessor(otlp_log_exporter)
-    otel_sdk_logger_provider.add_log_record_processor(log_processor)
-    set_logger_provider(otel_sdk_logger_provider)
-    
-    # Instrument Python's standard logging
-    LoggingInstrumentor().instrument(set_logging_format=True)
-    logger.info(f"OTEL Logging instrumentor configured. Log Endpoint: {OTEL_EXPORTER_OTLP_LOGS_ENDPOINT}")
-    
-    # 2. Load ML Assets
+class SummaryOptions:
+    """Query parameters of the summary response format (Accept: application/vnd.nbiot.summary+json)."""
+
+    def __init__(self, top_k: int = 10, histogram_bins: int = 10, window_seconds: float = 60.0):
+        if not 0 <= top_k <= 10000 or not 1 <= histogram_bins <= 1000 or not window_seconds > 0:
+            raise HTTPException(
+                status_code=400,
+                detail="top_k must be 0-10000, histogram_bins 1-1000 and window_seconds positive.",
+            )
+        self.top_k = top_k
+        self.histogram_bins = histogram_bins
+        self.window_seconds = window_seconds
+
+    def aggregator(self) -> VerdictAggregator:
+        return VerdictAggregator(PREDICTION_THRESHOLD, self.histogram_bins, self.top_k, self.window_seconds)
+
+class KeyColumns:
+    """
+    Leading CSV columns before the features: a device id and/or a Unix timestamp,
+    in that order. They group summaries by device and time window, and rows with a
+    device id update the rolling per-device attack rates.
+    """
+
+    def __init__(self, device_column: bool = False, timestamp_column: bool = False):
+        self.device_column = device_column
+        self.timestamp_column = timestamp_column
+
+    def __bool__(self):
+        return self.device_column or self.timestamp_column
+
+# --- Scoring ---
+# Per-stage histograms, rows and verdicts of the scoring endpoints (see app/instrumentation.py).
+scoring_metrics = ScoringMetrics(
+    stage_histogram=STAGE_DURATION_SECONDS,
+    rows_counter=ROWS_SCORED,
+    batch_rows_histogram=REQUEST_BATCH_ROWS,
+    predictions_counter=PREDICTIONS,
+)
+
+def score_features(features_np: np.ndarray, model: ModelVersion = None) -> np.ndarray:
+    """Scales a raw (n_rows, n_features) matrix and returns P(attack) for each row."""
+    return (model or model_registry.active).score(features_np)
+
+def score_with_cache(
+    features_np: np.ndarray, model: ModelVersion = None, score_fn=None, timer: Optional[StageTimer] = None
+) -> np.ndarray:
+    """Scores behind the prediction cache when it is enabled; cached rows skip scaling and prediction."""
+    model = model or model_registry.active
+    score_fn = score_fn or (lambda rows: model.score(rows, timer))
+    # Only the active version is cached, so selecting other versions does not thrash it.
+    if prediction_cache is None or model is not model_registry.active:
+        return score_fn(features_np)
+    return prediction_cache.score(features_np, score_fn, model.name)
+
+def lightgbm_threads() -> int:
+    return LIGHTGBM_NUM_THREADS or threads_per_worker(INFERENCE_WORKERS + INFERENCE_PROCESSES)
+
+def request_deadline(timeout_header: Optional[str]) -> Optional[float]:
+    """Absolute time.monotonic() deadline from X-Request-Timeout, or the configured default."""
+    try:
+        timeout = float(timeout_header) if timeout_header is not None else INFERENCE_DEADLINE_SECONDS
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout must be a number of seconds.")
+    return time.monotonic() + timeout if timeout > 0 else None
+
+def admission_error(e: Exception) -> HTTPException:
+    """Maps executor load shedding to its HTTP response."""
+    if isinstance(e, Overloaded):
+        return HTTPException(
+            status_code=INFERENCE_SHED_STATUS,
+            detail="The server is overloaded. Retry later.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return HTTPException(status_code=504, detail="The request deadline passed before it was scored.")
+
+def _scoring_job(features_np: np.ndarray, model: ModelVersion, timer: Optional[StageTimer]):
+    # Worker processes hold their own copy of the active model (and no prediction cache).
+    if inference_executor.processes and model is model_registry.active:
+        return (score_in_worker, features_np), True
+    return (score_with_cache, features_np, model, None, timer), False
+
+async def score_async(
+    features_np: np.ndarray, model: ModelVersion, deadline: Optional[float] = None, timer: Optional[StageTimer] = None
+) -> np.ndarray:
+    """Scores on the inference executor without blocking the event loop."""
+    job, in_process = _scoring_job(features_np, model, timer)
+    # Scaling and prediction in a worker process are timed together, from submission.
+    with timed(timer if in_process else None, "score"):
+        return await inference_executor.run(*job, deadline=deadline, in_process=in_process)
+
+def score_sync(
+    features_np: np.ndarray, model: ModelVersion, deadline: Optional[float] = None, timer: Optional[StageTimer] = None
+) -> np.ndarray:
+    """Scores on the inference executor, blocking the calling (threadpool) thread."""
+    job, in_process = _scoring_job(features_np, model, timer)
+    with timed(timer if in_process else None, "score"):
+        return inference_executor.call(*job, deadline=deadline, in_process=in_process)
+
+def score_job_rows(features_np: np.ndarray, model_version: str) -> np.ndarray:
+    """Scores one chunk of a batch job; runs on the inference executor (see app/batch_jobs.py)."""
+    probabilities = score_with_cache(features_np, model_registry.get(model_version))
+    scoring_metrics.record_verdicts("/jobs", probabilities, PREDICTION_THRESHOLD)
+    return probabilities
+
+def record_device_rates(keys: Optional[RowKeys], probabilities: np.ndarray):
+    """Adds rows with a device id to the rolling per-device attack rates (at the current time if untimed)."""
+    if keys is None or keys.devices is None or device_rates is None:
+        return
+    timestamps = keys.timestamps if keys.timestamps is not None else np.full(len(probabilities), time.time())
+    device_rates.record(keys.devices, timestamps, np.asarray(probabilities) > PREDICTION_THRESHOLD)
+
+def assets_loaded() -> bool:
+    return model_registry is not None and model_registry.active is not None
+
+def resolve_model(requested: Optional[str]) -> ModelVersion:
+    """The version selected with the X-Model-Version header, or the active one."""
+    try:
+        return model_registry.get(requested)
+    except VersionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# --- Model Loading ---
+def load_model_version(
+    engine: str,
+    model_path: str = MODEL_PATH,
+    scaler_path: str = SCALER_PATH,
+    feature_list_path: str = FEATURE_LIST_PATH,
+    artifact_path: str = None,
+    name: Optional[str] = None,
+    cascade_path: Optional[str] = None,
+    mlp_path: str = MLP_MODEL_PATH,
+    mlp_scaler_path: str = MLP_SCALER_PATH,
+) -> ModelVersion:
+    if engine not in INFERENCE_ENGINES:
+        raise ValueError(f"Unknown inference engine '{engine}'.")
+    if cascade_path and engine in ("mlp", "ensemble"):
+        raise ValueError("The early-exit cascade only applies to the tree engines.")
+
+    if engine == "artifact":
+        artifact_path = artifact_path or MODEL_ARTIFACT_PATH
+        ensemble, features = load_artifact(artifact_path)
+        logger.info(f"Model artifact {artifact_path} mapped with {ensemble.num_trees} trees and {len(features)} features.")
+        sources = [artifact_path] + ([cascade_path] if cascade_path else [])
+        return ModelVersion(
+            name or fingerprint_files(*sources), features,
+            tree_ensemble=ensemble, cascade=load_cascade(ensemble, cascade_path), engine=engine, sources=sources,
+        )
+
+    with open(feature_list_path, 'r') as f:
+        features = json.load(f)
+    logger.info(f"Feature list with {len(features)} features loaded successfully.")
+
+    if engine == "mlp":
+        mlp, mlp_scaler = load_mlp(mlp_path, mlp_scaler_path, len(features))
+        sources = [mlp_path, mlp_scaler_path, feature_list_path]
+        return ModelVersion(
+            name or fingerprint_files(*sources), features,
+            scaler=mlp_scaler, mlp=mlp, engine=engine, sources=sources,
+        )
+
+    loaded_scaler = joblib.load(scaler_path)
+    logger.info("Scaler loaded successfully.")
+
+    loaded_model = joblib.load(model_path)
+    logger.info("LightGBM model loaded successfully.")
+
+    ensemble = None
+    if engine == "native":
+        ensemble = TreeEnsemble.from_booster(loaded_model.booster_)
+        logger.info(f"Native tree engine built with {ensemble.num_trees} trees.")
+
+    sources = [model_path, scaler_path, feature_list_path] + ([cascade_path] if cascade_path else [])
+    if engine == "ensemble":
+        mlp, mlp_scaler = load_mlp(mlp_path, mlp_scaler_path, len(features))
+        blend = BlendedModel([
+            ("lightgbm", loaded_model, loaded_scaler, 1.0 - ENSEMBLE_MLP_WEIGHT),
+            ("mlp", mlp, mlp_scaler, ENSEMBLE_MLP_WEIGHT),
+        ])
+        sources += [mlp_path, mlp_scaler_path]
+        # Each member scales the raw vectors itself, so the version has no scaler of its own.
+        return ModelVersion(
+            name or fingerprint_files(*sources), features,
+            lgbm_model=loaded_model, mlp=mlp, blend=blend, engine=engine, sources=sources,
+        )
+
+    return ModelVersion(
+        name or fingerprint_files(*sources), features,
+        lgbm_model=loaded_model, scaler=loaded_scaler, tree_ensemble=ensemble,
+        cascade=load_cascade(ensemble if ensemble is not None else loaded_model, cascade_path),
+        engine=engine, sources=sources,
+    )
+
+def load_startup_version() -> ModelVersion:
+    """The version served at startup, as configured by INFERENCE_ENGINE and CASCADE_ENABLED."""
+    return load_model_version(INFERENCE_ENGINE, cascade_path=CASCADE_CONFIG_PATH if CASCADE_ENABLED else None)
+
+def load_mlp(mlp_path: str, mlp_scaler_path: str, num_features: int):
+    """Loads the MLP weights (without torch) and the scaler it was trained with."""
+    mlp = MLPEngine.load(mlp_path)
+    if mlp.num_features != num_features:
+        raise ValueError(f"The MLP expects {mlp.num_features} features, the feature list has {num_features}.")
+    mlp_scaler = joblib.load(mlp_scaler_path)
+    logger.info(f"MLP loaded from {os.path.basename(mlp_path)} with layers {mlp.layer_sizes}.")
+    return mlp, mlp_scaler
+
+def load_cascade(model, cascade_path: Optional[str]) -> Optional[CascadeModel]:
+    """Wraps the model in the early-exit cascade calibrated in `cascade_path`, if one is given."""
+    if not cascade_path:
+        return None
+    cascade = CascadeModel.from_calibration(
+        model, load_calibration(cascade_path), threshold=PREDICTION_THRESHOLD, exit_counter=CASCADE_EXIT_ROWS,
+    )
+    logger.info(f"Early-exit cascade enabled with stages {[k for k, _ in cascade.stages]} of {cascade.num_trees} trees.")
+    return cascade
+
+def _publish_active(version: ModelVersion):
+    global lgbm_model, scaler, tree_ensemble, feature_list
+    lgbm_model, scaler, tree_ensemble, feature_list = (
+        version.lgbm_model, version.scaler, version.tree_ensemble, version.feature_list
+    )
+    if inference_executor is not None and inference_executor.processes:
+        inference_executor.set_process_model(pickle.dumps(version), lightgbm_threads())
+    MODEL_INFO.clear()
+    MODEL_INFO.labels(version=version.name, engine=version.engine).set(1)
+
+def _configure_version(version: ModelVersion) -> ModelVersion:
+    version.set_num_threads(lightgbm_threads())
+    return version
+
+def configure_telemetry():
+    global trace_provider, otel_sdk_logger_provider
+    from app.telemetry import configure_telemetry as install_providers
+
+    trace_provider, otel_sdk_logger_provider = install_providers(
+        OTEL_SERVICE_NAME,
+        OTEL_EXPORTER_OTLP_TRACES_ENDPOINT,
+        OTEL_EXPORTER_OTLP_LOGS_ENDPOINT,
+        sampler_ratio=OTEL_TRACES_SAMPLER_RATIO,
+        sample_errors=OTEL_TRACES_SAMPLE_ERRORS,
+        log_export_level=None if OTEL_LOGS_EXPORT_LEVEL == "OFF" else logging.getLevelName(OTEL_LOGS_EXPORT_LEVEL),
+        max_queue_size=OTEL_EXPORT_MAX_QUEUE_SIZE,
+        max_export_batch_size=OTEL_EXPORT_MAX_BATCH_SIZE,
+        schedule_delay_millis=OTEL_EXPORT_SCHEDULE_DELAY_MS,
+        export_timeout_seconds=OTEL_EXPORT_TIMEOUT_SECONDS,
+        dropped_counter=TELEMETRY_DROPPED,
+    )
+
+def configure_request_logs():
+    """Applies LOG_REQUESTS to the per-request loggers (uvicorn configures its own on startup)."""
+    level = logging.NOTSET if LOG_REQUESTS else logging.WARNING
+    for name in ("uvicorn.access", request_logger.name):
+        logging.getLogger(name).setLevel(level)
+
+def start_model() -> ModelVersion:
+    """Loads the startup version, warms it up on the inference executor and activates it."""
+    global reduced_model
     logger.info("Application startup: Loading ML assets...")
+    started = time.perf_counter()
+    version = _configure_version(preloaded_version or load_startup_version())
+    # The first calls initialise the thread pools and caches of the engine; they are paid
+    # here rather than by the first requests.
+    inference_executor.call(model_registry.warm_up, version)
+    if REDUCED_MODEL_ENABLED:
+        # Loaded before activation, so /readyz only reports ready once both can score.
+        reduced = load_model_version("artifact", artifact_path=REDUCED_MODEL_PATH)
+        inference_executor.call(model_registry.warm_up, reduced)
+        reduced_model = reduced
+        logger.info(f"Reduced-feature model {reduced.name} ready with {reduced.num_features} features.")
+    model_registry.add(version, activate=True)
+    logger.info(f"Model version {version.name} ({version.engine}) ready in {time.perf_counter() - started:.2f}s.")
+    return version
+
+def _start_in_background():
+    global startup_error
     try:
-        with open(FEATURE_LIST_PATH, 'r') as f:
-            feature_list = json.load(f)
-        logger.info(f"Feature list with {len(feature_list)} features loaded successfully.")
-        
-        scaler = joblib.load(SCALER_PATH)
-        logger.info("Scaler loaded successfully.")
-        
-        lgbm_model = joblib.load(MODEL_PATH)
-        logger.info("LightGBM model loaded successfully.")
+        configure_telemetry()
+        start_model()
     except Exception as e:
         logger.error("CRITICAL: Failed to load ML assets.", exc_info=True)
-        raise RuntimeError("Could not load ML assets") from e
+        startup_error = f"{type(e).__name__}: {e}"
+
+# --- Lifespan Event Handler (Loads assets at startup) ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global tracer, micro_batcher, ws_batcher, prediction_cache, model_registry, tree_ensemble
+    global inference_executor, startup_error, batch_jobs, device_rates, reduced_model
+
+    configure_request_logs()
+
+    # 1. Start the inference executor that runs all scoring off the event loop
+    inference_executor = InferenceExecutor(
+        max_workers=INFERENCE_WORKERS,
+        max_queue=INFERENCE_MAX_QUEUE,
+        processes=INFERENCE_PROCESSES,
+        retry_after_seconds=INFERENCE_RETRY_AFTER_SECONDS,
+        queue_depth_gauge=INFERENCE_QUEUE_DEPTH,
+        rejected_counter=INFERENCE_REJECTED,
+    )
+    # BLAS (the MLP and the scaler) gets the same per-worker share of the cores as LightGBM.
+    threadpool_limits(limits=lightgbm_threads(), user_api="blas")
+    logger.info(
+        f"Inference executor started ({INFERENCE_WORKERS} threads, {INFERENCE_PROCESSES} processes, "
+        f"queue {INFERENCE_MAX_QUEUE}, {lightgbm_threads()} of {available_cpus()} CPUs per call)."
+    )
+    model_registry = ModelRegistry(warmup_rows=MODEL_WARMUP_ROWS, on_activate=_publish_active)
+
+    # 2. Configure OpenTelemetry and load, warm up and activate the ML assets. The tracer is a
+    #    proxy until the provider is installed, so it can be handed out before that.
+    tracer = trace.get_tracer(__name__)
+    startup_error = None
+    if MODEL_LOAD_IN_BACKGROUND:
+        threading.Thread(target=_start_in_background, name="startup-loader", daemon=True).start()
+    else:
+        configure_telemetry()
+        try:
+            start_model()
+        except Exception as e:
+            logger.error("CRITICAL: Failed to load ML assets.", exc_info=True)
+            model_registry.shutdown()
+            inference_executor.shutdown()
+            raise RuntimeError("Could not load ML assets") from e
+
+    # 3. Start the optional micro-batcher for /predict
+    if MICRO_BATCH_ENABLED:
+        micro_batcher = MicroBatcher(
+            lambda rows, deadline: inference_executor.call(score_features, rows, deadline=deadline),
+            max_batch_size=MICRO_BATCH_MAX_SIZE,
+            max_wait_ms=MICRO_BATCH_MAX_WAIT_MS,
+            batch_size_histogram=MICRO_BATCH_SIZE,
+            queue_wait_histogram=MICRO_BATCH_QUEUE_WAIT_SECONDS,
+            rejected_counter=INFERENCE_REJECTED,
+        )
+        micro_batcher.start()
+
+    # 4. Set up the optional prediction cache
+    if PREDICTION_CACHE_ENABLED:
+        prediction_cache = PredictionCache(
+            max_entries=PREDICTION_CACHE_MAX_ENTRIES,
+            max_bytes=PREDICTION_CACHE_MAX_BYTES,
+            ttl_seconds=PREDICTION_CACHE_TTL_SECONDS,
+            quantize_decimals=int(PREDICTION_CACHE_DECIMALS) if PREDICTION_CACHE_DECIMALS else None,
+            hits_counter=PREDICTION_CACHE_HITS,
+            misses_counter=PREDICTION_CACHE_MISSES,
+            evictions_counter=PREDICTION_CACHE_EVICTIONS,
+            entries_gauge=PREDICTION_CACHE_ENTRIES,
+        )
+        logger.info(f"Prediction cache enabled (max_entries={prediction_cache.max_entries}, ttl={PREDICTION_CACHE_TTL_SECONDS}s).")
+
+    # 5. Start the cross-connection batcher for /ws/predict
+    ws_batcher = AsyncBatcher(
+        score_features,
+        runner=inference_executor.run,
+        max_batch_rows=WS_BATCH_MAX_ROWS,
+        max_wait_ms=WS_BATCH_MAX_WAIT_MS,
+        max_pending=WS_MAX_PENDING,
+        batch_rows_histogram=WEBSOCKET_BATCH_ROWS,
+    )
+    ws_batcher.start()
+
+    # 6. Start the batch job workers; jobs interrupted by the last shutdown are resumed
+    batch_jobs = BatchJobManager(
+        BATCH_JOBS_DIR,
+        score_job_rows,
+        chunk_rows=BATCH_JOB_CHUNK_ROWS,
+        workers=BATCH_JOB_WORKERS,
+        threshold=PREDICTION_THRESHOLD,
+        csv_threads=lightgbm_threads(),
+        ttl_seconds=BATCH_JOB_TTL_SECONDS,
+        runner=inference_executor.call,
+        ready=assets_loaded,
+        jobs_counter=BATCH_JOBS,
+    )
+    batch_jobs.start()
+
+    # 7. Set up the rolling per-device attack rates
+    if prefork_workers > 1:
+        logger.warning(
+            f"Device attack rates are disabled: each of the {prefork_workers} pre-forked workers "
+            "would count only the uploads the kernel hands it."
+        )
+    else:
+        device_rates = DeviceRateStore(
+            bucket_seconds=DEVICE_RATE_BUCKET_SECONDS,
+            buckets=DEVICE_RATE_BUCKETS,
+            max_devices=DEVICE_RATE_MAX_DEVICES,
+            devices_gauge=DEVICE_RATE_DEVICES,
+        )
 
     logger.info("Lifespan: Startup tasks completed successfully.")
     yield
     # === Shutdown ===
     logger.info("Lifespan: Initiating shutdown procedures.")
+    if micro_batcher:
+        micro_batcher.stop()
+        micro_batcher = None
+    await ws_batcher.stop()
+    ws_batcher = None
+    # Before the executor, so no chunk fails for want of it; the job resumes on the next start.
+    batch_jobs.stop()
+    batch_jobs = None
+    device_rates = None
+    if prediction_cache:
+        prediction_cache.clear()
+        prediction_cache = None
+    model_registry.shutdown()
+    inference_executor.shutdown()
+    inference_executor = None
+    model_registry = None
+    reduced_model = None
+    tree_ensemble = None
     if trace_provider:
         logger.info("Shutting down OpenTelemetry trace provider.")
         trace_provider.shutdown()
     if otel_sdk_logger_provider:
+        from app.telemetry import remove_log_handler
+
         logger.info("Shutting down OpenTelemetry logger provider.")
+        remove_log_handler()
         otel_sdk_logger_provider.shutdown()
     logger.info("Lifespan: Shutdown complete.")
 
@@ -122,32 +682,70 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Instrument FastAPI for OpenTelemetry
-FastAPIInstrumentor.instrument_app(app)
+# Instrument FastAPI for OpenTelemetry. Per-message receive/send spans are skipped: a
+# /ws/predict connection would otherwise create two spans for every vector it streams.
+# The health probes, polled every few seconds, are not traced.
+FastAPIInstrumentor.instrument_app(app, excluded_urls="livez,readyz", exclude_spans=["receive", "send"])
+
+# Expose Prometheus metrics
+app.mount("/metrics", make_asgi_app(registry=exposition_registry()))
+app.add_middleware(
+    InFlightMiddleware,
+    gauge=REQUESTS_IN_FLIGHT,
+    paths=["/predict", "/predict_batch", "/predict_raw", "/predict_reduced", "/predict_batch/stream", "/ws/predict"],
+)
 
 # --- API Endpoints ---
 @app.get("/", summary="Root Endpoint", include_in_schema=False)
 def read_root():
     return {"message": "N-BaIoT Botnet Detector API with LightGBM model is running."}
 
+# Both probes run on the event loop, so they answer while every threadpool thread is scoring.
+@app.get("/livez", summary="Liveness Probe")
+async def liveness():
+    """Fails only when the startup model could not be loaded; a restart is the only remedy."""
+    if startup_error is not None:
+        raise HTTPException(status_code=503, detail=f"Model assets failed to load: {startup_error}")
+    return {"status": "alive"}
+
+@app.get("/readyz", summary="Readiness Probe")
+async def readiness():
+    """Ready once the startup model is loaded, warmed up and active."""
+    if startup_error is not None:
+        raise HTTPException(status_code=503, detail=f"Model assets failed to load: {startup_error}")
+    if not assets_loaded():
+        raise HTTPException(status_code=503, detail="Model assets are loading.")
+    return {"status": "ready", "model_version": model_registry.active.name}
+
 @app.post("/predict", response_model=PredictionResponse, summary="Predict a Single Instance")
-def predict_single(data: NetworkFeaturesInput):
+def predict_single(
+    data: NetworkFeaturesInput, x_model_version: Optional[str] = Header(None), x_request_timeout: Optional[str] = Header(None)
+):
     current_span = trace.get_current_span()
-    if not all([lgbm_model, scaler, feature_list]):
+    if not assets_loaded():
         raise HTTPException(status_code=503, detail="Model assets not loaded.")
+    model = resolve_model(x_model_version)
+    deadline = request_deadline(x_request_timeout)
+    current_span.set_attribute("model.version", model.name)
     
-    if len(data.features) != len(feature_list):
-        raise HTTPException(status_code=400, detail=f"Expected {len(feature_list)} features, but got {len(data.features)}")
+    if len(data.features) != model.num_features:
+        raise HTTPException(status_code=400, detail=f"Expected {model.num_features} features, but got {len(data.features)}")
 
+    timer = scoring_metrics.timer("/predict")
     try:
-        features_np = np.array(data.features).reshape(1, -1)
-        scaled_features = scaler.transform(features_np)
-        
-        # predict_proba returns [[P(benign), P(attack)]]
-        probability_attack = lgbm_model.predict_proba(scaled_features)[0][1]
+        with timer.stage("parse"):
+            features_np = np.array(data.features).reshape(1, -1)
+        if micro_batcher is not None and model is model_registry.active:
+            # Scaled and predicted together with other requests; timed as one stage, queue wait included.
+            with timer.stage("micro_batch"):
+                probability_attack = score_with_cache(
+                    features_np, model, lambda rows: [micro_batcher.submit(rows[0], deadline)]
+                )[0]
+        else:
+            probability_attack = score_sync(features_np, model, deadline, timer)[0]
+        scoring_metrics.record_predictions("/predict", [probability_attack], PREDICTION_THRESHOLD)
         
-        threshold = 0.5  # Adjust this threshold based on your precision/recall needs
-        prediction_label = 1 if probability_attack > threshold else 0
+        prediction_label = 1 if probability_attack > PREDICTION_THRESHOLD else 0
         status_message = "Attack" if prediction_label == 1 else "Benign"
         
         current_span.set_attribute("prediction.label", status_message)
@@ -158,64 +756,646 @@ def predict_single(data: NetworkFeaturesInput):
             status=status_message,
             probability_attack=probability_attack
         )
+    except (Overloaded, DeadlineExceeded) as e:
+        raise admission_error(e)
     except Exception as e:
         logger.error("Error during single prediction", exc_info=True)
         current_span.record_exception(e)
         current_span.set_status(Status(StatusCode.ERROR, "Error during prediction"))
         raise HTTPException(status_code=500, detail="An unexpected error occurred during prediction.")
+    finally:
+        timer.finish(current_span, tracer)
 
 
-@app.post("/predict_batch", response_model=List[PredictionResponse], summary="Predict a Batch from a CSV File")
-async def predict_batch(file: UploadFile = File(...)):
+def _batch_response(probabilities_attack: np.ndarray, media_type: str):
+    # Columnar and binary formats skip per-row response objects entirely
+    if media_type == MEDIA_TYPE_COLUMNAR_JSON:
+        return columnar_json_response(probabilities_attack, PREDICTION_THRESHOLD)
+    if media_type == MEDIA_TYPE_BINARY:
+        return binary_response(probabilities_attack, PREDICTION_THRESHOLD)
+
+    # Built here rather than through response_model, so the whole encoding is part of the
+    # "serialize" stage; the body is identical to FastAPI's List[PredictionResponse] output.
+    probabilities_attack = np.asarray(probabilities_attack)
+    labels = (probabilities_attack > PREDICTION_THRESHOLD).tolist()
+    return JSONResponse([
+        {"prediction_label": int(label), "status": "Attack" if label else "Benign", "probability_attack": prob_attack}
+        for label, prob_attack in zip(labels, probabilities_attack.tolist())
+    ])
+
+
+def _read_batch_csv(
+    contents: bytes, model: ModelVersion, timer: Optional[StageTimer] = None, key_columns: Optional[KeyColumns] = None,
+) -> Tuple[np.ndarray, Optional[RowKeys]]:
+    """The feature matrix of an upload, and the keys of its rows when it has key columns."""
+    with timed(timer, "parse"):
+        if not key_columns:
+            return _parse_batch_csv(contents, model), None
+        return _parse_keyed_batch_csv(contents, model, key_columns)
+
+def _parse_batch_csv(contents: bytes, model: ModelVersion) -> np.ndarray:
+    # Parsed straight into a float64 matrix, in parallel on the per-call share of the CPUs
+    # (see app/csv_decoder.py); columns are in feature_list order, as the model expects.
+    try:
+        features_np = decode_csv(contents, model.num_features, threads=lightgbm_threads())
+    except CsvRowError as e:
+        logger.warning(f"CSV parsing error for batch: {e}")
+        raise HTTPException(status_code=400, detail=f"Error parsing CSV file. {e}")
+    if len(features_np) == 0:
+        logger.warning("Attempted to process an empty CSV for batch prediction.")
+        raise HTTPException(status_code=400, detail="CSV file is empty or contains no data rows.")
+    return features_np
+
+def _parse_keyed_batch_csv(contents: bytes, model: ModelVersion, key_columns: KeyColumns) -> Tuple[np.ndarray, RowKeys]:
+    # The key columns are split off line by line; the features are decoded as above.
+    row_numbers, lines = numbered_lines(contents)
+    if not lines:
+        logger.warning("Attempted to process an empty CSV for batch prediction.")
+        raise HTTPException(status_code=400, detail="CSV file is empty or contains no data rows.")
+    try:
+        keys, lines = split_key_columns(lines, row_numbers, key_columns.device_column, key_columns.timestamp_column)
+        return parse_csv_lines(lines, row_numbers, model.num_features, lightgbm_threads()), keys
+    except CsvRowError as e:
+        logger.warning(f"CSV parsing error for batch: {e}")
+        raise HTTPException(status_code=400, detail=f"Error parsing CSV file. {e}")
+
+def _summary_response(probabilities_attack: np.ndarray, keys: Optional[RowKeys], options: SummaryOptions):
+    aggregator = options.aggregator()
+    aggregator.add(probabilities_attack, keys)
+    return JSONResponse(aggregator.summary(), media_type=MEDIA_TYPE_SUMMARY)
+
+@app.post(
+    "/predict_batch",
+    response_model=List[PredictionResponse],
+    summary="Predict a Batch from a CSV File",
+    responses={200: {"content": {MEDIA_TYPE_COLUMNAR_JSON: {}, MEDIA_TYPE_BINARY: {}, MEDIA_TYPE_SUMMARY: {}}}},
+)
+async def predict_batch(
+    file: UploadFile = File(...),
+    accept: Optional[str] = Header(None),
+    x_model_version: Optional[str] = Header(None),
+    x_request_timeout: Optional[str] = Header(None),
+    key_columns: KeyColumns = Depends(),
+    summary_options: SummaryOptions = Depends(),
+):
     current_span = trace.get_current_span()
-    if not all([lgbm_model, scaler, feature_list]):
+    if not assets_loaded():
         raise HTTPException(status_code=503, detail="Model assets not loaded.")
+    model = resolve_model(x_model_version)
+    deadline = request_deadline(x_request_timeout)
+    current_span.set_attribute("model.version", model.name)
+    media_type = negotiate_media_type(accept)
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=f"Unsupported Accept header. Supported: {', '.join(SUPPORTED_MEDIA_TYPES)}.")
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV.")
 
+    timer = scoring_metrics.timer("/predict_batch")
     try:
         contents = await file.read()
-        
-        # Specific handling for CSV parsing errors
-        try:
-            df = pd.read_csv(io.BytesIO(contents), header=None)
-        except pd.errors.EmptyDataError:
-            logger.warning("Attempted to process an empty CSV for batch prediction.")
-            raise HTTPException(status_code=400, detail="CSV file is empty or contains no data rows.")
-        except pd.errors.ParserError as pe:
-            logger.warning(f"CSV parsing error for batch: {str(pe)}")
-            raise HTTPException(status_code=400, detail="Error parsing CSV file. Ensure it's valid CSV with numerical data and no header.")
-
-        current_span.set_attribute("batch.row_count", len(df))
-
-        if df.shape[1] != len(feature_list):
-            raise HTTPException(status_code=400, detail=f"CSV has incorrect column count. Expected {len(feature_list)}, got {df.shape[1]}.")
-        
-        # Enforce correct feature order
-        df.columns = feature_list
-        features_np = df[feature_list].values
-        
-        scaled_features = scaler.transform(features_np)
-        
-        probabilities_batch = lgbm_model.predict_proba(scaled_features)
-        
-        predictions = []
-        threshold = 0.5
-        for prob in probabilities_batch:
-            prob_attack = prob[1]
-            label = 1 if prob_attack > threshold else 0
-            status = "Attack" if label == 1 else "Benign"
-            predictions.append(
-                PredictionResponse(prediction_label=label, status=status, probability_attack=prob_attack)
-            )
-        return predictions
+        # Parsing is CPU-bound too, so it runs on the inference executor like the scoring.
+        features_np, keys = await inference_executor.run(
+            _read_batch_csv, contents, model, timer, key_columns, deadline=deadline
+        )
+        current_span.set_attribute("batch.row_count", len(features_np))
+
+        probabilities_attack = await score_async(features_np, model, deadline, timer)
+        scoring_metrics.record_predictions("/predict_batch", probabilities_attack, PREDICTION_THRESHOLD)
+        record_device_rates(keys, probabilities_attack)
+
+        with timer.stage("serialize"):
+            if media_type == MEDIA_TYPE_SUMMARY:
+                return _summary_response(probabilities_attack, keys, summary_options)
+            return _batch_response(probabilities_attack, media_type)
 
     except HTTPException as http_exc:
         # If we raised a specific HTTPException (like a 400), let it pass through
         raise http_exc
+    except (Overloaded, DeadlineExceeded) as e:
+        raise admission_error(e)
     except Exception as e:
         # Catch any other unexpected errors and return a 500
         logger.error("Error during batch prediction", exc_info=True)
         current_span.record_exception(e)
         current_span.set_status(Status(StatusCode.ERROR, "Unexpected error processing batch file"))
-        raise HTTPException(status_code=500, detail="An unexpected server error occurred while processing the batch file.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An unexpected server error occurred while processing the batch file.")
+    finally:
+        timer.finish(current_span, tracer)
+
+
+@app.post(
+    "/predict_raw",
+    response_model=List[PredictionResponse],
+    summary="Predict from a Packed Binary Feature Matrix",
+    responses={200: {"content": {MEDIA_TYPE_COLUMNAR_JSON: {}, MEDIA_TYPE_BINARY: {}, MEDIA_TYPE_SUMMARY: {}}}},
+    openapi_extra={"requestBody": {"required": True, "content": {t: {} for t in SUPPORTED_CONTENT_TYPES}}},
+)
+async def predict_raw(
+    request: Request,
+    accept: Optional[str] = Header(None),
+    x_model_version: Optional[str] = Header(None),
+    x_request_timeout: Optional[str] = Header(None),
+    summary_options: SummaryOptions = Depends(),
+):
+    """
+    Scores an N x len(feature_list) matrix sent as packed little-endian float32/float64
+    or msgpack, decoded with `np.frombuffer` instead of JSON + Pydantic. The response
+    format is negotiated exactly like /predict_batch.
+    """
+    if not assets_loaded():
+        raise HTTPException(status_code=503, detail="Model assets not loaded.")
+    model = resolve_model(x_model_version)
+    return await _score_feature_body(request, model, "/predict_raw", accept, x_request_timeout, summary_options)
+
+
+async def _score_feature_body(
+    request: Request,
+    model: ModelVersion,
+    endpoint: str,
+    accept: Optional[str],
+    x_request_timeout: Optional[str],
+    summary_options: SummaryOptions,
+    allow_csv: bool = False,
+):
+    """Scores a feature matrix sent as the raw request body, for /predict_raw and /predict_reduced."""
+    current_span = trace.get_current_span()
+    current_span.set_attribute("model.version", model.name)
+    deadline = request_deadline(x_request_timeout)
+    media_type = negotiate_media_type(accept)
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=f"Unsupported Accept header. Supported: {', '.join(SUPPORTED_MEDIA_TYPES)}.")
+
+    body = await request.body()
+    content_type = request.headers.get("content-type")
+    timer = scoring_metrics.timer(endpoint)
+    try:
+        with timer.stage("parse"):
+            if allow_csv and (content_type or "").split(";")[0].strip().lower() == "text/csv":
+                features_np = decode_csv(body, model.num_features, threads=lightgbm_threads())
+                if not len(features_np):
+                    raise InvalidFeatureBody("Request body is empty.")
+            else:
+                features_np = decode_feature_body(body, content_type, model.num_features)
+    except UnsupportedContentType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except (InvalidFeatureBody, CsvRowError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    current_span.set_attribute("batch.row_count", features_np.shape[0])
+    try:
+        probabilities_attack = await score_async(features_np, model, deadline, timer)
+        scoring_metrics.record_predictions(endpoint, probabilities_attack, PREDICTION_THRESHOLD)
+        with timer.stage("serialize"):
+            if media_type == MEDIA_TYPE_SUMMARY:
+                return _summary_response(probabilities_attack, None, summary_options)
+            return _batch_response(probabilities_attack, media_type)
+    except (Overloaded, DeadlineExceeded) as e:
+        raise admission_error(e)
+    except Exception as e:
+        logger.error(f"Error during prediction on {endpoint}", exc_info=True)
+        current_span.record_exception(e)
+        current_span.set_status(Status(StatusCode.ERROR, "Error during prediction"))
+        raise HTTPException(status_code=500, detail="An unexpected error occurred during prediction.")
+    finally:
+        timer.finish(current_span, tracer)
+
+
+@app.post(
+    "/predict_reduced",
+    response_model=List[PredictionResponse],
+    summary="Predict from Reduced-Feature Vectors",
+    responses={200: {"content": {MEDIA_TYPE_COLUMNAR_JSON: {}, MEDIA_TYPE_BINARY: {}, MEDIA_TYPE_SUMMARY: {}}}},
+    openapi_extra={"requestBody": {"required": True, "content": {t: {} for t in ("text/csv",) + SUPPORTED_CONTENT_TYPES}}},
+)
+async def predict_reduced(
+    request: Request,
+    accept: Optional[str] = Header(None),
+    x_request_timeout: Optional[str] = Header(None),
+    summary_options: SummaryOptions = Depends(),
+):
+    """
+    Scores rows of only the features of the reduced-feature model (GET
+    /predict_reduced/features), sent as headerless CSV, packed float32/float64
+    or msgpack. The response format is negotiated like /predict_batch.
+    """
+    model = _reduced_model()
+    return await _score_feature_body(request, model, "/predict_reduced", accept, x_request_timeout, summary_options,
+                                     allow_csv=True)
+
+
+@app.get("/predict_reduced/features", summary="Features of the Reduced-Feature Model")
+def reduced_model_features():
+    """The features /predict_reduced expects, in order."""
+    model = _reduced_model()
+    return {"version": model.name, "num_features": model.num_features, "features": model.feature_list}
+
+
+def _reduced_model() -> ModelVersion:
+    if not REDUCED_MODEL_ENABLED:
+        raise HTTPException(status_code=404, detail="The reduced-feature model is not enabled (REDUCED_MODEL_ENABLED).")
+    model = reduced_model
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model assets not loaded.")
+    return model
+
+
+def _score_csv_lines(
+    model: ModelVersion, row_numbers: np.ndarray, lines: List[bytes], key_columns: Optional[KeyColumns] = None,
+):
+    keys = None
+    if key_columns:
+        keys, lines = split_key_columns(lines, row_numbers, key_columns.device_column, key_columns.timestamp_column)
+    features_np = parse_csv_lines(lines, row_numbers, model.num_features, lightgbm_threads())
+    probabilities = score_features(features_np, model)
+    scoring_metrics.record_verdicts("/predict_batch/stream", probabilities, PREDICTION_THRESHOLD)
+    record_device_rates(keys, probabilities)
+    return row_numbers, probabilities, keys
+
+
+# The upload is read from the raw form instead of an `UploadFile` parameter, because
+# FastAPI closes `UploadFile`s as soon as the endpoint returns, before the stream is sent.
+_STREAM_UPLOAD_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
+
+
+@app.post("/predict_batch/stream", summary="Stream Predictions for a Large CSV File", openapi_extra=_STREAM_UPLOAD_SCHEMA)
+async def predict_batch_stream(
+    request: Request,
+    format: str = "ndjson",
+    x_model_version: Optional[str] = Header(None),
+    key_columns: KeyColumns = Depends(),
+    summary_options: SummaryOptions = Depends(),
+):
+    """
+    Scores a headerless CSV in chunks of STREAM_CHUNK_ROWS rows and streams the
+    verdicts back as NDJSON (default) or CSV, so memory stays flat regardless of
+    the upload size. Errors in the first chunk return a 400; later errors end
+    the stream with an error record naming the offending row. The whole stream
+    is scored by the version that was active (or selected) when it started.
+    With format=summary the chunks are aggregated as they are scored and only
+    the summary is returned, once the whole upload is scored.
+    """
+    current_span = trace.get_current_span()
+    if not assets_loaded():
+        raise HTTPException(status_code=503, detail="Model assets not loaded.")
+    model = resolve_model(x_model_version)
+    current_span.set_attribute("model.version", model.name)
+    if format not in ("ndjson", "csv", "summary"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use 'ndjson', 'csv' or 'summary'.")
+    formatter = format_ndjson if format == "ndjson" else format_csv
+    aggregator = summary_options.aggregator() if format == "summary" else None
+
+    # Starlette spools the uploaded file to disk beyond 1 MB, so nothing here is held in memory.
+    form = await request.form()
+    file = form.get("file")
+    if not hasattr(file, "read") or not (file.filename or "").endswith(".csv"):
+        await form.close()
+        raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV.")
+
+    chunks = iter_csv_line_chunks(file.read, STREAM_CHUNK_ROWS)
+    # Score the first chunk up front so malformed uploads still get a proper status code.
+    try:
+        first_chunk = await anext(chunks)
+        first_result = await inference_executor.run(_score_csv_lines, model, *first_chunk, key_columns)
+        if aggregator is not None:
+            # Nothing is sent before the whole upload is scored, so every error gets a status code.
+            aggregator.add(*first_result[1:])
+            async for row_numbers, lines in chunks:
+                result = await inference_executor.run(_score_csv_lines, model, row_numbers, lines, key_columns)
+                aggregator.add(*result[1:])
+    except StopAsyncIteration:
+        await form.close()
+        logger.warning("Attempted to stream an empty CSV for batch prediction.")
+        raise HTTPException(status_code=400, detail="CSV file is empty or contains no data rows.")
+    except CsvRowError as e:
+        await form.close()
+        logger.warning(f"CSV parsing error for streamed batch: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Overloaded as e:
+        await form.close()
+        raise admission_error(e)
+    except Exception as e:
+        await form.close()
+        logger.error("Error during streamed batch prediction", exc_info=True)
+        current_span.record_exception(e)
+        current_span.set_status(Status(StatusCode.ERROR, "Unexpected error processing batch file"))
+        raise HTTPException(status_code=500, detail="An unexpected server error occurred while processing the batch file.")
+
+    if aggregator is not None:
+        await form.close()
+        scoring_metrics.observe_batch("/predict_batch/stream", aggregator.rows)
+        request_logger.info(f"Streamed batch summary finished after {aggregator.rows} rows.")
+        return JSONResponse(aggregator.summary(), media_type=MEDIA_TYPE_SUMMARY)
+
+    async def body():
+        if format == "csv":
+            yield CSV_HEADER
+        yield formatter(*first_result[:2], PREDICTION_THRESHOLD)
+        rows_scored = len(first_result[0])
+        try:
+            async for row_numbers, lines in chunks:
+                result = await inference_executor.run(_score_csv_lines, model, row_numbers, lines, key_columns)
+                rows_scored += len(row_numbers)
+                yield formatter(*result[:2], PREDICTION_THRESHOLD)
+        except CsvRowError as e:
+            logger.warning(f"CSV parsing error for streamed batch: {e}")
+            yield _stream_error(format, e.row, str(e))
+        except Overloaded:
+            logger.warning(f"Inference queue full; streamed batch stopped after {rows_scored} rows.")
+            yield _stream_error(format, rows_scored + 1, "Server overloaded; resubmit the remaining rows later.")
+        except Exception:
+            logger.error("Error during streamed batch prediction", exc_info=True)
+            yield _stream_error(format, None, "An unexpected server error occurred while processing the batch file.")
+        finally:
+            await form.close()
+            scoring_metrics.observe_batch("/predict_batch/stream", rows_scored)
+            request_logger.info(f"Streamed batch prediction finished after {rows_scored} rows.")
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(body(), media_type=media_type)
+
+
+def _stream_error(format: str, row, message: str) -> str:
+    if format == "ndjson":
+        return json.dumps({"error": message, "row": row}) + "\n"
+    return f"# error: {message}\n"
+
+
+@app.websocket("/ws/predict")
+async def predict_ws(websocket: WebSocket):
+    """
+    Long-lived scoring stream for gateways that send vectors continuously. Frames
+    are batched across all open connections into the same scale + predict path and
+    verdicts are sent back in order with their sequence IDs (see app/websocket_scoring.py).
+    The X-Model-Version header of the handshake selects the version for the whole connection.
+    """
+    if not assets_loaded() or ws_batcher is None:
+        # 1013: try again later
+        await websocket.close(code=1013, reason="Model assets not loaded.")
+        return
+    # The version is resolved once, so an activation mid-connection cannot score
+    # frames validated against another model's width.
+    try:
+        model = model_registry.get(websocket.headers.get("x-model-version"))
+    except VersionNotFound as e:
+        # 1008: policy violation
+        await websocket.close(code=1008, reason=str(e))
+        return
+    await websocket.accept()
+    WEBSOCKET_CONNECTIONS.inc()
+    try:
+        await serve_connection(
+            websocket, ws_batcher, model.num_features, PREDICTION_THRESHOLD, WS_MAX_IN_FLIGHT, score_args=(model,)
+        )
+    except WebSocketDisconnect:
+        pass
+    except Exception:
+        logger.error("WebSocket scoring connection failed", exc_info=True)
+    finally:
+        WEBSOCKET_CONNECTIONS.dec()
+
+
+# --- Device Attack Rate Endpoints ---
+def _device_rate_store() -> DeviceRateStore:
+    if device_rates is None:
+        reason = ""
+        if prefork_workers > 1:
+            reason = f" with {prefork_workers} pre-forked workers, each of which sees part of the traffic"
+        raise HTTPException(status_code=503, detail=f"Device attack rates are not available{reason}.")
+    return device_rates
+
+
+@app.get("/devices/attack_rates", summary="Rolling Attack Rates of All Devices")
+def device_attack_rates(window_seconds: Optional[float] = None, limit: int = 100):
+    """
+    Rows, attacks and attack rate of every device over the last `window_seconds`
+    (default: all buckets kept), riskiest first. Devices are recorded from uploads
+    with a device column (see KeyColumns) that reached this server process.
+    """
+    if window_seconds is not None and window_seconds <= 0:
+        raise HTTPException(status_code=400, detail="window_seconds must be positive.")
+    store = _device_rate_store()
+    return {
+        "bucket_seconds": store.bucket_seconds,
+        "devices_tracked": len(store),
+        "devices": store.rates(window_seconds, max(limit, 0)),
+    }
+
+
+@app.get("/devices/{device_id}/attack_rate", summary="Rolling Attack Rate of One Device")
+def device_attack_rate(device_id: str, window_seconds: Optional[float] = None):
+    """One device's rows, attacks and attack rate over the last `window_seconds`, and per bucket."""
+    if window_seconds is not None and window_seconds <= 0:
+        raise HTTPException(status_code=400, detail="window_seconds must be positive.")
+    rates = _device_rate_store().device(device_id, window_seconds)
+    if rates is None:
+        raise HTTPException(status_code=404, detail=f"Device '{device_id}' has no recent verdicts.")
+    return rates
+
+
+# --- Batch Job Endpoints ---
+_JOB_FORMATS = {"text/csv": FORMAT_CSV, MEDIA_TYPE_FLOAT32: FORMAT_FLOAT32, MEDIA_TYPE_FLOAT64: FORMAT_FLOAT64}
+
+# Accepts a raw body (CSV or packed floats, selected by Content-Type) or a multipart CSV upload.
+_JOB_UPLOAD_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "text/csv": {},
+            MEDIA_TYPE_FLOAT32: {},
+            MEDIA_TYPE_FLOAT64: {},
+            "multipart/form-data": _STREAM_UPLOAD_SCHEMA["requestBody"]["content"]["multipart/form-data"],
+        },
+    }
+}
+
+
+async def _spool_upload(request: Request, media_type: str, path: str) -> int:
+    """Writes the upload to `path` without holding it in memory; returns its size."""
+    if media_type == "multipart/form-data":
+        # Starlette has already spooled the file to a temporary file beyond 1 MB.
+        form = await request.form()
+        try:
+            file = form.get("file")
+            if not hasattr(file, "read") or not (file.filename or "").endswith(".csv"):
+                raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV.")
+            with open(path, "wb") as out:
+                await run_in_threadpool(shutil.copyfileobj, file.file, out, 1 << 20)
+                size = out.tell()
+        finally:
+            await form.close()
+        if size > BATCH_JOB_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Uploads are limited to {BATCH_JOB_MAX_BYTES} bytes.")
+        return size
+
+    size = 0
+    with open(path, "wb") as out:
+        async for data in request.stream():
+            size += len(data)
+            if size > BATCH_JOB_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Uploads are limited to {BATCH_JOB_MAX_BYTES} bytes.")
+            await run_in_threadpool(out.write, data)
+    return size
+
+
+@app.post("/jobs", status_code=202, summary="Submit a Batch Scoring Job", openapi_extra=_JOB_UPLOAD_SCHEMA)
+async def submit_job(request: Request, x_model_version: Optional[str] = Header(None)):
+    """
+    Spools a large upload to local disk and scores it in the background, in chunks
+    of BATCH_JOB_CHUNK_ROWS rows, with the version active (or selected) now. Poll
+    GET /jobs/{job_id} for progress and download the verdicts from
+    GET /jobs/{job_id}/results once the job has completed.
+    """
+    if not assets_loaded():
+        raise HTTPException(status_code=503, detail="Model assets not loaded.")
+    model = resolve_model(x_model_version)
+    media_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    job_format = FORMAT_CSV if media_type == "multipart/form-data" else _JOB_FORMATS.get(media_type)
+    if job_format is None:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported Content-Type '{media_type}'. Supported: {', '.join(_JOB_FORMATS)}, multipart/form-data.",
+        )
+
+    job_id = batch_jobs.create(job_format, model.name, model.num_features)
+    try:
+        await _spool_upload(request, media_type, batch_jobs.input_path(job_id))
+        job = batch_jobs.submit(job_id)
+    except InvalidJobInput as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        batch_jobs.delete(job_id)
+        raise
+    request_logger.info(f"Batch job {job_id} submitted ({job_format}, model {model.name}).")
+    return JSONResponse(job, status_code=202, headers={"Location": f"/jobs/{job_id}"})
+
+
+@app.get("/jobs/{job_id}", summary="Get the Progress of a Batch Job")
+def get_job(job_id: str):
+    """Status, rows done, progress (fraction of the upload) and rows/s of a batch job."""
+    try:
+        return batch_jobs.status(job_id)
+    except JobNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/jobs/{job_id}/results", summary="Download the Results of a Batch Job")
+def get_job_results(job_id: str):
+    """
+    An `.npz` file with two columns in upload row order: `probability_attack`
+    (float32) and `prediction_label` (uint8); load it with `numpy.load`.
+    """
+    try:
+        path = batch_jobs.results_path(job_id)
+        job = batch_jobs.status(job_id) if path is None else None
+    except JobNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if path is None:
+        if job["status"] == STATUS_FAILED:
+            raise HTTPException(status_code=409, detail=f"Job failed: {job['error']}")
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; results are not ready yet.")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{job_id}.npz")
+
+
+@app.delete("/jobs/{job_id}", status_code=204, summary="Cancel or Delete a Batch Job")
+def delete_job(job_id: str):
+    try:
+        batch_jobs.delete(job_id)
+    except JobNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+# --- Model Registry Admin Endpoints ---
+def require_admin(authorization: Optional[str] = Header(None)):
+    if ADMIN_TOKEN and authorization != f"Bearer {ADMIN_TOKEN}":
+        raise HTTPException(status_code=401, detail="Admin token required.")
+
+def require_single_registry():
+    """Registry changes would only reach the pre-forked worker that happened to serve them."""
+    if prefork_workers > 1:
+        raise HTTPException(
+            status_code=409,
+            detail=f"This server runs {prefork_workers} pre-forked workers, each with its own model registry; "
+                   "change model versions by restarting it with the new model settings.",
+        )
+
+def _registry_path(file_name: str) -> str:
+    """Resolves an asset file name inside MODEL_REGISTRY_DIR, refusing anything outside it."""
+    registry_dir = os.path.realpath(MODEL_REGISTRY_DIR)
+    path = os.path.realpath(os.path.join(registry_dir, file_name))
+    if os.path.dirname(path) != registry_dir or not os.path.isfile(path):
+        raise HTTPException(status_code=400, detail=f"Asset '{file_name}' not found in the model directory.")
+    return path
+
+@app.get("/admin/models", summary="List Model Versions", dependencies=[Depends(require_admin)])
+def list_models():
+    active = model_registry.active if model_registry else None
+    return {
+        "active": active.name if active else None,
+        "versions": model_registry.describe() if model_registry else [],
+        "available_assets": sorted(os.listdir(MODEL_REGISTRY_DIR)),
+    }
+
+@app.post(
+    "/admin/models", status_code=202, summary="Load a Model Version in the Background",
+    dependencies=[Depends(require_admin), Depends(require_single_registry)],
+)
+def load_model(spec: ModelLoadRequest):
+    if model_registry is None:
+        raise HTTPException(status_code=503, detail="Model registry not initialised.")
+    if spec.engine not in INFERENCE_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unknown engine '{spec.engine}'. Supported: {', '.join(INFERENCE_ENGINES)}.")
+    if spec.engine == "artifact":
+        paths = {"artifact_path": _registry_path(spec.artifact_file)}
+    else:
+        paths = {"feature_list_path": _registry_path(spec.feature_list_file)}
+        if spec.engine != "mlp":
+            paths["model_path"] = _registry_path(spec.model_file)
+            paths["scaler_path"] = _registry_path(spec.scaler_file)
+        if spec.engine in ("mlp", "ensemble"):
+            paths["mlp_path"] = _registry_path(spec.mlp_file)
+            paths["mlp_scaler_path"] = _registry_path(spec.mlp_scaler_file)
+    if spec.cascade_file:
+        paths["cascade_path"] = _registry_path(spec.cascade_file)
+    name = spec.version or fingerprint_files(*paths.values())
+    try:
+        model_registry.load(name, lambda: _configure_version(load_model_version(spec.engine, **paths)), activate=spec.activate)
+    except (ValueError, VersionNotReady) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info(f"Loading model version {name} ({spec.engine}) in the background.")
+    return {"version": name, "status": "loading"}
+
+@app.post(
+    "/admin/models/{version}/activate", summary="Activate a Loaded Model Version",
+    dependencies=[Depends(require_admin), Depends(require_single_registry)],
+)
+def activate_model(version: str, keep_previous: bool = False):
+    """Atomically swaps the active version. The previous one is unloaded unless keep_previous is set."""
+    try:
+        previous = model_registry.activate(version, keep_previous=keep_previous)
+    except VersionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except VersionNotReady as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"active": version, "previous": previous.name if previous else None}
+
+@app.delete(
+    "/admin/models/{version}", summary="Unload a Model Version",
+    dependencies=[Depends(require_admin), Depends(require_single_registry)],
+)
+def unload_model(version: str):
+    try:
+        model_registry.unload(version)
+    except VersionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, VersionNotReady) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"version": version, "status": "unloaded"}
@@ -0,0 +1,167 @@
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# --- Prometheus Metrics ---
+# Exposed by the FastAPI app on /metrics. A dedicated registry keeps the
+# endpoint limited to application metrics.
+#
+# Under the pre-forking server (app/prefork.py) PROMETHEUS_MULTIPROC_DIR is set
+# before prometheus_client is imported, so every worker writes its values to
+# files there and /metrics sums them over the workers (see exposition_registry).
+# multiprocess_mode says how each gauge is combined over the live workers; it
+# is ignored in a single process.
+REGISTRY = CollectorRegistry()
+
+
+def exposition_registry() -> CollectorRegistry:
+    """The registry /metrics serves: REGISTRY, or the metrics of every worker in multiprocess mode."""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
+
+
+MICRO_BATCH_SIZE = Histogram(
+    "nbiot_micro_batch_size",
+    "Number of /predict requests coalesced into a single scoring call.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+    registry=REGISTRY,
+)
+
+MICRO_BATCH_QUEUE_WAIT_SECONDS = Histogram(
+    "nbiot_micro_batch_queue_wait_seconds",
+    "Time a /predict request waited in the micro-batch queue before being scored.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1),
+    registry=REGISTRY,
+)
+
+WEBSOCKET_BATCH_ROWS = Histogram(
+    "nbiot_websocket_batch_rows",
+    "Number of rows from /ws/predict connections scored in a single call.",
+    buckets=(1, 4, 16, 64, 128, 256, 512, 1024, 2048, 4096),
+    registry=REGISTRY,
+)
+
+WEBSOCKET_CONNECTIONS = Gauge(
+    "nbiot_websocket_connections",
+    "Number of open /ws/predict connections.",
+    multiprocess_mode="livesum",
+    registry=REGISTRY,
+)
+
+PREDICTION_CACHE_HITS = Counter(
+    "nbiot_prediction_cache_hits",
+    "Rows answered from the prediction cache.",
+    registry=REGISTRY,
+)
+
+PREDICTION_CACHE_MISSES = Counter(
+    "nbiot_prediction_cache_misses",
+    "Rows not found in the prediction cache.",
+    registry=REGISTRY,
+)
+
+PREDICTION_CACHE_EVICTIONS = Counter(
+    "nbiot_prediction_cache_evictions",
+    "Prediction cache entries dropped, by reason (lru, ttl, model_change).",
+    ["reason"],
+    registry=REGISTRY,
+)
+
+PREDICTION_CACHE_ENTRIES = Gauge(
+    "nbiot_prediction_cache_entries",
+    "Number of entries in the prediction cache.",
+    multiprocess_mode="livesum",
+    registry=REGISTRY,
+)
+
+CASCADE_EXIT_ROWS = Counter(
+    "nbiot_cascade_exit_rows",
+    "Rows scored by the early-exit cascade, by the number of trees evaluated before their verdict.",
+    ["trees"],
+    registry=REGISTRY,
+)
+
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "nbiot_inference_queue_depth",
+    "Scoring jobs submitted to the inference executor and not finished yet (running or queued).",
+    multiprocess_mode="livesum",
+    registry=REGISTRY,
+)
+
+INFERENCE_REJECTED = Counter(
+    "nbiot_inference_rejected",
+    "Scoring jobs shed by the inference executor, by reason (overloaded, deadline).",
+    ["reason"],
+    registry=REGISTRY,
+)
+
+STAGE_DURATION_SECONDS = Histogram(
+    "nbiot_stage_duration_seconds",
+    "Time spent in each stage of a scoring request (parse, scale, predict, serialize, ...).",
+    ["endpoint", "stage"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    registry=REGISTRY,
+)
+
+ROWS_SCORED = Counter(
+    "nbiot_rows_scored",
+    "Feature vectors scored, by endpoint.",
+    ["endpoint"],
+    registry=REGISTRY,
+)
+
+REQUEST_BATCH_ROWS = Histogram(
+    "nbiot_request_batch_rows",
+    "Number of rows scored per request, by endpoint.",
+    ["endpoint"],
+    buckets=(1, 10, 100, 1000, 10000, 100000, 1000000),
+    registry=REGISTRY,
+)
+
+PREDICTIONS = Counter(
+    "nbiot_predictions",
+    "Verdicts returned, by endpoint and label (attack, benign); their ratio is the attack rate.",
+    ["endpoint", "label"],
+    registry=REGISTRY,
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    "nbiot_requests_in_flight",
+    "Scoring requests (and open WebSocket streams) in progress, by endpoint.",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+    registry=REGISTRY,
+)
+
+MODEL_INFO = Gauge(
+    "nbiot_model_info",
+    "The active model version and its engine; always 1.",
+    ["version", "engine"],
+    multiprocess_mode="livemax",
+    registry=REGISTRY,
+)
+
+BATCH_JOBS = Counter(
+    "nbiot_batch_jobs",
+    "Asynchronous batch jobs finished, by outcome (completed, failed).",
+    ["outcome"],
+    registry=REGISTRY,
+)
+
+DEVICE_RATE_DEVICES = Gauge(
+    "nbiot_device_rate_devices",
+    "Devices tracked by the rolling per-device attack-rate store.",
+    multiprocess_mode="livesum",
+    registry=REGISTRY,
+)
+
+TELEMETRY_DROPPED = Counter(
+    "nbiot_telemetry_dropped",
+    "Spans and log records dropped because the exporter queue was full, by signal (traces, logs).",
+    ["signal"],
+    registry=REGISTRY,
+)
@@ -0,0 +1,219 @@
+"""
+Torch-free inference for the MLPDetector checkpoint (see app/model_definition.py).
+
+The three `network.*` Linear layers are read straight out of the PyTorch zip
+checkpoint with a restricted unpickler, so neither torch nor its pickled
+classes are needed at serving time. Inference is batched float32 matmul + ReLU;
+dropout is the identity at inference and is skipped. The network outputs a
+logit (it was trained with BCEWithLogitsLoss), turned into P(attack) with a
+sigmoid.
+
+The weights can also be converted once to a plain NumPy archive:
+
+    python -m app.mlp_engine --output app/saved_assets/nbiot_mlp.npz
+"""
+import argparse
+import logging
+import os
+import pickle
+import re
+import sys
+import zipfile
+from collections import OrderedDict
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, "saved_assets")
+DEFAULT_CHECKPOINT_PATH = os.path.join(ASSETS_DIR, "best_nbiot_detector.pth")
+# The MLP was trained on all nine devices with this StandardScaler.
+DEFAULT_MLP_SCALER_PATH = os.path.join(ASSETS_DIR, "nbiot_multi_device_scaler.gz")
+
+# Storage classes a checkpoint may reference, mapped to their NumPy dtype.
+_STORAGE_DTYPES = {
+    "FloatStorage": np.float32,
+    "DoubleStorage": np.float64,
+    "HalfStorage": np.float16,
+    "LongStorage": np.int64,
+    "IntStorage": np.int32,
+    "ShortStorage": np.int16,
+    "CharStorage": np.int8,
+    "ByteStorage": np.uint8,
+    "BoolStorage": np.bool_,
+}
+
+_LAYER_KEY = re.compile(r"^(?P<prefix>.*?)(?P<index>\d+)\.(?P<param>weight|bias)$")
+
+
+def _rebuild_tensor(storage, storage_offset, size, stride, requires_grad=False, backward_hooks=None, metadata=None):
+    itemsize = storage.dtype.itemsize
+    return np.lib.stride_tricks.as_strided(
+        storage[storage_offset:],
+        shape=tuple(size),
+        strides=tuple(s * itemsize for s in stride),
+    ).copy()
+
+
+def _rebuild_parameter(data, requires_grad=False, backward_hooks=None):
+    return data
+
+
+class _StateDictUnpickler(pickle.Unpickler):
+    """Unpickles a torch state_dict into NumPy arrays; any other global is refused."""
+
+    def __init__(self, file, archive: zipfile.ZipFile, root: str, byteorder: str):
+        super().__init__(file)
+        self.archive = archive
+        self.root = root
+        self.byteorder = "<" if byteorder == "little" else ">"
+
+    def find_class(self, module, name):
+        if (module, name) == ("collections", "OrderedDict"):
+            return OrderedDict
+        if module == "torch._utils" and name == "_rebuild_tensor_v2":
+            return _rebuild_tensor
+        if module == "torch._utils" and name == "_rebuild_parameter":
+            return _rebuild_parameter
+        if module == "torch" and name in _STORAGE_DTYPES:
+            return np.dtype(_STORAGE_DTYPES[name]).newbyteorder(self.byteorder)
+        raise pickle.UnpicklingError(f"Checkpoint references unsupported global {module}.{name}.")
+
+    def persistent_load(self, saved_id):
+        # ("storage", storage_type, key, location, numel)
+        kind, dtype, key, _location, numel = saved_id
+        if kind != "storage":
+            raise pickle.UnpicklingError(f"Unsupported persistent id {kind!r}.")
+        data = self.archive.read(f"{self.root}/data/{key}")
+        return np.frombuffer(data, dtype=dtype, count=numel)
+
+
+def read_state_dict(path: str) -> Dict[str, np.ndarray]:
+    """Reads a PyTorch (>= 1.6 zip format) state_dict checkpoint as NumPy arrays, without torch."""
+    with zipfile.ZipFile(path) as archive:
+        pickles = [name for name in archive.namelist() if name.endswith("/data.pkl")]
+        if len(pickles) != 1:
+            raise ValueError(f"{path} is not a zip-format PyTorch checkpoint.")
+        root = pickles[0][: -len("/data.pkl")]
+        names = set(archive.namelist())
+        byteorder = archive.read(f"{root}/byteorder").decode().strip() if f"{root}/byteorder" in names else "little"
+        with archive.open(pickles[0]) as f:
+            state = _StateDictUnpickler(f, archive, root, byteorder).load()
+    if not isinstance(state, dict):
+        raise ValueError(f"{path} does not contain a state_dict.")
+    return {key: np.asarray(value) for key, value in state.items()}
+
+
+class MLPEngine:
+    """Feed-forward ReLU network evaluated in float32 with NumPy; exposes `predict_proba`."""
+
+    def __init__(self, weights: Sequence[np.ndarray], biases: Sequence[np.ndarray]):
+        if not weights or len(weights) != len(biases):
+            raise ValueError("Expected one bias per weight matrix.")
+        # Stored transposed, (in, out), so a layer is X @ W + b.
+        self.weights: List[np.ndarray] = [np.ascontiguousarray(np.asarray(w, dtype=np.float32).T) for w in weights]
+        self.biases: List[np.ndarray] = [np.asarray(b, dtype=np.float32) for b in biases]
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            if b.shape != (w.shape[1],) or (i and w.shape[0] != self.weights[i - 1].shape[1]):
+                raise ValueError(f"Layer {i} has mismatched shapes {w.shape[::-1]} / {b.shape}.")
+        if self.weights[-1].shape[1] != 1:
+            raise ValueError("The last layer must have a single output (the attack logit).")
+
+    @property
+    def num_features(self) -> int:
+        return self.weights[0].shape[0]
+
+    @property
+    def layer_sizes(self) -> List[int]:
+        return [self.num_features] + [w.shape[1] for w in self.weights]
+
+    @classmethod
+    def from_state_dict(cls, state: Dict[str, np.ndarray], prefix: str = "network.") -> "MLPEngine":
+        """Builds the engine from the Linear layers under `prefix`, in module order."""
+        layers = {}
+        for key, value in state.items():
+            match = _LAYER_KEY.match(key)
+            if match and match["prefix"] == prefix:
+                layers.setdefault(int(match["index"]), {})[match["param"]] = value
+        if not layers or any(set(params) != {"weight", "bias"} for params in layers.values()):
+            raise ValueError(f"No complete Linear layers found under '{prefix}'.")
+        ordered = [layers[index] for index in sorted(layers)]
+        return cls([layer["weight"] for layer in ordered], [layer["bias"] for layer in ordered])
+
+    @classmethod
+    def load(cls, path: str) -> "MLPEngine":
+        """Loads a converted .npz archive, or reads the PyTorch checkpoint directly."""
+        if path.endswith(".npz"):
+            with np.load(path) as archive:
+                count = len([name for name in archive.files if name.startswith("weight_")])
+                return cls([archive[f"weight_{i}"] for i in range(count)], [archive[f"bias_{i}"] for i in range(count)])
+        return cls.from_state_dict(read_state_dict(path))
+
+    def save(self, path: str):
+        """Writes the layers to a NumPy archive (weights in PyTorch's (out, in) layout)."""
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"weight_{i}"] = w.T
+            arrays[f"bias_{i}"] = b
+        np.savez(path, **arrays)
+
+    def predict_logit(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.num_features:
+            raise ValueError(f"Expected an array of shape (n_rows, {self.num_features}), got {X.shape}.")
+        hidden = X
+        for w, b in zip(self.weights[:-1], self.biases[:-1]):
+            hidden = hidden @ w
+            hidden += b
+            np.maximum(hidden, 0, out=hidden)
+        return (hidden @ self.weights[-1] + self.biases[-1])[:, 0]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Returns [[P(benign), P(attack)], ...] in float64, like `LGBMClassifier.predict_proba`."""
+        probability_attack = 1.0 / (1.0 + np.exp(-self.predict_logit(X).astype(np.float64)))
+        return np.column_stack([1.0 - probability_attack, probability_attack])
+
+
+class BlendedModel:
+    """
+    Weighted average of P(attack) from several models, each with its own scaler.
+
+    Takes raw feature vectors; every member scales them for itself, so the
+    ModelVersion that holds a BlendedModel has no scaler of its own.
+    """
+
+    def __init__(self, members: Sequence[tuple]):
+        # members: (name, model, scaler or None, weight)
+        total = sum(weight for _, _, _, weight in members)
+        if not members or total <= 0:
+            raise ValueError("A blended model needs members with a positive total weight.")
+        self.members = [(name, model, scaler, weight / total) for name, model, scaler, weight in members]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        probability_attack = np.zeros(len(X))
+        for _, model, scaler, weight in self.members:
+            scaled = scaler.transform(X) if scaler is not None else X
+            probability_attack += weight * model.predict_proba(scaled)[:, 1]
+        return np.column_stack([1.0 - probability_attack, probability_attack])
+
+    def describe(self) -> dict:
+        return {name: round(weight, 4) for name, _, _, weight in self.members}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the MLPDetector checkpoint to a NumPy archive.")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--output", default=os.path.join(ASSETS_DIR, "nbiot_mlp.npz"))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] - %(message)s")
+    engine = MLPEngine.load(args.checkpoint)
+    engine.save(args.output)
+    logger.info(f"Wrote {args.output} (layers {engine.layer_sizes}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.instrumentation import StageTimer, timed
+
+logger = logging.getLogger(__name__)
+
+STATUS_LOADING = "loading"
+STATUS_READY = "ready"
+STATUS_ACTIVE = "active"
+STATUS_FAILED = "failed"
+
+
+def fingerprint_files(*paths: str) -> str:
+    """Short fingerprint (path, size, mtime) of asset files, used as the default version name."""
+    fingerprint = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return fingerprint.hexdigest()[:12]
+
+
+class ModelVersion:
+    """One loaded set of scoring assets. Never mutated after loading, so it can be shared freely."""
+
+    def __init__(
+        self,
+        name: str,
+        feature_list: List[str],
+        lgbm_model=None,
+        scaler=None,
+        tree_ensemble=None,
+        cascade=None,
+        mlp=None,
+        blend=None,
+        engine: str = "lightgbm",
+        sources: Optional[List[str]] = None,
+    ):
+        self.name = name
+        self.feature_list = feature_list
+        self.lgbm_model = lgbm_model
+        self.scaler = scaler
+        self.tree_ensemble = tree_ensemble
+        # Early-exit wrapper around tree_ensemble / lgbm_model (see app/cascade.py), when calibrated.
+        self.cascade = cascade
+        # NumPy MLPDetector (app/mlp_engine.py), alone or blended with LightGBM.
+        self.mlp = mlp
+        self.blend = blend
+        self.engine = engine
+        self.sources = list(sources or [])
+        self.loaded_at = time.time()
+
+    @property
+    def model(self):
+        for model in (self.cascade, self.blend, self.tree_ensemble, self.mlp):
+            if model is not None:
+                return model
+        return self.lgbm_model
+
+    @property
+    def num_features(self) -> int:
+        return len(self.feature_list)
+
+    def set_num_threads(self, num_threads: int):
+        """Caps the OpenMP threads LightGBM uses per scoring call."""
+        if self.lgbm_model is not None and hasattr(self.lgbm_model, "set_params"):
+            self.lgbm_model.set_params(n_jobs=num_threads)
+        if self.cascade is not None:
+            self.cascade.set_num_threads(num_threads)
+
+    def score(self, features_np: np.ndarray, timer: Optional[StageTimer] = None) -> np.ndarray:
+        """Scales a raw (n_rows, n_features) matrix and returns P(attack) for each row."""
+        # The precompiled artifact has the scaler folded into its thresholds.
+        if self.scaler is not None:
+            with timed(timer, "scale"):
+                features_np = self.scaler.transform(features_np)
+        # predict_proba returns [[P(benign), P(attack)], ...]
+        with timed(timer, "predict"):
+            return self.model.predict_proba(features_np)[:, 1]
+
+    def describe(self) -> dict:
+        described = {
+            "version": self.name,
+            "engine": self.engine,
+            "num_features": self.num_features,
+            "sources": [os.path.basename(source) for source in self.sources],
+            "loaded_at": self.loaded_at,
+        }
+        if self.cascade is not None:
+            described["cascade"] = self.cascade.describe()
+        if self.blend is not None:
+            described["blend_weights"] = self.blend.describe()
+        return described
+
+
+class VersionNotFound(LookupError):
+    pass
+
+
+class VersionNotReady(RuntimeError):
+    pass
+
+
+class ModelRegistry:
+    """
+    Holds the loaded model versions and which one is active.
+
+    Versions are loaded and warmed up on a background thread, so serving
+    continues undisturbed. Activation swaps a single reference: requests that
+    already resolved the previous version finish with it, and its memory is
+    released once the last of them drops its reference.
+    """
+
+    def __init__(
+        self,
+        warmup_rows: int = 64,
+        warmup_data: Optional[np.ndarray] = None,
+        on_activate: Optional[Callable[[ModelVersion], None]] = None,
+    ):
+        self.warmup_rows = warmup_rows
+        self.warmup_data = warmup_data
+        self.on_activate = on_activate
+        self._versions: Dict[str, ModelVersion] = {}
+        self._status: Dict[str, str] = {}
+        self._errors: Dict[str, str] = {}
+        self._active: Optional[ModelVersion] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+
+    @property
+    def active(self) -> Optional[ModelVersion]:
+        return self._active
+
+    def get(self, name: Optional[str] = None) -> ModelVersion:
+        """Returns version `name`, or the active version when no name is given."""
+        if name is None:
+            if self._active is None:
+                raise VersionNotReady("No model version is active.")
+            return self._active
+        version = self._versions.get(name)
+        if version is None:
+            raise VersionNotFound(f"Model version '{name}' is not loaded.")
+        return version
+
+    def add(self, version: ModelVersion, activate: bool = False):
+        """Registers an already loaded version (used for the startup model)."""
+        with self._lock:
+            self._versions[version.name] = version
+            self._status[version.name] = STATUS_READY
+            self._errors.pop(version.name, None)
+        if activate:
+            self.activate(version.name, keep_previous=True)
+
+    def load(self, name: str, load_fn: Callable[[], ModelVersion], activate: bool = False) -> Future:
+        """Loads and warms up a version in the background; returns a future of the version."""
+        with self._lock:
+            if self._status.get(name) == STATUS_LOADING:
+                raise VersionNotReady(f"Model version '{name}' is already loading.")
+            if name in self._versions:
+                raise ValueError(f"Model version '{name}' is already loaded.")
+            self._status[name] = STATUS_LOADING
+            self._errors.pop(name, None)
+        return self._executor.submit(self._load, name, load_fn, activate)
+
+    def _load(self, name: str, load_fn: Callable[[], ModelVersion], activate: bool) -> ModelVersion:
+        started = time.perf_counter()
+        try:
+            version = load_fn()
+            version.name = name
+            self.warm_up(version)
+        except Exception as e:
+            logger.error(f"Failed to load model version {name}", exc_info=True)
+            with self._lock:
+                self._status[name] = STATUS_FAILED
+                self._errors[name] = str(e)
+            raise
+        with self._lock:
+            self._versions[name] = version
+            self._status[name] = STATUS_READY
+        logger.info(f"Model version {name} loaded and warmed up in {time.perf_counter() - started:.2f}s.")
+        if activate:
+            self.activate(name)
+        return version
+
+    def warm_up(self, version: ModelVersion):
+        """Scores the warm-up rows once and checks that the output is a probability per row."""
+        if self.warmup_data is not None:
+            rows = self.warmup_data
+            if rows.shape[1] != version.num_features:
+                raise ValueError(f"Warm-up data has {rows.shape[1]} features, the model expects {version.num_features}.")
+        else:
+            # Non-negative synthetic rows; N-BaIoT features are weights, means and variances.
+            rows = np.abs(np.random.default_rng(0).standard_normal((self.warmup_rows, version.num_features)))
+        if len(rows) == 0:
+            return
+        probabilities = np.asarray(version.score(rows))
+        if probabilities.shape != (len(rows),) or not np.all((probabilities >= 0) & (probabilities <= 1)):
+            raise ValueError("Warm-up scoring did not return one probability per row.")
+
+    def activate(self, name: str, keep_previous: bool = False) -> Optional[ModelVersion]:
+        """Makes `name` the active version; returns the previously active one."""
+        with self._lock:
+            version = self._versions.get(name)
+            if version is None:
+                if self._status.get(name) == STATUS_LOADING:
+                    raise VersionNotReady(f"Model version '{name}' is still loading.")
+                raise VersionNotFound(f"Model version '{name}' is not loaded.")
+            previous, self._active = self._active, version
+            if previous is not None and previous is not version and not keep_previous:
+                # Unregistered here; freed once in-flight requests holding it complete.
+                del self._versions[previous.name]
+                del self._status[previous.name]
+            if self.on_activate is not None:
+                self.on_activate(version)
+        logger.info(f"Model version {name} activated" + (f" (replacing {previous.name})." if previous and previous is not version else "."))
+        return previous
+
+    def unload(self, name: str):
+        with self._lock:
+            if name not in self._versions and name not in self._status:
+                raise VersionNotFound(f"Model version '{name}' is not loaded.")
+            if self._active is not None and self._active.name == name:
+                raise ValueError(f"Model version '{name}' is active and cannot be unloaded.")
+            if self._status.get(name) == STATUS_LOADING:
+                raise VersionNotReady(f"Model version '{name}' is still loading.")
+            self._versions.pop(name, None)
+            self._status.pop(name, None)
+            self._errors.pop(name, None)
+        logger.info(f"Model version {name} unloaded.")
+
+    def describe(self) -> List[dict]:
+        with self._lock:
+            described = []
+            for name, status in self._status.items():
+                version = self._versions.get(name)
+                entry = version.describe() if version is not None else {"version": name}
+                entry["status"] = STATUS_ACTIVE if self._active is version and version is not None else status
+                if name in self._errors:
+                    entry["error"] = self._errors[name]
+                described.append(entry)
+            return described
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
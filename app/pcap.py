@@ -0,0 +1,259 @@
+import mmap
+import struct
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.feature_extractor import Packet
+
+# --- Minimal pcap / pcapng reader ---
+# Files are memory-mapped and decoded record by record, so arbitrarily large
+# captures are streamed without being read into memory. Only the headers the
+# feature extractor needs are parsed: Ethernet (incl. 802.1Q), Linux SLL or raw
+# IP, then IPv4/IPv6 and TCP/UDP ports. Addresses are kept as raw bytes.
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+_PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_IDB = 0x00000001
+_PCAPNG_EPB = 0x00000006
+_PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+_ETHERTYPE_IPV4 = 0x0800
+_ETHERTYPE_IPV6 = 0x86DD
+_ETHERTYPE_VLAN = (0x8100, 0x88A8)
+_PROTO_TCP = 6
+_PROTO_UDP = 17
+
+_NO_MAC = b""
+
+
+class PcapError(ValueError):
+    pass
+
+
+def _ports(data: bytes, offset: int, proto: int) -> Tuple[int, int]:
+    if proto in (_PROTO_TCP, _PROTO_UDP) and len(data) >= offset + 4:
+        return struct.unpack_from(">HH", data, offset)
+    return 0, 0
+
+
+def _decode_ip(data, offset: int, version_hint: Optional[int] = None):
+    """Returns (src_ip, dst_ip, src_port, dst_port) or None for non-IP payloads."""
+    if len(data) <= offset:
+        return None
+    version = version_hint or (data[offset] >> 4)
+    if version == 4 and len(data) >= offset + 20:
+        ihl = (data[offset] & 0x0F) * 4
+        proto = data[offset + 9]
+        src_port, dst_port = _ports(data, offset + ihl, proto)
+        return bytes(data[offset + 12:offset + 16]), bytes(data[offset + 16:offset + 20]), src_port, dst_port
+    if version == 6 and len(data) >= offset + 40:
+        proto = data[offset + 6]
+        src_port, dst_port = _ports(data, offset + 40, proto)
+        return bytes(data[offset + 8:offset + 24]), bytes(data[offset + 24:offset + 40]), src_port, dst_port
+    return None
+
+
+def decode_frame(data, linktype: int, timestamp: float, size: int) -> Optional[Packet]:
+    """Decodes one captured frame; returns None for frames it cannot attribute to hosts."""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        dst_mac, src_mac = bytes(data[0:6]), bytes(data[6:12])
+        offset = 12
+        ethertype = struct.unpack_from(">H", data, offset)[0]
+        while ethertype in _ETHERTYPE_VLAN and len(data) >= offset + 6:
+            offset += 4
+            ethertype = struct.unpack_from(">H", data, offset)[0]
+        offset += 2
+        ip = _decode_ip(data, offset) if ethertype in (_ETHERTYPE_IPV4, _ETHERTYPE_IPV6) else None
+        if ip is None:
+            # Non-IP traffic (e.g. ARP) is attributed to the MAC addresses.
+            return Packet(timestamp, src_mac, src_mac, dst_mac, 0, 0, size)
+        return Packet(timestamp, src_mac, *ip, size)
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return None
+        src_mac = bytes(data[6:6 + min(data[5], 8)])
+        ethertype = struct.unpack_from(">H", data, 14)[0]
+        ip = _decode_ip(data, 16) if ethertype in (_ETHERTYPE_IPV4, _ETHERTYPE_IPV6) else None
+        return Packet(timestamp, src_mac, *ip, size) if ip else None
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        hint = {LINKTYPE_IPV4: 4, LINKTYPE_IPV6: 6}.get(linktype)
+        ip = _decode_ip(data, 0, hint)
+        return Packet(timestamp, _NO_MAC, *ip, size) if ip else None
+    return None
+
+
+class CaptureChunk(NamedTuple):
+    """A run of whole records of one capture, decodable on its own (see capture_chunks)."""
+    path: str
+    format: str  # "pcap" or "pcapng"
+    start: int
+    end: int
+    # pcap: (endian, resolution); pcapng: (endian, interfaces) in effect at `start`.
+    context: tuple
+
+
+def _iter_pcap(mapped, endian: str, resolution: float, start: int = 24, end: Optional[int] = None) -> Iterator[Packet]:
+    linktype = struct.unpack_from(endian + "I", mapped, 20)[0] & 0x0FFFFFFF
+    record = struct.Struct(endian + "IIII")
+    offset, end = start, len(mapped) if end is None else end
+    while offset + 16 <= end:
+        ts_sec, ts_frac, incl_len, orig_len = record.unpack_from(mapped, offset)
+        offset += 16
+        if offset + incl_len > end:
+            break  # truncated final record
+        data = memoryview(mapped)[offset:offset + incl_len]
+        packet = decode_frame(data, linktype, ts_sec + ts_frac * resolution, orig_len)
+        data.release()
+        offset += incl_len
+        if packet is not None:
+            yield packet
+
+
+def _iter_pcapng(
+    mapped, start: int = 0, end: Optional[int] = None, endian: str = "<", interfaces: Sequence = (),
+) -> Iterator[Packet]:
+    offset, end = start, len(mapped) if end is None else end
+    interfaces = list(interfaces)  # (linktype, seconds per timestamp unit)
+    while offset + 12 <= end:
+        block_type, block_len, endian = _pcapng_block(mapped, offset, endian, interfaces)
+        if block_len < 12 or offset + block_len > end:
+            break
+        if block_type == _PCAPNG_EPB:
+            body = offset + 8
+            if_id, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(endian + "IIIII", mapped, body)
+            if if_id < len(interfaces):
+                linktype, resolution = interfaces[if_id]
+                data = memoryview(mapped)[body + 20:body + 20 + cap_len]
+                packet = decode_frame(data, linktype, ((ts_high << 32) | ts_low) * resolution, orig_len)
+                data.release()
+                if packet is not None:
+                    yield packet
+        offset += block_len
+
+
+def _pcapng_block(mapped, offset: int, endian: str, interfaces: list) -> Tuple[int, int, str]:
+    """Reads a block header; applies section and interface blocks. Returns (type, length, endian)."""
+    block_type = struct.unpack_from(endian + "I", mapped, offset)[0]
+    if block_type == _PCAPNG_SHB:
+        magic = struct.unpack_from("<I", mapped, offset + 8)[0]
+        endian = "<" if magic == _PCAPNG_BYTE_ORDER_MAGIC else ">"
+        interfaces.clear()
+    block_len = struct.unpack_from(endian + "I", mapped, offset + 4)[0]
+    if block_type == _PCAPNG_IDB and block_len >= 12 and offset + block_len <= len(mapped):
+        body = offset + 8
+        linktype = struct.unpack_from(endian + "H", mapped, body)[0]
+        interfaces.append((linktype, _if_tsresol(mapped, body + 8, offset + block_len - 4, endian)))
+    return block_type, block_len, endian
+
+
+def _if_tsresol(mapped, offset: int, end: int, endian: str) -> float:
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", mapped, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = mapped[offset + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+
+def _map(path: str):
+    with open(path, "rb") as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None  # empty file
+
+
+def _format(path: str, mapped) -> str:
+    head = mapped[:4]
+    if head in _PCAP_MAGIC:
+        return "pcap"
+    if len(head) == 4 and struct.unpack("<I", head)[0] == _PCAPNG_SHB:
+        return "pcapng"
+    raise PcapError(f"{path} is neither a pcap nor a pcapng file.")
+
+
+def iter_packets(path: str) -> Iterator[Packet]:
+    """Yields the decodable packets of a pcap or pcapng file in file order."""
+    mapped = _map(path)
+    if mapped is None:
+        return
+    try:
+        if _format(path, mapped) == "pcap":
+            yield from _iter_pcap(mapped, *_PCAP_MAGIC[mapped[:4]])
+        else:
+            yield from _iter_pcapng(mapped)
+    finally:
+        mapped.close()
+
+
+def capture_chunks(path: str, chunk_bytes: int) -> List[CaptureChunk]:
+    """
+    Splits a capture into runs of whole records of about `chunk_bytes` each.
+    Only the record headers are read, so this is much cheaper than decoding;
+    the runs can then be decoded in parallel with iter_chunk.
+    """
+    mapped = _map(path)
+    if mapped is None:
+        return []
+    chunks = []
+    try:
+        if _format(path, mapped) == "pcap":
+            endian, resolution = _PCAP_MAGIC[mapped[:4]]
+            start = offset = 24
+            while offset + 16 <= len(mapped):
+                incl_len = struct.unpack_from(endian + "I", mapped, offset + 8)[0]
+                if offset + 16 + incl_len > len(mapped):
+                    break
+                offset += 16 + incl_len
+                if offset - start >= chunk_bytes:
+                    chunks.append(CaptureChunk(path, "pcap", start, offset, (endian, resolution)))
+                    start = offset
+            if offset > start:
+                chunks.append(CaptureChunk(path, "pcap", start, offset, (endian, resolution)))
+        else:
+            endian, interfaces = "<", []
+            start = offset = 0
+            context = (endian, ())
+            while offset + 12 <= len(mapped):
+                if offset - start >= chunk_bytes:
+                    chunks.append(CaptureChunk(path, "pcapng", start, offset, context))
+                    start, context = offset, (endian, tuple(interfaces))
+                _, block_len, endian = _pcapng_block(mapped, offset, endian, interfaces)
+                if block_len < 12 or offset + block_len > len(mapped):
+                    break
+                offset += block_len
+            if offset > start:
+                chunks.append(CaptureChunk(path, "pcapng", start, offset, context))
+    finally:
+        mapped.close()
+    return chunks
+
+
+def iter_chunk(chunk: CaptureChunk) -> Iterator[Packet]:
+    """Yields the decodable packets of one chunk from capture_chunks, in file order."""
+    mapped = _map(chunk.path)
+    if mapped is None:
+        return
+    try:
+        if chunk.format == "pcap":
+            yield from _iter_pcap(mapped, *chunk.context, start=chunk.start, end=chunk.end)
+        else:
+            endian, interfaces = chunk.context
+            yield from _iter_pcapng(mapped, chunk.start, chunk.end, endian, interfaces)
+    finally:
+        mapped.close()
@@ -0,0 +1,374 @@
+"""
+Offline scanning of archived pcap/pcapng captures.
+
+    python -m app.pcap_scan capture1.pcap capture2.pcapng --workers 8 --output verdicts.npz
+
+The scan runs in two phases over one pool of forked workers. The captures are
+first split into chunks of whole records (reading only the record headers)
+and every chunk is decoded once, by one worker, which forwards each packet to
+the shard owning its source host (crc32(src_ip) % workers) through a spool
+directory, and to the shard owning its destination as a reverse-direction
+update. Each shard worker then replays its packets chunk by chunk in file
+order, which keeps every host's channel and socket statistics identical to a
+single-process run. Chunks are at most MAX_CHUNK_BYTES and packets are
+spooled and replayed in batches of SPOOL_BATCH_PACKETS, so a worker's memory
+does not grow with the size of the captures; the spool (under --spool-dir,
+by default the system temporary directory) holds about the size of the
+captures again, more for packets whose hosts fall in different shards. Feature
+vectors are scored in large batches with the model loaded once in the parent
+and shared with the forked workers (capped to cores / workers threads each),
+and aggregated per (host, time window).
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import socket
+import sys
+import tempfile
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.artifact import ASSETS_DIR
+from app.feature_extractor import FeatureExtractor
+from app.pcap import CaptureChunk, capture_chunks, iter_chunk, iter_packets
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_THRESHOLD = 0.5
+
+# Decoding is split into about four chunks per worker, of MIN_CHUNK_BYTES to MAX_CHUNK_BYTES.
+MIN_CHUNK_BYTES = 1 << 20
+MAX_CHUNK_BYTES = 64 << 20
+
+# Packets per pickled batch in the spool, the most a worker holds per shard while decoding or replaying.
+SPOOL_BATCH_PACKETS = 8192
+
+# Set in the parent before forking; inherited copy-on-write by the workers.
+_scorer: Optional[Callable[[np.ndarray], np.ndarray]] = None
+
+
+class ShardResult(NamedTuple):
+    hosts: List[str]
+    window_start: np.ndarray
+    packets: np.ndarray
+    attack_packets: np.ndarray
+    probability_sum: np.ndarray
+    probability_max: np.ndarray
+    rows_scored: int
+
+
+class ScanResult(NamedTuple):
+    verdicts: Dict[str, np.ndarray]
+    packets_read: int
+    rows_scored: int
+    seconds: float
+
+    @property
+    def packets_per_second(self) -> float:
+        return self.packets_read / self.seconds if self.seconds else 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_scored / self.seconds if self.seconds else 0.0
+
+
+def shard_of(host, n_shards: int) -> int:
+    key = host if isinstance(host, bytes) else str(host).encode("utf-8")
+    return zlib.crc32(key) % n_shards
+
+
+def format_host(host) -> str:
+    if isinstance(host, bytes):
+        if len(host) == 4:
+            return socket.inet_ntop(socket.AF_INET, host)
+        if len(host) == 16:
+            return socket.inet_ntop(socket.AF_INET6, host)
+        return ":".join(f"{b:02x}" for b in host)
+    return str(host)
+
+
+class _WindowAggregator:
+    """Per (host, window) packet and attack counts over scored batches."""
+
+    def __init__(self):
+        self.index: Dict[tuple, int] = {}
+        self.keys: List[tuple] = []
+        self.packets: List[int] = []
+        self.attacks: List[int] = []
+        self.prob_sum: List[float] = []
+        self.prob_max: List[float] = []
+
+    def add(self, hosts: Sequence, windows: np.ndarray, probabilities: np.ndarray):
+        groups = [self.index.setdefault((host, window), len(self.index)) for host, window in zip(hosts, windows.tolist())]
+        grown = len(self.index) - len(self.keys)
+        if grown:
+            self.keys.extend(list(self.index)[len(self.keys):])
+            self.packets.extend([0] * grown)
+            self.attacks.extend([0] * grown)
+            self.prob_sum.extend([0.0] * grown)
+            self.prob_max.extend([0.0] * grown)
+        groups = np.asarray(groups, dtype=np.intp)
+        size = len(self.keys)
+        packets = np.bincount(groups, minlength=size)
+        attacks = np.bincount(groups, weights=probabilities > PREDICTION_THRESHOLD, minlength=size)
+        prob_sum = np.bincount(groups, weights=probabilities, minlength=size)
+        prob_max = np.zeros(size)
+        np.maximum.at(prob_max, groups, probabilities)
+        for g in np.unique(groups).tolist():
+            self.packets[g] += int(packets[g])
+            self.attacks[g] += int(attacks[g])
+            self.prob_sum[g] += float(prob_sum[g])
+            self.prob_max[g] = max(self.prob_max[g], float(prob_max[g]))
+
+
+def _score_packets(
+    packets: Iterable[Tuple[bool, tuple]], feature_list, window_seconds: float, batch_size: int, idle_timeout: float,
+) -> ShardResult:
+    """Runs (update, packet) pairs through one extractor; updates are scored, the rest only observed."""
+    extractor = FeatureExtractor(feature_list, idle_timeout=idle_timeout)
+    aggregator = _WindowAggregator()
+    vectors = np.empty((batch_size, len(extractor.feature_list)))
+    hosts: List = []
+    windows = np.empty(batch_size, dtype=np.int64)
+    rows_scored = 0
+
+    def flush():
+        nonlocal rows_scored
+        n = len(hosts)
+        if n:
+            aggregator.add(hosts, windows[:n], np.asarray(_scorer(vectors[:n]), dtype=np.float64))
+            rows_scored += n
+            hosts.clear()
+
+    for update, packet in packets:
+        if update:
+            vectors[len(hosts)] = extractor.update(packet)
+            windows[len(hosts)] = int(packet.timestamp // window_seconds)
+            hosts.append(packet.src_ip)
+            if len(hosts) == batch_size:
+                flush()
+        else:
+            extractor.observe(packet)
+    flush()
+
+    return ShardResult(
+        hosts=[format_host(host) for host, _ in aggregator.keys],
+        window_start=np.asarray([window for _, window in aggregator.keys], dtype=np.float64) * window_seconds,
+        packets=np.asarray(aggregator.packets, dtype=np.int64),
+        attack_packets=np.asarray(aggregator.attacks, dtype=np.int64),
+        probability_sum=np.asarray(aggregator.prob_sum, dtype=np.float64),
+        probability_max=np.asarray(aggregator.prob_max, dtype=np.float32),
+        rows_scored=rows_scored,
+    )
+
+
+def _spool_path(spool_dir: str, chunk_index: int, shard: int) -> str:
+    return os.path.join(spool_dir, f"{chunk_index:06d}-{shard:04d}.pkl")
+
+
+def default_chunk_bytes(total_bytes: int, workers: int) -> int:
+    return min(MAX_CHUNK_BYTES, max(MIN_CHUNK_BYTES, total_bytes // (4 * workers)))
+
+
+def _decode_chunk(args) -> int:
+    """Decodes one chunk and spools its packets per shard; returns the number of packets decoded."""
+    chunk, chunk_index, n_shards, spool_dir = args
+    shards: Dict = {}
+    forwarded: List[List[Tuple[bool, tuple]]] = [[] for _ in range(n_shards)]
+    files: Dict[int, object] = {}
+
+    def spool(shard: int):
+        # Appended as one pickle per batch, read back one at a time by _replay_spool.
+        if shard not in files:
+            files[shard] = open(_spool_path(spool_dir, chunk_index, shard), "wb")
+        pickle.dump(forwarded[shard], files[shard], protocol=pickle.HIGHEST_PROTOCOL)
+        forwarded[shard] = []
+
+    packets_read = 0
+    try:
+        for packet in iter_chunk(chunk):
+            packets_read += 1
+            src = shards.get(packet.src_ip)
+            if src is None:
+                src = shards[packet.src_ip] = shard_of(packet.src_ip, n_shards)
+            dst = shards.get(packet.dst_ip)
+            if dst is None:
+                dst = shards[packet.dst_ip] = shard_of(packet.dst_ip, n_shards)
+            forwarded[src].append((True, packet))
+            if len(forwarded[src]) == SPOOL_BATCH_PACKETS:
+                spool(src)
+            if dst != src:
+                forwarded[dst].append((False, packet))
+                if len(forwarded[dst]) == SPOOL_BATCH_PACKETS:
+                    spool(dst)
+        for shard, packets in enumerate(forwarded):
+            if packets:
+                spool(shard)
+    finally:
+        for f in files.values():
+            f.close()
+    return packets_read
+
+
+def _replay_spool(spool_dir: str, n_chunks: int, shard: int) -> Iterable[Tuple[bool, tuple]]:
+    for chunk_index in range(n_chunks):
+        path = _spool_path(spool_dir, chunk_index, shard)
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    packets = pickle.load(f)
+                except EOFError:
+                    break
+                yield from packets
+        os.remove(path)
+
+
+def _scan_shard(args) -> ShardResult:
+    shard, n_chunks, spool_dir, feature_list, window_seconds, batch_size, idle_timeout = args
+    return _score_packets(_replay_spool(spool_dir, n_chunks, shard), feature_list, window_seconds, batch_size,
+                          idle_timeout)
+
+
+def scan_captures(
+    paths: Sequence[str],
+    scorer: Callable[[np.ndarray], np.ndarray],
+    feature_list: Optional[Sequence[str]] = None,
+    workers: int = 1,
+    window_seconds: float = 10.0,
+    batch_size: int = 65536,
+    idle_timeout: float = 600.0,
+    chunk_bytes: Optional[int] = None,
+    spool_dir: Optional[str] = None,
+) -> ScanResult:
+    """
+    Extracts features from the captures, scores them and returns per-window verdicts.
+
+    With several workers, packets are spooled in a temporary directory under
+    `spool_dir` (default: the system temporary directory), removed afterwards.
+    """
+    global _scorer
+    _scorer = scorer
+    started = time.perf_counter()
+    if workers == 1:
+        packets = ((True, packet) for path in paths for packet in iter_packets(path))
+        results = [_score_packets(packets, feature_list, window_seconds, batch_size, idle_timeout)]
+        packets_read = results[0].rows_scored
+    else:
+        if chunk_bytes is None:
+            chunk_bytes = default_chunk_bytes(sum(os.path.getsize(path) for path in paths), workers)
+        with multiprocessing.get_context("fork").Pool(workers) as pool, \
+                tempfile.TemporaryDirectory(prefix="pcap-scan-", dir=spool_dir) as spool:
+            chunks: List[CaptureChunk] = [
+                chunk for file_chunks in pool.starmap(capture_chunks, [(path, chunk_bytes) for path in paths])
+                for chunk in file_chunks
+            ]
+            packets_read = sum(pool.map(
+                _decode_chunk, [(chunk, index, workers, spool) for index, chunk in enumerate(chunks)]
+            ))
+            results = pool.map(_scan_shard, [
+                (shard, len(chunks), spool, feature_list, window_seconds, batch_size, idle_timeout)
+                for shard in range(workers)
+            ])
+    seconds = time.perf_counter() - started
+
+    # Shards own disjoint source hosts, so their windows never overlap.
+    packets = np.concatenate([r.packets for r in results])
+    verdicts = {
+        "host": np.asarray([host for r in results for host in r.hosts], dtype=str),
+        "window_start": np.concatenate([r.window_start for r in results]),
+        "packets": packets,
+        "attack_packets": np.concatenate([r.attack_packets for r in results]),
+        "mean_probability": (np.concatenate([r.probability_sum for r in results]) / np.maximum(packets, 1)).astype(np.float32),
+        "max_probability": np.concatenate([r.probability_max for r in results]),
+    }
+    order = np.lexsort((verdicts["host"], verdicts["window_start"]))
+    verdicts = {name: column[order] for name, column in verdicts.items()}
+    return ScanResult(
+        verdicts=verdicts,
+        packets_read=packets_read,
+        rows_scored=sum(r.rows_scored for r in results),
+        seconds=seconds,
+    )
+
+
+def write_verdicts(path: str, verdicts: Dict[str, np.ndarray]):
+    """Writes the verdict columns as compressed .npz, or as CSV when the path ends in .csv."""
+    if path.endswith(".csv"):
+        with open(path, "w") as f:
+            f.write(",".join(verdicts) + "\n")
+            for row in zip(*(column.tolist() for column in verdicts.values())):
+                f.write(",".join(map(str, row)) + "\n")
+    else:
+        np.savez_compressed(path, **verdicts)
+
+
+def load_scorer(artifact_path: Optional[str] = None, num_threads: Optional[int] = None):
+    """
+    Returns (scorer, feature_list) from the precompiled artifact or the joblib
+    assets. num_threads caps LightGBM's OpenMP threads per scoring call, so
+    forked workers do not oversubscribe the cores.
+    """
+    if artifact_path:
+        from app.artifact import load_artifact
+
+        ensemble, feature_list = load_artifact(artifact_path)
+        return (lambda X: ensemble.predict_proba(X)[:, 1]), feature_list
+
+    import joblib
+
+    with open(os.path.join(ASSETS_DIR, "lgbm_features.json"), "r") as f:
+        feature_list = json.load(f)
+    scaler = joblib.load(os.path.join(ASSETS_DIR, "lgbm_nbiot_scaler.gz"))
+    lgbm_model = joblib.load(os.path.join(ASSETS_DIR, "lgbm_nbiot_model.joblib"))
+    params = {"num_threads": num_threads} if num_threads else {}
+    return (lambda X: lgbm_model.predict_proba(scaler.transform(X), **params)[:, 1]), feature_list
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score archived pcap/pcapng captures with the N-BaIoT detector.")
+    parser.add_argument("captures", nargs="+", help="pcap/pcapng files, processed in the given order")
+    parser.add_argument("--output", default="verdicts.npz", help="verdict file (.npz, or .csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--window", type=float, default=10.0, help="verdict window in seconds")
+    parser.add_argument("--batch-size", type=int, default=65536, help="feature vectors per scoring call")
+    parser.add_argument("--idle-timeout", type=float, default=600.0, help="seconds before idle hosts are forgotten")
+    parser.add_argument("--threads", type=int, help="scoring threads per worker (default: cores / workers)")
+    parser.add_argument("--artifact", help="score with a precompiled artifact (see app/artifact.py)")
+    parser.add_argument("--spool-dir", default=os.getenv("PCAP_SCAN_SPOOL_DIR"),
+                        help="where workers spool decoded packets, about the captures' size again "
+                             "(default: the system temporary directory)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] - %(message)s")
+    threads = args.threads or max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+    scorer, feature_list = load_scorer(args.artifact, threads)
+    result = scan_captures(
+        args.captures, scorer, feature_list,
+        workers=args.workers, window_seconds=args.window,
+        batch_size=args.batch_size, idle_timeout=args.idle_timeout, spool_dir=args.spool_dir,
+    )
+    write_verdicts(args.output, result.verdicts)
+    report = {
+        "packets": result.packets_read,
+        "rows": result.rows_scored,
+        "seconds": round(result.seconds, 3),
+        "packets_per_second": round(result.packets_per_second, 1),
+        "rows_per_second": round(result.rows_per_second, 1),
+        "windows": len(result.verdicts["packets"]),
+        "workers": args.workers,
+    }
+    logger.info(f"Wrote {args.output}: {json.dumps(report)}")
+    print(json.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import logging
+import threading
+import time
+from typing import Callable, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Memory held per cache slot: both key halves, the probability, the expiry and
+# the last use (8 bytes each) plus the valid flag. Used to turn a byte budget
+# into an entry limit; the raw feature vector itself is not stored.
+ENTRY_BYTES = 41
+
+# Entries per set. A row can only be cached in the set its key hashes to, and
+# eviction is LRU within the set.
+SET_WAYS = 8
+
+_MIX_MULTIPLIER = np.uint64(0xBF58476D1CE4E5B9)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """One multiply / xor-shift round (from splitmix64), in place; spreads every input bit over the low half."""
+    x *= _MIX_MULTIPLIER
+    x ^= x >> np.uint64(32)
+    return x
+
+
+def _group_starts(*columns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Stable sort order of the rows of `columns` and a mask of where each distinct row starts in it."""
+    order = np.lexsort(columns[::-1]) if len(columns) > 1 else np.argsort(columns[0], kind="stable")
+    starts = np.ones(len(order), dtype=bool)
+    for column in columns:
+        ordered = column[order]
+        starts[1:] &= ordered[1:] == ordered[:-1]
+    starts[1:] = ~starts[1:]
+    return order, starts
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of P(attack) per feature vector, placed in front of scale + predict.
+
+    Rows are keyed by a 128-bit hash computed for the whole batch at once with
+    NumPy (optionally after rounding to `quantize_decimals`, so near-identical
+    vectors share an entry). The cache is a set-associative table of NumPy
+    arrays: each key maps to one set of SET_WAYS slots, so a batch is looked up,
+    touched and inserted with array operations rather than per row. Only the
+    rows that miss are passed to `score_fn`, de-duplicated. Entries expire
+    `ttl_seconds` after being scored, the least recently used entry of a full
+    set is evicted, and the whole cache is dropped whenever the model version
+    passed to `score` changes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100_000,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: float = 300.0,
+        quantize_decimals: Optional[int] = None,
+        hits_counter=None,
+        misses_counter=None,
+        evictions_counter=None,
+        entries_gauge=None,
+        clock: Callable[[], float] = time.monotonic,
+        seed: Optional[int] = None,
+    ):
+        if max_bytes is not None:
+            max_entries = min(max_entries, max_bytes // ENTRY_BYTES)
+        if max_entries < 1:
+            raise ValueError("The cache must hold at least one entry")
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds must be positive")
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.quantize_decimals = quantize_decimals
+        self.hits_counter = hits_counter
+        self.misses_counter = misses_counter
+        self.evictions_counter = evictions_counter
+        self.entries_gauge = entries_gauge
+        self.clock = clock
+        self.hits = self.misses = self.evictions = 0
+        self.model_version: Optional[Hashable] = None
+
+        # Random per-process salts and multipliers, one per feature column.
+        self._rng = np.random.default_rng(seed)
+        self._salts: Optional[np.ndarray] = None
+        self._multipliers: Optional[np.ndarray] = None
+
+        # max_entries rounded up to whole sets of (about) SET_WAYS slots; slot
+        # `set * ways + way` of the flat arrays below.
+        self.n_sets = -(-max_entries // SET_WAYS)
+        self.ways = -(-max_entries // self.n_sets)
+        size = self.n_sets * self.ways
+        self._high = np.zeros(size, dtype=np.uint64)
+        self._low = np.zeros(size, dtype=np.uint64)
+        self._probability = np.zeros(size, dtype=np.float64)
+        self._expires = np.zeros(size, dtype=np.float64)
+        # Number of the `score` call that last used the slot, for LRU.
+        self._used = np.zeros(size, dtype=np.int64)
+        self._valid = np.zeros(size, dtype=bool)
+        self._way_offsets = np.arange(self.ways, dtype=np.intp)
+        self._size = 0
+        self._tick = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _hash_params(self, n_features: int):
+        if self._salts is None or len(self._salts) != n_features:
+            self._salts = self._rng.integers(0, 2**64, size=n_features, dtype=np.uint64)
+            self._multipliers = self._rng.integers(0, 2**64, size=n_features, dtype=np.uint64) | np.uint64(1)
+        return self._salts, self._multipliers
+
+    def key_arrays(self, features_np: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the high and low 64 bits of every row's 128-bit key."""
+        features_np = np.asarray(features_np, dtype=np.float64)
+        if self.quantize_decimals is not None:
+            features_np = np.round(features_np, self.quantize_decimals)
+        # Adding 0.0 turns -0.0 into 0.0 so both hash alike.
+        bits = np.ascontiguousarray(features_np + 0.0).view(np.uint64)
+        salts, multipliers = self._hash_params(bits.shape[1])
+        mixed = _mix(bits ^ salts)
+        high = mixed.sum(axis=1, dtype=np.uint64)
+        low = (mixed * multipliers).sum(axis=1, dtype=np.uint64)
+        return high, low
+
+    def keys(self, features_np: np.ndarray) -> List[tuple]:
+        """Returns one hashable 128-bit key per row."""
+        high, low = self.key_arrays(features_np)
+        return list(zip(high.tolist(), low.tolist()))
+
+    def _evicted(self, reason: str, count: int = 1):
+        if not count:
+            return
+        self.evictions += count
+        if self.evictions_counter is not None:
+            self.evictions_counter.labels(reason=reason).inc(count)
+
+    def _set_version(self, model_version: Hashable):
+        if model_version != self.model_version:
+            dropped = self._size
+            self._valid[:] = False
+            self._size = 0
+            if dropped:
+                self._evicted("model_change", dropped)
+                logger.info(f"Prediction cache invalidated ({dropped} entries) for model version {model_version}.")
+            self.model_version = model_version
+
+    def clear(self):
+        with self._lock:
+            self._valid[:] = False
+            self._size = 0
+            if self.entries_gauge is not None:
+                self.entries_gauge.set(0)
+
+    def _set_slots(self, high: np.ndarray) -> np.ndarray:
+        """(n_keys, ways) slots of the set each key maps to."""
+        sets = (high % np.uint64(self.n_sets)).astype(np.intp)
+        return sets[:, None] * self.ways + self._way_offsets
+
+    def _find(self, set_slots: np.ndarray, high: np.ndarray, low: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(found, slot) of each key within its set."""
+        match = self._valid[set_slots] & (self._high[set_slots] == high[:, None]) & (self._low[set_slots] == low[:, None])
+        return match.any(axis=1), set_slots[np.arange(len(high)), match.argmax(axis=1)]
+
+    def score(
+        self,
+        features_np: np.ndarray,
+        score_fn: Callable[[np.ndarray], np.ndarray],
+        model_version: Hashable = None,
+    ) -> np.ndarray:
+        """Returns P(attack) for every row, calling `score_fn` only for rows not in the cache."""
+        high, low = self.key_arrays(features_np)
+        set_slots = self._set_slots(high)
+        probabilities = np.empty(len(high), dtype=np.float64)
+        now = self.clock()
+        with self._lock:
+            self._set_version(model_version)
+            self._tick += 1
+            found, slot = self._find(set_slots, high, low)
+            hit = found & (self._expires[slot] > now)
+            expired = np.unique(slot[found & ~hit])
+            if len(expired):
+                self._valid[expired] = False
+                self._size -= len(expired)
+                self._evicted("ttl", len(expired))
+            probabilities[hit] = self._probability[slot[hit]]
+            self._used[slot[hit]] = self._tick
+            missed = np.flatnonzero(~hit)
+            n_hits = len(high) - len(missed)
+            self.hits += n_hits
+            self.misses += len(missed)
+
+        if self.hits_counter is not None and n_hits:
+            self.hits_counter.inc(n_hits)
+        if self.misses_counter is not None and len(missed):
+            self.misses_counter.inc(len(missed))
+        if not len(missed):
+            return probabilities
+
+        # Repeated rows within the batch are scored once.
+        order, starts = _group_starts(high[missed], low[missed])
+        unique_rows = missed[order[starts]]
+        scored = np.asarray(score_fn(features_np[unique_rows]), dtype=np.float64)
+        probabilities[missed[order]] = scored[np.cumsum(starts) - 1]
+
+        expires_at = self.clock() + self.ttl
+        with self._lock:
+            # Results of a model that was swapped out while scoring are not cached.
+            if model_version == self.model_version:
+                self._insert(set_slots[unique_rows], high[unique_rows], low[unique_rows], scored, expires_at)
+            if self.entries_gauge is not None:
+                self.entries_gauge.set(self._size)
+        return probabilities
+
+    def _insert(self, set_slots, high, low, probabilities, expires_at: float):
+        """Stores new keys, each in an empty, expired or least recently used slot of its set."""
+        # Keys that another thread cached meanwhile are refreshed in place.
+        found, slot = self._find(set_slots, high, low)
+        self._probability[slot[found]] = probabilities[found]
+        self._expires[slot[found]] = expires_at
+        self._used[slot[found]] = self._tick
+
+        now = self.clock()
+        pending = np.flatnonzero(~found)
+        # One key per set and round; a set takes at most `ways` new keys from one batch.
+        for _ in range(self.ways):
+            if not len(pending):
+                break
+            order, starts = _group_starts(set_slots[pending, 0])
+            chosen = pending[order[starts]]
+            candidates = set_slots[chosen]
+            # Empty slots go first (-2), then expired ones (-1), then the least recently used.
+            rank = np.where(
+                self._valid[candidates], np.where(self._expires[candidates] > now, self._used[candidates], -1), -2
+            )
+            way = rank.argmin(axis=1)
+            rows = np.arange(len(chosen))
+            victims = rank[rows, way]
+            self._size += int((victims == -2).sum())
+            self._evicted("ttl", int((victims == -1).sum()))
+            self._evicted("lru", int((victims >= 0).sum()))
+            slot = candidates[rows, way]
+            self._high[slot] = high[chosen]
+            self._low[slot] = low[chosen]
+            self._probability[slot] = probabilities[chosen]
+            self._expires[slot] = expires_at
+            self._used[slot] = self._tick
+            self._valid[slot] = True
+            pending = pending[order[~starts]]
@@ -0,0 +1,228 @@
+"""
+Pre-forking multi-worker server.
+
+`uvicorn --workers N` starts N independent interpreters, each unpickling its
+own copy of the model. This entry point loads the startup model version once
+in a parent process and then forks the workers, which inherit it
+copy-on-write: the tree arrays, the LightGBM booster and the scaler stay in
+pages shared by every worker as long as nobody writes to them. With
+INFERENCE_ENGINE=artifact the model is a read-only memory map, shared through
+the page cache even across restarts of a worker.
+
+    python -m app.prefork --host 0.0.0.0 --port 8000 [--workers N] [--pin-cpus]
+
+The number of workers defaults to the CPUs available to the container (its
+affinity mask capped by the cgroup CPU quota). Each worker gets an equal share
+of those CPUs for its inference threads and OpenMP/BLAS thread pools, and with
+--pin-cpus is bound to its own cores. Workers that die are re-forked from the
+parent, which still holds the model.
+
+The parent never scores anything: LightGBM's OpenMP runtime is not fork-safe,
+and a worker forked after the parent ran a parallel region hangs on its first
+prediction.
+
+Each worker has its own model registry and caches, and connections are spread
+over the workers by the kernel. Metrics are shared: the workers write them to
+files in PROMETHEUS_MULTIPROC_DIR (a temporary directory unless set) and
+/metrics, whichever worker answers, reports the sum over all of them. So, with more than one worker,
+/admin/models can list versions but not load, activate or unload them (409),
+since the change would reach only one worker; roll out a new model by
+restarting with new settings. For the same reason the rolling per-device
+attack rates (/devices) are off. This is not the Docker default; it is for hosts
+where one model copy per CPU does not fit.
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence, Set
+
+from app.inference_executor import available_cpus, threads_per_worker
+
+logger = logging.getLogger(__name__)
+
+# A worker that exits sooner than this after being forked is restarted with a delay,
+# so a worker that cannot start does not turn into a fork loop.
+MIN_WORKER_LIFETIME_SECONDS = 1.0
+
+
+def bind_tcp_socket(host: str, port: int) -> socket.socket:
+    """
+    Binds the listening socket shared by the workers.
+
+    The protocol is given explicitly: asyncio only enables TCP_NODELAY on accepted
+    connections whose socket proto is IPPROTO_TCP, and a socket created with the
+    default proto 0 (as uvicorn's Config.bind_socket does) leaves Nagle on, which
+    adds a ~40 ms delayed-ACK stall to every small response.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def prepare_metrics_dir() -> Optional[str]:
+    """
+    Points prometheus_client at the directory the workers share their metrics through.
+
+    Must run before prometheus_client is first imported, which picks its value
+    storage then. Files left by an earlier run are removed, or their counters would
+    be added to this one's. Returns the directory if it was created here.
+    """
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not metrics_dir:
+        metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="nbiot-metrics-")
+        return metrics_dir
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        if name.endswith(".db"):
+            os.remove(os.path.join(metrics_dir, name))
+    return None
+
+
+def worker_cpu_sets(workers: int, cpus: Sequence[int]) -> List[Set[int]]:
+    """Splits `cpus` into one equal, contiguous set per worker; workers share CPUs if there are more workers."""
+    cpus = sorted(cpus)
+    share = max(1, len(cpus) // workers)
+    return [{cpus[(i * share + j) % len(cpus)] for j in range(share)} for i in range(workers)]
+
+
+class PreforkServer:
+    """Forks `workers` uvicorn servers that accept connections on one shared listening socket."""
+
+    def __init__(self, config, workers: int, threads: int, cpu_sets: Optional[List[Set[int]]] = None):
+        self.config = config
+        self.workers = workers
+        self.threads = threads
+        self.cpu_sets = cpu_sets
+        self.children: Dict[int, tuple] = {}  # pid -> (worker index, fork time)
+        self.should_exit = False
+        self.sock: Optional[socket.socket] = None
+
+    def run(self) -> int:
+        self.sock = bind_tcp_socket(self.config.host, self.config.port)
+        # Objects that exist now are never collected; freezing them keeps the collector in
+        # the workers from writing to (and so copying) the pages the model lives in.
+        gc.freeze()
+        signal.signal(signal.SIGTERM, self._handle_exit)
+        signal.signal(signal.SIGINT, self._handle_exit)
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while self.children:
+            pid, status = os.wait()
+            index, forked_at = self.children.pop(pid, (None, None))
+            if index is None:
+                continue
+            if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+                # Drops the dead worker's live gauges; its counters and histograms still count.
+                from prometheus_client.multiprocess import mark_process_dead
+                mark_process_dead(pid)
+            if self.should_exit:
+                continue
+            logger.warning(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}; restarting it.")
+            if time.monotonic() - forked_at < MIN_WORKER_LIFETIME_SECONDS:
+                time.sleep(MIN_WORKER_LIFETIME_SECONDS)
+            if not self.should_exit:
+                self._spawn(index)
+        self.sock.close()
+        logger.info("All workers stopped.")
+        return 0
+
+    def _handle_exit(self, signum, frame):
+        self.should_exit = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = (index, time.monotonic())
+            return
+        try:
+            code = self._run_worker(index)
+        except BaseException:
+            logger.error(f"Worker {index} failed", exc_info=True)
+            code = 1
+        os._exit(code)
+
+    def _run_worker(self, index: int) -> int:
+        import uvicorn
+
+        import app.main as main_module
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        gc.enable()
+        if self.cpu_sets:
+            os.sched_setaffinity(0, self.cpu_sets[index])
+        # The per-call LightGBM threads; the executor splits them no further.
+        main_module.LIGHTGBM_NUM_THREADS = self.threads
+        os.environ["OMP_NUM_THREADS"] = str(self.threads)
+        cpus = f" on CPUs {sorted(self.cpu_sets[index])}" if self.cpu_sets else ""
+        logger.info(f"Worker {index} (pid {os.getpid()}) started{cpus} with {self.threads} threads per inference call.")
+
+        server = uvicorn.Server(self.config)
+        server.run(sockets=[self.sock])
+        return 0 if server.started else 3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the detector API from pre-forked workers sharing one loaded model.")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVER_WORKERS", "0")),
+                        help="Worker processes; 0 starts one per available CPU.")
+    parser.add_argument("--pin-cpus", action="store_true", default=os.getenv("SERVER_PIN_CPUS", "false").lower() == "true",
+                        help="Bind each worker to its own share of the CPUs.")
+    args = parser.parse_args(argv)
+
+    cpus = available_cpus()
+    workers = args.workers or cpus
+    # Equal share of the CPUs per worker, then per inference thread (or process) within a worker.
+    per_worker = max(1, cpus // workers)
+    from_env = os.getenv("INFERENCE_WORKERS", "2"), os.getenv("INFERENCE_PROCESSES", "0")
+    threads = int(os.getenv("LIGHTGBM_NUM_THREADS", "0")) or threads_per_worker(sum(map(int, from_env)), per_worker)
+    cpu_sets = None
+    if args.pin_cpus:
+        cpu_sets = worker_cpu_sets(workers, sorted(os.sched_getaffinity(0))[:cpus])
+
+    # Loading must not start an OpenMP thread pool in the parent (see the module docstring),
+    # so the runtime is initialised single-threaded; workers set their thread count per call.
+    os.environ["OMP_NUM_THREADS"] = "1"
+    gc.disable()
+    created_metrics_dir = prepare_metrics_dir()
+    import uvicorn
+
+    import app.main as main_module
+    # Imported by each worker's lifespan otherwise, after the fork, into private pages.
+    import app.telemetry  # noqa: F401
+
+    started = time.perf_counter()
+    main_module.preloaded_version = main_module.load_startup_version()
+    main_module.prefork_workers = workers
+    logger.info(
+        f"Model version {main_module.preloaded_version.name} loaded in {time.perf_counter() - started:.2f}s; "
+        f"forking {workers} workers for {cpus} CPUs."
+    )
+    config = uvicorn.Config(main_module.app, host=args.host, port=args.port)
+    try:
+        return PreforkServer(config, workers, threads, cpu_sets).run()
+    finally:
+        if created_metrics_dir:
+            shutil.rmtree(created_metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple
+
+import numpy as np
+
+from app.csv_decoder import CsvRowError, decode_csv
+
+# Bytes requested from the upload per read; rows are re-chunked independently.
+READ_SIZE = 1 << 20
+
+
+def parse_csv_lines(lines: List[bytes], row_numbers: np.ndarray, n_features: int, threads: int = 1) -> np.ndarray:
+    """Parses complete, non-blank CSV lines, numbered `row_numbers`, into a (len(lines), n_features) float64 array."""
+    return decode_csv(b"\n".join(lines), n_features, threads=threads, line_numbers=row_numbers)
+
+
+async def iter_csv_line_chunks(
+    read: Callable[[int], Awaitable[bytes]],
+    chunk_rows: int,
+) -> AsyncIterator[Tuple[np.ndarray, List[bytes]]]:
+    """
+    Reads a headerless CSV upload incrementally and yields (row_numbers, lines)
+    for at most `chunk_rows` non-blank lines at a time, so only one chunk and
+    one read buffer are held in memory. Row numbers are 1-based line numbers;
+    blank lines are skipped but still counted.
+    """
+    pending: List[bytes] = []
+    pending_rows: List[int] = []
+    remainder = b""
+    line_number = 0
+
+    def take():
+        chunk = (np.asarray(pending_rows), list(pending))
+        pending.clear()
+        pending_rows.clear()
+        return chunk
+
+    while True:
+        data = await read(READ_SIZE)
+        if not data:
+            break
+        lines = (remainder + data).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            line_number += 1
+            line = line.strip()
+            if not line:
+                continue
+            pending.append(line)
+            pending_rows.append(line_number)
+            if len(pending) >= chunk_rows:
+                yield take()
+
+    line_number += 1
+    remainder = remainder.strip()
+    if remainder:
+        pending.append(remainder)
+        pending_rows.append(line_number)
+    if pending:
+        yield take()
+
+
+def format_ndjson(row_numbers: np.ndarray, probabilities: np.ndarray, threshold: float) -> str:
+    lines = []
+    for row, probability in zip(row_numbers.tolist(), probabilities.tolist()):
+        label = 1 if probability > threshold else 0
+        status = "Attack" if label == 1 else "Benign"
+        lines.append(f'{{"row": {row}, "prediction_label": {label}, "status": "{status}", "probability_attack": {probability!r}}}\n')
+    return "".join(lines)
+
+
+CSV_HEADER = "row,prediction_label,status,probability_attack\n"
+
+
+def format_csv(row_numbers: np.ndarray, probabilities: np.ndarray, threshold: float) -> str:
+    lines = []
+    for row, probability in zip(row_numbers.tolist(), probabilities.tolist()):
+        label = 1 if probability > threshold else 0
+        status = "Attack" if label == 1 else "Benign"
+        lines.append(f"{row},{label},{status},{probability!r}\n")
+    return "".join(lines)
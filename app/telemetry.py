@@ -0,0 +1,216 @@
+"""
+OpenTelemetry tracing and log export over OTLP/HTTP.
+
+app.main imports this module when it starts serving rather than when it is
+imported: the SDK and the OTLP exporters (with requests and protobuf) take
+longer to import than the rest of the API, and nothing needs them until the
+lifespan installs the providers.
+
+Traces are head-sampled by trace id: `sampler_ratio` of the requests are
+recorded and exported, and a request whose caller sent a sampled or unsampled
+trace context follows that decision. The requests left out get a
+non-recording span, which is the cheapest. With `sample_errors` (off by
+default) they are recorded instead (attributes and status, but no child spans)
+so that their span can be exported when it ends with an error; that costs
+every unsampled request a span object and its attributes, which the "sampled"
+and "sampled_errors" levels of benchmarks/telemetry.py measure.
+
+Spans and log records wait for export in bounded queues. Once a queue is
+full the oldest item is dropped, and counted in `dropped_counter`, rather than
+the request that produced the new one being made to wait for the collector.
+The SDK keeps its queues private, so `ExportQueue` counts what goes in and what
+is handed to the exporter.
+"""
+import logging
+import threading
+from typing import Optional, Sequence, Tuple
+
+from opentelemetry import trace
+from opentelemetry._logs import set_logger_provider
+from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.instrumentation.logging import LoggingInstrumentor
+from opentelemetry.sdk._logs import LoggerProvider as OtelSDKLoggerProvider, LoggingHandler
+from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import (
+    Decision, ParentBased, Sampler, SamplingResult, TraceIdRatioBased,
+)
+from opentelemetry.trace import SpanContext, StatusCode, TraceFlags
+
+logger = logging.getLogger(__name__)
+
+# The handler exporting `logging` records, replaced when the providers are configured again.
+_log_handler: Optional[LoggingHandler] = None
+
+
+class RecordUnsampledSampler(Sampler):
+    """Samples like `sampler`, but records the spans it does not sample instead of dropping them."""
+
+    def __init__(self, sampler: Sampler):
+        self.sampler = sampler
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        result = self.sampler.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+        if result.decision is Decision.DROP:
+            return SamplingResult(Decision.RECORD_ONLY, attributes, result.trace_state)
+        return result
+
+    def get_description(self) -> str:
+        return f"RecordUnsampled{{{self.sampler.get_description()}}}"
+
+
+def make_sampler(ratio: float, sample_errors: bool = False) -> Sampler:
+    """A parent-based sampler keeping `ratio` of the new traces (recording the rest with `sample_errors`)."""
+    root: Sampler = TraceIdRatioBased(ratio)
+    if sample_errors:
+        root = RecordUnsampledSampler(root)
+    return ParentBased(root)
+
+
+def _as_sampled(span: ReadableSpan) -> ReadableSpan:
+    context = span.context
+    return ReadableSpan(
+        name=span.name,
+        context=SpanContext(context.trace_id, context.span_id, context.is_remote,
+                            TraceFlags(TraceFlags.SAMPLED), context.trace_state),
+        parent=span.parent,
+        resource=span.resource,
+        attributes=span.attributes,
+        events=span.events,
+        links=span.links,
+        kind=span.kind,
+        status=span.status,
+        start_time=span.start_time,
+        end_time=span.end_time,
+        instrumentation_scope=span.instrumentation_scope,
+    )
+
+
+class ExportQueue:
+    """
+    The number of items waiting in a batch processor's queue of `max_size`,
+    counted from the items put in and the batches handed to `exporter`, which
+    this object wraps. A put into a full queue evicts the oldest item and is
+    counted in `dropped_counter` under `signal`.
+    """
+
+    def __init__(self, exporter, max_size: int, dropped_counter=None, signal: str = ""):
+        self.exporter = exporter
+        self.max_size = max_size
+        self.dropped_counter = dropped_counter
+        self.signal = signal
+        self.depth = 0
+        self._lock = threading.Lock()
+
+    def put(self):
+        with self._lock:
+            dropped = self.depth >= self.max_size
+            if not dropped:
+                self.depth += 1
+        if dropped and self.dropped_counter is not None:
+            self.dropped_counter.labels(signal=self.signal).inc()
+
+    def export(self, batch: Sequence):
+        with self._lock:
+            self.depth = max(0, self.depth - len(batch))
+        return self.exporter.export(batch)
+
+    def __getattr__(self, name: str):
+        # shutdown, force_flush and anything else the processor calls on its exporter.
+        return getattr(self.exporter, name)
+
+
+class ErrorKeepingSpanProcessor(BatchSpanProcessor):
+    """
+    `BatchSpanProcessor` that also exports the recorded but unsampled spans
+    ending with an error status, and counts the spans its full queue drops.
+    """
+
+    def __init__(self, span_exporter, dropped_counter=None, max_queue_size: int = 2048, **kwargs):
+        self.export_queue = ExportQueue(span_exporter, max_queue_size, dropped_counter, "traces")
+        super().__init__(self.export_queue, max_queue_size=max_queue_size, **kwargs)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if not span.context.trace_flags.sampled:
+            if span.status.status_code is not StatusCode.ERROR:
+                return
+            span = _as_sampled(span)
+        self.export_queue.put()
+        super().on_end(span)
+
+
+class DropCountingLogRecordProcessor(BatchLogRecordProcessor):
+    """`BatchLogRecordProcessor` that counts the log records its full queue drops."""
+
+    def __init__(self, exporter, dropped_counter=None, max_queue_size: int = 2048, **kwargs):
+        self.export_queue = ExportQueue(exporter, max_queue_size, dropped_counter, "logs")
+        super().__init__(self.export_queue, max_queue_size=max_queue_size, **kwargs)
+
+    def emit(self, log_data) -> None:
+        self.export_queue.put()
+        super().emit(log_data)
+
+
+def remove_log_handler():
+    """Stops exporting `logging` records; called before the logger provider shuts down."""
+    global _log_handler
+    if _log_handler is not None:
+        logging.getLogger().removeHandler(_log_handler)
+        _log_handler = None
+
+
+def configure_telemetry(
+    service_name: str,
+    traces_endpoint: str,
+    logs_endpoint: str,
+    sampler_ratio: float = 1.0,
+    sample_errors: bool = False,
+    log_export_level: Optional[int] = logging.INFO,
+    max_queue_size: int = 2048,
+    max_export_batch_size: int = 512,
+    schedule_delay_millis: float = 5000,
+    export_timeout_seconds: int = 10,
+    dropped_counter=None,
+) -> Tuple[TracerProvider, OtelSDKLoggerProvider]:
+    """
+    Installs the global tracer and logger providers and instruments `logging`; returns both providers.
+
+    Log records of `log_export_level` and above are exported (none when it is None).
+    """
+    global _log_handler
+    resource = Resource(attributes={"service.name": service_name})
+    queue_options = dict(
+        max_queue_size=max_queue_size,
+        max_export_batch_size=min(max_export_batch_size, max_queue_size),
+        schedule_delay_millis=schedule_delay_millis,
+        export_timeout_millis=export_timeout_seconds * 1000,
+    )
+
+    # Configure Tracing
+    trace_provider = TracerProvider(resource=resource, sampler=make_sampler(sampler_ratio, sample_errors))
+    span_exporter = OTLPSpanExporter(endpoint=traces_endpoint, timeout=export_timeout_seconds)
+    trace_provider.add_span_processor(ErrorKeepingSpanProcessor(span_exporter, dropped_counter, **queue_options))
+    trace.set_tracer_provider(trace_provider)
+    logger.info(
+        f"OTEL Tracing configured. Service: {service_name}, Endpoint: {traces_endpoint}, "
+        f"sampled: {sampler_ratio:.2%}{' and errors' if sample_errors else ''}"
+    )
+
+    # Configure Logging SDK
+    logger_provider = OtelSDKLoggerProvider(resource=resource)
+    log_exporter = OTLPLogExporter(endpoint=logs_endpoint, timeout=export_timeout_seconds)
+    logger_provider.add_log_record_processor(DropCountingLogRecordProcessor(log_exporter, dropped_counter, **queue_options))
+    set_logger_provider(logger_provider)
+    remove_log_handler()
+    if log_export_level is not None:
+        _log_handler = LoggingHandler(level=log_export_level, logger_provider=logger_provider)
+        logging.getLogger().addHandler(_log_handler)
+
+    # Instrument Python's standard logging
+    LoggingInstrumentor().instrument(set_logging_format=True)
+    logger.info(f"OTEL Logging instrumentor configured. Log Endpoint: {logs_endpoint}")
+    return trace_provider, logger_provider
+
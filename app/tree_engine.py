@@ -0,0 +1,266 @@
+from typing import Optional
+
+import numpy as np
+
+# LightGBM treats |x| <= kZeroThreshold as zero when missing_type is "Zero".
+_ZERO_THRESHOLD = 1e-35
+
+# Encoding of LightGBM's per-node missing_type.
+MISSING_NONE = 0
+MISSING_ZERO = 1
+MISSING_NAN = 2
+_MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+# Rows are routed in chunks so the (rows x trees) working arrays stay in cache.
+DEFAULT_CHUNK_ROWS = 2048
+
+
+def _to_ordered(values: np.ndarray) -> np.ndarray:
+    """Maps doubles to int64 keys with the same ordering."""
+    bits = values.view(np.int64)
+    return np.where(bits >= 0, bits, -(bits & np.int64(0x7FFFFFFFFFFFFFFF)))
+
+
+def _from_ordered(keys: np.ndarray) -> np.ndarray:
+    bits = np.where(keys >= 0, keys, (-keys) | np.int64(-0x8000000000000000))
+    return bits.view(np.float64)
+
+
+def _fold_thresholds(threshold: np.ndarray, center: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """
+    For each split returns the largest double T with (T - center) / scale <= threshold,
+    found by bisection over the ordered bit patterns of all finite doubles.
+    """
+    def scaled(keys):
+        with np.errstate(over="ignore", invalid="ignore"):
+            return (_from_ordered(keys) - center) / scale
+
+    lo = np.full(threshold.shape, _to_ordered(np.array([-np.finfo(np.float64).max]))[0])
+    hi = np.full(threshold.shape, _to_ordered(np.array([np.finfo(np.float64).max]))[0])
+    lowest_ok = scaled(lo) <= threshold
+    highest_ok = scaled(hi) <= threshold
+    # Invariant: scaled(lo) <= threshold < scaled(hi) for the rows still being searched.
+    for _ in range(64):
+        mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)  # floor((lo + hi) / 2) without overflow
+        ok = scaled(mid) <= threshold
+        lo = np.where(ok, mid, lo)
+        hi = np.where(ok, hi, mid)
+    folded = _from_ordered(lo)
+    folded = np.where(highest_ok, np.inf, folded)
+    return np.where(lowest_ok, folded, -np.inf)
+
+
+def binary_sigmoid(objective: str) -> float:
+    """Returns the sigmoid parameter of a LightGBM objective string such as 'binary sigmoid:1'."""
+    params = objective.split()
+    if not params or params[0] != "binary":
+        raise ValueError(f"Only binary LightGBM models are supported, got objective '{objective}'.")
+    sigmoid = 1.0
+    for param in params[1:]:
+        if param.startswith("sigmoid:"):
+            sigmoid = float(param.split(":", 1)[1])
+    return sigmoid
+
+
+class TreeEnsemble:
+    """
+    Flat NumPy representation of a binary LightGBM booster.
+
+    Every node of every tree lives in one set of parallel arrays. Leaves are
+    stored as nodes that loop back onto themselves (threshold +inf, both
+    children pointing at the leaf) and carry their output in `node_value`, so
+    a batch is evaluated by stepping all (row, tree) pairs down one level at a
+    time for `max_depth` steps, without masking out finished trees.
+    """
+
+    def __init__(
+        self,
+        split_feature: np.ndarray,
+        threshold: np.ndarray,
+        children: np.ndarray,
+        default_left: np.ndarray,
+        missing_type: np.ndarray,
+        node_value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        num_features: int,
+        sigmoid: float = 1.0,
+        nan_value: Optional[np.ndarray] = None,
+    ):
+        # Arrays are used as given (no copies), so they may be read-only views
+        # into a memory-mapped artifact.
+        self.split_feature = split_feature
+        self.threshold = threshold
+        # children[2 * node] is the left child, children[2 * node + 1] the right one.
+        self.children = children
+        self.default_left = default_left
+        self.missing_type = missing_type
+        self.node_value = node_value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.num_features = num_features
+        self.sigmoid = sigmoid
+        # Raw value a NaN input is evaluated as, per feature (0.0 for LightGBM).
+        self.nan_value = nan_value if nan_value is not None else np.zeros(num_features)
+        self._has_missing_splits = bool(np.any(missing_type != MISSING_NONE))
+
+    @property
+    def left_child(self) -> np.ndarray:
+        return self.children[0::2]
+
+    @property
+    def right_child(self) -> np.ndarray:
+        return self.children[1::2]
+
+    @property
+    def num_trees(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_booster(cls, booster, num_iteration: Optional[int] = None) -> "TreeEnsemble":
+        """Exports a `lightgbm.Booster` (or the `booster_` of an LGBMClassifier)."""
+        if num_iteration is None and booster.best_iteration > 0:
+            num_iteration = booster.best_iteration
+        dump = booster.dump_model(num_iteration=num_iteration if num_iteration else -1)
+
+        sigmoid = binary_sigmoid(dump["objective"])
+        if dump["num_tree_per_iteration"] != 1:
+            raise ValueError(f"Only binary LightGBM models are supported, got objective '{dump['objective']}'.")
+
+        split_feature, threshold, children = [], [], []
+        default_left, missing_type, node_value = [], [], []
+        roots = []
+        max_depth = 0
+
+        def add(node, depth):
+            nonlocal max_depth
+            index = len(threshold)
+            children.extend((index, index))
+            if "split_index" not in node:
+                split_feature.append(0)
+                threshold.append(np.inf)
+                default_left.append(True)
+                missing_type.append(MISSING_NONE)
+                node_value.append(node["leaf_value"])
+                max_depth = max(max_depth, depth)
+                return index
+            if node["decision_type"] != "<=":
+                raise ValueError(f"Unsupported split type '{node['decision_type']}' (categorical splits are not supported).")
+            split_feature.append(node["split_feature"])
+            threshold.append(node["threshold"])
+            default_left.append(node["default_left"])
+            missing_type.append(_MISSING_TYPES[node["missing_type"]])
+            node_value.append(0.0)
+            children[2 * index] = add(node["left_child"], depth + 1)
+            children[2 * index + 1] = add(node["right_child"], depth + 1)
+            return index
+
+        for tree in dump["tree_info"]:
+            roots.append(add(tree["tree_structure"], 0))
+
+        return cls(
+            split_feature=np.asarray(split_feature, dtype=np.intp),
+            threshold=np.asarray(threshold, dtype=np.float64),
+            children=np.asarray(children, dtype=np.intp),
+            default_left=np.asarray(default_left, dtype=bool),
+            missing_type=np.asarray(missing_type, dtype=np.int8),
+            node_value=np.asarray(node_value, dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            num_features=dump["max_feature_idx"] + 1,
+            sigmoid=sigmoid,
+        )
+
+    def fold_scaler(self, scaler) -> "TreeEnsemble":
+        """
+        Returns an ensemble that takes raw features, with a fitted RobustScaler
+        (or StandardScaler) folded into the split thresholds.
+
+        The scaler maps x -> (x - center) / scale with scale > 0, which is
+        monotone in x even after float rounding, so `scaled <= t` is exactly
+        equivalent to `x <= T` for the largest double T that still scales to
+        at most t.
+        """
+        if self._has_missing_splits and np.any(self.missing_type == MISSING_ZERO):
+            raise ValueError("Cannot fold a scaler into zero-as-missing splits.")
+        center = getattr(scaler, "center_", None)
+        if center is None:
+            center = getattr(scaler, "mean_", None)
+        center = np.zeros(self.num_features) if center is None else np.asarray(center, dtype=np.float64)
+        scale = np.ones(self.num_features) if scaler.scale_ is None else np.asarray(scaler.scale_, dtype=np.float64)
+        if center.shape != (self.num_features,) or scale.shape != (self.num_features,):
+            raise ValueError(f"Scaler does not match the model's {self.num_features} features.")
+
+        is_leaf = self.children[0::2] == np.arange(len(self.threshold))
+        threshold = np.where(
+            is_leaf,
+            self.threshold,
+            _fold_thresholds(self.threshold, center[self.split_feature], scale[self.split_feature]),
+        )
+        return TreeEnsemble(
+            split_feature=self.split_feature,
+            threshold=threshold,
+            children=self.children,
+            default_left=self.default_left,
+            missing_type=self.missing_type,
+            node_value=self.node_value,
+            roots=self.roots,
+            max_depth=self.max_depth,
+            num_features=self.num_features,
+            sigmoid=self.sigmoid,
+            # A NaN used to be scaled to NaN and then evaluated as 0.0, i.e. the raw value `center`.
+            nan_value=self.nan_value * scale + center,
+        )
+
+    def leaf_nodes(
+        self,
+        X: np.ndarray,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        start_tree: int = 0,
+        end_tree: Optional[int] = None,
+    ) -> np.ndarray:
+        """Returns the (n_rows, n_trees) index of the leaf node each row lands in, for trees [start_tree, end_tree)."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.num_features:
+            raise ValueError(f"Expected an array of shape (n_rows, {self.num_features}), got {X.shape}.")
+
+        roots = self.roots[start_tree:end_tree]
+        leaves = np.empty((X.shape[0], len(roots)), dtype=np.intp)
+        for start in range(0, X.shape[0], chunk_rows):
+            leaves[start:start + chunk_rows] = self._route(X[start:start + chunk_rows], roots)
+        return leaves
+
+    def _route(self, X: np.ndarray, roots: np.ndarray) -> np.ndarray:
+        n_rows = X.shape[0]
+        is_nan = np.isnan(X)
+        has_nan = bool(is_nan.any())
+        # NaN is compared as `nan_value` unless the split treats it as missing.
+        flat = np.where(is_nan, self.nan_value, X).ravel() if has_nan else np.ascontiguousarray(X).ravel()
+        flat_nan = is_nan.ravel()
+        offsets = (np.arange(n_rows, dtype=np.intp) * self.num_features)[:, None]
+
+        node = np.broadcast_to(roots, (n_rows, len(roots))).copy()
+        for _ in range(self.max_depth):
+            positions = offsets + self.split_feature[node]
+            go_right = flat[positions] > self.threshold[node]
+            if self._has_missing_splits:
+                missing_type = self.missing_type[node]
+                is_missing = (missing_type == MISSING_ZERO) & (np.abs(flat[positions]) <= _ZERO_THRESHOLD)
+                if has_nan:
+                    is_missing |= (missing_type == MISSING_NAN) & flat_nan[positions]
+                go_right = np.where(is_missing, ~self.default_left[node], go_right)
+            node = self.children[2 * node + go_right]
+        return node
+
+    def predict_margin(self, X: np.ndarray, start_tree: int = 0, end_tree: Optional[int] = None) -> np.ndarray:
+        """
+        Returns the raw boosted score (log-odds) for each row. With a tree range,
+        only the contribution of trees [start_tree, end_tree) is returned; the
+        contributions of consecutive ranges add up to the full margin.
+        """
+        return self.node_value[self.leaf_nodes(X, start_tree=start_tree, end_tree=end_tree)].sum(axis=1)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Returns [[P(benign), P(attack)], ...], matching `LGBMClassifier.predict_proba`."""
+        probability_attack = 1.0 / (1.0 + np.exp(-self.sigmoid * self.predict_margin(X)))
+        return np.column_stack([1.0 - probability_attack, probability_attack])
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import struct
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+from fastapi import WebSocket
+from fastapi.concurrency import run_in_threadpool
+
+from app.batch_formats import encode_binary
+
+logger = logging.getLogger(__name__)
+
+# --- WebSocket Scoring Protocol (/ws/predict) ---
+# Text frames carry one vector:   {"seq": 17, "features": [f0, ..., f114]}
+#   and are answered with:        {"seq": 17, "prediction_label": 1, "status": "Attack", "probability_attack": 0.97}
+# Binary frames carry k vectors:  uint64 seq of the first row, then k x n_features float32, little-endian
+#   and are answered with:        uint64 seq, then the /predict_batch binary layout (float32[k] + uint8[k])
+# "seq" is optional in text frames and defaults to the previous frame's last seq + 1.
+# Verdicts are sent in the order the frames arrived; invalid frames are answered with
+# {"seq": ..., "error": "..."} and the connection stays open.
+SEQ_HEADER = struct.Struct("<Q")
+
+
+class FrameError(ValueError):
+    def __init__(self, seq, message: str):
+        super().__init__(message)
+        self.seq = seq
+
+
+class AsyncBatcher:
+    """
+    Coalesces scoring requests from many WebSocket connections into batched calls.
+
+    A single task on the event loop drains the queue into batches of up to
+    `max_batch_rows` rows, waiting at most `max_wait_ms` after the first one,
+    and scores each batch in the threadpool. While a batch is being scored the
+    next one accumulates. The queue holds at most `max_pending` requests, so
+    producers wait in `submit` once scoring falls behind. `runner` awaits
+    score_fn(batch, *args) off the event loop (the threadpool by default); rows
+    submitted with different `args` (e.g. model versions) are scored in
+    separate calls.
+    """
+
+    def __init__(
+        self,
+        score_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_rows: int = 1024,
+        max_wait_ms: float = 2.0,
+        max_pending: int = 1024,
+        batch_rows_histogram=None,
+        runner: Optional[Callable[..., Awaitable]] = None,
+    ):
+        if max_batch_rows < 1:
+            raise ValueError("max_batch_rows must be at least 1")
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        self.score_fn = score_fn
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_pending = max_pending
+        self.batch_rows_histogram = batch_rows_histogram
+        self.runner = runner or run_in_threadpool
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"WebSocket batcher started (max_batch_rows={self.max_batch_rows}, max_wait={self.max_wait * 1000:.2f} ms).")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("WebSocket batcher stopped."))
+        logger.info("WebSocket batcher stopped.")
+
+    async def submit(self, features: np.ndarray, *args) -> asyncio.Future:
+        """
+        Queues an (n_rows, n_features) matrix to be scored with score_fn(rows, *args),
+        waiting while the queue is full; returns a future of P(attack).
+        """
+        if self._task is None:
+            raise RuntimeError("AsyncBatcher is not running.")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, args, future))
+        return future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while rows < self.max_batch_rows:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            rows += len(item[0])
+        return batch, rows
+
+    async def _run(self):
+        while True:
+            batch, rows = await self._collect()
+            if self.batch_rows_histogram is not None:
+                self.batch_rows_histogram.observe(rows)
+            groups = {}
+            for item in batch:
+                groups.setdefault(tuple(map(id, item[1])), []).append(item)
+            for group in groups.values():
+                await self._score(group)
+
+    async def _score(self, batch):
+        rows = sum(len(features) for features, _, _ in batch)
+        try:
+            features_np = batch[0][0] if len(batch) == 1 else np.vstack([features for features, _, _ in batch])
+            probabilities = await self.runner(self.score_fn, features_np, *batch[0][1])
+            if len(probabilities) != rows:
+                raise RuntimeError(f"Scoring returned {len(probabilities)} results for a batch of {rows} rows.")
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for features, _, future in batch:
+            # Futures of connections that went away are cancelled; skip them.
+            if not future.done():
+                future.set_result(probabilities[offset:offset + len(features)])
+            offset += len(features)
+
+
+def parse_text_frame(text: str, next_seq: int, n_features: int):
+    """Returns (seq, (1, n_features) array) for a JSON frame."""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        raise FrameError(None, "Frame is not valid JSON.")
+    if not isinstance(message, dict):
+        raise FrameError(None, "Frame must be a JSON object with 'features'.")
+    seq = message.get("seq", next_seq)
+    if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+        raise FrameError(None, "'seq' must be a non-negative integer.")
+    features = message.get("features")
+    if not isinstance(features, list):
+        raise FrameError(seq, "Frame must contain a 'features' list.")
+    if len(features) != n_features:
+        raise FrameError(seq, f"Expected {n_features} features, but got {len(features)}")
+    try:
+        features_np = np.asarray(features, dtype=np.float64)
+    except (TypeError, ValueError):
+        features_np = None
+    if features_np is None or features_np.ndim != 1:
+        raise FrameError(seq, "'features' must contain only numbers.")
+    return seq, features_np.reshape(1, -1)
+
+
+def parse_binary_frame(data: bytes, n_features: int):
+    """Returns (seq of the first row, (k, n_features) float32 array) for a binary frame."""
+    if len(data) < SEQ_HEADER.size:
+        raise FrameError(None, "Binary frame is shorter than its 8-byte sequence header.")
+    seq = SEQ_HEADER.unpack_from(data)[0]
+    payload = memoryview(data)[SEQ_HEADER.size:]
+    row_bytes = 4 * n_features
+    if not payload or len(payload) % row_bytes:
+        raise FrameError(seq, f"Binary frame payload of {len(payload)} bytes is not a whole number of {n_features} float32 rows.")
+    return seq, np.frombuffer(payload, dtype="<f4").reshape(-1, n_features)
+
+
+async def serve_connection(
+    websocket: WebSocket,
+    batcher: AsyncBatcher,
+    n_features: int,
+    threshold: float,
+    max_in_flight: int = 256,
+    score_args: tuple = (),
+):
+    """
+    Scores frames from an accepted WebSocket until the client disconnects.
+    Every frame is submitted to `batcher` with `score_args`, so a connection
+    keeps the model it was validated against.
+
+    Frames are handed to `batcher` as they arrive and their pending results are
+    queued for the sender in arrival order. At most `max_in_flight` frames may be
+    awaiting delivery; beyond that the server stops reading, so a client that does
+    not consume its verdicts is slowed down by TCP flow control rather than
+    buffered without limit.
+    """
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=max_in_flight)
+
+    async def send_verdict(seq, binary, result):
+        if isinstance(result, str):
+            await websocket.send_text(json.dumps({"seq": seq, "error": result}))
+            return
+        try:
+            probabilities = await result
+        except Exception:
+            logger.error("Error during WebSocket prediction", exc_info=True)
+            await websocket.send_text(json.dumps({"seq": seq, "error": "An unexpected error occurred during prediction."}))
+            return
+        if binary:
+            await websocket.send_bytes(SEQ_HEADER.pack(seq) + encode_binary(probabilities, threshold))
+        else:
+            probability_attack = float(probabilities[0])
+            label = 1 if probability_attack > threshold else 0
+            await websocket.send_text(json.dumps({
+                "seq": seq,
+                "prediction_label": label,
+                "status": "Attack" if label == 1 else "Benign",
+                "probability_attack": probability_attack,
+            }))
+
+    async def send_verdicts():
+        while True:
+            item = await outbox.get()
+            try:
+                await send_verdict(*item)
+            except Exception:
+                break
+        # The connection is broken; keep draining so the receiver never blocks on a full outbox.
+        logger.warning("WebSocket send failed; dropping verdicts until the client disconnects.")
+        while True:
+            _, _, result = await outbox.get()
+            if isinstance(result, asyncio.Future):
+                result.cancel()
+
+    sender = asyncio.create_task(send_verdicts())
+    next_seq = 0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            binary = message.get("bytes") is not None
+            try:
+                if binary:
+                    seq, features_np = parse_binary_frame(message["bytes"], n_features)
+                else:
+                    seq, features_np = parse_text_frame(message.get("text") or "", next_seq, n_features)
+            except FrameError as e:
+                await outbox.put((e.seq, False, str(e)))
+                continue
+            next_seq = seq + len(features_np)
+            future = await batcher.submit(features_np, *score_args)
+            await outbox.put((seq, binary, future))
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        while not outbox.empty():
+            _, _, result = outbox.get_nowait()
+            if isinstance(result, asyncio.Future):
+                result.cancel()
@@ -0,0 +1,13 @@
+"""
+Benchmarks for the scoring API, run locally against the real assets in app/saved_assets.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.compare baseline.json results.json
+
+`benchmarks.stages` times each stage of the batch path (JSON decode, CSV parse,
+scaling, prediction, response serialization) for batch sizes from 1 to 1M
+rows; `benchmarks.load` drives /predict and /predict_batch over HTTP against
+the app served in-process. Inputs are rows of example.csv resampled with
+multiplicative noise, generated from a fixed seed, so runs are comparable
+across commits.
+"""
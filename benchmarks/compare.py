@@ -0,0 +1,81 @@
+"""
+Compares two benchmark results files and flags regressions.
+
+    python -m benchmarks.compare baseline.json results.json --tolerance 0.15
+
+Exits with status 1 when any shared measurement got worse by more than the
+tolerance (relative): a longer median stage time, a higher p50/p99 latency, a
+lower RPS, slower CSV decoding, more CPU per request at a telemetry level, a
+slower import of app.main or a slower server start. Measurements present in
+only one file are listed, not judged.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+# (section, key fields, metrics where lower is better, metrics where higher is better)
+_SECTIONS = (
+    ("stages", ("stage", "rows"), ("median_s",), ()),
+    ("load", ("endpoint", "concurrency", "rows_per_request"), ("p50_ms", "p99_ms"), ("rps",)),
+    ("csv", ("parser", "threads", "rows"), ("median_s",), ()),
+    ("telemetry", ("level", "endpoint", "concurrency"), ("p50_ms", "p99_ms", "cpu_ms_per_request"), ("rps",)),
+    ("imports", ("module",), ("median_s",), ()),
+    ("startup", ("engine", "background_load"), ("live_s", "ready_s"), ()),
+)
+
+
+def _index(results: dict, section: str, keys: Tuple[str, ...]) -> Dict[tuple, dict]:
+    return {tuple(entry[k] for k in keys): entry for entry in results.get(section, [])}
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1) -> List[dict]:
+    """One row per shared measurement with its relative change (positive = worse) and a regression flag."""
+    rows = []
+    for section, keys, lower_better, higher_better in _SECTIONS:
+        before, after = _index(baseline, section, keys), _index(current, section, keys)
+        for key in before.keys() & after.keys():
+            for metric in lower_better + higher_better:
+                old, new = before[key].get(metric), after[key].get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old if metric in lower_better else (old - new) / old
+                rows.append({
+                    "section": section, "key": key, "metric": metric, "baseline": old, "current": new,
+                    "change": change, "regression": change > tolerance,
+                })
+        for key in before.keys() ^ after.keys():
+            rows.append({"section": section, "key": key, "metric": None, "only_in": "baseline" if key in before else "current"})
+    return sorted(rows, key=lambda row: (row["section"], str(row["key"]), row["metric"] or ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark results files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative slowdown tolerated before failing.")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows = compare(baseline, current, args.tolerance)
+    for row in rows:
+        key = " ".join(str(part) for part in row["key"])
+        if row["metric"] is None:
+            print(f"{row['section']:<7} {key:<32} only in {row['only_in']}")
+            continue
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['section']:<7} {key:<32} {row['metric']:<9} {row['baseline']:>12.6g} -> {row['current']:>12.6g}"
+            f" ({row['change']:+.1%} worse){flag}"
+        )
+    regressions = sum(1 for row in rows if row.get("regression"))
+    print(f"{regressions} regression(s) beyond {args.tolerance:.0%}.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+CSV decoding benchmark: app.csv_decoder against the pandas path it replaced.
+
+    read_csv        pd.read_csv(header=None).values, as /predict_batch parsed uploads before
+    decode_csv      app.csv_decoder.decode_csv with 1 thread and with every available CPU
+
+Both parse the same headerless upload of `rows` rows into a float64 matrix;
+each result records the median time, throughput and speedup over read_csv.
+The decoder's single-thread gain comes from skipping type inference and NA
+matching; its threads add to it with the CPUs available (see `environment.cpus`
+in the results file). Measured on a single-CPU host with 115 columns:
+
+    rows      read_csv    decode_csv x1        decode_csv x2
+    10000     138 ms      103 ms (1.34x)
+    100000    1251 ms     950 ms (1.32x)       1043 ms (1.20x, two threads on one CPU)
+"""
+import io
+import logging
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.csv_decoder import decode_csv
+from app.inference_executor import available_cpus
+from benchmarks.data import csv_bytes, sample_rows
+from benchmarks.stages import summarize, time_call
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def run_csv_benchmarks(
+    sizes: Sequence[int] = DEFAULT_SIZES, threads: Sequence[int] = (), n_features: int = 115, min_time: float = 0.5,
+) -> List[dict]:
+    """Times read_csv and decode_csv (at each thread count, default 1 and all CPUs) for every size."""
+    threads = sorted(set(threads or (1, available_cpus())))
+    results = []
+    for n_rows in sizes:
+        contents = csv_bytes(sample_rows(n_rows, seed=2)[:, :n_features])
+        expected = decode_csv(contents, n_features)
+        if not np.allclose(pd.read_csv(io.BytesIO(contents), header=None).values, expected, rtol=1e-15, atol=0):
+            raise AssertionError("decode_csv and read_csv disagree.")
+
+        baseline = summarize("read_csv", n_rows, time_call(
+            lambda: pd.read_csv(io.BytesIO(contents), header=None).values, min_time))
+        runs = [dict(baseline, parser="read_csv", threads=1)]
+        for count in threads:
+            result = summarize("decode_csv", n_rows, time_call(
+                lambda: decode_csv(contents, n_features, threads=count), min_time))
+            runs.append(dict(result, parser="decode_csv", threads=count))
+        for run in runs:
+            del run["stage"]
+            run["mb_per_s"] = len(contents) / run["median_s"] / 1e6
+            run["speedup"] = baseline["median_s"] / run["median_s"]
+            logger.info(
+                f"{run['parser']} x{run['threads']} {n_rows} rows: {run['median_s'] * 1e3:.1f} ms, "
+                f"{run['mb_per_s']:.0f} MB/s, {run['speedup']:.2f}x read_csv"
+            )
+        results += runs
+    return results
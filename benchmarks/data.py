@@ -0,0 +1,25 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE_CSV_PATH = os.path.join(ROOT_DIR, "example.csv")
+
+
+def sample_rows(n_rows: int, seed: int = 0) -> np.ndarray:
+    """Raw feature vectors: rows of example.csv resampled with log-normal noise, so every row is distinct."""
+    base = pd.read_csv(EXAMPLE_CSV_PATH, header=None).values
+    rng = np.random.default_rng(seed)
+    return base[rng.integers(0, len(base), n_rows)] * rng.lognormal(0, 0.5, (n_rows, base.shape[1]))
+
+
+def csv_bytes(rows: np.ndarray) -> bytes:
+    """A headerless CSV upload, formatted like the N-BaIoT exports."""
+    return pd.DataFrame(rows).to_csv(header=False, index=False, float_format="%.10g").encode()
+
+
+def json_body(rows: np.ndarray) -> bytes:
+    """A JSON array of /predict request bodies."""
+    return json.dumps([{"features": row} for row in rows.tolist()]).encode()
@@ -0,0 +1,138 @@
+"""
+HTTP load generator for /predict and /predict_batch.
+
+By default the app is served in-process by uvicorn on a loopback port, with its
+normal lifespan (real assets, inference executor, telemetry), and driven over
+real HTTP by `concurrency` asyncio clients for a fixed duration. The client
+shares the interpreter with the server, so absolute RPS is lower than against
+a separate server; pass `url` to target one (e.g. `python -m app.prefork`).
+"""
+import asyncio
+import contextlib
+import logging
+import socket
+import threading
+import time
+from typing import Iterator, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.data import csv_bytes, sample_rows
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ("/predict", "/predict_batch")
+
+
+@contextlib.contextmanager
+def serve_in_process(host: str = "127.0.0.1", startup_timeout: float = 60.0) -> Iterator[str]:
+    """Runs the app on a free loopback port in a background thread; yields its base URL."""
+    import uvicorn
+
+    import app.main as main_module
+    from app.prefork import bind_tcp_socket
+
+    sock = bind_tcp_socket(host, 0)
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main_module.app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="benchmark-server", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + startup_timeout
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("The in-process server did not start.")
+        time.sleep(0.05)
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=30)
+        sock.close()
+
+
+def _request_kwargs(endpoint: str, rows: np.ndarray) -> List[dict]:
+    if endpoint == "/predict":
+        return [{"json": {"features": row}} for row in rows.tolist()]
+    if endpoint == "/predict_batch":
+        return [{"files": {"file": ("benchmark.csv", csv_bytes(rows), "text/csv")}}]
+    raise ValueError(f"Unknown endpoint '{endpoint}'. Supported: {', '.join(ENDPOINTS)}.")
+
+
+async def _drive(url: str, endpoint: str, requests: List[dict], concurrency: int, duration: float):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    # Without TCP_NODELAY, headers and body go out as two segments and every request
+    # waits out the server's delayed ACK (~40 ms); see app.prefork.bind_tcp_socket.
+    transport = httpx.AsyncHTTPTransport(limits=limits, socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)])
+    async with httpx.AsyncClient(base_url=url, transport=transport, timeout=60.0) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def worker(offset: int):
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(endpoint, **requests[i % len(requests)])
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+                i += concurrency
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def run_load(
+    url: str,
+    endpoint: str,
+    concurrency: int = 8,
+    duration: float = 10.0,
+    batch_rows: int = 1000,
+    warmup: float = 1.0,
+) -> dict:
+    """Drives `endpoint` at `concurrency` for `duration` seconds; returns latency percentiles and RPS."""
+    rows = sample_rows(256 if endpoint == "/predict" else batch_rows, seed=1)
+    requests = _request_kwargs(endpoint, rows)
+    if warmup:
+        asyncio.run(_drive(url, endpoint, requests, concurrency, warmup))
+    latencies, errors, elapsed = asyncio.run(_drive(url, endpoint, requests, concurrency, duration))
+    latencies_ms = np.asarray(latencies) * 1e3
+    result = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "rows_per_request": 1 if endpoint == "/predict" else batch_rows,
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+        "p90_ms": float(np.percentile(latencies_ms, 90)) if len(latencies) else None,
+        "p99_ms": float(np.percentile(latencies_ms, 99)) if len(latencies) else None,
+        "max_ms": float(latencies_ms.max()) if len(latencies) else None,
+    }
+    logger.info(
+        f"{endpoint} x{concurrency}: {result['rps']:.1f} req/s, p50 {result['p50_ms'] or 0:.2f} ms, "
+        f"p99 {result['p99_ms'] or 0:.2f} ms, {errors} errors"
+    )
+    return result
+
+
+def run_load_benchmarks(
+    endpoints=ENDPOINTS, concurrency=(1, 8), duration: float = 10.0, batch_rows: int = 1000, url: Optional[str] = None,
+) -> List[dict]:
+    """Runs every endpoint at every concurrency level, against `url` or an in-process server."""
+    with contextlib.ExitStack() as stack:
+        base_url = url or stack.enter_context(serve_in_process())
+        return [
+            run_load(base_url, endpoint, level, duration, batch_rows)
+            for endpoint in endpoints
+            for level in concurrency
+        ]
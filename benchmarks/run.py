@@ -0,0 +1,123 @@
+"""
+Runs the benchmark suite and writes a JSON results file.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --suite stages --sizes 1,1000,1000000
+    python -m benchmarks.run --suite load --concurrency 1,16 --duration 30 --url http://localhost:8000
+    python -m benchmarks.run --suite startup --startup-engines lightgbm,artifact
+    python -m benchmarks.run --suite csv --csv-sizes 10000,100000 --csv-threads 1,2,4
+    python -m benchmarks.run --suite telemetry --telemetry-levels off,sampled,full --concurrency 1,8
+"""
+import argparse
+import datetime
+import json
+import logging
+import platform
+import subprocess
+import sys
+import warnings
+
+import lightgbm
+import numpy as np
+import sklearn
+
+from app.inference_executor import available_cpus
+from benchmarks.csv_decode import DEFAULT_SIZES as DEFAULT_CSV_SIZES, run_csv_benchmarks
+from benchmarks.data import ROOT_DIR
+from benchmarks.load import ENDPOINTS, run_load_benchmarks
+from benchmarks.stages import DEFAULT_MAX_TEXT_ROWS, DEFAULT_SIZES, STAGES, run_stage_benchmarks
+from benchmarks.startup import DEFAULT_ENGINES, measure_import, run_startup_benchmarks
+from benchmarks.telemetry import LEVELS as TELEMETRY_LEVELS, run_telemetry_benchmarks
+
+logger = logging.getLogger(__name__)
+
+
+def _int_list(value: str):
+    return [int(item) for item in value.split(",") if item]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(engine: str) -> dict:
+    """What a result depends on besides the code: commit, interpreter, libraries and CPUs."""
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": available_cpus(),
+        "numpy": np.__version__,
+        "lightgbm": lightgbm.__version__,
+        "scikit_learn": sklearn.__version__,
+        "engine": engine,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring stages and the HTTP API with the real assets.")
+    parser.add_argument("--suite", choices=("all", "stages", "load", "startup", "csv", "telemetry"), default="all")
+    parser.add_argument("--output", help="Write the results to this JSON file (printed to stdout otherwise).")
+    parser.add_argument("--engine", default="lightgbm", help="Inference engine for the stage benchmarks.")
+    parser.add_argument("--sizes", type=_int_list, default=list(DEFAULT_SIZES), help="Batch sizes, comma-separated.")
+    parser.add_argument("--stages", type=lambda v: v.split(","), default=list(STAGES))
+    parser.add_argument("--max-text-rows", type=int, default=DEFAULT_MAX_TEXT_ROWS,
+                        help="Largest batch for the row-by-row text stages (JSON decode/encode, CSV parse).")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds spent timing each stage and size.")
+    parser.add_argument("--endpoints", type=lambda v: v.split(","), default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8], help="Concurrent clients, comma-separated.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per load run.")
+    parser.add_argument("--batch-rows", type=int, default=1000, help="Rows per /predict_batch upload.")
+    parser.add_argument("--url", help="Load-test this server instead of one started in-process.")
+    parser.add_argument("--csv-sizes", type=_int_list, default=list(DEFAULT_CSV_SIZES),
+                        help="Rows per upload for the CSV decoding benchmark, comma-separated.")
+    parser.add_argument("--csv-threads", type=_int_list, default=[],
+                        help="Decoder thread counts, comma-separated (default: 1 and all available CPUs).")
+    parser.add_argument("--telemetry-levels", type=lambda v: v.split(","), default=list(TELEMETRY_LEVELS),
+                        help="Telemetry levels whose /predict overhead is measured (with --engine, --concurrency "
+                             "and --duration); include 'off' for the overhead relative to no telemetry.")
+    parser.add_argument("--startup-engines", type=lambda v: v.split(","), default=list(DEFAULT_ENGINES),
+                        help="Inference engines whose server startup is timed.")
+    parser.add_argument("--startup-repeats", type=int, default=3, help="Server starts (and imports x5) per measurement.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] - %(message)s")
+    # LightGBM warns on every call that the arrays carry no feature names.
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = {"environment": environment(args.engine)}
+
+    if args.suite in ("all", "stages"):
+        import app.main as main_module
+
+        version = main_module._configure_version(main_module.load_model_version(args.engine))
+        results["stages"] = run_stage_benchmarks(version, args.sizes, args.stages, args.max_text_rows, args.min_time)
+    if args.suite in ("all", "load"):
+        results["load"] = run_load_benchmarks(args.endpoints, args.concurrency, args.duration, args.batch_rows, args.url)
+    if args.suite in ("all", "csv"):
+        results["csv"] = run_csv_benchmarks(args.csv_sizes, args.csv_threads, min_time=args.min_time)
+    if args.suite in ("all", "telemetry"):
+        results["telemetry"] = run_telemetry_benchmarks(args.telemetry_levels, args.engine, args.concurrency,
+                                                        args.duration)
+    if args.suite in ("all", "startup"):
+        results["imports"] = [measure_import("app.main", repeats=5 * args.startup_repeats)]
+        results["startup"] = run_startup_benchmarks(args.startup_engines, args.startup_repeats)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        logger.info(f"Wrote {args.output}.")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
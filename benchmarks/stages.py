@@ -0,0 +1,106 @@
+"""
+Per-stage micro-benchmarks of the batch scoring path.
+
+Each stage runs the function the API itself uses, on inputs of `rows` rows:
+
+    json_decode          JSON array of /predict bodies -> validated models -> float64 matrix
+    csv_parse            /predict_batch upload -> float64 matrix in feature order
+    scale                scaler.transform (skipped by engines that fold the scaler in)
+    predict              predict_proba of the version's model on scaled rows
+    serialize_json       list-of-objects response (the default)
+    serialize_columnar   application/vnd.nbiot.columnar+json
+    serialize_binary     application/vnd.nbiot.predictions
+"""
+import logging
+import time
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+from pydantic import TypeAdapter
+
+import app.main as main_module
+from app.batch_formats import MEDIA_TYPE_BINARY, MEDIA_TYPE_COLUMNAR_JSON, MEDIA_TYPE_JSON
+from app.model_registry import ModelVersion
+from benchmarks.data import csv_bytes, json_body, sample_rows
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+# Stages that parse or build text row by row are capped: a 1M-row JSON body decodes to
+# ~115M Python floats (several GB), and a 1M-row JSON response takes ~30 s per call,
+# while neither says more than the 100k-row run.
+DEFAULT_MAX_TEXT_ROWS = 100_000
+TEXT_STAGES = ("json_decode", "csv_parse", "serialize_json")
+STAGES = ("json_decode", "csv_parse", "scale", "predict", "serialize_json", "serialize_columnar", "serialize_binary")
+
+_BODIES = TypeAdapter(List[main_module.NetworkFeaturesInput])
+
+
+def time_call(fn: Callable, min_time: float = 0.2, min_repeats: int = 3, max_repeats: int = 1000) -> List[float]:
+    """Wall times of repeated calls after one warm-up call, for at least `min_time` seconds in total."""
+    fn()
+    times = []
+    started = time.perf_counter()
+    while len(times) < max_repeats and (len(times) < min_repeats or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def summarize(stage: str, rows: int, times: Sequence[float]) -> dict:
+    times = np.asarray(times)
+    median = float(np.median(times))
+    return {
+        "stage": stage,
+        "rows": rows,
+        "repeats": len(times),
+        "median_s": median,
+        "min_s": float(times.min()),
+        "p90_s": float(np.percentile(times, 90)),
+        "rows_per_s": rows / median if median > 0 else None,
+    }
+
+
+def stage_functions(version: ModelVersion, rows: np.ndarray, stages: Sequence[str] = STAGES) -> Dict[str, Callable]:
+    """The callables of the selected stages for one input matrix, with their inputs prepared up front."""
+    scaled = version.scaler.transform(rows) if version.scaler is not None else rows
+    probabilities = version.model.predict_proba(scaled)[:, 1]
+    fns = {}
+    if "json_decode" in stages:
+        body = json_body(rows)
+        fns["json_decode"] = lambda: np.array([item.features for item in _BODIES.validate_json(body)])
+    if "csv_parse" in stages:
+        contents = csv_bytes(rows)
+        fns["csv_parse"] = lambda: main_module._read_batch_csv(contents, version)
+    if "scale" in stages and version.scaler is not None:
+        fns["scale"] = lambda: version.scaler.transform(rows)
+    if "predict" in stages:
+        fns["predict"] = lambda: version.model.predict_proba(scaled)
+    if "serialize_json" in stages:
+        fns["serialize_json"] = lambda: main_module._batch_response(probabilities, MEDIA_TYPE_JSON).body
+    if "serialize_columnar" in stages:
+        fns["serialize_columnar"] = lambda: main_module._batch_response(probabilities, MEDIA_TYPE_COLUMNAR_JSON).body
+    if "serialize_binary" in stages:
+        fns["serialize_binary"] = lambda: main_module._batch_response(probabilities, MEDIA_TYPE_BINARY).body
+    return fns
+
+
+def run_stage_benchmarks(
+    version: ModelVersion,
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    stages: Sequence[str] = STAGES,
+    max_text_rows: int = DEFAULT_MAX_TEXT_ROWS,
+    min_time: float = 0.2,
+) -> List[dict]:
+    """Times every stage at every batch size; returns one summary dict per (stage, size)."""
+    all_rows = sample_rows(max(sizes))
+    results = []
+    for size in sorted(sizes):
+        rows = all_rows[:size]
+        selected = [stage for stage in stages if stage not in TEXT_STAGES or size <= max_text_rows]
+        for stage, fn in stage_functions(version, rows, selected).items():
+            result = summarize(stage, size, time_call(fn, min_time=min_time))
+            logger.info(f"{stage:>20} {size:>9} rows: {result['median_s'] * 1e3:10.3f} ms (x{result['repeats']})")
+            results.append(result)
+    return results
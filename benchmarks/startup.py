@@ -0,0 +1,158 @@
+"""
+Import-time and startup-time benchmarks.
+
+Every measurement runs in a fresh interpreter, so nothing is imported or
+cached in-process beforehand:
+
+    imports   seconds to `import app.main`, the heavy libraries that import
+              pulled in (none, with the lazy imports of app/lazy_imports.py)
+              and its slowest direct imports according to `python -X importtime`
+    startup   seconds from launching `uvicorn app.main:app` until /livez and
+              then /readyz answer 200, per inference engine, with the model
+              loaded before serving and with MODEL_LOAD_IN_BACKGROUND
+"""
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Sequence
+
+import httpx
+
+from benchmarks.data import ROOT_DIR
+
+logger = logging.getLogger(__name__)
+
+# Libraries the API only needs on some code paths; importing app.main must not import them.
+HEAVY_MODULES = ("pandas", "sklearn", "scipy", "lightgbm", "joblib", "opentelemetry.sdk", "opentelemetry.exporter")
+
+DEFAULT_ENGINES = ("lightgbm", "artifact")
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+loaded = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "loaded": loaded}}))
+"""
+
+
+def _run_python(args: List[str], env=None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(module: str, top: int = 10) -> List[dict]:
+    """The direct imports of `module` that took longest, cumulative, from `python -X importtime`."""
+    stderr = _run_python(["-X", "importtime", "-c", f"import {module}"]).stderr
+    imports = []
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2][1:]
+        # Two spaces of indentation per level below the imported module itself.
+        if len(name) - len(name.lstrip(" ")) == 2:
+            imports.append({"module": name.strip(), "cumulative_s": int(fields[1]) / 1e6})
+    return sorted(imports, key=lambda entry: entry["cumulative_s"], reverse=True)[:top]
+
+
+def measure_import(module: str = "app.main", repeats: int = 5) -> dict:
+    """Median seconds to import `module` in a new interpreter, and the heavy modules it loaded."""
+    runs = [
+        json.loads(_run_python(["-c", _IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)]).stdout)
+        for _ in range(repeats)
+    ]
+    result = {
+        "module": module,
+        "repeats": repeats,
+        "median_s": statistics.median(run["seconds"] for run in runs),
+        "min_s": min(run["seconds"] for run in runs),
+        "heavy_modules": runs[-1]["loaded"],
+        "slowest_imports": slowest_imports(module),
+    }
+    logger.info(f"import {module}: {result['median_s'] * 1e3:.0f} ms (heavy modules: {result['heavy_modules'] or 'none'})")
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_200(client: httpx.Client, url: str, process: subprocess.Popen, deadline: float):
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with status {process.returncode} before {url} was ready.")
+        try:
+            if client.get(url).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} did not answer 200 in time.")
+
+
+def measure_startup(engine: str, background_load: bool = False, timeout: float = 120.0) -> dict:
+    """Seconds from launching a server process until it is live and until it is ready."""
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        INFERENCE_ENGINE=engine,
+        MODEL_LOAD_IN_BACKGROUND=str(background_load).lower(),
+        # Nothing listens there; the exporters drop what they cannot send.
+        OTEL_EXPORTER_OTLP_TRACES_ENDPOINT="http://127.0.0.1:9/v1/traces",
+        OTEL_EXPORTER_OTLP_LOGS_ENDPOINT="http://127.0.0.1:9/v1/logs",
+    )
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning"]
+    with tempfile.TemporaryFile() as log, httpx.Client(timeout=1.0) as client:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log)
+        try:
+            _wait_for_200(client, f"{base_url}/livez", process, started + timeout)
+            live_s = time.perf_counter() - started
+            _wait_for_200(client, f"{base_url}/readyz", process, started + timeout)
+            ready_s = time.perf_counter() - started
+        except RuntimeError:
+            log.seek(0)
+            logger.error(log.read().decode(errors="replace")[-4000:])
+            raise
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+    return {"engine": engine, "background_load": background_load, "live_s": live_s, "ready_s": ready_s}
+
+
+def run_startup_benchmarks(
+    engines: Sequence[str] = DEFAULT_ENGINES, repeats: int = 3, background_load: Sequence[bool] = (False, True),
+) -> List[dict]:
+    """Median time to live and to ready for every engine, loading before serving and in the background."""
+    results = []
+    for engine in engines:
+        for background in background_load:
+            runs = [measure_startup(engine, background) for _ in range(repeats)]
+            result = {
+                "engine": engine,
+                "background_load": background,
+                "repeats": repeats,
+                "live_s": statistics.median(run["live_s"] for run in runs),
+                "ready_s": statistics.median(run["ready_s"] for run in runs),
+            }
+            logger.info(
+                f"startup {engine}{' (background load)' if background else ''}: live after "
+                f"{result['live_s']:.2f}s, ready after {result['ready_s']:.2f}s"
+            )
+            results.append(result)
+    return results
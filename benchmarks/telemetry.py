@@ -0,0 +1,183 @@
+"""
+Per-request cost of each telemetry level.
+
+A server process is started per level, exporting to a stub OTLP/HTTP receiver
+in this process that answers every export with 200, and /predict is driven by
+the load generator of benchmarks/load.py. Latencies and the server's CPU time
+per request are compared with the "off" level:
+
+    off              the OpenTelemetry SDK disabled (OTEL_SDK_DISABLED), no request logs
+    sampled          1% of the requests traced; WARNING logs exported
+    sampled_errors   as sampled, and the other requests recorded so failed ones are exported too
+    traced           every request traced; WARNING logs exported
+    full             every request traced, INFO logs exported and the access log written
+
+The receiver counts the export requests and bytes it got per signal, after the
+server has shut down and flushed its queues.
+"""
+import contextlib
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+from benchmarks.data import ROOT_DIR
+from benchmarks.load import run_load
+from benchmarks.startup import _free_port, _wait_for_200
+
+logger = logging.getLogger(__name__)
+
+LEVELS: Dict[str, Dict[str, str]] = {
+    "off": {"OTEL_SDK_DISABLED": "true", "OTEL_LOGS_EXPORT_LEVEL": "OFF", "LOG_REQUESTS": "false"},
+    "sampled": {"OTEL_TRACES_SAMPLER_RATIO": "0.01", "OTEL_LOGS_EXPORT_LEVEL": "WARNING", "LOG_REQUESTS": "false"},
+    "sampled_errors": {"OTEL_TRACES_SAMPLER_RATIO": "0.01", "OTEL_TRACES_SAMPLE_ERRORS": "true",
+                       "OTEL_LOGS_EXPORT_LEVEL": "WARNING", "LOG_REQUESTS": "false"},
+    "traced": {"OTEL_TRACES_SAMPLER_RATIO": "1.0", "OTEL_LOGS_EXPORT_LEVEL": "WARNING", "LOG_REQUESTS": "false"},
+    "full": {"OTEL_TRACES_SAMPLER_RATIO": "1.0", "OTEL_LOGS_EXPORT_LEVEL": "INFO", "LOG_REQUESTS": "true"},
+}
+
+
+class _ReceiverHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        signal = self.path.rstrip("/").rsplit("/", 1)[-1]
+        with self.server.lock:
+            counts = self.server.received.setdefault(signal, {"requests": 0, "bytes": 0})
+            counts["requests"] += 1
+            counts["bytes"] += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-protobuf")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def stub_otlp_receiver(host: str = "127.0.0.1") -> Iterator[Tuple[str, dict]]:
+    """Accepts OTLP/HTTP exports on a free port; yields its base URL and the counts per signal (traces, logs)."""
+    server = ThreadingHTTPServer((host, 0), _ReceiverHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.received = {}
+    thread = threading.Thread(target=server.serve_forever, name="otlp-receiver", daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}", server.received
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _cpu_seconds(pid: int) -> Optional[float]:
+    """User and system CPU time of a process, from /proc (None where there is no /proc)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+@contextlib.contextmanager
+def serve_subprocess(env: dict, timeout: float = 120.0) -> Iterator[Tuple[str, subprocess.Popen]]:
+    """Runs `uvicorn app.main:app` with `env` until ready; yields its base URL and process, then stops it."""
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "info"]
+    # The access log and the application logs are written to a file, as they would be collected.
+    with tempfile.TemporaryFile() as log, httpx.Client(timeout=1.0) as client:
+        process = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=log, stderr=log)
+        try:
+            try:
+                _wait_for_200(client, f"{base_url}/readyz", process, time.perf_counter() + timeout)
+            except RuntimeError:
+                log.seek(0)
+                logger.error(log.read().decode(errors="replace")[-4000:])
+                raise
+            yield base_url, process
+        finally:
+            # SIGTERM runs the lifespan shutdown, which flushes the exporter queues.
+            process.terminate()
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def measure_level(
+    level: str, engine: str = "lightgbm", concurrency: int = 1, duration: float = 10.0, warmup: float = 1.0,
+) -> dict:
+    """Latency, RPS and server CPU per /predict request at one telemetry level, and what was exported."""
+    with stub_otlp_receiver() as (receiver_url, received):
+        env = dict(
+            os.environ,
+            INFERENCE_ENGINE=engine,
+            OTEL_EXPORTER_OTLP_TRACES_ENDPOINT=f"{receiver_url}/v1/traces",
+            OTEL_EXPORTER_OTLP_LOGS_ENDPOINT=f"{receiver_url}/v1/logs",
+            # Exports as soon as a batch fills or after 1s, as in a busy server.
+            OTEL_EXPORT_SCHEDULE_DELAY_MS="1000",
+            **LEVELS[level],
+        )
+        with serve_subprocess(env) as (url, process):
+            if warmup:
+                run_load(url, "/predict", concurrency, warmup, warmup=0)
+            cpu_before = _cpu_seconds(process.pid)
+            result = run_load(url, "/predict", concurrency, duration, warmup=0)
+            cpu_after = _cpu_seconds(process.pid)
+        exported = {signal: dict(counts) for signal, counts in sorted(received.items())}
+
+    cpu_ms = None
+    if cpu_before is not None and cpu_after is not None and result["requests"]:
+        cpu_ms = (cpu_after - cpu_before) * 1e3 / result["requests"]
+    return {
+        "level": level,
+        "endpoint": "/predict",
+        "concurrency": concurrency,
+        "requests": result["requests"],
+        "errors": result["errors"],
+        "rps": result["rps"],
+        "p50_ms": result["p50_ms"],
+        "p99_ms": result["p99_ms"],
+        "cpu_ms_per_request": cpu_ms,
+        "exported": exported,
+    }
+
+
+def run_telemetry_benchmarks(
+    levels: Sequence[str] = tuple(LEVELS), engine: str = "lightgbm", concurrency: Sequence[int] = (1, 8),
+    duration: float = 10.0, warmup: float = 1.0,
+) -> List[dict]:
+    """Every level at every concurrency, with its overhead per request relative to the "off" level."""
+    results = []
+    for level in levels:
+        if level not in LEVELS:
+            raise ValueError(f"Unknown telemetry level '{level}'. Supported: {', '.join(LEVELS)}.")
+        for clients in concurrency:
+            results.append(measure_level(level, engine, clients, duration, warmup))
+
+    baselines = {r["concurrency"]: r for r in results if r["level"] == "off"}
+    for result in results:
+        baseline = baselines.get(result["concurrency"])
+        if baseline is None or not result["requests"]:
+            continue
+        result["overhead_p50_ms"] = result["p50_ms"] - baseline["p50_ms"]
+        if result["cpu_ms_per_request"] is not None and baseline["cpu_ms_per_request"] is not None:
+            result["overhead_cpu_ms"] = result["cpu_ms_per_request"] - baseline["cpu_ms_per_request"]
+        logger.info(
+            f"telemetry {result['level']} x{result['concurrency']}: p50 {result['overhead_p50_ms']:+.3f} ms, "
+            f"CPU {result.get('overhead_cpu_ms', 0):+.3f} ms per request over 'off'"
+        )
+    return results
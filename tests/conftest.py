@@ -8,7 +8,7 @@ import json
 import app.main as main_module
 
 @pytest.fixture
-def client(mocker):
+def client(mocker, tmp_path_factory):
     """
     A robust fixture that provides a configured TestClient for the API.
     It patches the global ML assets in the `main` module before the app starts.
@@ -32,8 +32,13 @@ def client(mocker):
     mocker.patch("app.main.json.load", return_value=mock_feature_list)
 
     # 4. Mock OTLP Exporters to prevent actual HTTP calls during tests.
-    mocker.patch("app.main.OTLPSpanExporter", return_value=MagicMock())
-    mocker.patch("app.main.OTLPLogExporter", return_value=MagicMock())
+    mocker.patch("app.telemetry.OTLPSpanExporter", return_value=MagicMock())
+    mocker.patch("app.telemetry.OTLPLogExporter", return_value=MagicMock())
+
+    # The mocked model returns mocks, not probabilities, so the startup warm-up is skipped.
+    mocker.patch.object(main_module, "MODEL_WARMUP_ROWS", 0)
+    # Batch jobs are spooled to a directory of the test's own.
+    mocker.patch.object(main_module, "BATCH_JOBS_DIR", str(tmp_path_factory.mktemp("jobs")))
 
     # 5. Now, with all patches in place, safely create the TestClient.
     from app.main import app
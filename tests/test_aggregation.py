@@ -0,0 +1,160 @@
+# tests/test_aggregation.py
+import io
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+from app.aggregation import DeviceRateStore, RowKeys, VerdictAggregator, split_key_columns
+from app.batch_formats import MEDIA_TYPE_SUMMARY
+from app.csv_decoder import CsvRowError
+
+
+def test_chunked_summary_equals_whole_batch_summary():
+    """Tests that aggregating chunk by chunk gives exactly the summary of the whole batch."""
+    rng = np.random.default_rng(0)
+    probabilities = rng.random(1000)
+    keys = RowKeys(rng.choice(["cam", "bell", "plug"], 1000), rng.uniform(0, 600, 1000))
+
+    whole = VerdictAggregator(0.5, top_k=5, window_seconds=120)
+    whole.add(probabilities, keys)
+    chunked = VerdictAggregator(0.5, top_k=5, window_seconds=120)
+    for start in range(0, 1000, 128):
+        chunk = slice(start, start + 128)
+        chunked.add(probabilities[chunk], RowKeys(keys.devices[chunk], keys.timestamps[chunk]))
+
+    summary = whole.summary()
+    assert chunked.summary() == summary
+    assert summary["attacks"] == int((probabilities > 0.5).sum())
+    assert sum(summary["probability_histogram"]["counts"]) == 1000
+    assert [entry["index"] for entry in summary["top_k"]] == np.argsort(-probabilities)[:5].tolist()
+    cam = next(entry for entry in summary["devices"] if entry["device"] == "cam")
+    assert cam["rows"] == int((keys.devices == "cam").sum())
+    assert [window["start"] for window in cam["windows"]] == [0.0, 120.0, 240.0, 360.0, 480.0]
+
+
+def test_summary_without_keys_has_no_groups():
+    """Tests that a summary of plain rows has no device or window breakdown."""
+    aggregator = VerdictAggregator(0.5, histogram_bins=4, top_k=2)
+    aggregator.add(np.array([0.1, 0.9, 0.6, 1.0]))
+
+    summary = aggregator.summary()
+    assert summary["probability_histogram"] == {"edges": [0.0, 0.25, 0.5, 0.75, 1.0], "counts": [1, 0, 1, 2]}
+    assert summary["top_k"] == [{"index": 3, "probability_attack": 1.0}, {"index": 1, "probability_attack": 0.9}]
+    assert "devices" not in summary and "windows" not in summary
+
+
+def test_key_columns_are_split_and_bad_timestamps_reported():
+    """Tests that leading device and timestamp columns are split off, and a bad timestamp names its row."""
+    keys, features = split_key_columns([b"cam,1.5,0.1,0.2", b" bell ,2,0.3,0.4"], np.array([1, 3]), True, True)
+    assert keys.devices.tolist() == ["cam", "bell"] and keys.timestamps.tolist() == [1.5, 2.0]
+    assert features == [b"0.1,0.2", b"0.3,0.4"]
+
+    with pytest.raises(CsvRowError, match="Row 3: could not parse timestamp 'soon'"):
+        split_key_columns([b"cam,1.5,0.1", b"bell,soon,0.3"], np.array([1, 3]), True, True)
+
+
+def test_device_store_rolls_buckets_over():
+    """Tests that ring buffer columns are reused by newer buckets and windows only count recent buckets."""
+    store = DeviceRateStore(bucket_seconds=10, buckets=3)
+    store.record(np.array(["cam"] * 4), np.array([0, 5, 12, 25]), np.array([True, True, False, True]))
+    assert [b["start"] for b in store.device("cam")["buckets"]] == [0.0, 10.0, 20.0]
+
+    # Bucket 3 takes the column of bucket 0; a row older than the kept buckets is dropped.
+    store.record(np.array(["cam", "cam"]), np.array([31, 1]), np.array([False, True]))
+    cam = store.device("cam")
+    assert [(b["start"], b["rows"], b["attacks"]) for b in cam["buckets"]] == [(10.0, 1, 0), (20.0, 1, 1), (30.0, 1, 0)]
+    assert store.device("cam", window_seconds=10)["rows"] == 1
+    assert store.rates(window_seconds=20) == [
+        {"device": "cam", "rows": 2, "attacks": 1, "attack_rate": 0.5, "last_seen": 30.0}
+    ]
+
+
+def test_device_store_evicts_the_least_recently_seen_device():
+    """Tests that a full store makes room for a new device by evicting the one seen longest ago."""
+    store = DeviceRateStore(bucket_seconds=10, buckets=6, max_devices=2)
+    store.record(np.array(["a", "b"]), np.array([0, 10]), np.array([True, False]))
+    store.record(np.array(["c"]), np.array([20]), np.array([True]))
+
+    assert len(store) == 2 and store.device("a") is None
+    assert [entry["device"] for entry in store.rates()] == ["c", "b"]
+
+
+@pytest.fixture
+def scoring_mocks(client: TestClient):
+    """P(attack) is the first feature, through an identity scaler."""
+    main_module.scaler.transform.side_effect = lambda x: x
+    main_module.lgbm_model.predict_proba.side_effect = lambda x: np.column_stack([1 - x[:, 0], x[:, 0]])
+    return client
+
+
+def keyed_csv(rows):
+    return "\n".join(f"{device},{timestamp}," + ",".join([str(p)] + ["0.5"] * 114) for device, timestamp, p in rows)
+
+
+ROWS = [("cam", 0, 0.9), ("bell", 10, 0.2), ("cam", 70, 0.8), ("cam", 75, 0.1), ("bell", 80, 0.7)]
+
+
+def test_predict_batch_summary_by_device_and_window(scoring_mocks: TestClient):
+    """Tests the summary format of /predict_batch with device and timestamp columns."""
+    response = scoring_mocks.post(
+        "/predict_batch?device_column=true&timestamp_column=true&top_k=2",
+        files={"file": ("x.csv", io.BytesIO(keyed_csv(ROWS).encode()), "text/csv")},
+        headers={"Accept": MEDIA_TYPE_SUMMARY},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == MEDIA_TYPE_SUMMARY
+    summary = response.json()
+    assert (summary["rows"], summary["attacks"]) == (5, 3)
+    assert [entry["index"] for entry in summary["top_k"]] == [0, 2]
+    cam, bell = summary["devices"]
+    assert (cam["device"], cam["rows"], cam["attacks"]) == ("cam", 3, 2)
+    assert [(w["start"], w["rows"], w["attacks"]) for w in cam["windows"]] == [(0.0, 1, 1), (60.0, 2, 1)]
+    assert (bell["device"], bell["attacks"]) == ("bell", 1)
+
+    # The rows also went into the rolling per-device rates.
+    rates = scoring_mocks.get("/devices/attack_rates").json()["devices"]
+    assert [(entry["device"], entry["rows"], entry["attacks"]) for entry in rates] == [("cam", 3, 2), ("bell", 2, 1)]
+    assert scoring_mocks.get("/devices/cam/attack_rate").json()["attacks"] == 2
+    assert scoring_mocks.get("/devices/router/attack_rate").status_code == 404
+
+
+def test_device_rates_are_off_with_prefork_workers(mocker, request):
+    """Tests that with several pre-forked workers keyed uploads are scored but /devices answers 503."""
+    mocker.patch.object(main_module, "prefork_workers", 2)
+    client = request.getfixturevalue("scoring_mocks")
+
+    response = client.post(
+        "/predict_batch?device_column=true&timestamp_column=true",
+        files={"file": ("x.csv", io.BytesIO(keyed_csv(ROWS).encode()), "text/csv")},
+    )
+
+    assert response.status_code == 200 and len(response.json()) == len(ROWS)
+    for path in ("/devices/attack_rates", "/devices/cam/attack_rate"):
+        rates = client.get(path)
+        assert rates.status_code == 503 and "2 pre-forked workers" in rates.json()["detail"]
+
+
+def test_stream_summary_matches_batch_summary(scoring_mocks: TestClient, mocker):
+    """Tests that format=summary on the streaming endpoint aggregates across chunks like /predict_batch."""
+    mocker.patch.object(main_module, "STREAM_CHUNK_ROWS", 2)
+    upload = keyed_csv(ROWS).encode()
+    query = "device_column=true&timestamp_column=true"
+
+    streamed = scoring_mocks.post(f"/predict_batch/stream?format=summary&{query}",
+                                  files={"file": ("x.csv", io.BytesIO(upload), "text/csv")})
+    batch = scoring_mocks.post(f"/predict_batch?{query}", files={"file": ("x.csv", io.BytesIO(upload), "text/csv")},
+                               headers={"Accept": MEDIA_TYPE_SUMMARY})
+
+    assert streamed.status_code == 200
+    assert streamed.json() == batch.json()
+
+    # Errors in later chunks still get a status code, as nothing has been sent yet.
+    bad = upload + b"\ncam,not-a-time," + b",".join([b"0.5"] * 115)
+    response = scoring_mocks.post(f"/predict_batch/stream?format=summary&{query}",
+                                  files={"file": ("x.csv", io.BytesIO(bad), "text/csv")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Row 6: could not parse timestamp 'not-a-time'."
@@ -0,0 +1,107 @@
+# tests/test_artifact.py
+import os
+import struct
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+# Import the main module to access its mocked globals and asset paths
+import app.main as main_module
+from app.artifact import (
+    ArtifactError, DEFAULT_ARTIFACT_PATH, FORMAT_VERSION, MAGIC, build_artifact, load_artifact,
+)
+
+EXAMPLE_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "example.csv")
+
+
+@pytest.fixture(scope="module")
+def reference():
+    """Raw example rows plus perturbed copies, with the full pipeline's probabilities."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        scaler = joblib.load(main_module.SCALER_PATH)
+        model = joblib.load(main_module.MODEL_PATH)
+        features_np = pd.read_csv(EXAMPLE_CSV_PATH, header=None).values
+        rng = np.random.default_rng(0)
+        perturbed = features_np[rng.integers(0, len(features_np), 5000)] * rng.lognormal(0, 1, (5000, 115))
+        perturbed[rng.random(perturbed.shape) < 0.01] = np.nan
+        rows = np.vstack([features_np, perturbed])
+        expected = model.predict_proba(scaler.transform(rows))
+    return rows, expected
+
+
+@pytest.fixture
+def built_artifact(tmp_path):
+    path = str(tmp_path / "model.nbm")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        build_artifact(main_module.MODEL_PATH, main_module.SCALER_PATH, main_module.FEATURE_LIST_PATH, path)
+    return path
+
+
+def test_artifact_with_folded_scaler_matches_full_pipeline(built_artifact, reference):
+    """Tests that raw rows scored by the artifact match scaler.transform + predict_proba."""
+    rows, expected = reference
+    ensemble, feature_list = load_artifact(built_artifact)
+
+    assert len(feature_list) == 115
+    assert not ensemble.threshold.flags.writeable
+    np.testing.assert_allclose(ensemble.predict_proba(rows), expected, rtol=0, atol=1e-12)
+
+
+def test_shipped_artifact_is_up_to_date(reference):
+    """Tests that the committed artifact was built from the committed model and scaler."""
+    rows, expected = reference
+    ensemble, _ = load_artifact(DEFAULT_ARTIFACT_PATH)
+
+    np.testing.assert_allclose(ensemble.predict_proba(rows), expected, rtol=0, atol=1e-12)
+
+
+def test_corrupted_artifact_fails_checksum(built_artifact):
+    """Tests that a flipped payload byte is detected."""
+    with open(built_artifact, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    with pytest.raises(ArtifactError, match="checksum"):
+        load_artifact(built_artifact)
+
+
+def test_unknown_artifact_version_is_rejected(built_artifact):
+    """Tests that artifacts from another format version are refused."""
+    with open(built_artifact, "r+b") as f:
+        f.seek(len(MAGIC))
+        f.write(struct.pack("<I", FORMAT_VERSION + 1))
+
+    with pytest.raises(ArtifactError, match="version"):
+        load_artifact(built_artifact)
+
+
+@pytest.fixture
+def artifact_client(mocker, request):
+    """Provides the API client with the artifact engine selected at startup."""
+    mock_ensemble = mocker.MagicMock()
+    mocker.patch.object(main_module, "INFERENCE_ENGINE", "artifact")
+    mocker.patch("app.main.load_artifact", return_value=(mock_ensemble, ["feature_" + str(i) for i in range(115)]))
+    client = request.getfixturevalue("client")
+    # Nothing but the artifact is loaded in this mode.
+    mocker.patch.object(main_module, "scaler", None)
+    mocker.patch.object(main_module, "lgbm_model", None)
+    return client, mock_ensemble
+
+
+def test_predict_single_with_artifact_skips_scaling(artifact_client):
+    """Tests that the artifact engine scores raw vectors without a scaler."""
+    client, mock_ensemble = artifact_client
+    mock_ensemble.predict_proba.return_value = np.array([[0.2, 0.8]])
+
+    response = client.post("/predict", json={"features": [0.1] * 115})
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "Attack"
+    scored = mock_ensemble.predict_proba.call_args[0][0]
+    np.testing.assert_array_equal(scored, np.full((1, 115), 0.1))
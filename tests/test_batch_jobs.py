@@ -0,0 +1,219 @@
+# tests/test_batch_jobs.py
+import io
+import threading
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+# Import the main module to configure the app under test
+import app.main as main_module
+from app.batch_jobs import (
+    FORMAT_CSV, FORMAT_FLOAT32, STATUS_COMPLETED, STATUS_FAILED, BatchJobManager, InvalidJobInput, load_results,
+)
+from app.binary_input import MEDIA_TYPE_FLOAT32
+from app.inference_executor import Overloaded
+
+
+def mean_score(features_np, model_version):
+    """A stand-in model: P(attack) is the row mean."""
+    return features_np.mean(axis=1)
+
+
+def submit(manager: BatchJobManager, format: str, data: bytes, n_features: int = 3) -> str:
+    job_id = manager.create(format, "v1", n_features)
+    with open(manager.input_path(job_id), "wb") as f:
+        f.write(data)
+    manager.submit(job_id)
+    return job_id
+
+
+def wait_for(manager: BatchJobManager, job_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while (job := manager.status(job_id))["status"] not in (STATUS_COMPLETED, STATUS_FAILED):
+        assert time.monotonic() < deadline, f"job still {job['status']}"
+        time.sleep(0.01)
+    return job
+
+
+@pytest.fixture
+def rows():
+    return np.random.default_rng(0).random((25, 3))
+
+
+def csv_of(rows: np.ndarray) -> bytes:
+    return "".join(",".join(repr(v) for v in row) + "\n" for row in rows.tolist()).encode()
+
+
+def test_csv_job_is_scored_in_chunks(tmp_path, rows):
+    """Tests that a CSV job is scored chunk by chunk and its results keep the upload's row order."""
+    manager = BatchJobManager(str(tmp_path), mean_score, chunk_rows=4, poll_seconds=0.05)
+    manager.start()
+    try:
+        job_id = submit(manager, FORMAT_CSV, csv_of(rows))
+        job = wait_for(manager, job_id)
+    finally:
+        manager.stop()
+
+    assert job["status"] == STATUS_COMPLETED and job["rows_done"] == 25 and job["progress"] == 1.0
+    assert job["rows_per_second"] > 0
+    results = load_results(manager.results_path(job_id))
+    np.testing.assert_array_equal(results["probability_attack"], rows.mean(axis=1).astype(np.float32))
+    np.testing.assert_array_equal(results["prediction_label"], (results["probability_attack"] > 0.5).astype(np.uint8))
+    # Only the results are kept once the job is done.
+    assert sorted(p.name for p in (tmp_path / job_id).iterdir()) == ["job.json", "lock", "results.npz"]
+
+
+def test_binary_job_reports_total_rows_and_rejects_partial_rows(tmp_path, rows):
+    """Tests that packed float32 jobs know their row count and that truncated uploads are refused."""
+    manager = BatchJobManager(str(tmp_path), mean_score, chunk_rows=10, poll_seconds=0.05)
+    data = rows.astype("<f4").tobytes()
+
+    with pytest.raises(InvalidJobInput, match="not a multiple of 3 float32 values"):
+        submit(manager, FORMAT_FLOAT32, data[:-4])
+    assert list(tmp_path.iterdir()) == []
+
+    manager.start()
+    try:
+        job = wait_for(manager, submit(manager, FORMAT_FLOAT32, data))
+    finally:
+        manager.stop()
+    assert job["status"] == STATUS_COMPLETED and job["total_rows"] == job["rows_done"] == 25
+
+
+def test_bad_row_fails_the_job_with_its_line_number(tmp_path, rows):
+    """Tests that a malformed line in a later chunk fails the job, naming that line."""
+    lines = csv_of(rows).split(b"\n")
+    lines[17] = b"1,2"
+    manager = BatchJobManager(str(tmp_path), mean_score, chunk_rows=4, poll_seconds=0.05)
+    manager.start()
+    try:
+        job = wait_for(manager, submit(manager, FORMAT_CSV, b"\n".join(lines)))
+    finally:
+        manager.stop()
+
+    assert job["status"] == STATUS_FAILED
+    assert job["error"] == "Row 18: expected 3 columns, got 2."
+    assert job["rows_done"] == 16
+
+
+def test_interrupted_job_resumes_from_its_last_chunk(tmp_path, rows):
+    """Tests that a restarted manager scores only the chunks the previous one had not recorded."""
+    scored = []
+    first = BatchJobManager(str(tmp_path), None, chunk_rows=4, poll_seconds=0.05)
+
+    def score_then_stop(features_np, model_version):
+        scored.append(len(features_np))
+        if len(scored) == 3:
+            first._stop.set()  # shut down while the third chunk is being scored
+        return mean_score(features_np, model_version)
+
+    first.score_fn = score_then_stop
+    first.start()
+    job_id = submit(first, FORMAT_CSV, csv_of(rows))
+    deadline = time.monotonic() + 10
+    while len(scored) < 3 or any(thread.is_alive() for thread in first._threads):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    first.stop()
+    assert first.status(job_id)["rows_done"] == 12
+    # Results written by a crashed worker after the last recorded chunk are discarded on resume.
+    with open(tmp_path / job_id / "probabilities.f4", "ab") as f:
+        f.write(np.ones(4, dtype="<f4").tobytes())
+
+    resumed = []
+    second = BatchJobManager(str(tmp_path), lambda f, v: resumed.append(len(f)) or mean_score(f, v),
+                             chunk_rows=4, poll_seconds=0.05)
+    second.start()
+    try:
+        job = wait_for(second, job_id)
+    finally:
+        second.stop()
+
+    assert job["status"] == STATUS_COMPLETED and sum(resumed) == 13
+    results = load_results(second.results_path(job_id))
+    np.testing.assert_array_equal(results["probability_attack"], rows.mean(axis=1).astype(np.float32))
+
+
+def test_shed_chunks_are_retried(tmp_path, rows):
+    """Tests that a chunk shed by an overloaded executor is retried rather than failing the job."""
+    runner = MagicMock(side_effect=[Overloaded(0), Overloaded(0)] + [mean_score(rows, "v1")])
+    manager = BatchJobManager(str(tmp_path), mean_score, chunk_rows=100, poll_seconds=0.05, runner=runner)
+    manager.start()
+    try:
+        job = wait_for(manager, submit(manager, FORMAT_CSV, csv_of(rows)))
+    finally:
+        manager.stop()
+
+    assert job["status"] == STATUS_COMPLETED and runner.call_count == 3
+
+
+def test_workers_wait_until_ready(tmp_path, rows):
+    """Tests that queued jobs are not started before the manager reports ready."""
+    ready = threading.Event()
+    manager = BatchJobManager(str(tmp_path), mean_score, poll_seconds=0.05, ready=ready.is_set)
+    manager.start()
+    try:
+        job_id = submit(manager, FORMAT_CSV, csv_of(rows))
+        time.sleep(0.2)
+        assert manager.status(job_id)["status"] == "queued"
+        ready.set()
+        assert wait_for(manager, job_id)["status"] == STATUS_COMPLETED
+    finally:
+        manager.stop()
+
+
+@pytest.fixture
+def jobs_client(mocker, tmp_path):
+    """The app with the real artifact engine (the conftest client mocks file access)."""
+    mocker.patch.object(main_module, "INFERENCE_ENGINE", "artifact")
+    mocker.patch.object(main_module, "BATCH_JOBS_DIR", str(tmp_path))
+    mocker.patch.object(main_module, "BATCH_JOB_CHUNK_ROWS", 7)
+    mocker.patch("app.telemetry.OTLPSpanExporter", return_value=MagicMock())
+    mocker.patch("app.telemetry.OTLPLogExporter", return_value=MagicMock())
+    with TestClient(main_module.app) as c:
+        yield c
+
+
+def test_job_endpoints_match_predict_batch(jobs_client: TestClient):
+    """Tests submitting, polling and downloading a job, whose verdicts match /predict_batch."""
+    features = np.random.default_rng(1).random((30, 115)) * 100
+    csv_data = "\n".join(",".join(map(str, row)) for row in features.tolist()).encode()
+    expected = jobs_client.post("/predict_batch", files={"file": ("x.csv", io.BytesIO(csv_data), "text/csv")}).json()
+
+    jobs = [
+        jobs_client.post("/jobs", content=csv_data, headers={"Content-Type": "text/csv"}),
+        jobs_client.post("/jobs", files={"file": ("x.csv", io.BytesIO(csv_data), "text/csv")}),
+        jobs_client.post("/jobs", content=features.astype("<f4").tobytes(), headers={"Content-Type": MEDIA_TYPE_FLOAT32}),
+    ]
+    for response in jobs:
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.headers["location"] == f"/jobs/{job_id}"
+
+        deadline = time.monotonic() + 10
+        while (job := jobs_client.get(f"/jobs/{job_id}").json())["status"] != STATUS_COMPLETED:
+            assert job["status"] != STATUS_FAILED and time.monotonic() < deadline
+            time.sleep(0.02)
+        assert job["rows_done"] == 30
+
+        download = jobs_client.get(f"/jobs/{job_id}/results")
+        assert download.status_code == 200
+        with np.load(io.BytesIO(download.content)) as results:
+            assert results["prediction_label"].tolist() == [row["prediction_label"] for row in expected]
+            np.testing.assert_allclose(results["probability_attack"], [row["probability_attack"] for row in expected],
+                                       rtol=1e-5)
+
+        assert jobs_client.delete(f"/jobs/{job_id}").status_code == 204
+        assert jobs_client.get(f"/jobs/{job_id}").status_code == 404
+
+
+def test_job_endpoints_reject_bad_requests(jobs_client: TestClient):
+    """Tests the errors of the job endpoints: content type, partial rows, unknown jobs."""
+    assert jobs_client.post("/jobs", content=b"{}", headers={"Content-Type": "application/json"}).status_code == 415
+    partial = jobs_client.post("/jobs", content=b"\0" * 12, headers={"Content-Type": MEDIA_TYPE_FLOAT32})
+    assert partial.status_code == 400 and "not a multiple" in partial.json()["detail"]
+    assert jobs_client.get("/jobs/0123456789abcdef0123456789abcdef").status_code == 404
+    assert jobs_client.get("/jobs/..%2F..%2Fetc/results").status_code == 404
@@ -0,0 +1,107 @@
+# tests/test_benchmarks.py
+import json
+import warnings
+import pytest
+
+# Import the main module to access its asset paths
+import app.main as main_module
+from benchmarks import run as run_module
+from benchmarks.compare import compare
+from benchmarks.csv_decode import run_csv_benchmarks
+from benchmarks.load import run_load, serve_in_process
+from benchmarks.stages import STAGES, run_stage_benchmarks
+from benchmarks.startup import measure_import, measure_startup
+from benchmarks.telemetry import run_telemetry_benchmarks
+
+
+@pytest.fixture(scope="module")
+def version():
+    """The shipped LightGBM version, loaded like the API does."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return main_module.load_model_version("lightgbm")
+
+
+def test_stage_benchmarks_cover_every_stage_and_cap_text_stages(version):
+    """Tests that every stage is timed per size and text stages stop at max_text_rows."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        results = run_stage_benchmarks(version, sizes=[1, 20], max_text_rows=10, min_time=0)
+
+    timed = {(r["stage"], r["rows"]) for r in results}
+    assert {(stage, 1) for stage in STAGES} <= timed
+    assert ("csv_parse", 20) not in timed and ("predict", 20) in timed
+    assert all(r["median_s"] > 0 and r["repeats"] >= 3 for r in results)
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """Tests that slower stages, higher latency and lower RPS count as regressions."""
+    baseline = {
+        "stages": [{"stage": "predict", "rows": 100, "median_s": 1.0}, {"stage": "scale", "rows": 100, "median_s": 1.0}],
+        "load": [{"endpoint": "/predict", "concurrency": 1, "rows_per_request": 1, "p50_ms": 5.0, "p99_ms": 9.0, "rps": 100.0}],
+    }
+    current = {
+        "stages": [{"stage": "predict", "rows": 100, "median_s": 1.05}, {"stage": "scale", "rows": 100, "median_s": 1.5}],
+        "load": [{"endpoint": "/predict", "concurrency": 1, "rows_per_request": 1, "p50_ms": 4.0, "p99_ms": 9.0, "rps": 80.0}],
+    }
+
+    regressions = {(r["key"], r["metric"]) for r in compare(baseline, current, tolerance=0.1) if r.get("regression")}
+
+    assert regressions == {(("scale", 100), "median_s"), (("/predict", 1, 1), "rps")}
+
+
+def test_load_generator_against_in_process_server():
+    """Tests that the load generator reports latency percentiles from the real app."""
+    with serve_in_process() as url:
+        result = run_load(url, "/predict_batch", concurrency=2, duration=0.5, batch_rows=10, warmup=0)
+
+    assert result["requests"] > 0 and result["errors"] == 0
+    assert result["p50_ms"] <= result["p99_ms"]
+
+
+def test_run_cli_writes_results_file(tmp_path):
+    """Tests that the CLI writes environment and stage results as JSON."""
+    output = tmp_path / "results.json"
+
+    assert run_module.main(["--suite", "stages", "--sizes", "1,5", "--stages", "scale,predict", "--min-time", "0",
+                            "--output", str(output)]) == 0
+
+    results = json.loads(output.read_text())
+    assert results["environment"]["lightgbm"]
+    assert [(r["stage"], r["rows"]) for r in results["stages"]] == [("scale", 1), ("predict", 1), ("scale", 5), ("predict", 5)]
+
+
+def test_csv_benchmark_times_read_csv_and_each_thread_count():
+    """Tests that the CSV benchmark times read_csv and the decoder per thread count, relative to read_csv."""
+    results = run_csv_benchmarks(sizes=[50], threads=[1, 2], min_time=0)
+
+    assert [(r["parser"], r["threads"], r["rows"]) for r in results] == [
+        ("read_csv", 1, 50), ("decode_csv", 1, 50), ("decode_csv", 2, 50)]
+    assert results[0]["speedup"] == 1.0
+    assert all(r["median_s"] > 0 and r["mb_per_s"] > 0 for r in results)
+
+
+def test_import_benchmark_finds_no_heavy_libraries():
+    """Tests that importing the API in a new interpreter imports none of the heavy libraries."""
+    result = measure_import("app.main", repeats=1)
+
+    assert result["heavy_modules"] == []
+    assert result["median_s"] > 0 and result["slowest_imports"]
+
+
+@pytest.mark.parametrize("background_load", [False, True])
+def test_startup_benchmark_times_liveness_and_readiness(background_load):
+    """Tests that the startup benchmark launches a server and times both probes."""
+    result = measure_startup("artifact", background_load=background_load, timeout=60)
+
+    assert 0 < result["live_s"] <= result["ready_s"]
+
+
+def test_telemetry_benchmark_exports_to_the_stub_receiver():
+    """Tests that each level is measured on its own server and only the traced one exports spans."""
+    results = run_telemetry_benchmarks(["off", "traced"], engine="artifact", concurrency=[1], duration=0.5, warmup=0)
+
+    off, traced = results
+    assert off["requests"] > 0 and off["errors"] == 0 and off["overhead_p50_ms"] == 0
+    assert off["exported"] == {}
+    assert traced["exported"]["traces"]["requests"] > 0 and "overhead_p50_ms" in traced
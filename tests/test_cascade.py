@@ -0,0 +1,108 @@
+# tests/test_cascade.py
+import json
+import os
+import pickle
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+# Import the main module to access its asset paths
+import app.main as main_module
+from app import cascade as cascade_module
+from app.cascade import CascadeModel, calibrate
+from app.tree_engine import TreeEnsemble
+
+EXAMPLE_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "example.csv")
+
+
+@pytest.fixture(scope="module")
+def reference():
+    """The shipped model with scaled rows of example.csv, perturbed across split thresholds."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        scaler = joblib.load(main_module.SCALER_PATH)
+        model = joblib.load(main_module.MODEL_PATH)
+    scaled = scaler.transform(pd.read_csv(EXAMPLE_CSV_PATH, header=None).values)
+    rng = np.random.default_rng(0)
+    rows = scaled[rng.integers(0, len(scaled), 5000)] * rng.lognormal(0, 1, (5000, 115))
+    return model, rows
+
+
+def test_partial_margins_add_up_to_full_margin(reference):
+    """Tests that tree-range margins of the native engine sum to the full margin."""
+    model, rows = reference
+    ensemble = TreeEnsemble.from_booster(model.booster_)
+
+    parts = ensemble.predict_margin(rows, 0, 7) + ensemble.predict_margin(rows, 7)
+
+    np.testing.assert_allclose(parts, ensemble.predict_margin(rows), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("native", [False, True])
+def test_calibrated_cascade_matches_full_model_decisions(reference, native):
+    """Tests that calibrated early exits reproduce every full-model decision on the reference set."""
+    model, rows = reference
+    target = TreeEnsemble.from_booster(model.booster_) if native else model
+    calibration = calibrate(target, rows, stages=[3, 10], timing_repeats=1)
+    cascade = CascadeModel.from_calibration(target, calibration)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = model.predict_proba(rows)[:, 1] > 0.5
+    probabilities = cascade.predict_proba(rows)[:, 1]
+
+    assert calibration["report"]["decision_agreement"] == 1.0
+    assert np.array_equal(probabilities > 0.5, expected)
+    assert cascade.exits[0] > 0
+    assert cascade.average_trees_per_row < cascade.num_trees
+
+
+def test_cascade_rejects_mismatched_calibration(reference):
+    """Tests that a calibration for another ensemble size or threshold is refused."""
+    model, rows = reference
+    calibration = calibrate(model, rows[:100], timing_repeats=1)
+
+    with pytest.raises(ValueError):
+        CascadeModel.from_calibration(model, dict(calibration, num_trees=99))
+    with pytest.raises(ValueError):
+        CascadeModel.from_calibration(model, calibration, threshold=0.7)
+
+
+def test_calibration_cli_and_model_loading(reference, tmp_path, capsys):
+    """Tests that the CLI writes a calibration that load_model_version serves through."""
+    output = tmp_path / "cascade.json"
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert cascade_module.main(["--data", EXAMPLE_CSV_PATH, "--stages", "5", "--output", str(output)]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert {"average_trees_per_row", "tree_speedup", "measured_speedup"} <= report.keys()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        version = main_module.load_model_version("native", cascade_path=str(output))
+    assert version.model is version.cascade
+    assert version.describe()["cascade"]["stages"][0]["num_trees"] == 5
+    raw_rows = pd.read_csv(EXAMPLE_CSV_PATH, header=None).values
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = version.lgbm_model.predict_proba(version.scaler.transform(raw_rows))[:, 1] > 0.5
+    assert np.array_equal(version.score(raw_rows) > 0.5, expected)
+
+
+def _linear_margin(X, start, end):
+    return X[:, 0] * (end - start)
+
+
+def test_exit_counts_are_exact_under_concurrent_scoring():
+    """Tests that threads sharing one cascade lose no exit counts, and that it still pickles."""
+    cascade = CascadeModel(_linear_margin, num_trees=4, stages=[(1, 0.5)])
+    rows = np.linspace(-1, 1, 64).reshape(-1, 1)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: cascade.predict_margin(rows), range(400)))
+
+    assert cascade.rows_scored == 400 * len(rows)
+    assert pickle.loads(pickle.dumps(cascade)).exit_counts() == cascade.exit_counts()
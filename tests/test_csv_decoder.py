@@ -0,0 +1,117 @@
+# tests/test_csv_decoder.py
+import io
+import warnings
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.csv_decoder as csv_decoder
+from app.csv_decoder import CsvRowError, decode_csv
+
+ROWS = [
+    ["0.1", "3.29E-84", "-7", "1e5"],
+    ["2.5", "+.5", "1.", "-0.000123456789012345"],
+    ["1797693.1348623157", "6", "7.000000000000001", "8"],
+]
+
+
+def csv_text(rows, line_end="\n"):
+    return line_end.join(",".join(row) for row in rows).encode()
+
+
+def test_decode_matches_float():
+    """Tests that every value is parsed as Python's float() would, to the precision of pandas' parser."""
+    decoded = decode_csv(csv_text(ROWS), n_features=4)
+
+    assert decoded.dtype == np.float64
+    np.testing.assert_allclose(decoded, [[float(value) for value in row] for row in ROWS], rtol=1e-12, atol=0)
+
+
+def test_decode_to_float32():
+    """Tests that the decoder fills an array of the requested dtype."""
+    decoded = decode_csv(csv_text(ROWS), n_features=4, dtype=np.float32)
+
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, np.array([[float(v) for v in row] for row in ROWS], dtype=np.float32))
+
+
+def test_crlf_trailing_and_blank_lines_are_skipped():
+    """Tests that CRLF line ends, blank lines and trailing newlines do not produce rows."""
+    data = csv_text(ROWS[:1], "\r\n") + b"\r\n\r\n" + csv_text(ROWS[1:], "\r\n") + b"\r\n\r\n"
+
+    np.testing.assert_array_equal(decode_csv(data, n_features=4), decode_csv(csv_text(ROWS), n_features=4))
+    assert decode_csv(b"\n\n", n_features=4).shape == (0, 4)
+
+
+def test_whitespace_only_lines_are_skipped():
+    """Tests that a line of spaces is skipped like a blank one, by the fast and by the line-by-line path."""
+    np.testing.assert_array_equal(decode_csv(b"1,2,3\n   \n4,5,6\n", n_features=3), [[1, 2, 3], [4, 5, 6]])
+    decoded = decode_csv(b"1,,3\n \t \n4,5,6\n", n_features=3)
+    assert decoded.shape == (2, 3) and np.isnan(decoded[0, 1])
+    with pytest.raises(CsvRowError, match="Row 3:"):
+        decode_csv(b"1,2,3\n  \n4,5\n", n_features=3)
+
+
+def test_empty_fields_are_read_as_nan():
+    """Tests that an empty field is a missing value, as it was with pandas."""
+    decoded = decode_csv(b"1,,3\n4,5,6", n_features=3)
+
+    assert np.isnan(decoded[0, 1])
+    assert decoded[1].tolist() == [4.0, 5.0, 6.0]
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"1,2,3\n\n4,5\n", "Row 3: expected 3 columns, got 2."),
+    (b"1,2,3\n4,x5,6\n", "Row 2: could not parse 'x5' in column 2 as a number."),
+])
+def test_bad_rows_are_reported_by_line_number(data, message):
+    """Tests that the error names the line (counting blank ones) and, for a bad value, the column."""
+    with pytest.raises(CsvRowError, match=message) as error:
+        decode_csv(data, n_features=3)
+    assert error.value.row == int(message.split()[1][:-1])
+
+
+def test_threaded_decode_matches_single_thread(monkeypatch):
+    """Tests that decoding in several chunks gives the same matrix and the first bad row of a later chunk."""
+    monkeypatch.setattr(csv_decoder, "MIN_CHUNK_BYTES", 64)
+    rows = np.random.default_rng(0).normal(size=(200, 5))
+    data = "\n".join(",".join(repr(v) for v in row) for row in rows.tolist()).encode()
+
+    np.testing.assert_array_equal(decode_csv(data, n_features=5, threads=4), decode_csv(data, n_features=5))
+
+    lines = data.split(b"\n")
+    lines[150] = b"1,2,3"
+    with pytest.raises(CsvRowError, match="Row 151:"):
+        decode_csv(b"\n".join(lines), n_features=5, threads=4)
+
+
+def test_short_rows_are_not_padded():
+    """Tests that a row with too few values is reported rather than filled with NaN as read_csv would."""
+    with pytest.raises(CsvRowError, match="Row 2: expected 3 columns, got 2."):
+        decode_csv(b"1,2,3\n4,5\n6,7,8", n_features=3)
+
+
+def test_line_numbers_of_a_slice_are_reported_without_warnings():
+    """Tests that a slice of an upload reports its own line numbers and that bad data raises no DeprecationWarning."""
+    rows = np.random.default_rng(0).normal(size=(200, 5))
+    lines = "\n".join(",".join(repr(v) for v in row) for row in rows.tolist()).encode().split(b"\n")
+
+    np.testing.assert_allclose(decode_csv(b"\n".join(lines), n_features=5), rows, rtol=1e-12, atol=0)
+
+    lines[150] = b"1,2,3"
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        with pytest.raises(CsvRowError, match="Row 1151:"):
+            decode_csv(b"\n".join(lines), n_features=5, line_numbers=np.arange(1001, 1201))
+
+
+def test_predict_batch_reports_the_bad_row(client: TestClient):
+    """Tests that /predict_batch names the malformed row in its 400 response."""
+    good = ",".join(["0.1"] * 115)
+    csv_file = ("test.csv", io.BytesIO(f"{good}\n{good}\n{good[:-3]}abc".encode()), "text/csv")
+
+    response = client.post("/predict_batch", files={"file": csv_file})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Error parsing CSV file. Row 3: could not parse 'abc' in column 115 as a number."
@@ -0,0 +1,153 @@
+# tests/test_feature_extractor.py
+import json
+import math
+import pytest
+import numpy as np
+
+# Import the main module to access the asset paths
+import app.main as main_module
+from app.feature_extractor import LAMBDAS, FeatureExtractor, Packet, canonical_feature_names
+
+
+class ReferenceStat:
+    """Straightforward scalar damped statistic, one per key and window."""
+
+    def __init__(self, lam, t):
+        self.lam, self.t, self.w, self.cf1, self.cf2, self.residual = lam, t, 0.0, 0.0, 0.0, 0.0
+
+    def decay(self, t):
+        if t > self.t:
+            factor = 2 ** (-self.lam * (t - self.t))
+            self.w, self.cf1, self.cf2, self.t = self.w * factor, self.cf1 * factor, self.cf2 * factor, t
+
+    def insert(self, v, t):
+        self.decay(t)
+        self.w += 1
+        self.cf1 += v
+        self.cf2 += v * v
+        self.residual = v - self.mean()
+
+    def mean(self):
+        return self.cf1 / self.w if self.w else 0.0
+
+    def var(self):
+        return abs(self.cf2 / self.w - self.mean() ** 2) if self.w else 0.0
+
+
+def reference_features(packets):
+    stats, pairs, last_seen, rows = {}, {}, {}, []
+
+    def stat(group, key, lam, t):
+        return stats.setdefault((group, key, lam), ReferenceStat(lam, t))
+
+    def one_d(group, key, v, t):
+        out = []
+        for lam in LAMBDAS:
+            s = stat(group, key, lam, t)
+            s.insert(v, t)
+            out += [s.w, s.mean(), s.var()]
+        return out
+
+    def two_d(group, key, reverse, v, t):
+        out = []
+        for lam in LAMBDAS:
+            a = stat(group, key, lam, t)
+            a.insert(v, t)
+            b = stats.get((group, reverse, lam))
+            pair = pairs.setdefault((group, frozenset([key, reverse]), lam), ReferenceStat(lam, t))
+            pair.decay(t)
+            if b is not None:
+                b.decay(t)
+                pair.cf1 += a.residual * b.residual
+            wb, mb, vb = (b.w, b.mean(), b.var()) if b is not None else (0.0, 0.0, 0.0)
+            cov = pair.cf1 / (a.w + wb)
+            sa, sb = math.sqrt(a.var()), math.sqrt(vb)
+            out += [a.w, a.mean(), sa, math.sqrt(a.mean() ** 2 + mb ** 2), math.sqrt(a.var() ** 2 + vb ** 2),
+                    cov, cov / (sa * sb) if sa * sb > 0 else 0.0]
+        return out
+
+    for p in packets:
+        t, v = p.timestamp, float(p.size)
+        channel = (p.src_ip, p.dst_ip)
+        jitter = t - last_seen[channel] if channel in last_seen else 0.0
+        last_seen[channel] = t
+        rows.append(
+            one_d("MI", (p.src_mac, p.src_ip), v, t)
+            + one_d("H", p.src_ip, v, t)
+            + two_d("HH", channel, (p.dst_ip, p.src_ip), v, t)
+            + one_d("jit", channel, jitter, t)
+            + two_d("HpHp", (p.src_ip, p.src_port, p.dst_ip, p.dst_port),
+                    (p.dst_ip, p.dst_port, p.src_ip, p.src_port), v, t)
+        )
+    return np.array(rows)
+
+
+def random_packets(n, seed=0):
+    rng = np.random.default_rng(seed)
+    t, packets = 0.0, []
+    for _ in range(n):
+        t += float(rng.exponential(0.05))
+        a, b = rng.integers(0, 4, size=2)
+        packets.append(Packet(t, f"mac{a}", f"10.0.0.{a}", f"10.0.0.{b}", int(rng.integers(1000, 1003)), 80,
+                              float(rng.integers(60, 1500))))
+    return packets
+
+
+def test_feature_vector_follows_feature_list_order():
+    """Tests that vectors are emitted in lgbm_features.json order."""
+    with open(main_module.FEATURE_LIST_PATH) as f:
+        feature_list = json.load(f)
+    extractor = FeatureExtractor(feature_list)
+    canonical = FeatureExtractor()
+
+    packet = Packet(1.0, "aa", "10.0.0.1", "10.0.0.2", 1234, 80, 100)
+    vector = extractor.update(packet)
+    canonical_vector = canonical.update(packet)
+
+    assert sorted(feature_list) == sorted(canonical_feature_names())
+    assert vector.shape == (115,)
+    by_name = dict(zip(canonical_feature_names(), canonical_vector))
+    np.testing.assert_array_equal(vector, [by_name[name] for name in feature_list])
+
+
+def test_feature_extractor_matches_scalar_reference():
+    """Tests the array-backed store against a direct scalar implementation."""
+    packets = random_packets(300)
+
+    vectors = FeatureExtractor(capacity=2).transform(packets)
+
+    np.testing.assert_allclose(vectors, reference_features(packets), rtol=1e-9, atol=1e-9)
+
+
+def test_weights_decay_per_window():
+    """Tests the damped weight of two packets one second apart."""
+    extractor = FeatureExtractor()
+    extractor.update(Packet(0.0, "aa", "10.0.0.1", "10.0.0.2", 1234, 80, 100))
+    vector = extractor.update(Packet(1.0, "aa", "10.0.0.1", "10.0.0.2", 1234, 80, 300))
+    by_name = dict(zip(extractor.feature_list, vector))
+
+    assert by_name["H_L1_weight"] == pytest.approx(1.5)
+    assert by_name["H_L5_weight"] == pytest.approx(1 + 2 ** -5)
+    assert by_name["H_L1_mean"] == pytest.approx((50 + 300) / 1.5)
+    assert by_name["HH_jit_L1_mean"] == pytest.approx(1.0 / 1.5)
+
+
+def test_unknown_feature_names_are_rejected():
+    """Tests that a feature list the extractor cannot produce fails early."""
+    with pytest.raises(ValueError):
+        FeatureExtractor(["MI_dir_L5_weight", "not_a_feature"])
+
+
+def test_idle_keys_are_evicted():
+    """Tests that keys idle past the timeout are dropped and their slots reused."""
+    extractor = FeatureExtractor(idle_timeout=10.0, sweep_interval=5.0)
+    extractor.update(Packet(0.0, "aa", "10.0.0.1", "10.0.0.2", 1234, 80, 100))
+    keys_after_first = extractor.num_keys
+
+    extractor.update(Packet(20.0, "bb", "10.0.0.3", "10.0.0.4", 1234, 80, 100))
+
+    assert extractor.num_keys == keys_after_first
+    assert ("aa", "10.0.0.1") not in extractor.mi_dir.store.slots
+    # A returning host starts from fresh statistics.
+    vector = extractor.update(Packet(21.0, "aa", "10.0.0.1", "10.0.0.2", 1234, 80, 100))
+    assert dict(zip(extractor.feature_list, vector))["MI_dir_L0_01_weight"] == pytest.approx(1.0)
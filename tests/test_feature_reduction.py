@@ -0,0 +1,187 @@
+# tests/test_feature_reduction.py
+import json
+import os
+import warnings
+from unittest.mock import MagicMock
+
+import joblib
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+# Import the main module to access its asset paths and configure the app under test
+import app.main as main_module
+from app import feature_reduction
+from app.artifact import build_artifact, load_artifact
+from app.binary_input import MEDIA_TYPE_FLOAT32
+from app.csv_decoder import decode_csv
+from app.feature_reduction import analyze_features, build_reduced_model, kept_indices, reduce_ensemble
+from app.tree_engine import TreeEnsemble
+
+EXAMPLE_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "example.csv")
+
+
+@pytest.fixture(scope="module")
+def assets():
+    """The shipped model, scaler and feature list, with perturbed example rows whose H columns repeat MI_dir."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = joblib.load(main_module.MODEL_PATH)
+        scaler = joblib.load(main_module.SCALER_PATH)
+    with open(main_module.FEATURE_LIST_PATH) as f:
+        feature_list = json.load(f)
+    with open(EXAMPLE_CSV_PATH, "rb") as f:
+        example = decode_csv(f.read(), 115)
+    rng = np.random.default_rng(0)
+    rows = example[rng.integers(0, len(example), 2000)] * rng.lognormal(0, 1, (2000, 115))
+    rows[:, 15:30] = rows[:, 0:15]
+    return model, scaler, feature_list, rows
+
+
+def test_analysis_flags_unused_constant_and_duplicate_columns():
+    """Tests the analysis of a toy ensemble: one split per feature 0-3, feature 4 unused."""
+    ensemble = TreeEnsemble(
+        split_feature=np.array([0, 1, 2, 3, 0, 0, 0, 0, 0]),
+        threshold=np.array([0.5, 0.5, 0.5, 0.5] + [np.inf] * 5),
+        children=np.array([1, 2, 3, 4, 5, 6, 7, 8, 4, 4, 5, 5, 6, 6, 7, 7, 8, 8]),
+        default_left=np.ones(9, dtype=bool),
+        missing_type=np.zeros(9, dtype=np.int8),
+        node_value=np.array([0, 0, 0, 0, 1, 2, 3, 4, 5.0]),
+        roots=np.array([0]),
+        max_depth=3,
+        num_features=5,
+    )
+    reference = np.array([[0.1, 7.0, 0.1, 0.9, 3.0], [0.9, 7.0, 0.9, 0.2, 3.0], [0.3, 7.0, 0.3, 0.6, 3.0]])
+    names = ["a", "b", "a_copy", "c", "d"]
+
+    features = analyze_features(ensemble, names, reference, gain=np.array([10.0, 1.0, 5.0, 0.5, 0.0]), min_gain=0.1)
+
+    assert [entry["action"] for entry in features] == ["kept", "constant", "duplicate", "low_gain", "unused"]
+    assert features[2]["merged_into"] == "a" and features[4]["constant"] and features[1]["fill_value"] == 7.0
+    assert features[3]["fill_value"] == 0.6
+
+    reduced = reduce_ensemble(ensemble, features)
+    assert reduced.num_features == 1 and reduced.max_depth == 2
+    # b = 7 always goes right under the root's left child; a_copy splits the same way as a.
+    rows = np.array([[0.1], [0.9]])
+    np.testing.assert_array_equal(reduced.predict_margin(rows), [1.0, 3.0])
+    np.testing.assert_array_equal(ensemble.predict_margin(reference[:2]), reduced.predict_margin(rows))
+
+
+def test_reduced_model_is_exact_without_low_gain_drops(assets, tmp_path):
+    """Tests that dropping unused, constant and duplicate columns keeps every prediction on held-out rows."""
+    model, scaler, feature_list, rows = assets
+    path = str(tmp_path / "reduced.nbm")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = build_reduced_model(model, scaler, feature_list, rows, path)
+
+    report = result["report"]
+    assert report["evaluated_on"] == {"set": "holdout", "rows": 400, "analysis_rows": 1600, "holdout": 0.2, "seed": 0}
+    assert report["rows"] == 400
+    assert report["decision_agreement"] == 1.0 and report["max_abs_probability_difference"] < 1e-12
+    assert report["reduced_features"] < 80 and report["dropped"]["duplicate"] >= 1
+    assert report["float32_bytes_per_row"]["reduced"] == 4 * report["reduced_features"]
+    ensemble, kept = load_artifact(path)
+    assert kept == [feature_list[i] for i in kept_indices(result["features"])]
+    assert not any(name.startswith("H_") and f"MI_dir_{name[2:]}" in kept for name in kept)
+
+
+def test_parity_report_counts_the_cost_of_low_gain_drops(assets, tmp_path):
+    """Tests that dropping low-gain features shrinks the model further and the report shows the disagreements."""
+    model, scaler, feature_list, rows = assets
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        exact = build_reduced_model(model, scaler, feature_list, rows, str(tmp_path / "exact.nbm"))["report"]
+        lossy = build_reduced_model(model, scaler, feature_list, rows, str(tmp_path / "lossy.nbm"), min_gain=0.01)["report"]
+
+    assert lossy["reduced_features"] < exact["reduced_features"] and lossy["dropped"]["low_gain"] > 0
+    disagreements = sum(lossy["disagreements"].values())
+    assert lossy["decision_agreement"] == pytest.approx(1 - disagreements / lossy["rows"])
+    assert lossy["max_depth"]["reduced"] <= lossy["max_depth"]["full"]
+
+
+def test_cli_writes_artifact_and_report(assets, tmp_path):
+    """Tests that the CLI reads a reference CSV and writes the artifact and its JSON report, held out or on --eval-data."""
+    *_, rows = assets
+    data, evaluation = tmp_path / "reference.csv", tmp_path / "evaluation.npy"
+    data.write_text("\n".join(",".join(map(repr, row)) for row in rows[:200].tolist()))
+    np.save(evaluation, rows[200:250])
+    output = tmp_path / "reduced.nbm"
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert feature_reduction.main(["--data", str(data), "--output", str(output), "--holdout", "0.1"]) == 0
+        held_out = json.loads((tmp_path / "reduced.json").read_text())
+        assert feature_reduction.main(["--data", str(data), "--output", str(output), "--eval-data", str(evaluation)]) == 0
+        written = json.loads((tmp_path / "reduced.json").read_text())
+
+    assert held_out["report"]["evaluated_on"]["set"] == "holdout" and held_out["report"]["rows"] == 20
+    assert written["report"]["evaluated_on"] == {"set": "eval_data", "rows": 50, "analysis_rows": 200}
+    assert written["report"]["rows"] == 50 and len(written["features"]) == 115
+    assert load_artifact(str(output))[0].num_features == written["report"]["reduced_features"]
+
+
+def test_in_sample_parity_is_labelled(assets, tmp_path):
+    """Tests that holdout=0 analyses and evaluates on the whole reference set and says so."""
+    model, scaler, feature_list, rows = assets
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        report = build_reduced_model(model, scaler, feature_list, rows[:300], str(tmp_path / "r.nbm"), holdout=0)["report"]
+
+    assert report["evaluated_on"] == {"set": "reference", "rows": 300, "analysis_rows": 300}
+
+
+@pytest.fixture
+def reduced_client(mocker, tmp_path, assets):
+    """The app with the artifact engine and a reduced-feature model built from the reference rows."""
+    model, scaler, feature_list, rows = assets
+    full_path, reduced_path = str(tmp_path / "full.nbm"), str(tmp_path / "reduced.nbm")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        build_artifact(main_module.MODEL_PATH, main_module.SCALER_PATH, main_module.FEATURE_LIST_PATH, full_path)
+        build_reduced_model(model, scaler, feature_list, rows, reduced_path)
+    mocker.patch.object(main_module, "INFERENCE_ENGINE", "artifact")
+    mocker.patch.object(main_module, "MODEL_ARTIFACT_PATH", full_path)
+    mocker.patch.object(main_module, "REDUCED_MODEL_ENABLED", True)
+    mocker.patch.object(main_module, "REDUCED_MODEL_PATH", reduced_path)
+    mocker.patch.object(main_module, "BATCH_JOBS_DIR", str(tmp_path / "jobs"))
+    mocker.patch("app.telemetry.OTLPSpanExporter", return_value=MagicMock())
+    mocker.patch("app.telemetry.OTLPLogExporter", return_value=MagicMock())
+    with TestClient(main_module.app) as c:
+        yield c
+
+
+def test_predict_reduced_matches_predict_raw(reduced_client: TestClient, assets):
+    """Tests that the short vectors scored by /predict_reduced get the verdicts of the full vectors on /predict_raw."""
+    *_, feature_list, rows = assets
+    rows = rows[:50]
+    features = reduced_client.get("/predict_reduced/features").json()
+    kept = [feature_list.index(name) for name in features["features"]]
+    assert features["num_features"] == len(kept) < 115
+
+    expected = reduced_client.post("/predict_raw", content=rows.astype("<f8").tobytes(),
+                                   headers={"Content-Type": "application/vnd.nbiot.float64"}).json()
+    packed = reduced_client.post("/predict_reduced", content=rows[:, kept].astype("<f8").tobytes(),
+                                 headers={"Content-Type": "application/vnd.nbiot.float64"})
+    csv_body = "\n".join(",".join(map(repr, row)) for row in rows[:, kept].tolist())
+    text = reduced_client.post("/predict_reduced", content=csv_body, headers={"Content-Type": "text/csv"})
+
+    assert packed.status_code == text.status_code == 200
+    assert [row["prediction_label"] for row in packed.json()] == [row["prediction_label"] for row in expected]
+    np.testing.assert_allclose([row["probability_attack"] for row in text.json()],
+                               [row["probability_attack"] for row in expected], rtol=1e-9)
+
+    # Full-length vectors are refused.
+    full = reduced_client.post("/predict_reduced", content=rows[:1].astype("<f4").tobytes(),
+                               headers={"Content-Type": MEDIA_TYPE_FLOAT32})
+    assert full.status_code == 400 and "not a multiple" in full.json()["detail"]
+    bad = reduced_client.post("/predict_reduced", content=b"1,2", headers={"Content-Type": "text/csv"})
+    assert bad.status_code == 400 and bad.json()["detail"].startswith("Row 1:")
+
+
+def test_predict_reduced_is_not_found_when_disabled(client: TestClient):
+    """Tests that the reduced-feature endpoints answer 404 unless the model is enabled."""
+    assert client.get("/predict_reduced/features").status_code == 404
+    response = client.post("/predict_reduced", content=b"1,2", headers={"Content-Type": "text/csv"})
+    assert response.status_code == 404
@@ -0,0 +1,153 @@
+# tests/test_inference_executor.py
+import asyncio
+import threading
+import time
+import pytest
+import numpy as np
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+from app.binary_input import MEDIA_TYPE_FLOAT32
+from app.inference_executor import DeadlineExceeded, InferenceExecutor, Overloaded, threads_per_worker
+
+
+def test_executor_sheds_load_when_queue_is_full():
+    """Tests that submissions beyond workers + queue fail fast and are counted."""
+    release = threading.Event()
+    rejected = MagicMock()
+    executor = InferenceExecutor(max_workers=1, max_queue=1, rejected_counter=rejected)
+
+    running = executor.submit(release.wait)
+    queued = executor.submit(lambda: "queued")
+    with pytest.raises(Overloaded) as excinfo:
+        executor.submit(lambda: "rejected")
+    release.set()
+
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == "queued"
+    assert excinfo.value.retry_after == 1
+    rejected.labels.assert_called_with(reason="overloaded")
+    executor.shutdown()
+
+
+def test_executor_drops_queued_work_after_deadline():
+    """Tests that a job whose deadline passes while queued is never started."""
+    release = threading.Event()
+    started = []
+    executor = InferenceExecutor(max_workers=1, max_queue=4)
+    executor.submit(release.wait)
+
+    with pytest.raises(DeadlineExceeded):
+        executor.call(started.append, "late", deadline=time.monotonic() + 0.05)
+    release.set()
+    executor.submit(lambda: None).result(timeout=5)
+
+    assert started == []
+    assert executor.pending == 0
+    executor.shutdown()
+
+
+def test_executor_async_run_and_queue_depth_gauge():
+    """Tests that `run` awaits the result and the queue-depth gauge returns to zero."""
+    gauge = MagicMock()
+    executor = InferenceExecutor(max_workers=2, max_queue=2, queue_depth_gauge=gauge)
+
+    result = asyncio.run(executor.run(np.sum, np.arange(4)))
+
+    assert result == 6
+    gauge.set.assert_any_call(1)
+    executor.submit(lambda: None).result(timeout=5)
+    assert gauge.set.call_args[0][0] == 0
+    executor.shutdown()
+
+
+def test_threads_per_worker_splits_cpus():
+    """Tests that native threads are divided across workers, with at least one each."""
+    assert threads_per_worker(2, cpus=8) == 4
+    assert threads_per_worker(3, cpus=8) == 2
+    assert threads_per_worker(16, cpus=8) == 1
+
+
+def wait_until_busy(timeout=5.0):
+    """Waits until the app's inference executor has picked up a job."""
+    deadline = time.monotonic() + timeout
+    while main_module.inference_executor.pending == 0:
+        assert time.monotonic() < deadline, "no scoring job was submitted"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def blocked_client(mocker, request):
+    """Provides the API client with one inference worker and no queue, whose scorer blocks until released."""
+    mocker.patch.object(main_module, "INFERENCE_WORKERS", 1)
+    mocker.patch.object(main_module, "INFERENCE_MAX_QUEUE", 0)
+    client = request.getfixturevalue("client")
+    release = threading.Event()
+    main_module.scaler.transform.side_effect = lambda x: x
+
+    def slow_predict(x):
+        release.wait(5)
+        return np.tile([0.3, 0.7], (x.shape[0], 1))
+
+    main_module.lgbm_model.predict_proba.side_effect = slow_predict
+    yield client, release
+    release.set()
+
+
+def test_predict_sheds_load_with_retry_after(blocked_client):
+    """Tests that a request arriving while the only worker is busy gets 503 + Retry-After."""
+    client, release = blocked_client
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(r=client.post("/predict", json={"features": [0.1] * 115})))
+    thread.start()
+    wait_until_busy()
+
+    response = client.post("/predict", json={"features": [0.1] * 115})
+    release.set()
+    thread.join(timeout=10)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert first["r"].status_code == 200
+    metrics = client.get("/metrics/").text
+    assert 'nbiot_inference_rejected_total{reason="overloaded"}' in metrics
+
+
+def test_event_loop_stays_responsive_during_slow_batch(blocked_client):
+    """Tests that a slow /predict_raw leaves the event loop free for other requests."""
+    client, release = blocked_client
+    body = np.full((4, 115), 0.1, dtype="<f4").tobytes()
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(
+        r=client.post("/predict_raw", content=body, headers={"Content-Type": MEDIA_TYPE_FLOAT32})
+    ))
+    thread.start()
+    wait_until_busy()
+
+    assert client.get("/").status_code == 200
+    release.set()
+    thread.join(timeout=10)
+    assert first["r"].status_code == 200
+
+
+def test_request_timeout_header_returns_504(mocker, request):
+    """Tests that X-Request-Timeout bounds the wait for scoring."""
+    mocker.patch.object(main_module, "INFERENCE_WORKERS", 1)
+    client = request.getfixturevalue("client")
+    release = threading.Event()
+    main_module.scaler.transform.side_effect = lambda x: x
+    main_module.lgbm_model.predict_proba.side_effect = lambda x: release.wait(5) and np.tile([0.3, 0.7], (x.shape[0], 1))
+
+    response = client.post("/predict", json={"features": [0.1] * 115}, headers={"X-Request-Timeout": "0.1"})
+    release.set()
+
+    assert response.status_code == 504
+
+
+def test_invalid_request_timeout_header(client: TestClient):
+    """Tests that a non-numeric X-Request-Timeout is rejected."""
+    response = client.post("/predict", json={"features": [0.1] * 115}, headers={"X-Request-Timeout": "soon"})
+
+    assert response.status_code == 400
@@ -0,0 +1,127 @@
+# tests/test_micro_batching.py
+import threading
+import time
+import pytest
+import numpy as np
+from fastapi.testclient import TestClient
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+from app.batching import MicroBatcher
+from app.inference_executor import DeadlineExceeded
+
+
+def test_micro_batcher_coalesces_concurrent_calls():
+    """Tests that concurrent submissions are scored together and fanned back in order."""
+    batch_sizes = []
+
+    def score_fn(features_np, deadline):
+        batch_sizes.append(features_np.shape[0])
+        return features_np[:, 0] / 100.0
+
+    batcher = MicroBatcher(score_fn, max_batch_size=8, max_wait_ms=200)
+    batcher.start()
+    results = {}
+
+    def worker(i):
+        results[i] = batcher.submit(np.full(115, float(i)))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.stop()
+
+    assert results == {i: pytest.approx(i / 100.0) for i in range(8)}
+    assert sum(batch_sizes) == 8
+    assert len(batch_sizes) < 8
+
+
+def test_micro_batcher_propagates_scoring_errors():
+    """Tests that a failing scoring call raises in every waiting caller."""
+    def score_fn(features_np, deadline):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(score_fn, max_batch_size=4, max_wait_ms=1)
+    batcher.start()
+    with pytest.raises(ValueError):
+        batcher.submit(np.zeros(115))
+    batcher.stop()
+
+
+def test_micro_batcher_rejects_invalid_config():
+    """Tests that nonsensical batch sizes are rejected up front."""
+    with pytest.raises(ValueError):
+        MicroBatcher(lambda x, deadline: x, max_batch_size=0)
+
+
+def test_micro_batcher_stops_waiting_at_the_deadline():
+    """Tests that a caller behind a stalled batch gives up at its deadline and its row is never scored."""
+    release, scored = threading.Event(), []
+
+    def score_fn(features_np, deadline):
+        scored.append((features_np[:, 0].tolist(), deadline))
+        release.wait(5)
+        return features_np[:, 0]
+
+    batcher = MicroBatcher(score_fn, max_batch_size=1, max_wait_ms=0)
+    batcher.start()
+    try:
+        stalled = threading.Thread(target=batcher.submit, args=(np.full(115, 1.0),))
+        stalled.start()
+        while not scored:
+            time.sleep(0.001)
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            batcher.submit(np.full(115, 2.0), deadline=started + 0.05)
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+        stalled.join()
+        batcher.stop()
+
+    assert scored == [([1.0], None)]
+
+
+@pytest.fixture
+def batching_client(mocker, request):
+    """Provides the API client with micro-batching switched on."""
+    mocker.patch.object(main_module, "MICRO_BATCH_ENABLED", True)
+    mocker.patch.object(main_module, "MICRO_BATCH_MAX_WAIT_MS", 1.0)
+    return request.getfixturevalue("client")
+
+
+def test_predict_single_through_micro_batcher(batching_client: TestClient):
+    """Tests that /predict is served by the micro-batcher when enabled."""
+    main_module.scaler.transform.side_effect = lambda x: x
+    main_module.lgbm_model.predict_proba.side_effect = lambda x: np.tile([0.3, 0.7], (x.shape[0], 1))
+
+    response = batching_client.post("/predict", json={"features": [0.1] * 115})
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "Attack"
+    assert main_module.micro_batcher is not None
+
+
+def test_predict_single_micro_batch_honours_request_timeout(batching_client: TestClient):
+    """Tests that X-Request-Timeout turns a stalled micro-batch into a 504 instead of a hung request."""
+    release = threading.Event()
+    main_module.scaler.transform.side_effect = lambda x: x
+    main_module.lgbm_model.predict_proba.side_effect = lambda x: release.wait(5) and np.tile([0.3, 0.7], (x.shape[0], 1))
+
+    try:
+        response = batching_client.post("/predict", json={"features": [0.1] * 115}, headers={"X-Request-Timeout": "0.1"})
+    finally:
+        release.set()
+
+    assert response.status_code == 504
+
+
+def test_metrics_endpoint_exposes_batching_histograms(batching_client: TestClient):
+    """Tests that the micro-batch histograms are exported on /metrics."""
+    response = batching_client.get("/metrics/")
+
+    assert response.status_code == 200
+    assert "nbiot_micro_batch_size" in response.text
+    assert "nbiot_micro_batch_queue_wait_seconds" in response.text
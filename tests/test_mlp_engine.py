@@ -0,0 +1,135 @@
+# tests/test_mlp_engine.py
+import os
+import pickle
+import shutil
+import warnings
+import zipfile
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+# Import the main module to access its mocked globals and asset paths
+import app.main as main_module
+from app import mlp_engine
+from app.mlp_engine import DEFAULT_CHECKPOINT_PATH, DEFAULT_MLP_SCALER_PATH, MLPEngine, read_state_dict
+
+EXAMPLE_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "example.csv")
+
+
+@pytest.fixture(scope="module")
+def scaled_rows():
+    """Rows of example.csv, perturbed, scaled with the MLP's StandardScaler."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        scaler = joblib.load(DEFAULT_MLP_SCALER_PATH)
+    features_np = pd.read_csv(EXAMPLE_CSV_PATH, header=None).values
+    rng = np.random.default_rng(0)
+    rows = features_np[rng.integers(0, len(features_np), 2000)] * rng.lognormal(0, 0.5, (2000, 115))
+    return scaler.transform(rows)
+
+
+def reference_forward(state, X):
+    """Float64 forward pass of the three Linear layers, written out by hand."""
+    hidden = np.maximum(X @ state["network.0.weight"].T.astype(np.float64) + state["network.0.bias"], 0)
+    hidden = np.maximum(hidden @ state["network.3.weight"].T.astype(np.float64) + state["network.3.bias"], 0)
+    return (hidden @ state["network.6.weight"].T.astype(np.float64) + state["network.6.bias"])[:, 0]
+
+
+def test_checkpoint_is_read_without_torch():
+    """Tests that the Linear layers of the shipped checkpoint are extracted in module order."""
+    state = read_state_dict(DEFAULT_CHECKPOINT_PATH)
+    engine = MLPEngine.from_state_dict(state)
+
+    assert sorted(state) == [f"network.{i}.{p}" for i in (0, 3, 6) for p in ("bias", "weight")]
+    assert all(value.dtype == np.float32 for value in state.values())
+    assert engine.layer_sizes == [115, 128, 64, 1]
+
+
+def test_numpy_forward_matches_reference(scaled_rows):
+    """Tests float32 inference against a float64 forward pass of the same weights."""
+    state = read_state_dict(DEFAULT_CHECKPOINT_PATH)
+    engine = MLPEngine.from_state_dict(state)
+
+    np.testing.assert_allclose(engine.predict_logit(scaled_rows), reference_forward(state, scaled_rows), rtol=1e-4, atol=1e-4)
+    probabilities = engine.predict_proba(scaled_rows)
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1.0)
+
+
+def test_numpy_forward_matches_torch(scaled_rows):
+    """Tests parity with the PyTorch MLPDetector forward pass in eval mode."""
+    torch = pytest.importorskip("torch")
+    from app.model_definition import MLPDetector
+
+    network = MLPDetector(115, 128, 64, 1, 0.3)
+    network.load_state_dict(torch.load(DEFAULT_CHECKPOINT_PATH, map_location="cpu"))
+    network.eval()
+    with torch.no_grad():
+        expected = network(torch.tensor(scaled_rows, dtype=torch.float32)).numpy()[:, 0]
+
+    engine = MLPEngine.load(DEFAULT_CHECKPOINT_PATH)
+    np.testing.assert_allclose(engine.predict_logit(scaled_rows), expected, rtol=1e-5, atol=1e-5)
+
+
+def test_npz_conversion_round_trips(tmp_path, scaled_rows):
+    """Tests that the offline NumPy archive scores exactly like the checkpoint."""
+    output = tmp_path / "mlp.npz"
+    assert mlp_engine.main(["--output", str(output)]) == 0
+
+    original, converted = MLPEngine.load(DEFAULT_CHECKPOINT_PATH), MLPEngine.load(str(output))
+    np.testing.assert_array_equal(converted.predict_logit(scaled_rows), original.predict_logit(scaled_rows))
+
+
+def test_checkpoint_with_foreign_globals_is_refused(tmp_path):
+    """Tests that the restricted unpickler does not resolve arbitrary globals."""
+    path = tmp_path / "evil.pth"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("evil/data.pkl", pickle.dumps(os.getcwd, protocol=2))
+
+    with pytest.raises(pickle.UnpicklingError):
+        read_state_dict(str(path))
+
+
+def test_ensemble_engine_averages_members():
+    """Tests that the ensemble engine blends LightGBM and MLP probabilities."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ensemble = main_module.load_model_version("ensemble")
+        mlp = main_module.load_model_version("mlp")
+        lightgbm = main_module.load_model_version("lightgbm")
+    raw_rows = pd.read_csv(EXAMPLE_CSV_PATH, header=None).values
+
+    assert ensemble.scaler is None
+    assert ensemble.describe()["blend_weights"] == {"lightgbm": 0.5, "mlp": 0.5}
+    np.testing.assert_allclose(
+        ensemble.score(raw_rows), 0.5 * lightgbm.score(raw_rows) + 0.5 * mlp.score(raw_rows), rtol=1e-12,
+    )
+
+
+@pytest.fixture
+def mlp_assets(tmp_path):
+    """Copies the MLP assets into a model directory before the client patches the loaders."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        scaler = joblib.load(DEFAULT_MLP_SCALER_PATH)
+    for path in (DEFAULT_CHECKPOINT_PATH, DEFAULT_MLP_SCALER_PATH, main_module.FEATURE_LIST_PATH):
+        shutil.copy(path, tmp_path)
+    row = pd.read_csv(EXAMPLE_CSV_PATH, header=None).values[:1]
+    return tmp_path, scaler, row
+
+
+def test_mlp_version_served_through_registry(mlp_assets, client: TestClient, mocker):
+    """Tests loading the MLP as a registry version and selecting it per request."""
+    model_dir, scaler, row = mlp_assets
+    mocker.patch.object(main_module, "MODEL_REGISTRY_DIR", str(model_dir))
+    mocker.patch("app.main.joblib.load", return_value=scaler)
+
+    response = client.post("/admin/models", json={"version": "mlp", "engine": "mlp"})
+    assert response.status_code == 202
+    main_module.model_registry._executor.submit(lambda: None).result(timeout=10)
+
+    expected = MLPEngine.load(DEFAULT_CHECKPOINT_PATH).predict_proba(scaler.transform(row))[0, 1]
+    result = client.post("/predict", json={"features": row[0].tolist()}, headers={"X-Model-Version": "mlp"})
+    assert result.status_code == 200
+    assert result.json()["probability_attack"] == pytest.approx(expected)
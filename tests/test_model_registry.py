@@ -0,0 +1,172 @@
+# tests/test_model_registry.py
+import time
+import pytest
+import numpy as np
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+from app.model_registry import ModelRegistry, ModelVersion, VersionNotFound
+
+
+class ConstantModel:
+    """predict_proba stand-in that returns the same P(attack) for every row."""
+
+    def __init__(self, probability):
+        self.probability = probability
+
+    def predict_proba(self, features_np):
+        attack = np.full(len(features_np), self.probability)
+        return np.column_stack([1 - attack, attack])
+
+
+def version(name, probability=0.5, n_features=115):
+    return ModelVersion(name, [f"f{i}" for i in range(n_features)], lgbm_model=ConstantModel(probability))
+
+
+def test_registry_loads_in_background_and_activates():
+    """Tests that a version loaded on the loader thread is warmed up and can be activated."""
+    registry = ModelRegistry(warmup_rows=8)
+    registry.add(version("v1", 0.1), activate=True)
+
+    loaded = registry.load("v2", lambda: version("ignored", 0.9)).result(timeout=5)
+    assert loaded.name == "v2"
+    assert registry.active.name == "v1"
+
+    previous = registry.activate("v2")
+    assert previous.name == "v1"
+    assert registry.active.score(np.zeros((2, 115))).tolist() == [0.9, 0.9]
+    # The replaced version is unregistered; in-flight holders of `previous` keep working.
+    with pytest.raises(VersionNotFound):
+        registry.get("v1")
+    assert previous.score(np.zeros((1, 115))).tolist() == [0.1]
+    registry.shutdown()
+
+
+def test_registry_keep_previous_and_unload():
+    """Tests that keep_previous retains the old version, which can then be unloaded but not the active one."""
+    registry = ModelRegistry(warmup_rows=8)
+    registry.add(version("v1"), activate=True)
+    registry.add(version("v2"))
+
+    registry.activate("v2", keep_previous=True)
+    assert registry.get("v1").name == "v1"
+
+    with pytest.raises(ValueError):
+        registry.unload("v2")
+    registry.unload("v1")
+    assert [entry["version"] for entry in registry.describe()] == ["v2"]
+    registry.shutdown()
+
+
+def test_registry_failed_warm_up_is_not_activated():
+    """Tests that a version whose warm-up output is not a probability is marked failed."""
+    registry = ModelRegistry(warmup_rows=8)
+    registry.add(version("v1"), activate=True)
+
+    future = registry.load("broken", lambda: version("broken", 1.5), activate=True)
+    with pytest.raises(ValueError):
+        future.result(timeout=5)
+
+    assert registry.active.name == "v1"
+    broken = next(entry for entry in registry.describe() if entry["version"] == "broken")
+    assert broken["status"] == "failed"
+    assert "probability" in broken["error"]
+    with pytest.raises(VersionNotFound):
+        registry.activate("broken")
+    registry.shutdown()
+
+
+def test_registry_rejects_duplicate_load():
+    """Tests that a version cannot be loaded twice while it is loading or loaded."""
+    registry = ModelRegistry(warmup_rows=8)
+    registry.add(version("v1"))
+
+    with pytest.raises(ValueError):
+        registry.load("v1", lambda: version("v1"))
+    registry.shutdown()
+
+
+@pytest.fixture
+def registry_client(mocker, request, tmp_path):
+    """Provides the API client with a model directory holding a second set of assets."""
+    for name in ("model_v2.joblib", "scaler_v2.joblib", "features_v2.json"):
+        (tmp_path / name).write_text("placeholder")
+    mocker.patch.object(main_module, "MODEL_REGISTRY_DIR", str(tmp_path))
+    client = request.getfixturevalue("client")
+    main_module.scaler.transform.side_effect = lambda x: x
+    main_module.lgbm_model.predict_proba.side_effect = lambda x: np.column_stack([1 - x[:, 0], x[:, 0]])
+
+    identity_scaler = MagicMock()
+    identity_scaler.transform.side_effect = lambda x: x
+    mocker.patch("app.main.joblib.load", side_effect=[identity_scaler, ConstantModel(0.75)])
+    return client
+
+
+def wait_for_status(client, name, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        versions = client.get("/admin/models").json()["versions"]
+        entry = next((v for v in versions if v["version"] == name), None)
+        if entry and entry["status"] == status:
+            return entry
+        time.sleep(0.01)
+    raise AssertionError(f"Version {name} never reached status {status}")
+
+
+def test_admin_load_and_select_version(registry_client: TestClient):
+    """Tests loading a version over the API, selecting it per request and activating it."""
+    payload = {"features": [0.2] + [0.5] * 114}
+    listing = registry_client.get("/admin/models").json()
+    startup_version = listing["active"]
+    assert listing["available_assets"] == ["features_v2.json", "model_v2.joblib", "scaler_v2.joblib"]
+
+    response = registry_client.post("/admin/models", json={
+        "version": "v2", "model_file": "model_v2.joblib",
+        "scaler_file": "scaler_v2.joblib", "feature_list_file": "features_v2.json",
+    })
+    assert response.status_code == 202
+    assert response.json() == {"version": "v2", "status": "loading"}
+    wait_for_status(registry_client, "v2", "ready")
+
+    assert registry_client.post("/predict", json=payload).json()["probability_attack"] == pytest.approx(0.2)
+    selected = registry_client.post("/predict", json=payload, headers={"X-Model-Version": "v2"})
+    assert selected.json()["probability_attack"] == pytest.approx(0.75)
+    assert registry_client.post("/predict", json=payload, headers={"X-Model-Version": "nope"}).status_code == 404
+
+    activated = registry_client.post("/admin/models/v2/activate")
+    assert activated.json() == {"active": "v2", "previous": startup_version}
+    assert registry_client.post("/predict", json=payload).json()["probability_attack"] == pytest.approx(0.75)
+    assert [v["version"] for v in registry_client.get("/admin/models").json()["versions"]] == ["v2"]
+
+
+def test_admin_rejects_paths_outside_model_dir(registry_client: TestClient):
+    """Tests that asset names escaping MODEL_REGISTRY_DIR are refused."""
+    response = registry_client.post("/admin/models", json={
+        "model_file": "../../etc/passwd", "scaler_file": "scaler_v2.joblib", "feature_list_file": "features_v2.json",
+    })
+    assert response.status_code == 400
+
+
+def test_admin_requires_token(registry_client: TestClient, mocker):
+    """Tests that the admin endpoints require the bearer token when ADMIN_TOKEN is set."""
+    mocker.patch.object(main_module, "ADMIN_TOKEN", "secret")
+
+    assert registry_client.get("/admin/models").status_code == 401
+    assert registry_client.get("/admin/models", headers={"Authorization": "Bearer secret"}).status_code == 200
+
+
+def test_admin_refuses_registry_changes_under_prefork(registry_client: TestClient, mocker):
+    """Tests that versions cannot be loaded or swapped when each pre-forked worker has its own registry."""
+    mocker.patch.object(main_module, "prefork_workers", 4)
+
+    load = registry_client.post("/admin/models", json={
+        "version": "v2", "model_file": "model_v2.joblib", "scaler_file": "scaler_v2.joblib",
+        "feature_list_file": "features_v2.json",
+    })
+    activate = registry_client.post("/admin/models/v2/activate")
+
+    assert load.status_code == activate.status_code == 409
+    assert "4 pre-forked workers" in load.json()["detail"]
+    assert registry_client.get("/admin/models").status_code == 200
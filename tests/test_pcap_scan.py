@@ -0,0 +1,152 @@
+# tests/test_pcap_scan.py
+import struct
+import pytest
+import numpy as np
+
+from app.feature_extractor import FeatureExtractor
+from app.pcap import PcapError, capture_chunks, iter_chunk, iter_packets
+from app import pcap_scan
+from app.pcap_scan import MAX_CHUNK_BYTES, MIN_CHUNK_BYTES, default_chunk_bytes, main, scan_captures, shard_of
+
+HOSTS = [bytes([10, 0, 0, i]) for i in range(1, 7)]
+MACS = [bytes([2, 0, 0, 0, 0, i]) for i in range(1, 7)]
+
+
+def ethernet_udp(src, dst, sport, dport, payload_len):
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 28 + payload_len, 0, 0, 64, 17, 0, HOSTS[src], HOSTS[dst])
+    udp = struct.pack(">HHHH", sport, dport, 8 + payload_len, 0)
+    return MACS[dst] + MACS[src] + b"\x08\x00" + ip + udp + b"\0" * payload_len
+
+
+def make_traffic(n, seed=0):
+    """(timestamp, frame) pairs between a handful of hosts."""
+    rng = np.random.default_rng(seed)
+    t, traffic = 1_700_000_000.0, []
+    for _ in range(n):
+        t += float(rng.exponential(0.05))
+        src, dst = rng.choice(len(HOSTS), size=2, replace=False)
+        traffic.append((round(t, 6), ethernet_udp(src, dst, int(rng.integers(1000, 1003)), 53, int(rng.integers(0, 200)))))
+    return traffic
+
+
+def write_pcap(path, traffic):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for t, frame in traffic:
+            seconds = int(t)
+            f.write(struct.pack("<IIII", seconds, round((t - seconds) * 1e6), len(frame), len(frame)) + frame)
+
+
+def pcapng_block(block_type, body):
+    body += b"\0" * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def write_pcapng(path, traffic):
+    with open(path, "wb") as f:
+        f.write(pcapng_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1)))
+        # if_tsresol = 9 (nanoseconds), then opt_endofopt.
+        f.write(pcapng_block(1, struct.pack("<HHI", 1, 0, 65535) + struct.pack("<HHB3x", 9, 1, 9) + b"\0" * 4))
+        for t, frame in traffic:
+            ts = round(t * 1e9)
+            f.write(pcapng_block(6, struct.pack("<IIIII", 0, ts >> 32, ts & 0xFFFFFFFF, len(frame), len(frame)) + frame))
+
+
+def first_feature_scorer(X):
+    """Deterministic stand-in for the model that depends on the extracted features."""
+    return 1.0 / (1.0 + np.exp(-(X[:, 0] - 2.0)))
+
+
+@pytest.mark.parametrize("writer", [write_pcap, write_pcapng])
+def test_reader_decodes_captures(tmp_path, writer):
+    """Tests that pcap and pcapng records decode to the expected packets."""
+    traffic = make_traffic(20)
+    path = tmp_path / "capture"
+    writer(path, traffic)
+
+    packets = list(iter_packets(str(path)))
+
+    assert len(packets) == 20
+    for packet, (t, frame) in zip(packets, traffic):
+        assert packet.timestamp == pytest.approx(t, abs=1e-6)
+        assert packet.size == len(frame)
+        assert packet.src_mac == frame[6:12]
+        assert packet.src_ip == frame[26:30]
+        assert packet.dst_ip == frame[30:34]
+        assert packet.dst_port == 53
+
+
+@pytest.mark.parametrize("writer", [write_pcap, write_pcapng])
+def test_chunks_decode_to_the_whole_capture(tmp_path, writer):
+    """Tests that the chunks of a capture decode, in order, to exactly its packets."""
+    path = tmp_path / "capture"
+    writer(path, make_traffic(200))
+
+    chunks = capture_chunks(str(path), 2048)
+
+    assert len(chunks) > 5
+    assert all(a.end == b.start for a, b in zip(chunks, chunks[1:]))
+    assert [packet for chunk in chunks for packet in iter_chunk(chunk)] == list(iter_packets(str(path)))
+
+
+def test_reader_rejects_other_files(tmp_path):
+    """Tests that a file that is not a capture raises PcapError."""
+    path = tmp_path / "not_a_capture"
+    path.write_bytes(b"hello world")
+    with pytest.raises(PcapError):
+        list(iter_packets(str(path)))
+
+
+def test_sharded_scan_matches_single_process(tmp_path, monkeypatch):
+    """Tests that chunked decoding, batched spooling and per-host sharding give the same verdicts as one worker."""
+    traffic = make_traffic(600)
+    first, second = tmp_path / "a.pcap", tmp_path / "b.pcapng"
+    write_pcap(first, traffic[:300])
+    write_pcapng(second, traffic[300:])
+    paths = [str(first), str(second)]
+    assert len({shard_of(host, 2) for host in HOSTS}) == 2
+
+    single = scan_captures(paths, first_feature_scorer, workers=1, window_seconds=5.0, batch_size=64)
+    # Small chunks, so each capture is decoded by several workers, spooled in several batches per shard.
+    monkeypatch.setattr(pcap_scan, "SPOOL_BATCH_PACKETS", 7)
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    sharded = scan_captures(paths, first_feature_scorer, workers=2, window_seconds=5.0, batch_size=64,
+                            chunk_bytes=4096, spool_dir=str(spool_dir))
+    assert list(spool_dir.iterdir()) == []
+
+    assert single.packets_read == sharded.packets_read == 600
+    assert single.rows_scored == sharded.rows_scored == 600
+    assert set(single.verdicts) == set(sharded.verdicts)
+    for name, column in single.verdicts.items():
+        if column.dtype.kind in "fc":
+            np.testing.assert_allclose(sharded.verdicts[name], column, rtol=1e-9, err_msg=name)
+        else:
+            np.testing.assert_array_equal(sharded.verdicts[name], column, err_msg=name)
+
+    # The verdicts agree with scoring every packet with the in-process extractor.
+    packets = [packet for path in paths for packet in iter_packets(path)]
+    probabilities = first_feature_scorer(FeatureExtractor().transform(packets))
+    assert single.verdicts["attack_packets"].sum() == (probabilities > 0.5).sum()
+    assert single.verdicts["max_probability"].max() == pytest.approx(probabilities.max(), rel=1e-6)
+
+
+def test_default_chunk_size_is_bounded():
+    """Tests that chunks are about a quarter of each worker's share, within MIN_CHUNK_BYTES and MAX_CHUNK_BYTES."""
+    assert default_chunk_bytes(10_000, 8) == MIN_CHUNK_BYTES
+    assert default_chunk_bytes(32 * MIN_CHUNK_BYTES, 2) == 4 * MIN_CHUNK_BYTES
+    assert default_chunk_bytes(200 << 30, 8) == MAX_CHUNK_BYTES
+
+
+def test_cli_writes_csv(tmp_path, mocker):
+    """Tests the command line entry point with a patched scorer."""
+    capture, output = tmp_path / "a.pcap", tmp_path / "verdicts.csv"
+    write_pcap(capture, make_traffic(50))
+    mocker.patch("app.pcap_scan.load_scorer", return_value=(first_feature_scorer, None))
+
+    assert main([str(capture), "--workers", "1", "--output", str(output)]) == 0
+
+    lines = output.read_text().splitlines()
+    assert lines[0] == "host,window_start,packets,attack_packets,mean_probability,max_probability"
+    assert sum(int(line.split(",")[2]) for line in lines[1:]) == 50
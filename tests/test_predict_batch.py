@@ -64,4 +64,57 @@ def test_predict_batch_empty_csv(client: TestClient):
     """Tests that an empty CSV file is handled."""
     csv_file = ("test.csv", io.BytesIO(b""), "text/csv")
     response = client.post("/predict_batch", files={"file": csv_file})
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+def test_predict_batch_columnar_json(client: TestClient, setup_batch_mocks):
+    """Tests the columnar JSON format selected through the Accept header."""
+    csv_data = "\n".join([",".join(map(str, [0.1] * 115)) for i in range(3)])
+    csv_file = ("test.csv", io.BytesIO(csv_data.encode('utf-8')), "text/csv")
+
+    response = client.post(
+        "/predict_batch", files={"file": csv_file},
+        headers={"Accept": "application/vnd.nbiot.columnar+json"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.nbiot.columnar+json"
+    assert response.json() == {"labels": [1, 0, 1], "probability_attack": [0.8, 0.3, 0.8]}
+
+
+def test_predict_batch_binary(client: TestClient, setup_batch_mocks):
+    """Tests the packed float32/uint8 binary format."""
+    from app.batch_formats import decode_binary
+
+    csv_data = "\n".join([",".join(map(str, [0.1] * 115)) for i in range(3)])
+    csv_file = ("test.csv", io.BytesIO(csv_data.encode('utf-8')), "text/csv")
+
+    response = client.post(
+        "/predict_batch", files={"file": csv_file},
+        headers={"Accept": "application/vnd.nbiot.predictions"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["x-row-count"] == "3"
+    probabilities, labels = decode_binary(response.content)
+    np.testing.assert_allclose(probabilities, [0.8, 0.3, 0.8], rtol=1e-6)
+    assert labels.tolist() == [1, 0, 1]
+
+
+def test_predict_batch_unsupported_accept(client: TestClient):
+    """Tests that an unsatisfiable Accept header is rejected with 406."""
+    csv_file = ("test.csv", io.BytesIO(b"0.1"), "text/csv")
+    response = client.post("/predict_batch", files={"file": csv_file}, headers={"Accept": "text/html"})
+    assert response.status_code == 406
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, "application/json"),
+    ("*/*", "application/json"),
+    ("application/vnd.nbiot.predictions;q=0.5, application/vnd.nbiot.columnar+json", "application/vnd.nbiot.columnar+json"),
+    ("text/html;q=0.9, application/vnd.nbiot.predictions;q=0.8", "application/vnd.nbiot.predictions"),
+    ("application/json;q=0", None),
+])
+def test_negotiate_media_type(accept, expected):
+    """Tests Accept header parsing with q-values and wildcards."""
+    from app.batch_formats import negotiate_media_type
+    assert negotiate_media_type(accept) == expected
@@ -0,0 +1,116 @@
+# tests/test_predict_batch_stream.py
+import asyncio
+import io
+import json
+import pytest
+import numpy as np
+from fastapi.testclient import TestClient
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+from app.streaming import iter_csv_line_chunks
+
+
+def make_csv(values, n_features=115):
+    return "\n".join(",".join([str(v)] * n_features) for v in values).encode("utf-8")
+
+
+@pytest.fixture
+def setup_stream_mocks(mocker):
+    """Identity scaler; P(attack) equals the first feature of each row."""
+    main_module.scaler.transform.side_effect = lambda x: x
+    main_module.lgbm_model.predict_proba.side_effect = lambda x: np.column_stack([1 - x[:, 0], x[:, 0]])
+    mocker.patch.object(main_module, "STREAM_CHUNK_ROWS", 2)
+
+
+def test_predict_batch_stream_ndjson(client: TestClient, setup_stream_mocks):
+    """Tests that rows are scored chunk by chunk and streamed back as NDJSON."""
+    csv_file = ("test.csv", io.BytesIO(make_csv([0.9, 0.1, 0.8, 0.2, 0.7])), "text/csv")
+
+    response = client.post("/predict_batch/stream", files={"file": csv_file})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["row"] for r in records] == [1, 2, 3, 4, 5]
+    assert [r["status"] for r in records] == ["Attack", "Benign", "Attack", "Benign", "Attack"]
+    assert records[0]["probability_attack"] == pytest.approx(0.9)
+    # Five rows in chunks of two -> three scoring calls
+    assert main_module.lgbm_model.predict_proba.call_count == 3
+
+
+def test_predict_batch_stream_csv(client: TestClient, setup_stream_mocks):
+    """Tests the chunked CSV output format."""
+    csv_file = ("test.csv", io.BytesIO(make_csv([0.9, 0.1, 0.8])), "text/csv")
+
+    response = client.post("/predict_batch/stream?format=csv", files={"file": csv_file})
+
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "row,prediction_label,status,probability_attack"
+    assert lines[1] == "1,1,Attack,0.9"
+    assert lines[2] == "2,0,Benign,0.1"
+    assert len(lines) == 4
+
+
+def test_predict_batch_stream_wrong_columns_in_first_chunk(client: TestClient, setup_stream_mocks):
+    """Tests that a column-count error before streaming starts returns a 400 naming the row."""
+    data = make_csv([0.9]) + b"\n0.1,0.2,0.3"
+    csv_file = ("test.csv", io.BytesIO(data), "text/csv")
+
+    response = client.post("/predict_batch/stream", files={"file": csv_file})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Row 2: expected 115 columns, got 3."
+
+
+def test_predict_batch_stream_error_after_streaming_started(client: TestClient, setup_stream_mocks):
+    """Tests that a parse error in a later chunk ends the stream with an error record."""
+    data = make_csv([0.9, 0.1, 0.8]) + b"\n" + b",".join([b"0.5"] * 114 + [b"abc"])
+    csv_file = ("test.csv", io.BytesIO(data), "text/csv")
+
+    response = client.post("/predict_batch/stream", files={"file": csv_file})
+
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r.get("row") for r in records[:2]] == [1, 2]
+    assert records[-1]["row"] == 4
+    assert "column 115" in records[-1]["error"]
+
+
+def test_predict_batch_stream_empty_csv(client: TestClient):
+    """Tests that an empty upload is rejected."""
+    csv_file = ("test.csv", io.BytesIO(b"\n\n"), "text/csv")
+    response = client.post("/predict_batch/stream", files={"file": csv_file})
+    assert response.status_code == 400
+
+
+def test_predict_batch_stream_invalid_format(client: TestClient):
+    """Tests that unknown output formats are rejected."""
+    csv_file = ("test.csv", io.BytesIO(make_csv([0.1])), "text/csv")
+    response = client.post("/predict_batch/stream?format=xml", files={"file": csv_file})
+    assert response.status_code == 400
+
+
+def test_iter_csv_line_chunks_splits_across_reads(mocker):
+    """Tests that lines split across read boundaries are reassembled and blank lines counted."""
+    mocker.patch("app.streaming.READ_SIZE", 3)
+    buffer = io.BytesIO(b"1,2\n\n3,4\r\n5,6")
+
+    async def read(size):
+        return buffer.read(size)
+
+    async def collect():
+        return [chunk async for chunk in iter_csv_line_chunks(read, chunk_rows=2)]
+
+    chunks = asyncio.run(collect())
+
+    assert [rows.tolist() for rows, _ in chunks] == [[1, 3], [4]]
+    assert [lines for _, lines in chunks] == [[b"1,2", b"3,4"], [b"5,6"]]
+
+
+def test_predict_batch_stream_invalid_file_type(client: TestClient):
+    """Tests that a non-CSV upload is rejected."""
+    txt_file = ("test.txt", io.BytesIO(b"this is not a csv"), "text/plain")
+    response = client.post("/predict_batch/stream", files={"file": txt_file})
+    assert response.status_code == 400
@@ -0,0 +1,106 @@
+# tests/test_predict_raw.py
+import msgpack
+import pytest
+import numpy as np
+from fastapi.testclient import TestClient
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+
+
+@pytest.fixture
+def setup_raw_mocks():
+    """Identity scaler; P(attack) equals the first feature of each row."""
+    main_module.scaler.transform.side_effect = lambda x: x
+    main_module.lgbm_model.predict_proba.side_effect = lambda x: np.column_stack([1 - x[:, 0], x[:, 0]])
+
+
+def make_rows(first_values):
+    rows = np.full((len(first_values), 115), 0.5)
+    rows[:, 0] = first_values
+    return rows
+
+
+@pytest.mark.parametrize("content_type, dtype", [
+    ("application/vnd.nbiot.float32", "<f4"),
+    ("application/vnd.nbiot.float64", "<f8"),
+])
+def test_predict_raw_packed_floats(client: TestClient, setup_raw_mocks, content_type, dtype):
+    """Tests that packed little-endian float matrices are decoded and scored."""
+    body = make_rows([0.75, 0.25]).astype(dtype).tobytes()
+
+    response = client.post("/predict_raw", content=body, headers={"Content-Type": content_type})
+
+    assert response.status_code == 200
+    json_response = response.json()
+    assert [r["status"] for r in json_response] == ["Attack", "Benign"]
+    assert json_response[0]["probability_attack"] == pytest.approx(0.75)
+    scored = main_module.scaler.transform.call_args[0][0]
+    assert scored.shape == (2, 115)
+    assert scored.dtype == np.dtype(dtype)
+
+
+def test_predict_raw_msgpack_packed(client: TestClient, setup_raw_mocks):
+    """Tests the msgpack map with a packed float32 blob."""
+    body = msgpack.packb({"dtype": "float32", "data": make_rows([0.9]).astype("<f4").tobytes()})
+
+    response = client.post("/predict_raw", content=body, headers={"Content-Type": "application/msgpack"})
+
+    assert response.status_code == 200
+    assert response.json()[0]["status"] == "Attack"
+
+
+def test_predict_raw_msgpack_array(client: TestClient, setup_raw_mocks):
+    """Tests a msgpack array of rows, answered in the columnar format."""
+    body = msgpack.packb(make_rows([0.9, 0.1]).tolist())
+
+    response = client.post(
+        "/predict_raw", content=body,
+        headers={"Content-Type": "application/msgpack", "Accept": "application/vnd.nbiot.columnar+json"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["labels"] == [1, 0]
+
+
+def test_predict_raw_wrong_length(client: TestClient, setup_raw_mocks):
+    """Tests that a body that is not a whole number of rows is rejected."""
+    body = np.zeros(114, dtype="<f4").tobytes()
+
+    response = client.post("/predict_raw", content=body, headers={"Content-Type": "application/vnd.nbiot.float32"})
+
+    assert response.status_code == 400
+    assert "not a multiple of 115 float32 values" in response.json()["detail"]
+
+
+def test_predict_raw_msgpack_wrong_feature_count(client: TestClient, setup_raw_mocks):
+    """Tests that msgpack rows of the wrong width are rejected."""
+    body = msgpack.packb([[0.1] * 114])
+
+    response = client.post("/predict_raw", content=body, headers={"Content-Type": "application/msgpack"})
+
+    assert response.status_code == 400
+    assert "Expected 115 features" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("dtype", [[1], {"name": "float32"}, 32, "int8"])
+def test_predict_raw_msgpack_bad_dtype(client: TestClient, dtype):
+    """Tests that a msgpack map whose dtype is not one of the supported names is a 400, whatever its type."""
+    body = msgpack.packb({"dtype": dtype, "data": b""})
+
+    response = client.post("/predict_raw", content=body, headers={"Content-Type": "application/msgpack"})
+
+    assert response.status_code == 400
+    assert "'dtype' ('float32' or 'float64')" in response.json()["detail"]
+
+
+def test_predict_raw_empty_body(client: TestClient):
+    """Tests that an empty body is rejected."""
+    response = client.post("/predict_raw", content=b"", headers={"Content-Type": "application/vnd.nbiot.float64"})
+    assert response.status_code == 400
+
+
+def test_predict_raw_unsupported_content_type(client: TestClient):
+    """Tests that JSON bodies are pointed back to /predict with a 415."""
+    response = client.post("/predict_raw", json={"features": [0.1] * 115})
+    assert response.status_code == 415
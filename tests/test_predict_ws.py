@@ -0,0 +1,188 @@
+# tests/test_predict_ws.py
+import asyncio
+import json
+import threading
+import pytest
+import numpy as np
+from fastapi.testclient import TestClient
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+from app.batch_formats import decode_binary
+from app.model_registry import ModelVersion
+from app.websocket_scoring import SEQ_HEADER, AsyncBatcher
+
+
+@pytest.fixture
+def setup_ws_mocks():
+    """Identity scaler; P(attack) equals the first feature of each row."""
+    main_module.scaler.transform.side_effect = lambda x: x
+    main_module.lgbm_model.predict_proba.side_effect = lambda x: np.column_stack([1 - x[:, 0], x[:, 0]])
+
+
+def vector(first_value):
+    return [first_value] + [0.5] * 114
+
+
+def test_ws_text_frames_with_sequence_ids(client: TestClient, setup_ws_mocks):
+    """Tests that JSON frames are answered in order, with explicit and implicit seq."""
+    with client.websocket_connect("/ws/predict") as ws:
+        ws.send_text(json.dumps({"seq": 10, "features": vector(0.9)}))
+        ws.send_text(json.dumps({"features": vector(0.2)}))
+        first, second = ws.receive_json(), ws.receive_json()
+
+    assert first == {"seq": 10, "prediction_label": 1, "status": "Attack", "probability_attack": pytest.approx(0.9)}
+    assert second["seq"] == 11
+    assert second["status"] == "Benign"
+
+
+def test_ws_binary_frames(client: TestClient, setup_ws_mocks):
+    """Tests that a packed float32 frame of several rows gets one binary verdict frame."""
+    rows = np.full((3, 115), 0.5, dtype="<f4")
+    rows[:, 0] = [0.75, 0.25, 0.6]
+
+    with client.websocket_connect("/ws/predict") as ws:
+        ws.send_bytes(SEQ_HEADER.pack(42) + rows.tobytes())
+        reply = ws.receive_bytes()
+
+    assert SEQ_HEADER.unpack_from(reply)[0] == 42
+    probabilities, labels = decode_binary(reply[SEQ_HEADER.size:])
+    np.testing.assert_allclose(probabilities, [0.75, 0.25, 0.6], rtol=1e-6)
+    assert labels.tolist() == [1, 0, 1]
+
+
+def test_ws_invalid_frames_keep_connection_open(client: TestClient, setup_ws_mocks):
+    """Tests that bad frames are answered with an error and later frames still score."""
+    with client.websocket_connect("/ws/predict") as ws:
+        ws.send_text(json.dumps({"seq": 1, "features": [0.1] * 114}))
+        ws.send_text("not json")
+        ws.send_bytes(SEQ_HEADER.pack(5) + b"\0" * 10)
+        ws.send_text(json.dumps({"seq": 7, "features": vector(0.8)}))
+        replies = [ws.receive_json() for _ in range(3)] + [ws.receive_json()]
+
+    assert replies[0] == {"seq": 1, "error": "Expected 115 features, but got 114"}
+    assert replies[1]["seq"] is None and "JSON" in replies[1]["error"]
+    assert replies[2]["seq"] == 5 and "float32 rows" in replies[2]["error"]
+    assert replies[3]["seq"] == 7 and replies[3]["status"] == "Attack"
+
+
+def test_ws_scoring_error_is_reported(client: TestClient):
+    """Tests that a failing model produces an error frame instead of closing the stream."""
+    main_module.scaler.transform.side_effect = ValueError("boom")
+
+    with client.websocket_connect("/ws/predict") as ws:
+        ws.send_text(json.dumps({"seq": 3, "features": vector(0.5)}))
+        reply = ws.receive_json()
+
+    assert reply == {"seq": 3, "error": "An unexpected error occurred during prediction."}
+
+
+def test_ws_rejected_when_assets_missing(client: TestClient, mocker):
+    """Tests that connections are closed with 1013 while the model is unavailable."""
+    mocker.patch.object(main_module, "assets_loaded", return_value=False)
+
+    with pytest.raises(Exception) as exc_info:
+        with client.websocket_connect("/ws/predict") as ws:
+            ws.receive_text()
+
+    assert getattr(exc_info.value, "code", None) == 1013
+
+
+class ConstantModel:
+    """predict_proba stand-in that returns the same P(attack) for every row."""
+
+    def __init__(self, probability):
+        self.probability = probability
+
+    def predict_proba(self, features_np):
+        attack = np.full(len(features_np), self.probability)
+        return np.column_stack([1 - attack, attack])
+
+
+def test_ws_connection_keeps_its_model_across_activation(client: TestClient, setup_ws_mocks):
+    """Tests that frames are validated and scored with the version active when the connection opened."""
+    registry = main_module.model_registry
+    registry.add(ModelVersion("narrow", ["f0", "f1"], lgbm_model=ConstantModel(0.3)))
+
+    with client.websocket_connect("/ws/predict") as ws:
+        ws.send_text(json.dumps({"seq": 1, "features": vector(0.9)}))
+        assert ws.receive_json()["probability_attack"] == pytest.approx(0.9)
+        previous = registry.activate("narrow", keep_previous=True)
+        ws.send_text(json.dumps({"seq": 2, "features": vector(0.8)}))
+        assert ws.receive_json()["probability_attack"] == pytest.approx(0.8)
+
+    with client.websocket_connect("/ws/predict") as ws:
+        ws.send_text(json.dumps({"seq": 3, "features": [0.1, 0.2]}))
+        assert ws.receive_json()["probability_attack"] == pytest.approx(0.3)
+    with client.websocket_connect("/ws/predict", headers={"X-Model-Version": previous.name}) as ws:
+        ws.send_text(json.dumps({"seq": 4, "features": vector(0.7)}))
+        assert ws.receive_json()["probability_attack"] == pytest.approx(0.7)
+
+
+def test_async_batcher_scores_each_model_separately():
+    """Tests that rows submitted for different models in one batch are scored in separate calls."""
+    calls = []
+
+    def score_fn(features_np, offset):
+        calls.append((features_np.shape[0], offset))
+        return features_np[:, 0] + offset
+
+    async def scenario():
+        batcher = AsyncBatcher(score_fn, max_batch_rows=64, max_wait_ms=50)
+        batcher.start()
+        futures = [await batcher.submit(np.full((1, 115), 0.5), offset) for offset in (0.0, 0.25, 0.0)]
+        results = await asyncio.gather(*futures)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert sorted(calls) == [(1, 0.25), (2, 0.0)]
+    assert [r.tolist() for r in results] == [[0.5], [0.75], [0.5]]
+
+
+def test_async_batcher_coalesces_across_producers():
+    """Tests that rows submitted by concurrent producers are scored in one call."""
+    calls = []
+
+    def score_fn(features_np):
+        calls.append(features_np.shape[0])
+        return features_np[:, 0]
+
+    async def scenario():
+        batcher = AsyncBatcher(score_fn, max_batch_rows=64, max_wait_ms=50)
+        batcher.start()
+        futures = [await batcher.submit(np.full((k, 115), float(k))) for k in (1, 2, 3)]
+        results = await asyncio.gather(*futures)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert calls == [6]
+    assert [r.tolist() for r in results] == [[1.0], [2.0, 2.0], [3.0, 3.0, 3.0]]
+
+
+def test_async_batcher_applies_backpressure():
+    """Tests that producers wait once max_pending requests are queued behind a slow scorer."""
+    release = threading.Event()
+
+    def score_fn(features_np):
+        release.wait(5)
+        return features_np[:, 0]
+
+    async def scenario():
+        batcher = AsyncBatcher(score_fn, max_batch_rows=1, max_wait_ms=0, max_pending=1)
+        batcher.start()
+        first = await batcher.submit(np.zeros((1, 115)))
+        await asyncio.sleep(0.05)  # the first row is now being scored
+        second = await batcher.submit(np.zeros((1, 115)))
+        third = asyncio.ensure_future(batcher.submit(np.zeros((1, 115))))
+        await asyncio.sleep(0.05)
+        blocked = not third.done()
+        release.set()
+        await asyncio.gather(first, second, await third)
+        await batcher.stop()
+        return blocked
+
+    assert asyncio.run(scenario())
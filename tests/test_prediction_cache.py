@@ -0,0 +1,143 @@
+# tests/test_prediction_cache.py
+import io
+import pytest
+import numpy as np
+from fastapi.testclient import TestClient
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+from app.prediction_cache import ENTRY_BYTES, PredictionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingScorer:
+    """P(attack) is the first feature; remembers how many rows it was asked to score."""
+
+    def __init__(self):
+        self.rows = []
+
+    def __call__(self, features_np):
+        self.rows.append(len(features_np))
+        return features_np[:, 0] / 10.0
+
+
+def rows(*first_values):
+    features = np.full((len(first_values), 115), 0.5)
+    features[:, 0] = first_values
+    return features
+
+
+def test_cache_scores_only_misses():
+    """Tests that cached rows and repeats within a batch are not scored again."""
+    cache, scorer = PredictionCache(seed=0), CountingScorer()
+
+    first = cache.score(rows(1, 2, 1, 3), scorer)
+    second = cache.score(rows(3, 4, 1), scorer)
+
+    np.testing.assert_allclose(first, [0.1, 0.2, 0.1, 0.3])
+    np.testing.assert_allclose(second, [0.3, 0.4, 0.1])
+    assert scorer.rows == [3, 1]
+    assert (cache.hits, cache.misses) == (2, 5)
+
+
+def test_cache_ttl_expiry():
+    """Tests that entries are rescored once their TTL has passed."""
+    clock, scorer = FakeClock(), CountingScorer()
+    cache = PredictionCache(ttl_seconds=10, clock=clock, seed=0)
+
+    cache.score(rows(1), scorer)
+    clock.now = 5
+    cache.score(rows(1), scorer)
+    clock.now = 11
+    cache.score(rows(1), scorer)
+
+    assert scorer.rows == [1, 1]
+    assert cache.evictions == 1
+
+
+def test_cache_lru_eviction():
+    """Tests that the least recently used entry goes first when the cache is full."""
+    cache, scorer = PredictionCache(max_entries=2, seed=0), CountingScorer()
+
+    cache.score(rows(1, 2), scorer)
+    cache.score(rows(1), scorer)   # 1 is now the most recently used
+    cache.score(rows(3), scorer)   # evicts 2
+    cache.score(rows(1, 2), scorer)
+
+    assert scorer.rows == [2, 1, 1]
+    assert len(cache) == 2
+
+
+def test_cache_batches_larger_than_the_cache():
+    """Tests that batches overflowing the sets still return every row's own score and keep the size bounded."""
+    cache, scorer = PredictionCache(max_entries=64, seed=0), CountingScorer()
+    values = np.random.default_rng(0).integers(0, 200, size=500).astype(float)
+
+    first = cache.score(rows(*values), scorer)
+    second = cache.score(rows(*values[-20:]), scorer)
+
+    np.testing.assert_allclose(first, values / 10.0)
+    np.testing.assert_allclose(second, values[-20:] / 10.0)
+    assert scorer.rows[0] == len(np.unique(values))
+    assert len(cache) <= 64 and cache.hits + cache.misses == 520
+
+
+def test_cache_byte_budget_limits_entries():
+    """Tests that max_bytes caps the number of entries."""
+    cache = PredictionCache(max_entries=1000, max_bytes=10 * ENTRY_BYTES, seed=0)
+    assert cache.max_entries == 10
+
+
+def test_cache_invalidated_on_model_change():
+    """Tests that a new model version drops every cached verdict."""
+    cache, scorer = PredictionCache(seed=0), CountingScorer()
+
+    cache.score(rows(1, 2), scorer, model_version="a")
+    cache.score(rows(1, 2), scorer, model_version="a")
+    cache.score(rows(1, 2), scorer, model_version="b")
+
+    assert scorer.rows == [2, 2]
+
+
+def test_cache_quantization_shares_entries():
+    """Tests that near-identical vectors share an entry only when quantization is on."""
+    exact, quantized = PredictionCache(seed=0), PredictionCache(quantize_decimals=3, seed=0)
+    features = rows(1.0, 1.0 + 1e-9, 0.0, -0.0)
+
+    assert len(set(exact.keys(features))) == 3
+    assert len(set(quantized.keys(features))) == 2
+
+
+@pytest.fixture
+def cached_client(mocker, request):
+    """Provides the API client with the prediction cache switched on."""
+    mocker.patch.object(main_module, "PREDICTION_CACHE_ENABLED", True)
+    client = request.getfixturevalue("client")
+    main_module.scaler.transform.side_effect = lambda x: x
+    main_module.lgbm_model.predict_proba.side_effect = lambda x: np.column_stack([1 - x[:, 0], x[:, 0]])
+    return client
+
+
+def test_predict_batch_only_scores_unique_rows(cached_client: TestClient):
+    """Tests that duplicate CSV rows reach the model once and later requests hit the cache."""
+    csv_data = "\n".join(",".join(map(str, [v] + [0.5] * 114)) for v in (0.9, 0.1, 0.9, 0.9))
+    files = lambda: {"file": ("test.csv", io.BytesIO(csv_data.encode("utf-8")), "text/csv")}
+
+    first = cached_client.post("/predict_batch", files=files())
+    second = cached_client.post("/predict", json={"features": [0.1] + [0.5] * 114})
+
+    assert first.status_code == 200
+    assert [r["status"] for r in first.json()] == ["Attack", "Benign", "Attack", "Attack"]
+    assert second.json()["probability_attack"] == pytest.approx(0.1)
+    assert [call.args[0].shape[0] for call in main_module.lgbm_model.predict_proba.call_args_list] == [2]
+
+    metrics = cached_client.get("/metrics/").text
+    assert "nbiot_prediction_cache_hits_total" in metrics
+    assert "nbiot_prediction_cache_misses_total" in metrics
@@ -0,0 +1,127 @@
+# tests/test_prefork.py
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import pandas as pd
+import pytest
+
+from app import inference_executor
+from app.inference_executor import available_cpus, cpu_quota
+from app.prefork import worker_cpu_sets
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+EXAMPLE_CSV_PATH = os.path.join(ROOT_DIR, "example.csv")
+
+
+def test_cpu_quota_reads_cgroup_v2_and_v1(tmp_path):
+    """Tests parsing of cgroup v2 cpu.max and the v1 CFS quota files."""
+    v2 = tmp_path / "v2"
+    v2.mkdir()
+    (v2 / "cpu.max").write_text("250000 100000\n")
+    v1 = tmp_path / "v1"
+    (v1 / "cpu").mkdir(parents=True)
+    (v1 / "cpu" / "cpu.cfs_quota_us").write_text("150000\n")
+    (v1 / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    unlimited = tmp_path / "unlimited"
+    unlimited.mkdir()
+    (unlimited / "cpu.max").write_text("max 100000\n")
+
+    assert cpu_quota(str(v2)) == 2.5
+    assert cpu_quota(str(v1)) == 1.5
+    assert cpu_quota(str(unlimited)) is None
+    assert cpu_quota(str(tmp_path / "missing")) is None
+
+
+def test_available_cpus_is_capped_by_quota(mocker):
+    """Tests that the CPU quota, rounded up, caps the affinity mask."""
+    mocker.patch.object(inference_executor.os, "sched_getaffinity", return_value=set(range(8)))
+
+    mocker.patch.object(inference_executor, "cpu_quota", return_value=2.5)
+    assert available_cpus() == 3
+    mocker.patch.object(inference_executor, "cpu_quota", return_value=0.5)
+    assert available_cpus() == 1
+    mocker.patch.object(inference_executor, "cpu_quota", return_value=None)
+    assert available_cpus() == 8
+
+
+def test_worker_cpu_sets_split_cpus_evenly():
+    """Tests that pinned workers get disjoint equal CPU shares, wrapping when oversubscribed."""
+    assert worker_cpu_sets(2, [3, 2, 1, 0]) == [{0, 1}, {2, 3}]
+    assert worker_cpu_sets(3, range(7)) == [{0, 1}, {2, 3}, {4, 5}]
+    assert worker_cpu_sets(3, [0, 1]) == [{0}, {1}, {0}]
+
+
+def _children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def _wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.1)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/task"), reason="needs Linux /proc")
+def test_prefork_server_serves_restarts_and_stops(tmp_path):
+    """Tests that forked workers serve predictions and summed metrics, a killed worker is replaced and SIGTERM stops all."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(
+        os.environ,
+        OTEL_EXPORTER_OTLP_TRACES_ENDPOINT="http://127.0.0.1:9/v1/traces",
+        OTEL_EXPORTER_OTLP_LOGS_ENDPOINT="http://127.0.0.1:9/v1/logs",
+        PROMETHEUS_MULTIPROC_DIR=str(tmp_path / "metrics"),
+    )
+    log = open(tmp_path / "server.log", "wb")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.prefork", "--host", "127.0.0.1", "--port", str(port), "--workers", "2"],
+        cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    row = pd.read_csv(EXAMPLE_CSV_PATH, header=None).values[0].tolist()
+    scored = []
+
+    def predict():
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{port}/predict", data=json.dumps({"features": row}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            result = json.loads(urllib.request.urlopen(request, timeout=5).read())
+        except OSError:
+            return None
+        scored.append(result)
+        return result
+
+    def rows_scored():
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics/", timeout=5).read().decode()
+        line = next(line for line in body.splitlines() if line.startswith('nbiot_rows_scored_total{endpoint="/predict"}'))
+        return float(line.split()[-1])
+
+    try:
+        _wait_for(lambda: predict() is not None)
+        assert 0 <= predict()["probability_attack"] <= 1
+        workers = _children(server.pid)
+        assert len(workers) == 2
+
+        os.kill(workers[0], signal.SIGKILL)
+        _wait_for(lambda: len(_children(server.pid)) == 2 and workers[0] not in _children(server.pid))
+        _wait_for(lambda: predict() is not None)
+        for _ in range(6):
+            predict()
+        # Each scrape lands on either worker and counts the rows of both, and of the killed one.
+        assert [rows_scored() for _ in range(4)] == [float(len(scored))] * 4
+
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=30) == 0
+    finally:
+        if server.poll() is None:
+            server.kill()
+        log.close()
@@ -0,0 +1,91 @@
+# tests/test_stage_metrics.py
+import io
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ALWAYS_OFF, ALWAYS_ON
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+from app.batch_formats import MEDIA_TYPE_JSON
+from app.instrumentation import StageTimer
+
+
+def _tracer(sampler):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=sampler)
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return provider.get_tracer(__name__), exporter
+
+
+@pytest.fixture
+def setup_batch_mocks():
+    """Identity scaler and a model that flags every other row as an attack."""
+    main_module.scaler.transform.side_effect = lambda rows: rows
+    main_module.lgbm_model.predict_proba.side_effect = lambda rows: np.array(
+        [[0.2, 0.8] if i % 2 == 0 else [0.7, 0.3] for i in range(rows.shape[0])]
+    )
+
+
+def test_stage_timer_adds_child_spans_only_when_sampled():
+    """Tests that stages are always observed but become child spans only of sampled requests."""
+    for sampler, expected_spans in ((ALWAYS_ON, ["parse", "predict"]), (ALWAYS_OFF, [])):
+        tracer, exporter = _tracer(sampler)
+        histogram = MagicMock()
+        timer = StageTimer("/predict_batch", histogram)
+        with tracer.start_as_current_span("request") as span:
+            with timer.stage("parse"):
+                pass
+            with timer.stage("predict"):
+                pass
+            timer.finish(span, tracer)
+
+        histogram.labels.assert_any_call(endpoint="/predict_batch", stage="parse")
+        histogram.labels.assert_any_call(endpoint="/predict_batch", stage="predict")
+        assert histogram.labels.return_value.observe.call_count == 2
+        children = [s for s in exporter.get_finished_spans() if s.name != "request"]
+        assert [s.name for s in children] == expected_spans
+        parent = next((s for s in exporter.get_finished_spans() if s.name == "request"), None)
+        assert all(s.parent.span_id == parent.context.span_id and s.end_time >= s.start_time for s in children)
+
+
+def test_batch_request_exports_stage_and_prediction_metrics(client: TestClient, setup_batch_mocks):
+    """Tests that a batch upload shows up in the stage histogram, row and verdict counters."""
+    csv_data = "\n".join(",".join(["0.1"] * 115) for _ in range(3))
+
+    response = client.post("/predict_batch", files={"file": ("test.csv", io.BytesIO(csv_data.encode()), "text/csv")})
+
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()] == ["Attack", "Benign", "Attack"]
+    metrics = client.get("/metrics/").text
+    for stage in ("parse", "scale", "predict", "serialize"):
+        assert f'nbiot_stage_duration_seconds_count{{endpoint="/predict_batch",stage="{stage}"}}' in metrics
+    assert 'nbiot_rows_scored_total{endpoint="/predict_batch"}' in metrics
+    assert 'nbiot_predictions_total{endpoint="/predict_batch",label="attack"}' in metrics
+    assert 'nbiot_requests_in_flight{endpoint="/predict_batch"} 0.0' in metrics
+    assert "nbiot_model_info{" in metrics
+
+
+def test_json_batch_response_matches_default_encoding():
+    """Tests that the handler-built JSON body is byte-identical to FastAPI's response_model encoding."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    probabilities = np.array([0.9, 0.1, 0.5, 0.500001, 1e-7])
+    expected = [
+        main_module.PredictionResponse(
+            prediction_label=int(p > main_module.PREDICTION_THRESHOLD),
+            status="Attack" if p > main_module.PREDICTION_THRESHOLD else "Benign",
+            probability_attack=p,
+        )
+        for p in probabilities.tolist()
+    ]
+
+    body = main_module._batch_response(probabilities, MEDIA_TYPE_JSON).body
+
+    assert body == JSONResponse(jsonable_encoder(expected)).body
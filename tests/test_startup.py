@@ -0,0 +1,98 @@
+# tests/test_startup.py
+import sys
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+# Import the main module to access its mocked globals
+import app.main as main_module
+from app.lazy_imports import LazyModule, lazy_import
+from app.model_registry import ModelRegistry
+
+
+def wait_until_ready(client: TestClient, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while client.get("/readyz").status_code != 200:
+        assert time.monotonic() < deadline, "the startup model never became ready"
+        time.sleep(0.01)
+
+
+def test_lazy_import_defers_the_import_to_first_attribute_access(tmp_path, monkeypatch):
+    """Tests that a lazy module is imported only when one of its attributes is read."""
+    (tmp_path / "lazy_probe_module.py").write_text("VALUE = 3\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_probe_module", raising=False)
+
+    module = lazy_import("lazy_probe_module")
+    assert isinstance(module, LazyModule) and "lazy_probe_module" not in sys.modules
+
+    assert module.VALUE == 3
+    assert "lazy_probe_module" in sys.modules
+    assert lazy_import("lazy_probe_module") is sys.modules["lazy_probe_module"]
+    monkeypatch.delitem(sys.modules, "lazy_probe_module")
+
+
+def test_probes_report_ready_after_startup(client: TestClient):
+    """Tests that both probes pass once the startup model is active."""
+    assert client.get("/livez").json() == {"status": "alive"}
+
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "model_version": main_module.model_registry.active.name}
+
+
+def test_startup_model_is_warmed_up_before_activation(mocker, request):
+    """Tests that the startup version is warmed up before it becomes the active one."""
+    active_during_warm_up = []
+    original = ModelRegistry.warm_up
+
+    def warm_up(registry, version):
+        active_during_warm_up.append(registry.active)
+        return original(registry, version)
+
+    mocker.patch.object(ModelRegistry, "warm_up", warm_up)
+    client = request.getfixturevalue("client")
+
+    assert active_during_warm_up == [None]
+    assert client.get("/readyz").status_code == 200
+
+
+def test_background_load_is_live_but_not_ready_until_loaded(mocker, request):
+    """Tests that with a background load the server answers /livez at once and /readyz once loaded."""
+    release = threading.Event()
+    load = main_module.load_startup_version
+
+    def blocked_load():
+        release.wait(5)
+        return load()
+
+    mocker.patch.object(main_module, "MODEL_LOAD_IN_BACKGROUND", True)
+    mocker.patch.object(main_module, "load_startup_version", blocked_load)
+    client = request.getfixturevalue("client")
+
+    assert client.get("/livez").status_code == 200
+    readiness = client.get("/readyz")
+    assert readiness.status_code == 503 and readiness.json()["detail"] == "Model assets are loading."
+    assert client.post("/predict", json={"features": [0.1] * 115}).status_code == 503
+
+    release.set()
+    wait_until_ready(client)
+    assert client.get("/livez").status_code == 200
+
+
+def test_failed_background_load_fails_both_probes(mocker, request):
+    """Tests that a startup model that cannot be loaded makes the liveness probe fail."""
+    mocker.patch.object(main_module, "MODEL_LOAD_IN_BACKGROUND", True)
+    mocker.patch.object(main_module, "load_startup_version", side_effect=OSError("model file missing"))
+    client = request.getfixturevalue("client")
+
+    deadline = time.monotonic() + 5
+    while main_module.startup_error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    for probe in ("/livez", "/readyz"):
+        response = client.get(probe)
+        assert response.status_code == 503
+        assert "model file missing" in response.json()["detail"]
+
@@ -0,0 +1,124 @@
+# tests/test_telemetry.py
+import logging
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.trace import Status, StatusCode
+
+# Import the main module to configure the request logs
+import app.main as main_module
+from app.telemetry import ErrorKeepingSpanProcessor, ExportQueue, configure_telemetry, make_sampler, remove_log_handler
+
+
+def exported_names(exporter: MagicMock):
+    return [span.name for call in exporter.export.call_args_list for span in call.args[0]]
+
+
+@pytest.fixture
+def traced():
+    """A tracer sampling no new traces but keeping errors, exporting to a mock."""
+    exporter = MagicMock()
+    provider = TracerProvider(sampler=make_sampler(0.0, sample_errors=True))
+    provider.add_span_processor(ErrorKeepingSpanProcessor(exporter))
+    yield provider.get_tracer(__name__), provider, exporter
+    provider.shutdown()
+
+
+def test_unsampled_spans_are_exported_only_when_they_fail(traced):
+    """Tests that requests outside the ratio are recorded, but only the failed ones are exported."""
+    tracer, provider, exporter = traced
+    with tracer.start_as_current_span("ok") as span:
+        assert span.is_recording() and not span.get_span_context().trace_flags.sampled
+        # Children of an unsampled request are not recorded at all.
+        assert not tracer.start_span("child").is_recording()
+    with tracer.start_as_current_span("failed") as span:
+        span.set_status(Status(StatusCode.ERROR, "boom"))
+    provider.force_flush()
+
+    assert exported_names(exporter) == ["failed"]
+    assert exporter.export.call_args.args[0][0].context.trace_flags.sampled
+
+
+def test_sampling_without_errors_records_nothing():
+    """Tests that by default, without sample_errors, the requests outside the ratio get non-recording spans."""
+    provider = TracerProvider(sampler=make_sampler(0.0))
+    assert not provider.get_tracer(__name__).start_span("request").is_recording()
+    assert TracerProvider(sampler=make_sampler(1.0)).get_tracer(__name__).start_span("request").is_recording()
+
+
+def test_full_queue_drops_and_counts_spans():
+    """Tests that spans ended while the exporter is stuck are dropped and counted, not waited for."""
+    release, exporting = threading.Event(), threading.Event()
+    exporter = MagicMock()
+    exporter.export.side_effect = lambda spans: exporting.set() or release.wait(10)
+    dropped = MagicMock()
+    processor = ErrorKeepingSpanProcessor(exporter, dropped, max_queue_size=2, max_export_batch_size=2)
+    provider = TracerProvider(sampler=make_sampler(1.0))
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+    try:
+        for _ in range(2):
+            tracer.start_span("first batch").end()
+        assert exporting.wait(10)
+        started = time.perf_counter()
+        for _ in range(5):
+            tracer.start_span("queued").end()
+        assert time.perf_counter() - started < 1
+    finally:
+        release.set()
+        provider.shutdown()
+
+    dropped.labels.assert_called_with(signal="traces")
+    assert dropped.labels.return_value.inc.call_count == 3
+
+
+def test_export_queue_counts_its_own_depth():
+    """Tests that the queue depth follows puts and exported batches, counting the puts into a full queue."""
+    exporter, dropped = MagicMock(), MagicMock()
+    queue = ExportQueue(exporter, max_size=2, dropped_counter=dropped, signal="logs")
+    for _ in range(3):
+        queue.put()
+    assert queue.depth == 2
+    dropped.labels.assert_called_once_with(signal="logs")
+
+    assert queue.export(["a", "b"]) is exporter.export.return_value
+    queue.shutdown()
+    assert queue.depth == 0 and exporter.shutdown.called
+
+
+def test_logs_are_exported_from_the_configured_level(mocker):
+    """Tests that `logging` records are exported through OTLP from log_export_level up, until the handler is removed."""
+    exporter = MagicMock()
+    mocker.patch("app.telemetry.OTLPSpanExporter", return_value=MagicMock())
+    mocker.patch("app.telemetry.OTLPLogExporter", return_value=exporter)
+    trace_provider, logger_provider = configure_telemetry("test", "http://traces", "http://logs",
+                                                          log_export_level=logging.WARNING)
+    test_logger = logging.getLogger("tests.telemetry")
+    try:
+        test_logger.info("below the level")
+        test_logger.warning("exported")
+    finally:
+        remove_log_handler()
+        test_logger.warning("after removal")
+        trace_provider.shutdown()
+        logger_provider.shutdown()
+
+    bodies = [data.log_record.body for call in exporter.export.call_args_list for data in call.args[0]]
+    assert "exported" in bodies
+    assert "below the level" not in bodies and "after removal" not in bodies
+
+
+def test_request_logs_can_be_silenced():
+    """Tests that LOG_REQUESTS=false raises the access and per-request loggers above INFO."""
+    try:
+        with patch.object(main_module, "LOG_REQUESTS", False):
+            main_module.configure_request_logs()
+        assert not logging.getLogger("uvicorn.access").isEnabledFor(logging.INFO)
+        assert not main_module.request_logger.isEnabledFor(logging.INFO)
+        assert main_module.request_logger.isEnabledFor(logging.WARNING)
+    finally:
+        main_module.configure_request_logs()
+    assert main_module.request_logger.isEnabledFor(logging.INFO)
@@ -0,0 +1,103 @@
+# tests/test_tree_engine.py
+import os
+import warnings
+import joblib
+import lightgbm
+import numpy as np
+import pandas as pd
+import pytest
+
+# Import the main module to access its mocked globals and asset paths
+import app.main as main_module
+from app.tree_engine import TreeEnsemble, MISSING_NAN, MISSING_ZERO
+
+EXAMPLE_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "example.csv")
+
+
+@pytest.fixture(scope="module")
+def real_assets():
+    """Loads the shipped scaler and LightGBM model together with example.csv."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        scaler = joblib.load(main_module.SCALER_PATH)
+        model = joblib.load(main_module.MODEL_PATH)
+    features_np = pd.read_csv(EXAMPLE_CSV_PATH, header=None).values
+    return scaler, model, features_np
+
+
+def test_native_engine_matches_predict_proba_on_example_csv(real_assets):
+    """Tests that the flat tree evaluator reproduces predict_proba on example.csv."""
+    scaler, model, features_np = real_assets
+    scaled_features = scaler.transform(features_np)
+    ensemble = TreeEnsemble.from_booster(model.booster_)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = model.predict_proba(scaled_features)
+
+    np.testing.assert_allclose(ensemble.predict_proba(scaled_features), expected, rtol=0, atol=1e-12)
+
+
+def test_native_engine_matches_predict_proba_on_perturbed_rows(real_assets):
+    """Tests parity on rows perturbed across split thresholds, including NaNs."""
+    scaler, model, features_np = real_assets
+    rng = np.random.default_rng(0)
+    scaled_features = scaler.transform(features_np)
+    rows = scaled_features[rng.integers(0, len(scaled_features), 5000)] * rng.lognormal(0, 1, (5000, 115))
+    rows[rng.random(rows.shape) < 0.01] = np.nan
+    ensemble = TreeEnsemble.from_booster(model.booster_)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = model.predict_proba(rows)
+
+    np.testing.assert_allclose(ensemble.predict_proba(rows), expected, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("zero_as_missing, missing_type", [(False, MISSING_NAN), (True, MISSING_ZERO)])
+def test_native_engine_handles_missing_value_splits(zero_as_missing, missing_type):
+    """Tests default-direction routing for NaN and zero missing-value splits."""
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(2000, 5))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    X[rng.random(X.shape) < 0.2] = np.nan
+    X[rng.random(X.shape) < 0.1] = 0.0
+    model = lightgbm.LGBMClassifier(n_estimators=20, zero_as_missing=zero_as_missing, verbose=-1).fit(X, y)
+
+    ensemble = TreeEnsemble.from_booster(model.booster_)
+
+    assert missing_type in ensemble.missing_type
+    np.testing.assert_allclose(ensemble.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_native_engine_rejects_wrong_feature_count(real_assets):
+    """Tests that inputs with the wrong width are rejected."""
+    _, model, _ = real_assets
+    ensemble = TreeEnsemble.from_booster(model.booster_)
+
+    with pytest.raises(ValueError):
+        ensemble.predict_proba(np.zeros((1, 114)))
+
+
+@pytest.fixture
+def native_client(mocker, request):
+    """Provides the API client with the native engine selected at startup."""
+    mock_ensemble = mocker.MagicMock()
+    mocker.patch.object(main_module, "INFERENCE_ENGINE", "native")
+    mocker.patch("app.main.TreeEnsemble.from_booster", return_value=mock_ensemble)
+    client = request.getfixturevalue("client")
+    return client, mock_ensemble
+
+
+def test_lifespan_selects_native_engine(native_client):
+    """Tests that /predict is scored by the native engine when selected."""
+    client, mock_ensemble = native_client
+    main_module.scaler.transform.side_effect = lambda x: x
+    mock_ensemble.predict_proba.return_value = np.array([[0.9, 0.1]])
+
+    response = client.post("/predict", json={"features": [0.1] * 115})
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "Benign"
+    mock_ensemble.predict_proba.assert_called_once()
+    main_module.lgbm_model.predict_proba.assert_not_called()